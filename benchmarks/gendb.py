@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""
+gendb.py
+    build a synthetic database to benchmark against.
+
+Every resolve is a copy of the sample resolve of tests/db_root, with its own
+timestamp, and padded with additional resolved packages until it reaches the
+requested size. Contexts are named ctx<n> and names name<n>. Timestamps of a
+name are step seconds apart, with some jitter.
+
+gendb.py [-c contexts] [-n names] [-t timestamps] [-k rxt kb] <db>
+"""
+
+from os.path import realpath, dirname
+from os.path import join as pjoin
+import argparse
+import copy
+import json
+import random
+import sys
+import time
+
+REPO_ROOT = dirname(dirname(realpath(__file__)))
+
+SAMPLE = pjoin(REPO_ROOT, "tests", "db_root", "context", "model", "name", "houdini",
+               "timestamp", "1503265457", "model-houdini-1503265457.rxt")
+
+# timestamp of the first resolve of each name
+START = 1500000000
+
+
+def load_sample():
+    """
+    Return the sample resolve the generated resolves are modelled on.
+    """
+    with open(SAMPLE) as f_handle:
+        return json.load(f_handle)
+
+
+def make_rxt(sample, timestamp, rxt_bytes, rand):
+    """
+    Return a copy of sample for the supplied timestamp, padded with resolved
+    packages until its json is at least rxt_bytes long.
+
+    Args:
+        sample        (dict): the resolve to copy.
+        timestamp      (int): timestamp of the new resolve.
+        rxt_bytes      (int): target size of the resolve.
+        rand (random.Random): source of package versions.
+
+    Returns:
+        dict
+    """
+    rxt = copy.deepcopy(sample)
+    rxt["timestamp"] = timestamp
+    rxt["created"] = timestamp
+    size = len(json.dumps(rxt))
+    template = rxt["resolved_packages"][0]
+    index = 0
+    while size < rxt_bytes:
+        package = copy.deepcopy(template)
+        package["variables"]["name"] = "pkg{0}".format(index)
+        package["variables"]["version"] = "{0}.{1}.{2}".format(
+            rand.randint(0, 9), rand.randint(0, 20), rand.randint(0, 200))
+        package["variables"]["index"] = rand.randint(0, 3)
+        rxt["resolved_packages"].append(package)
+        rxt["package_requests"].append(package["variables"]["name"])
+        # the separators of both lists are counted as well
+        size += len(json.dumps(package)) + len(json.dumps(package["variables"]["name"])) + 4
+        index += 1
+    return rxt
+
+
+def generate(db, contexts=2, names=10, timestamps=100, rxt_kb=4, step=3600, seed=0,
+             callback=None):
+    """
+    Build a synthetic database.
+
+    Args:
+        db          (str): database location. (see rezrxt.backends.parse_db)
+        contexts    (int): number of contexts.
+        names       (int): number of names in each context.
+        timestamps  (int): number of resolves of each name.
+        rxt_kb    (float): size of each resolve, in KB.
+        step        (int): seconds between the resolves of a name.
+        seed        (int): seed of the jitter and package versions, so that a
+                           database may be built again identically.
+        callback (callable): called with (context, name) as each name is written.
+
+    Returns:
+        dict of (context, name) -> list of timestamps, in ascending order.
+    """
+    sys.path.insert(0, pjoin(REPO_ROOT, "python"))
+    from rezrxt import backends
+    from rezrxt.filebacked.fsutil import makedirs_exist_ok
+
+    backend, path = backends.parse_db(db)
+    if backend == "filebacked":
+        makedirs_exist_ok(path)
+    rand = random.Random(seed)
+    sample = load_sample()
+    writer = backends.get_writer(db)
+    written = {}
+    for c_index in range(contexts):
+        context = "ctx{0}".format(c_index)
+        for n_index in range(names):
+            name = "name{0}".format(n_index)
+            stamps = [START + t_index * step + rand.randint(0, step // 2)
+                      for t_index in range(timestamps)]
+            for t_stamp in stamps:
+                rxt = make_rxt(sample, t_stamp, int(rxt_kb * 1024), rand)
+                # the filebacked writer indexes a name once, rather than per resolve
+                if hasattr(writer, "store_rxt"):
+                    writer.store_rxt(context, name, rxt)
+                else:
+                    writer.add_rxt(context, name, rxt)
+            if hasattr(writer, "store_rxt"):
+                writer.mgr.update_indexes([(context, name)])
+            written[(context, name)] = stamps
+            if callback is not None:
+                callback(context, name)
+    writer.flush()
+    return written
+
+
+def main():
+    """
+    Main entry point
+    """
+    parser = argparse.ArgumentParser(description="Build a synthetic rezrxt database.")
+    parser.add_argument("db", help="database to create. (a directory, or sqlite:<path>)")
+    parser.add_argument("-c", "--contexts", type=int, default=2,
+                        help="number of contexts (default: %(default)s)")
+    parser.add_argument("-n", "--names", type=int, default=10,
+                        help="number of names per context (default: %(default)s)")
+    parser.add_argument("-t", "--timestamps", type=int, default=100,
+                        help="number of resolves per name (default: %(default)s)")
+    parser.add_argument("-k", "--rxt-kb", dest="rxt_kb", type=float, default=4,
+                        help="size of each resolve in KB (default: %(default)s)")
+    parser.add_argument("--step", type=int, default=3600,
+                        help="seconds between resolves of a name (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    args = parser.parse_args()
+
+    start = time.time()
+    generate(args.db, args.contexts, args.names, args.timestamps, args.rxt_kb, args.step,
+             args.seed, callback=lambda context, name: sys.stdout.write(
+                 "{0} {1}\n".format(context, name)))
+    print "wrote {0} resolves in {1:.2f}s".format(
+        args.contexts * args.names * args.timestamps, time.time() - start)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+
+"""
+suite.py
+    measure the latency of database operations against a synthetic database,
+    and compare them with a saved baseline.
+
+A database is built with gendb.py in a temporary directory, unless one is
+supplied with --db. Each benchmark runs an operation the given number of
+times, choosing its context, name and timestamp at random, and reports the
+p50 and p99 latencies in milliseconds, and the file system calls (stat,
+listdir, open) each operation makes.
+
+    contexts         list the contexts.
+    names            list the names of a context.
+    timestamps       list the timestamps of a name.
+    resolve          resolve an exact timestamp.
+    resolve_approx   resolve the closest timestamp not after a time.
+    rxt_dict         load a resolve, bypassing the cache.
+    rxt_dict_cached  load a resolve from the cache.
+    add_rxt          add a resolve to a separate database of the same backend.
+    wrapper_args     handle the arguments of a wrapper invocation, up to the
+                     point the tool would be launched. rez is stubbed out, and
+                     any import of it fails.
+
+--pack rolls every resolve of the generated database into the pack file of
+its name (see rezrxt-pack) first, to compare packed reads against loose ones.
+
+--save writes the results to benchmarks/baselines/<commit>.json, or the path
+given. --compare reports the change in p50 against a saved baseline, and
+fails if any benchmark is slower than --tolerance allows.
+"""
+
+from os.path import realpath, dirname, isdir, exists
+from os.path import join as pjoin
+from os import environ, makedirs
+import argparse
+import json
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from gendb import REPO_ROOT, START, generate, load_sample
+from wrapper_startup import percentile
+
+sys.path.insert(0, pjoin(REPO_ROOT, "python"))
+
+BASELINE_DIR = pjoin(REPO_ROOT, "benchmarks", "baselines")
+
+# a benchmark fails a comparison when its p50 exceeds the baseline by more than this
+TOLERANCE = 0.25
+# nor when it is slower by less than this many milliseconds, which is noise for
+# the fastest benchmarks
+MIN_SLOWDOWN_MS = 0.01
+# runs of each benchmark traced to count its file system calls
+SYSCALL_RUNS = 20
+
+
+def time_op(operation, runs):
+    """
+    Call operation(run) for each run, returning wall times in milliseconds.
+    """
+    times = []
+    for run in range(runs):
+        start = time.time()
+        operation(run)
+        times.append((time.time() - start) * 1000.0)
+    return times
+
+
+def count_syscalls(operation, runs):
+    """
+    Call operation(run) for each run with instrumentation enabled, returning
+    the mean number of file system calls (fs.* counters) per call.
+    """
+    from rezrxt import instrument
+
+    previous = instrument._TRACE
+    trace = instrument._TRACE = instrument.Trace(None)
+    try:
+        for run in range(runs):
+            operation(run)
+    finally:
+        instrument._TRACE = previous
+    return sum(value for name, value in trace.counters.items()
+               if name.startswith("fs.")) / float(runs)
+
+
+def build_benchmarks(db, written, scratch_db, seed):
+    """
+    Return the benchmarks, as a list of (name, operation) pairs.
+
+    Args:
+        db         (str): database to read.
+        written   (dict): (context, name) -> timestamps, of the database.
+        scratch_db (str): empty database of the same backend, for add_rxt.
+        seed       (int): seed of the random choice of keys.
+    """
+    from rezrxt import backends, cli
+    from rezrxt.cache import RxtCache, shared_cache
+
+    rand = random.Random(seed)
+    keys = sorted(written)
+    reader = backends.get_reader(db, cache=False)
+    cached_reader = backends.get_reader(db, cache=RxtCache())
+
+    def key():
+        context, name = rand.choice(keys)
+        return context, name, rand.choice(written[(context, name)])
+
+    def resolve_approx(_):
+        context, name, t_stamp = key()
+        # location, as resolve raises for packed resolves
+        reader.location(context, name, t_stamp + 1, approximate=True)
+
+    def rxt_dict(_):
+        reader.rxt_dict(*key())
+
+    # a single key, so every load after the first is a cache hit
+    cached_key = key()
+
+    def rxt_dict_cached(_):
+        cached_reader.rxt_dict(*cached_key)
+
+    writer = backends.get_writer(scratch_db)
+    sample = load_sample()
+
+    def add_rxt(run):
+        writer.add_rxt("ctx0", "name0", dict(sample, timestamp=START + run, created=START + run))
+
+    wrapper_db = backends.realdb(db)
+
+    def wrapper_args(_):
+        context, name, t_stamp = key()
+        # a wrapper is a new process, with a cold cache
+        shared_cache().clear()
+        cli.argv[:] = [pjoin("/bin", name), "--rropt",
+                       "context={0},shell=bash,ts={1},db={2}".format(context, t_stamp,
+                                                                     wrapper_db),
+                       "-c", "true"]
+        cli.invoke_wrapped_tool()
+
+    return [
+        ("contexts", lambda _: list(reader.contexts())),
+        ("names", lambda _: reader.names(rand.choice(keys)[0])),
+        ("timestamps", lambda _: reader.timestamps(*rand.choice(keys))),
+        ("resolve", lambda _: reader.location(*key())),
+        ("resolve_approx", resolve_approx),
+        ("rxt_dict", rxt_dict),
+        ("rxt_dict_cached", rxt_dict_cached),
+        ("add_rxt", add_rxt),
+        ("wrapper_args", wrapper_args),
+    ]
+
+
+def stub_rez():
+    """
+    Make the wrapper stop where it would launch the tool, and make any import
+    of rez fail.
+    """
+    from rezrxt import cli
+
+    def no_launch(*args, **kwargs):
+        """
+        Stands in for launching the tool.
+        """
+        return None
+
+    cli._invoke_with_rez = no_launch
+    cli._exec_launch_script = no_launch
+    # a None entry makes import raise ImportError
+    sys.modules["rez"] = None
+    environ.pop("REZRXT_SERVICE", None)
+    environ.pop("REZRXT_MANIFEST", None)
+
+
+def scan_db(db):
+    """
+    Return (context, name) -> timestamps of an existing database.
+    """
+    from rezrxt import backends
+
+    reader = backends.get_reader(db, cache=False)
+    return dict(((context, name), list(reader.timestamps(context, name)))
+                for context in reader.contexts() for name in reader.names(context))
+
+
+def git_commit():
+    """
+    Return the abbreviated commit of the repository, or None.
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=REPO_ROOT, stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the change of each p50 against a baseline.
+
+    Returns:
+        list of the names of benchmarks slower than the tolerance allows.
+    """
+    slower = []
+    print ""
+    print "against {0} ({1})".format(baseline["meta"].get("commit"), baseline["meta"].get("date"))
+    if baseline["meta"].get("db") != results["meta"].get("db"):
+        print "warning: the baseline was measured against a different database"
+    for name, result in sorted(results["results"].items()):
+        base = baseline["results"].get(name)
+        if base is None:
+            print "{0:16} {1:>10}".format(name, "new")
+            continue
+        change = (result["p50"] - base["p50"]) / base["p50"] if base["p50"] else 0.0
+        failed = change > tolerance and result["p50"] - base["p50"] > MIN_SLOWDOWN_MS
+        if failed:
+            slower.append(name)
+        print "{0:16} {1:10.3f} -> {2:10.3f} ms  {3:+7.1%}{4}".format(
+            name, base["p50"], result["p50"], change, "  SLOWER" if failed else "")
+    return slower
+
+
+def main():
+    """
+    Main entry point
+    """
+    parser = argparse.ArgumentParser(description="Benchmark rezrxt database operations.")
+    parser.add_argument("-d", "--db", help=("existing database to read, rather than a generated "
+                                            "one. add_rxt always writes to a scratch database."))
+    parser.add_argument("--backend", default="filebacked", choices=("filebacked", "sqlite"),
+                        help="backend of the generated databases (default: %(default)s)")
+    parser.add_argument("-c", "--contexts", type=int, default=2,
+                        help="generated contexts (default: %(default)s)")
+    parser.add_argument("-n", "--names", type=int, default=10,
+                        help="generated names per context (default: %(default)s)")
+    parser.add_argument("-t", "--timestamps", type=int, default=200,
+                        help="generated resolves per name (default: %(default)s)")
+    parser.add_argument("-k", "--rxt-kb", dest="rxt_kb", type=float, default=4,
+                        help="size of generated resolves in KB (default: %(default)s)")
+    parser.add_argument("-r", "--runs", type=int, default=200,
+                        help="runs of each benchmark (default: %(default)s)")
+    parser.add_argument("--pack", action="store_true",
+                        help="pack every resolve of the generated filebacked database")
+    parser.add_argument("--frozen", action="store_true",
+                        help="read an export of the database to a frozen database file")
+    parser.add_argument("--only", help="comma separated benchmarks to run")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    parser.add_argument("--save", nargs="?", const="", default=None,
+                        help="save the results as a baseline (default: baselines/<commit>.json)")
+    parser.add_argument("--compare", help="baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed p50 slowdown against the baseline (default: %(default)s)")
+    args = parser.parse_args()
+
+    stub_rez()
+    tmp_dir = realpath(tempfile.mkdtemp())
+    try:
+        prefix = "sqlite:" if args.backend == "sqlite" else ""
+        scratch_db = prefix + pjoin(tmp_dir, "scratch")
+        generate(scratch_db, 0, 0, 0)
+        if args.db:
+            db = args.db
+            written = scan_db(db)
+            db_meta = {"path": realpath(db)}
+        else:
+            db = prefix + pjoin(tmp_dir, "db")
+            written = generate(db, args.contexts, args.names, args.timestamps, args.rxt_kb,
+                               seed=args.seed)
+            db_meta = {"backend": args.backend, "contexts": args.contexts, "names": args.names,
+                       "timestamps": args.timestamps, "rxt_kb": args.rxt_kb, "seed": args.seed}
+            if args.pack and args.backend == "filebacked":
+                from rezrxt.filebacked.packer import pack_db
+                pack_db(db, sys.maxsize)
+                db_meta["packed"] = True
+        if args.frozen:
+            from rezrxt.frozen.exporter import export_db
+            export_db(db, pjoin(tmp_dir, "db.rxtdb"))
+            db = "frozen:" + pjoin(tmp_dir, "db.rxtdb")
+            db_meta["frozen"] = True
+
+        only = set(args.only.split(",")) if args.only else None
+        results = {"meta": {"commit": git_commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                            "python": platform.python_version(), "host": platform.node(),
+                            "runs": args.runs, "db": db_meta},
+                   "results": {}}
+        print "{0:16} {1:>10} {2:>10} {3:>10} {4:>10} {5:>10}".format(
+            "benchmark", "p50 ms", "p99 ms", "mean ms", "ops/s", "fs/op")
+        for name, operation in build_benchmarks(db, written, scratch_db, args.seed):
+            if only is not None and name not in only:
+                continue
+            times = time_op(operation, args.runs)
+            mean = sum(times) / len(times)
+            # traced runs continue the run numbers, so add_rxt writes new timestamps
+            syscalls = count_syscalls(lambda run: operation(args.runs + run), SYSCALL_RUNS)
+            result = {"p50": percentile(times, 50), "p99": percentile(times, 99), "mean": mean,
+                      "syscalls": syscalls}
+            results["results"][name] = result
+            print "{0:16} {1:10.3f} {2:10.3f} {3:10.3f} {4:10.0f} {5:10.1f}".format(
+                name, result["p50"], result["p99"], mean, 1000.0 / mean if mean else 0, syscalls)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    if args.save is not None:
+        path = args.save or pjoin(BASELINE_DIR, "{0}.json".format(git_commit() or "baseline"))
+        if not isdir(dirname(realpath(path))):
+            makedirs(dirname(realpath(path)))
+        with open(path, "w") as f_handle:
+            json.dump(results, f_handle, indent=2, sort_keys=True)
+        print "\nsaved baseline {0}".format(path)
+
+    if args.compare:
+        if not exists(args.compare):
+            print "baseline \"{0}\" does not exist".format(args.compare)
+            exit(1)
+        with open(args.compare) as f_handle:
+            slower = compare(results, json.load(f_handle), args.tolerance)
+        exit(1 if slower else 0)
+
+if __name__ == "__main__":
+    main()
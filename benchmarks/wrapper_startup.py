@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""
+wrapper_startup.py
+    measure the startup time of _wrapper.py invocations which do not need rez,
+    and check it against a budget.
+
+A copy of tests/db_root is given a baked bash launch script, and the wrapper
+is invoked through it to run "true". A "rez" package which refuses to import
+is placed first on the PYTHONPATH, so any rez import on the fast path fails
+the benchmark.
+"""
+
+from os.path import realpath, dirname
+from os.path import join as pjoin
+from os import environ, symlink, makedirs
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# p50 wall time budget, in milliseconds, for a wrapper launch which does not
+# need rez. This includes the interpreter startup and the exec'd shell.
+STARTUP_BUDGET_MS = 150
+
+REPO_ROOT = dirname(dirname(realpath(__file__)))
+
+
+def percentile(values, pct):
+    """
+    Return the pct percentile of values.
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def time_command(cmd, env, runs):
+    """
+    Run cmd the given number of times, returning wall times in milliseconds.
+    """
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        subprocess.check_call(cmd, env=env)
+        times.append((time.time() - start) * 1000.0)
+    return times
+
+
+def setup(tmp_dir):
+    """
+    Build a database, wrapper link and poisoned rez package under tmp_dir.
+
+    Returns:
+        (wrapper path, db path, env)
+    """
+    sys.path.insert(0, pjoin(REPO_ROOT, "python"))
+    from rezrxt.filebacked.writer import RezRxtDbWriteMgr
+
+    db_path = pjoin(tmp_dir, "db_root")
+    shutil.copytree(pjoin(REPO_ROOT, "tests", "db_root"), db_path)
+    RezRxtDbWriteMgr(db_path).write_launch_env("model", "houdini", "1503266406",
+                                               {"bash": "export REZRXT_BENCH=1\n"})
+
+    wrapper = pjoin(tmp_dir, "houdini")
+    symlink(pjoin(REPO_ROOT, "bin", "_wrapper.py"), wrapper)
+
+    poison = pjoin(tmp_dir, "poison", "rez")
+    makedirs(poison)
+    with open(pjoin(poison, "__init__.py"), "w") as f_handle:
+        f_handle.write("raise ImportError('rez imported on the wrapper fast path')\n")
+
+    env = dict(environ)
+    env["PYTHONPATH"] = ":".join([dirname(poison), pjoin(REPO_ROOT, "python")])
+    return wrapper, db_path, env
+
+
+def main():
+    """
+    Main entry point
+    """
+    parser = argparse.ArgumentParser(description="Benchmark rez-free wrapper startup.")
+    parser.add_argument("-n", "--runs", type=int, default=20, help="number of launches")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS,
+                        help="p50 budget in milliseconds (default: %(default)s)")
+    args = parser.parse_args()
+
+    tmp_dir = realpath(tempfile.mkdtemp())
+    try:
+        wrapper, db_path, env = setup(tmp_dir)
+        python_times = time_command([sys.executable, "-c", "pass"], env, args.runs)
+        wrapper_times = time_command(
+            [sys.executable, wrapper, "--rropt",
+             "context=model,shell=bash,tool=true,db={0}".format(db_path)], env, args.runs)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    p50 = percentile(wrapper_times, 50)
+    print "python startup   p50 {0:8.2f} ms".format(percentile(python_times, 50))
+    print "wrapper startup  p50 {0:8.2f} ms  p90 {1:8.2f} ms  max {2:8.2f} ms".format(
+        p50, percentile(wrapper_times, 90), max(wrapper_times))
+    print "budget           p50 {0:8.2f} ms  {1}".format(
+        args.budget_ms, "OK" if p50 <= args.budget_ms else "OVER BUDGET")
+    exit(0 if p50 <= args.budget_ms else 1)
+
+if __name__ == "__main__":
+    main()
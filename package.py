@@ -17,7 +17,15 @@ description = \
 
 tools = [
     "rezrxt-add",
-    "rezrxt-ls"
+    "rezrxt-compress",
+    "rezrxt-export",
+    "rezrxt-ls",
+    "rezrxt-pack",
+    "rezrxt-prune",
+    "rezrxt-reindex",
+    "rezrxt-relayout",
+    "rezrxt-serve",
+    "rezrxt-sync"
 ]
 
 requires = ["rez-2+"]
@@ -0,0 +1,113 @@
+"""
+backends.py - select the database implementation for a database location.
+
+A database is named by a path, optionally prefixed by its backend:
+
+    sqlite:/path/to/resolves.sqlite
+    filebacked:/path/to/root
+    frozen:/path/to/export.rxtdb
+
+Unprefixed paths to existing directories are the root directory of a
+filebacked database, whatever their name. Other unprefixed paths ending in
+one of FROZEN_SUFFIXES are frozen databases, exported by rezrxt-export, which
+are read-only. Other unprefixed paths to existing files, or to paths ending
+in one of SQLITE_SUFFIXES, are sqlite databases. Anything else is the root
+directory of a filebacked database.
+Backend modules are imported only once selected.
+"""
+
+__all__ = ("BACKENDS", "parse_db", "db_exists", "realdb", "get_reader", "get_writer")
+
+from os.path import isdir, isfile, realpath
+
+BACKENDS = ("filebacked", "sqlite", "frozen")
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+FROZEN_SUFFIXES = (".rxtdb",)
+
+
+def parse_db(db):
+    """
+    Split a database location into its backend and path.
+
+    Returns:
+        (backend, path)
+    """
+    for backend in BACKENDS:
+        prefix = backend + ":"
+        if db.startswith(prefix):
+            return backend, db[len(prefix):]
+    if isdir(db):
+        return "filebacked", db
+    if db.endswith(FROZEN_SUFFIXES):
+        return "frozen", db
+    if isfile(db) or db.endswith(SQLITE_SUFFIXES):
+        return "sqlite", db
+    return "filebacked", db
+
+
+def db_exists(db):
+    """
+    Return True if the database exists.
+    """
+    backend, path = parse_db(db)
+    return isdir(path) if backend == "filebacked" else isfile(path)
+
+
+def realdb(db):
+    """
+    Return the database location with its path made absolute.
+    """
+    backend, path = parse_db(db)
+    return "{0}:{1}".format(backend, realpath(path))
+
+
+def get_reader(db, cache=None, replica=None):
+    """
+    Return a reader for the database.
+
+    Args:
+        db         (str): database location.
+        cache (RxtCache): cache of parsed resolves. (see the backend readers)
+        replica    (str): path of a local replica of a filebacked database,
+                          synced by rezrxt-sync, to read resolves from.
+
+    Returns:
+        RezRxtDbReaderI
+    """
+    backend, path = parse_db(db)
+    if backend == "filebacked" and replica:
+        from rezrxt.filebacked.replica import ReplicaReader
+        return ReplicaReader(replica, path, cache=cache)
+    if backend == "sqlite":
+        from rezrxt.sqlite.reader import RezRxtDbReader
+    elif backend == "frozen":
+        from rezrxt.frozen.reader import RezRxtDbReader
+    else:
+        from rezrxt.filebacked.reader import RezRxtDbReader
+    return RezRxtDbReader(path, cache=cache)
+
+
+def get_writer(db, bake=False):
+    """
+    Return a writer for the database.
+
+    Args:
+        db    (str): database location.
+        bake (bool): Whether to bake each resolve as it is added. Requires rez.
+
+    Returns:
+        RezRxtDbWriterI
+
+    Raises:
+        ValueError: If the database is frozen, and so read-only.
+    """
+    backend, path = parse_db(db)
+    if backend == "frozen":
+        raise ValueError("{0} is a frozen database, which is read-only".format(path))
+    if backend == "sqlite":
+        from rezrxt.sqlite.writer import RezRxtDbWriter
+    else:
+        from rezrxt.filebacked.writer import RezRxtDbWriter
+    return RezRxtDbWriter(path, bake=bake)
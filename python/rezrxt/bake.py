@@ -0,0 +1,64 @@
+"""
+bake.py - derive launch data from a resolve at add time.
+
+Everything in here requires rez, which is imported only when a function
+is called, so that importing rezrxt.bake stays cheap.
+"""
+
+__all__ = ("load_context", "launch_scripts", "tools_manifest")
+
+
+def load_context(rxt_dict):
+    """
+    Build a rez ResolvedContext from a resolve python dict.
+    """
+    from rez.resolved_context import ResolvedContext
+
+    return ResolvedContext.from_dict(rxt_dict)
+
+
+def launch_scripts(context, shells=None):
+    """
+    Evaluate a resolve, producing a sourceable script per shell type. The
+    scripts apply the fully evaluated environment of the resolve, so a tool
+    may be launched by sourcing one instead of evaluating the context.
+
+    Args:
+        context (ResolvedContext): the resolve.
+        shells            (list): shell types to generate scripts for. (default:
+                                  all shell types known to rez)
+
+    Returns:
+        dict of shell type -> script. Shells which cannot generate code on
+        this host are left out. Failed resolves produce no scripts.
+    """
+    from rez.shells import get_shell_types
+
+    if not context.success:
+        return {}
+
+    scripts = {}
+    for shell in (shells or get_shell_types()):
+        try:
+            scripts[shell] = context.get_shell_code(shell=shell)
+        except Exception:
+            # some shell plugins (eg cmd) refuse to run on this platform.
+            continue
+    return scripts
+
+
+def tools_manifest(context):
+    """
+    Extract the tools provided by each package of a resolve.
+
+    Args:
+        context (ResolvedContext): the resolve.
+
+    Returns:
+        dict of package name -> sorted list of tool names. Failed resolves
+        provide no tools.
+    """
+    if not context.success:
+        return {}
+    return dict((pkg_name, sorted(tools))
+                for pkg_name, (_, tools) in context.get_tools().iteritems())
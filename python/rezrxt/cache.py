@@ -0,0 +1,139 @@
+"""
+cache.py - bounded, in-process LRU cache of parsed resolves.
+
+Entries are keyed (normally by path) and carry a validator, such as the
+(mtime, size) of the file they were parsed from. A lookup whose validator
+does not match the stored one is a miss, and the stale entry is dropped.
+The cache is bounded by a byte budget, measured in the size of the source
+documents, rather than by entry count.
+
+Values are shared between callers, and must be treated as read-only.
+Readers hand out copies of them (see copy_doc), unless asked for the
+shared value.
+"""
+
+__all__ = ("RxtCache", "copy_doc", "shared_cache")
+
+from collections import OrderedDict
+from os import environ
+import threading
+
+from rezrxt import constants, instrument
+
+_SHARED_CACHE = None
+
+
+class RxtCache(object):
+    """
+    Least recently used cache with a byte budget and hit/miss counters.
+    """
+    def __init__(self, max_bytes=constants.DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            max_bytes (int): Byte budget of the cache. Entries larger than the
+                             budget are never stored.
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, validator=None):
+        """
+        Look up an entry.
+
+        Args:
+            key       (hashable): The key of the entry.
+            validator (hashable): The validator the entry must have been stored with.
+
+        Returns:
+            The cached value, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] != validator:
+                if entry is not None:
+                    self.nbytes -= entry[1]
+                self.misses += 1
+                instrument.count("cache.miss")
+                return None
+            # re-insert as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            instrument.count("cache.hit")
+            return entry[2]
+
+    def put(self, key, value, size, validator=None):
+        """
+        Store an entry, evicting the least recently used entries as required
+        to remain within the byte budget.
+
+        Args:
+            key       (hashable): The key of the entry.
+            value       (object): The value to store.
+            size           (int): The cost of the entry, in bytes.
+            validator (hashable): Validator to check against on lookup.
+        """
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            while self._entries and self.nbytes + size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted[1]
+            self._entries[key] = (validator, size, value)
+            self.nbytes += size
+
+    def clear(self):
+        """
+        Drop every entry and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Return a dict of cache statistics.
+        """
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+def copy_doc(value):
+    """
+    Return a deep copy of a parsed json document. Much faster than
+    copy.deepcopy, as only dicts and lists need copying.
+    """
+    if isinstance(value, dict):
+        return dict((key, copy_doc(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [copy_doc(item) for item in value]
+    return value
+
+
+def shared_cache():
+    """
+    Return the process wide cache. Its budget may be set, in bytes, via the
+    REZRXT_CACHE_BYTES env var.
+    """
+    global _SHARED_CACHE
+    if _SHARED_CACHE is None:
+        _SHARED_CACHE = RxtCache(int(environ.get(constants.REZRXT_CACHE_BYTES,
+                                                 constants.DEFAULT_CACHE_BYTES)))
+    return _SHARED_CACHE
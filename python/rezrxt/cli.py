@@ -1,28 +1,28 @@
 """
 wrapper functions.
+
+rez is only imported by the code paths which evaluate a context. Launching
+through a baked launch script, and argument handling, do not import it.
 """
 
 __all__ = ("invoke_wrapped_tool",)
 
 #from os import environ
 from os.path import basename
-from os import environ
+from os import environ, execvp
 from sys import argv, stderr, stdin
 import argparse
 import time
 import select
 
-from rez.resolver import ResolverStatus
-from rez.system import system
-from rez.shells import get_shell_types
-from rez.resolved_context import ResolvedContext
-from rez.vendor.argparse import SUPPRESS
-
-from rezrxt.filebacked import reader
-from rezrxt import constants
+from rezrxt import backends, constants, instrument
+from rezrxt.manifest import read_manifest, pinned_timestamp
+from rezrxt.service import connect_reader
 #from rezrxt.timeutils import epoc_to_gm_asctime, epoc_to_loc_asctime
 #from rez.utils.colorize import  critical, heading, local, implicit, Printer
 
+# shells able to source a baked launch script and exec the tool via "-c"
+_FAST_LAUNCH_SHELLS = ("bash", "sh", "zsh")
 
 def invoke_wrapped_tool():
     """
@@ -31,6 +31,8 @@ def invoke_wrapped_tool():
     wrapper.py
 
     """
+    start = time.time()
+
     # get the package name
     pkg = basename(argv[0])
 
@@ -39,62 +41,112 @@ def invoke_wrapped_tool():
 
     wrapper_args = parse_wrapped_args(pkg, all_args[0])
 
+    # instrumentation. enabled by REZRXT_TRACE, or here, once the arguments
+    # enabling it have been parsed.
+    if wrapper_args.trace:
+        instrument.enable(wrapper_args.trace)
+    instrument.add_time("wrapper.args", time.time() - start)
+
+    # job manifest
+    manifest = _read_job_manifest()
+
     # database
     db_root = wrapper_args.db if wrapper_args and wrapper_args.db\
               else environ.get(constants.REZRXT_DB_ROOT)
+    if db_root is None and manifest is not None:
+        db_root = manifest["db"]
 
     if db_root is None:
         print >> stderr, "Need to set {0} or set db via --rropt".format(constants.REZRXT_DB_ROOT)
         exit(1)
     
-    db_reader = reader.RezRxtDbReader(db_root)
+    with instrument.phase("wrapper.connect"):
+        db_reader = connect_reader(db_root)
 
     # Context
     ctx = wrapper_args.context if (wrapper_args and wrapper_args.context)\
           else environ.get(constants.REZRXT_CTX)
+    if ctx is None and manifest is not None and len(manifest["contexts"]) == 1:
+        ctx = list(manifest["contexts"])[0]
     if ctx is None:
         print >> stderr, "Need to supply a context via --rropt set {0} env var".format(constants.REZRXT_CTX)
         exit(1)
 
-    # Timestamp
-    t_stamp = wrapper_args.timestamp or int(time.time())
+    # Timestamp. a timestamp pinned by the job manifest is exact, and needs no
+    # index lookup. names it does not pin resolve as of the manifest.
+    approximate = True
+    t_stamp = wrapper_args.timestamp
+    if t_stamp is None and manifest is not None and backends.realdb(db_root) == manifest["db"]:
+        t_stamp = pinned_timestamp(manifest, ctx, pkg)
+        approximate = t_stamp is None
+        t_stamp = t_stamp or manifest["timestamp"]
+    t_stamp = t_stamp or int(time.time())
+    instrument.annotate(tool=pkg, context=ctx, timestamp=t_stamp, db=db_root)
 
     if wrapper_args.list_tools is True:
-        _list_tools(db_root, ctx, pkg, t_stamp)
+        _list_tools(db_reader, ctx, pkg, t_stamp, approximate)
 
      # tool
     tool = wrapper_args.tool
 
-    rxt_dict = db_reader.rxt_dict(ctx, pkg, t_stamp, True)
+    cmd = [tool or pkg]
+    cmd.extend(all_args[1])
+
+    # fast path - source the launch script baked by rezrxt-add instead of
+    # evaluating the context. falls back to rez if the script is missing or stale.
+    shell = wrapper_args.shell or _current_shell()
+    if _can_fast_launch(wrapper_args, shell):
+        script = db_reader.launch_script(ctx, pkg, t_stamp, shell, approximate)
+        if script is not None:
+            instrument.annotate(launch="script")
+            _exec_launch_script(shell, script, cmd, wrapper_args.verbose)
 
-    context = ResolvedContext.from_dict(rxt_dict, db_reader.read_mgr.rxt_name(ctx, pkg, t_stamp))
+    return _invoke_with_rez(db_reader, ctx, pkg, t_stamp, cmd, wrapper_args, approximate)
+
+def _read_job_manifest():
+    """
+    Read the job manifest named by the REZRXT_MANIFEST env var, if set.
+
+    Returns:
+        dict, or None if not set.
+    """
+    path = environ.get(constants.REZRXT_MANIFEST)
+    if not path:
+        return None
+    try:
+        return read_manifest(path)
+    except (IOError, ValueError), err:
+        print >> stderr, "cannot read {0} {1} - {2}".format(constants.REZRXT_MANIFEST, path, err)
+        exit(1)
+
+def _invoke_with_rez(db_reader, ctx, pkg, t_stamp, cmd, wrapper_args, approximate=True):
+    """
+    Evaluate the resolve through rez and execute the command in a shell.
+
+    Returns:
+        return code of the command.
+    """
+    instrument.annotate(launch="rez")
+    with instrument.phase("rez.import"):
+        from rez.resolver import ResolverStatus
+        from rez.resolved_context import ResolvedContext
+        from rez.shells import get_shell_types
+
+    if wrapper_args.shell and wrapper_args.shell not in get_shell_types():
+        print >> stderr, "invalid shell \"{0}\" (choose from {1})"\
+            .format(wrapper_args.shell, ", ".join(get_shell_types()))
+        exit(1)
+
+    rxt_dict = db_reader.rxt_dict(ctx, pkg, t_stamp, approximate)
+
+    with instrument.phase("rez.from_dict"):
+        context = ResolvedContext.from_dict(rxt_dict,
+                                            db_reader.location(ctx, pkg, t_stamp, approximate))
 
     if context.status != ResolverStatus.solved:
         print >> stderr, "cannot rez-env into a failed context"
         exit(1)
 
-    # from rez
-    '''
-     # generally shells will behave as though the '-s' flag was not present when
-    # no stdin is available. So here we replicate this behaviour.
-    if opts.stdin and not select.select([sys.stdin], [], [], 0.0)[0]:
-        opts.stdin = False
-
-    quiet = opts.quiet or bool(command)
-    returncode, _, _ = context.execute_shell(
-        shell=opts.shell,
-        rcfile=opts.rcfile,
-        norc=opts.norc,
-        command=command,
-        stdin=opts.stdin,
-        quiet=quiet,
-        start_new_session=opts.new_session,
-        detached=opts.detached,
-        pre_command=opts.pre_command,
-        block=True)
-
-    sys.exit(returncode)
-    '''
     #
     # from rez.cli.env.py
     #
@@ -103,24 +155,57 @@ def invoke_wrapped_tool():
     if wrapper_args.stdin and not select.select([stdin], [], [], 0.0)[0]:
         wrapper_args.stdin = False
 
-    cmd = [tool or pkg]
-    cmd.extend(all_args[1])
-
     quiet = False if wrapper_args.verbose else True
 
-    returncode, _, _ = context.execute_shell(
-        shell=wrapper_args.shell,
-        rcfile=wrapper_args.rcfile,
-        norc=wrapper_args.norc,
-        command=cmd,
-        stdin=wrapper_args.stdin,
-        quiet=quiet,
-        start_new_session=wrapper_args.new_session,
-        detached=wrapper_args.detached,
-        pre_command=wrapper_args.pre_command,
-        block=True)
+    with instrument.phase("rez.execute_shell"):
+        returncode, _, _ = context.execute_shell(
+            shell=wrapper_args.shell,
+            rcfile=wrapper_args.rcfile,
+            norc=wrapper_args.norc,
+            command=cmd,
+            stdin=wrapper_args.stdin,
+            quiet=quiet,
+            start_new_session=wrapper_args.new_session,
+            detached=wrapper_args.detached,
+            pre_command=wrapper_args.pre_command,
+            block=True)
     return returncode
 
+def _current_shell():
+    """
+    Return the shell type of the user's login shell, from the SHELL env var,
+    without asking rez.
+    """
+    return basename(environ.get("SHELL", "")) or None
+
+def _can_fast_launch(wrapper_args, shell):
+    """
+    Return True if the wrapper arguments may be honored by sourcing a baked
+    launch script. Shell options such as rcfile or detached need rez.
+    """
+    if shell not in _FAST_LAUNCH_SHELLS:
+        return False
+    return not (wrapper_args.rcfile or wrapper_args.norc or wrapper_args.stdin or
+                wrapper_args.new_session or wrapper_args.detached or wrapper_args.pre_command)
+
+def _exec_launch_script(shell, script, cmd, verbose=False):
+    """
+    Replace the current process with the shell, sourcing the launch script,
+    which in turn execs the command. Does not return.
+
+    Args:
+        shell   (str): The shell type. (eg bash)
+        script  (str): Path to the baked launch script.
+        cmd    (list): The command and its arguments.
+        verbose (bool): Whether to report the script being sourced.
+    """
+    if verbose:
+        print >> stderr, "sourcing {0}".format(script)
+    # exec does not run exit handlers, so the trace is written first.
+    instrument.write()
+    # within "-c", $0 is the first trailing argument and $@ the remainder.
+    execvp(shell, [shell, "-c", '. "$0" && exec "$@"', script] + cmd)
+
 def _split_args(args):
     """
     Given a list of args, split it into two list - the first a list of
@@ -145,12 +230,12 @@ def _split_args(args):
         all_args[1].append(an_arg)
     return all_args
 
-def _list_tools(db_root, ctx, pkg, t_stamp):
+def _list_tools(db_reader, ctx, pkg, t_stamp, approximate=True):
     """
     List the tools.
     """
     try:
-        t_gen = get_tools(db_root, ctx, pkg, t_stamp)
+        t_gen = get_tools(db_reader, ctx, pkg, t_stamp, approximate)
         list_tools(t_gen)
     except (KeyError, RuntimeError), err:
         print >> stderr, err.message
@@ -166,9 +251,8 @@ def parse_wrapped_args(name, args):
     -d --db rez rxt database
     -t --tool <name> tool
     -l --list list tools
+    --trace <path> append timings and counters to a json lines file
     """
-    shells = get_shell_types()
-
     if args is None:
         return None
     fargs = []
@@ -189,10 +273,12 @@ def parse_wrapped_args(name, args):
     parser.add_argument("-l", "--list", "--list-tools", dest="list_tools", action="store_true",
                         help="list the tools associated with the resolve.")
     parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("--trace", dest="trace",
+                        help=("Append timings and counters to this json lines file. (see {0})"\
+                              .format(constants.REZRXT_TRACE)))
     parser.add_argument(
-        "--shell", dest="shell", type=str, choices=shells,
-        default=system.shell,
-        help="target shell type (default: %(default)s)")
+        "--shell", dest="shell", type=str,
+        help="target shell type (default: the current shell)")
     parser.add_argument(
         "--rcfile", type=str,
         help="source this file instead of the target shell's standard startup "
@@ -210,7 +296,7 @@ def parse_wrapped_args(name, args):
         "--detached", action="store_true",
         help="open a separate terminal")
     parser.add_argument(
-        "--pre-command", type=str, help=SUPPRESS)
+        "--pre-command", type=str, help=argparse.SUPPRESS)
 
     args = parser.parse_args(fargs)
     return args
@@ -223,31 +309,41 @@ def list_tools(t_gen):
     try:
         for pkg_name, tools in t_gen:
             print pkg_name
-            for t_name in tools[1]:
+            for t_name in tools:
                 print "\t{0}".format(t_name)
     except KeyError, err:
         print >> stderr, err.message
         exit(1)
 
-def get_tools(db_root, ctx, pkg, timestamp):
+def get_tools(db_root, ctx, pkg, timestamp, approximate=True):
     """
     Given the appropriate information, list the tools available.
 
     Args:
-        db_root (str): Path to the root of the database.
+        db_root (str | RezRxtDbReaderI): Location of the database, or a reader.
         ctx (str): The context.
         pkg (str): The package.
         timestamp (int): The timestamp in seconds since Jan 1, 1970
+        approximate (bool): Whether to find the nearest timestamp, less than or
+                            equal to timestamp.
 
     Returns:
-        generator of iterator over tools
+        iterator over (package name, list of tools), sorted by package name.
+        The tools manifest stored with the resolve is used where available,
+        otherwise the resolve is evaluated through rez.
 
     Raises:
         KeyError, RuntimeError
     """
-    db_reader = reader.RezRxtDbReader(db_root)
+    db_reader = connect_reader(db_root) if isinstance(db_root, basestring) else db_root
+
+    tools = db_reader.tools(ctx, pkg, timestamp, approximate)
+    if tools is None:
+        from rez.resolved_context import ResolvedContext
 
-    rxt_f = db_reader.resolve(ctx, pkg, timestamp, approximate=True)
-    resolved = ResolvedContext.load(rxt_f)
+        resolved = ResolvedContext.from_dict(db_reader.rxt_dict(ctx, pkg, timestamp, approximate),
+                                             db_reader.location(ctx, pkg, timestamp, approximate))
+        tools = dict((pkg_name, tool_names)
+                     for pkg_name, (_, tool_names) in resolved.get_tools().iteritems())
 
-    return resolved.get_tools().iteritems()
+    return iter(sorted(tools.items()))
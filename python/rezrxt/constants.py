@@ -5,3 +5,23 @@ constants.py - constants
 REZRXT_DB_ROOT = "REZRXT_DB_ROOT"
 # env var name for context
 REZRXT_CTX = "REZRXT_CTX"
+# env var name for the byte budget of the in-process resolve cache
+REZRXT_CACHE_BYTES = "REZRXT_CACHE_BYTES"
+# default byte budget of the in-process resolve cache
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# env var name for the address of a rezrxt-serve service. (eg unix:/tmp/rezrxt.sock
+# or http://host:port)
+REZRXT_SERVICE = "REZRXT_SERVICE"
+# env var name for the path of a job manifest pinning resolves. (see manifest.py)
+REZRXT_MANIFEST = "REZRXT_MANIFEST"
+# env var name for the path of a json lines file timings and counters are
+# appended to. (see instrument.py)
+REZRXT_TRACE = "REZRXT_TRACE"
+# env var name for the path of a node local replica of the database, synced by
+# rezrxt-sync. (see filebacked/replica.py)
+REZRXT_REPLICA = "REZRXT_REPLICA"
+# env var name for the seconds filebacked readers reuse stat results for. (see
+# filebacked/reader.py)
+REZRXT_STAT_TTL = "REZRXT_STAT_TTL"
+# http header naming the database a rezrxt-serve service serves. (see service/server.py)
+DB_HEADER = "X-Rezrxt-Db"
@@ -14,6 +14,161 @@ class RezRxtDbReaderI(object):
             name      (str): Name of the package.
             timestamp (int): Timestamp of the resolve.
 	    approximate  (bool): Whether to allow fuzzy timestamp values.
+
+        Returns:
+            python dict, which the caller may modify.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        raise NotImplementedError()
+
+    def rxt_dict_shared(self, context, name, timestamp, approximate=False):
+        """
+        Retrieve a python dictionary matching the name, context, and timestamp,
+        without copying it out of the cache of the reader. Cheaper than rxt_dict,
+        but the dict is shared, and must be treated as read-only.
+        Readers without a cache need not implement it.
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            timestamp    (int): Timestamp of the resolve.
+            approximate (bool): Whether to allow fuzzy timestamp values.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        return self.rxt_dict(context, name, timestamp, approximate)
+
+    def rxt_fields(self, context, name, timestamp, fields, approximate=False):
+        """
+        Retrieve selected top level keys of a resolve, without parsing the rest.
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            timestamp    (int): Timestamp of the resolve.
+            fields  (iterable): keys to retrieve. (eg ["status", "created"])
+            approximate (bool): Whether to allow fuzzy timestamp values.
+
+        Returns:
+            dict of the keys found to their values.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        raise NotImplementedError()
+
+    def stream_rxt_fields(self, context, name, fields, start=None, end=None, reverse=False):
+        """
+        Retrieve selected top level keys of every resolve of a context and name,
+        one resolve at a time, in timestamp order.
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            fields  (iterable): keys to retrieve.
+            start        (int): earliest timestamp. (default: unbounded)
+            end          (int): latest timestamp. (default: unbounded)
+            reverse     (bool): Whether to stream the newest resolve first.
+
+        Returns:
+            generator of (timestamp, dict of keys found to their values).
+
+        Raises:
+            KeyError: If the db is missing the context or name.
+        """
+        raise NotImplementedError()
+
+    def resolve_timestamp(self, context, name, timestamp, approximate=False):
+        """
+        Return the exact timestamp under which a resolve is stored.
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            timestamp    (int): Timestamp of the resolve.
+            approximate (bool): Whether to find the greatest timestamp less than or
+                                equal to the one supplied (or the earliest, if it
+                                predates every resolve).
+
+        Returns:
+            int
+        """
+        raise NotImplementedError()
+
+    def resolve(self, context, name, timestamp, approximate=False):
+        """
+        Return the path to the rxt file of a resolve. Backends which do not
+        store resolves in files of their own return its location. (see location)
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            timestamp    (int): Timestamp of the resolve.
+            approximate (bool): Whether to allow fuzzy timestamp values.
+
+        Raises:
+            PackedResolveError: If the resolve is packed, and has no rxt file.
+        """
+        raise NotImplementedError()
+
+    def location(self, context, name, timestamp, approximate=False):
+        """
+        Return the location of a resolve, for display. (eg the path of its rxt
+        file, or <pack path>#<timestamp> for a packed resolve)
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            timestamp    (int): Timestamp of the resolve.
+            approximate (bool): Whether to allow fuzzy timestamp values.
+        """
+        raise NotImplementedError()
+
+    def launch_script(self, context, name, timestamp, shell, approximate=False):
+        """
+        Return the path to a script applying the baked environment of a resolve,
+        for the supplied shell type, without rez.
+
+        Returns:
+            Path to the script, or None if unavailable.
+        """
+        raise NotImplementedError()
+
+    def tools(self, context, name, timestamp, approximate=False):
+        """
+        Retrieve the tools provided by each package of a resolve, without rez.
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            timestamp    (int): Timestamp of the resolve.
+            approximate (bool): Whether to allow fuzzy timestamp values.
+
+        Returns:
+            dict of package name -> list of tools, or None if unavailable.
+        """
+        raise NotImplementedError()
+
+    def snapshot(self, contexts, timestamp):
+        """
+        Resolve every name of the supplied contexts as of a timestamp, in one
+        call. Each name resolves as resolve_timestamp does with approximate.
+
+        Args:
+            contexts (list): Contexts to resolve.
+            timestamp (int): Timestamp to resolve as of.
+
+        Returns:
+            dict of context -> name -> {"timestamp": <exact timestamp>,
+                                        "location": <as location>,
+                                        "header": <keys of the resolve outside
+                                                   of its bulky sections>}
+
+        Raises:
+            KeyError: If the db is missing a context.
         """
         raise NotImplementedError()
 
@@ -27,6 +182,46 @@ class RezRxtDbReaderI(object):
         """
         raise NotImplementedError()
 
+    def timestamp_range(self, context, name, start=None, end=None, include_start=True,
+                        include_end=True, reverse=False, limit=None):
+        """
+        Retrieve the timestamps of a name and context between two timestamps, in order.
+
+        Args:
+            context       (str): Context of package.
+            name          (str): Name of package.
+            start         (int): lower bound. (default: unbounded)
+            end           (int): upper bound. (default: unbounded)
+            include_start (bool): Whether the lower bound is inclusive.
+            include_end   (bool): Whether the upper bound is inclusive.
+            reverse       (bool): Whether to order the timestamps newest first.
+            limit         (int): maximum number of timestamps, taken in order.
+
+        Returns:
+            list of timestamps.
+
+        Raises:
+            KeyError: If the db is missing the context or name.
+        """
+        raise NotImplementedError()
+
+    def latest(self, context, name, count=1):
+        """
+        Retrieve the most recent timestamps of a name and context, newest first.
+
+        Args:
+            context (str): Context of package.
+            name    (str): Name of package.
+            count   (int): number of timestamps.
+
+        Returns:
+            list of timestamps.
+
+        Raises:
+            KeyError: If the db is missing the context or name.
+        """
+        raise NotImplementedError()
+
     def names(self, context):
         """
         Given a context, return the names of all the resolves tracked by the Rez Resolve DB.
@@ -65,7 +260,14 @@ class RezRxtDbWriterI(object):
             rxt_dict (dict): resolve python dict.
 
         Raises:
-            DuplicateKeyError: If a context already exists with the supplied data.
+            rezrxt.exceptions.DuplicateKeyError: If a context already exists with the
+                                                 supplied data.
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        """
+        Make every resolve added so far durable, for writers which defer it.
         """
         raise NotImplementedError()
 
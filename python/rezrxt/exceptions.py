@@ -0,0 +1,29 @@
+"""
+exceptions.py - errors raised by rez rxt databases.
+"""
+
+__all__ = ("DuplicateKeyError", "PackedResolveError", "ServiceUnavailable")
+
+
+class DuplicateKeyError(KeyError):
+    """
+    Raised when adding a resolve whose context, name and timestamp are already
+    present in the database.
+    """
+    pass
+
+
+class PackedResolveError(ValueError):
+    """
+    Raised when the path to the rxt file of a resolve is requested, and the
+    resolve is stored in a pack file rather than a file of its own.
+    """
+    pass
+
+
+class ServiceUnavailable(RuntimeError):
+    """
+    Raised by the service client when the service cannot be reached, or does
+    not serve the expected database.
+    """
+    pass
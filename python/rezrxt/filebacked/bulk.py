@@ -0,0 +1,195 @@
+"""
+bulk.py - add many resolves to a database at once.
+
+Resolves are parsed, validated and written by a pool of processes, each of
+which keeps its writer for the life of the pool. The timestamp indexes and
+catalog are brought up to date by the parent once per batch, rather than
+once per resolve. With "batch" durability, the parent also flushes the
+files written by the workers once per batch. A resolve which fails is
+reported and skipped; the rest are still added.
+
+Sources are (context, name, path) triples, built either from paths -
+files, directories (searched recursively for rxt files) and glob patterns -
+or from lines of the form "context name path".
+"""
+
+__all__ = ("bulk_add", "sources_from_paths", "sources_from_lines", "parse_rxt_name",
+           "validate_rxt")
+
+from multiprocessing import Pool
+from os.path import isdir, basename
+from os.path import join as pjoin
+from os import walk
+import glob
+import json
+import re
+import time
+
+from rezrxt.filebacked.writer import RezRxtDbWriter, RezRxtDbWriteMgr
+
+# <context>-<name>-<timestamp>.rxt, as written by the filebacked writer
+_RXT_NAME = re.compile(r"^(?P<context>[^-]+)-(?P<name>.+)-(?P<timestamp>\d+)\.rxt$")
+
+# writers of the current worker process, keyed by (root_db, bake)
+_WRITERS = {}
+
+
+def parse_rxt_name(path):
+    """
+    Extract the context and name from the file name of an rxt file named as
+    the database names them. Contexts containing "-" cannot be recognized.
+
+    Returns:
+        (context, name)
+
+    Raises:
+        ValueError: If the file name does not match.
+    """
+    match = _RXT_NAME.match(basename(path))
+    if match is None:
+        raise ValueError("cannot determine context and name from \"{0}\"".format(basename(path)))
+    return match.group("context"), match.group("name")
+
+
+def sources_from_paths(paths, context=None, name=None):
+    """
+    Expand files, directories and glob patterns into sources. Directories are
+    searched recursively for files ending in .rxt.
+
+    Args:
+        paths (iterable): files, directories or glob patterns.
+        context    (str): context of every resolve. (default: from the file name)
+        name       (str): name of every resolve. (default: from the file name)
+
+    Returns:
+        generator of (context, name, path). context and name are None where
+        they cannot be determined, which bulk_add reports as a failure.
+    """
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if isdir(path):
+                files = sorted(pjoin(d_path, f_name)
+                               for d_path, _, f_names in walk(path)
+                               for f_name in f_names if f_name.endswith(".rxt"))
+            else:
+                files = [path]
+            for f_path in files:
+                try:
+                    f_context, f_name = parse_rxt_name(f_path)
+                except ValueError:
+                    f_context, f_name = None, None
+                yield context or f_context, name or f_name, f_path
+
+
+def sources_from_lines(lines):
+    """
+    Parse lines of "context name path" into sources. Blank lines and lines
+    starting with # are ignored. The path may contain spaces.
+
+    Returns:
+        generator of (context, name, path). Malformed lines yield a source
+        with no context or name, holding the line in place of the path.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split(None, 2)
+        if len(fields) != 3:
+            yield None, None, line
+        else:
+            yield fields[0], fields[1], fields[2]
+
+
+def validate_rxt(rxt_dict):
+    """
+    Check that a parsed rxt file is a resolve which may be added.
+
+    Raises:
+        ValueError: If it is not.
+    """
+    if not isinstance(rxt_dict, dict):
+        raise ValueError("not a resolve - expected a json object")
+    if "timestamp" not in rxt_dict:
+        raise ValueError("resolve has no timestamp")
+    if not isinstance(rxt_dict["timestamp"], (int, long)):
+        raise ValueError("resolve timestamp {0!r} is not an integer".format(rxt_dict["timestamp"]))
+
+
+def _add(task):
+    """
+    Pool worker. Parse, validate and write a single resolve.
+
+    Args:
+        task (tuple): (root_db, context, name, path, bake)
+
+    Returns:
+        (context, name, path, timestamp or None, error message or None, paths
+        written but not yet flushed to disk)
+    """
+    root_db, context, name, path, bake = task
+    try:
+        if context is None or name is None:
+            raise ValueError("cannot determine context and name (expected \"context name path\")")
+        with open(path) as f_handle:
+            rxt_dict = json.load(f_handle)
+        validate_rxt(rxt_dict)
+        writer = _WRITERS.get((root_db, bake))
+        if writer is None:
+            writer = _WRITERS[(root_db, bake)] = RezRxtDbWriter(root_db, bake=bake)
+        timestamp = writer.store_rxt(context, name, rxt_dict)
+        # with "batch" durability, the parent flushes these with the batch
+        return context, name, path, timestamp, None, writer.mgr.sync_batch.drain()
+    except Exception as err:
+        return context, name, path, None, "{0}: {1}".format(type(err).__name__, err), []
+
+
+def bulk_add(root_db, sources, processes=None, bake=False, batch_size=500, callback=None):
+    """
+    Add resolves to the database in parallel.
+
+    Args:
+        root_db      (str): path to the root of the database.
+        sources (iterable): (context, name, path) triples. May be a generator;
+                            it is consumed as the pool makes progress.
+        processes    (int): number of worker processes. (default: cpu count)
+        bake        (bool): whether to bake each resolve. Requires rez.
+        batch_size   (int): number of resolves to write between index updates.
+        callback (callable): called with (context, name, path, timestamp or None,
+                            error message or None) as each resolve completes.
+
+    Returns:
+        dict with the number of resolves added, the failures as (path, error)
+        pairs, and the elapsed seconds.
+    """
+    start = time.time()
+    mgr = RezRxtDbWriteMgr(root_db)
+    summary = {"count": 0, "failures": [], "seconds": 0.0}
+    pending = set()
+    tasks = ((root_db, context, name, path, bake) for context, name, path in sources)
+
+    pool = Pool(processes)
+    try:
+        for result in pool.imap_unordered(_add, tasks, chunksize=8):
+            context, name, path, _, error, unsynced = result
+            mgr.sync_batch.extend(unsynced)
+            if error is None:
+                summary["count"] += 1
+                pending.add((context, name))
+                if summary["count"] % batch_size == 0:
+                    mgr.flush()
+                    mgr.update_indexes(pending)
+                    pending.clear()
+            else:
+                summary["failures"].append((path, error))
+            if callback is not None:
+                callback(result[:5])
+    finally:
+        pool.close()
+        pool.join()
+        mgr.flush()
+        if pending:
+            mgr.update_indexes(pending)
+
+    summary["seconds"] = time.time() - start
+    return summary
@@ -0,0 +1,203 @@
+"""
+catalog.py - root level catalog of the database.
+
+The catalog lives at the root of the database and maps every context to its
+names, and every name to a summary of its timestamps:
+
+{
+    "mtime": <mtime of root/context>,
+    "names_mtimes": {"fx": <mtime of root/context/fx/name>},
+    "contexts": {
+        "fx": {
+            "houdini": {"count": 1, "min": 1503266474, "max": 1503266474}
+        }
+    }
+}
+
+Listing contexts and names is answered from this one file rather than by
+walking the directory tree. The recorded mtimes of the contexts directory,
+and of the names directory of each context, allow a catalog which is missing
+a context or a name to be detected as stale.
+"""
+
+from os.path import join as pjoin
+from os import listdir, stat
+import json
+
+from rezrxt import instrument
+from rezrxt.filebacked.fsutil import atomic_write
+
+CATALOG_NAME = "catalog.json"
+
+
+def _mtime(path):
+    """
+    Return the mtime of path, or None if it does not exist.
+    """
+    instrument.count("fs.stat")
+    try:
+        return stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class Catalog(object):
+    """
+    Contexts -> names -> timestamp summary.
+    """
+    def __init__(self, path, contexts_dir):
+        """
+        Args:
+            path         (str): Path to the catalog file.
+            contexts_dir (str): Path to the directory housing the contexts.
+        """
+        self.path = path
+        self.contexts_dir = contexts_dir
+        self.contexts = {}
+        self.mtime = None
+        self.names_mtimes = {}
+
+    def names_dir(self, context):
+        """
+        Return the path to the directory housing the names of a context.
+        """
+        return pjoin(self.contexts_dir, context, "name")
+
+    def _names_mtimes(self, contexts):
+        """
+        Return the mtime of the names directory of each context.
+        """
+        return dict((context, _mtime(self.names_dir(context))) for context in contexts)
+
+    def read(self):
+        """
+        Read the raw catalog file.
+
+        Returns:
+            dict, or None if the catalog is missing or unreadable.
+        """
+        instrument.count("fs.open")
+        try:
+            with open(self.path) as f_handle:
+                return json.load(f_handle)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def read_current(self):
+        """
+        Read the raw catalog file, provided it matches the contexts directory,
+        and the names directory of each context.
+
+        Returns:
+            dict, or None if the catalog is missing or stale.
+        """
+        mtime = _mtime(self.contexts_dir)
+        data = self.read()
+        if data is None or mtime is None or data.get("mtime") != mtime:
+            return None
+        if data.get("names_mtimes") != self._names_mtimes(data["contexts"]):
+            return None
+        return data
+
+    def load(self, read_mgr):
+        """
+        Load the catalog from disk. If it is missing or stale, rebuild it in
+        memory from the directory tree.
+
+        Args:
+            read_mgr (RezRxtDbReadMgr): manager used to rebuild the catalog.
+
+        Returns:
+            self
+        """
+        data = self.read_current()
+        if data is None:
+            return self.rebuild(read_mgr)
+        self.contexts = data["contexts"]
+        self.mtime = data["mtime"]
+        self.names_mtimes = data["names_mtimes"]
+        return self
+
+    def rebuild(self, read_mgr):
+        """
+        Rebuild the catalog by walking the directory tree.
+
+        Args:
+            read_mgr (RezRxtDbReadMgr): manager used to locate names and timestamps.
+        """
+        self.mtime = _mtime(self.contexts_dir)
+        self.contexts = {}
+        self.names_mtimes = {}
+        if self.mtime is None:
+            # empty database
+            return self
+
+        instrument.count("fs.listdir")
+        for context in listdir(self.contexts_dir):
+            names = self.contexts.setdefault(context, {})
+            # before listing, so that a name added meanwhile makes the catalog stale
+            self.names_mtimes[context] = _mtime(self.names_dir(context))
+            try:
+                n_dir = read_mgr.names_dir(context, verify=True)
+            except KeyError:
+                continue
+            instrument.count("fs.listdir")
+            for name in listdir(n_dir):
+                try:
+                    index = read_mgr.timestamp_index(context, name)
+                except KeyError:
+                    continue
+                names[name] = self.summary(index)
+        return self
+
+    @staticmethod
+    def summary(index):
+        """
+        Summarize a TimestampIndex as a catalog entry.
+        """
+        timestamps = index.timestamps
+        return {"count": len(timestamps),
+                "min": timestamps[0] if timestamps else None,
+                "max": timestamps[-1] if timestamps else None}
+
+    def update(self, context, name, index):
+        """
+        Record the timestamp summary of a context and name.
+        """
+        self.contexts.setdefault(context, {})[name] = self.summary(index)
+
+    def save(self):
+        """
+        Write the catalog to disk, replacing any existing catalog atomically.
+        """
+        self.mtime = _mtime(self.contexts_dir)
+        self.names_mtimes = self._names_mtimes(self.contexts)
+        atomic_write(self.path, json.dumps({"mtime": self.mtime, "names_mtimes": self.names_mtimes,
+                                            "contexts": self.contexts}).encode())
+
+    def names(self, context):
+        """
+        Return the sorted names within a context.
+
+        Raises:
+            KeyError: If the catalog does not contain the context.
+        """
+        try:
+            return sorted(self.contexts[context])
+        except KeyError:
+            raise KeyError("Catalog.names({0}) - context does not exist".format(context))
+
+    def entry(self, context, name):
+        """
+        Return the timestamp summary of a context and name.
+
+        Raises:
+            KeyError: If the catalog does not contain the context or name.
+        """
+        try:
+            return self.contexts[context][name]
+        except KeyError:
+            raise KeyError("Catalog.entry({0}, {1}) - does not exist".format(context, name))
+
+    def __iter__(self):
+        return iter(sorted(self.contexts))
@@ -0,0 +1,141 @@
+"""
+codec.py - compression of stored resolves.
+
+Compressed data is stored in the standard container of each codec, and
+recognized on read by its magic bytes, so readers never need to be told
+which codec was used:
+
+    zlib  0x78
+    bz2   BZh
+    lzma  0xfd 7zXZ 0x00  (xz container)
+
+Anything else is taken to be uncompressed json. lzma is only available
+where the interpreter provides it (python 3, or backports.lzma).
+"""
+
+__all__ = ("CODECS", "available_codecs", "encode", "decode", "decode_stream", "detect")
+
+import bz2
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+CODECS = ("none", "zlib", "bz2", "lzma")
+
+_LZMA_MAGIC = b"\xfd7zXZ\x00"
+_BZ2_MAGIC = b"BZh"
+_ZLIB_MAGIC = b"\x78"
+
+
+def available_codecs():
+    """
+    Return the codecs usable by this interpreter.
+    """
+    return tuple(codec for codec in CODECS if codec != "lzma" or lzma is not None)
+
+
+def detect(data):
+    """
+    Return the name of the codec data was encoded with. data may be bytes, or
+    a buffer over them. (eg a slice of a memory mapped file)
+    """
+    head = bytes(data[:len(_LZMA_MAGIC)])
+    if head.startswith(_LZMA_MAGIC):
+        return "lzma"
+    if head.startswith(_BZ2_MAGIC):
+        return "bz2"
+    if head.startswith(_ZLIB_MAGIC):
+        return "zlib"
+    return "none"
+
+
+def encode(data, codec="none", level=None):
+    """
+    Compress data with codec.
+
+    Args:
+        data  (bytes): data to compress.
+        codec   (str): one of CODECS.
+        level   (int): compression level, or None for the codec's default.
+
+    Returns:
+        bytes
+
+    Raises:
+        ValueError: If the codec is unknown, or unavailable.
+    """
+    if codec in (None, "none"):
+        return data
+    if codec == "zlib":
+        return zlib.compress(data, 6 if level is None else level)
+    if codec == "bz2":
+        return bz2.compress(data, 9 if level is None else level)
+    if codec == "lzma":
+        if lzma is None:
+            raise ValueError("codec lzma is not available to this interpreter")
+        return lzma.compress(data, preset=6 if level is None else level)
+    raise ValueError("unknown codec \"{0}\" (choose from {1})".format(codec, ", ".join(CODECS)))
+
+
+def decode(data):
+    """
+    Decompress data, detecting the codec it was encoded with.
+
+    Returns:
+        bytes
+
+    Raises:
+        ValueError: If data is lzma compressed and lzma is not available.
+    """
+    codec = detect(data)
+    if codec == "none":
+        return data
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "bz2":
+        return bz2.decompress(data)
+    if lzma is None:
+        raise ValueError("data is lzma compressed, and lzma is not available to this interpreter")
+    return lzma.decompress(data)
+
+
+def decode_stream(chunks):
+    """
+    Decompress a stream of chunks incrementally, detecting the codec from the
+    first chunk, so that the whole of the data is never held at once.
+
+    Args:
+        chunks (iterable): the data, as a sequence of bytes. The first chunk
+                           must hold at least the magic bytes of the codec.
+
+    Returns:
+        generator over decompressed bytes.
+
+    Raises:
+        ValueError: If the data is lzma compressed and lzma is not available.
+    """
+    chunks = iter(chunks)
+    first = next(chunks, b"")
+    codec = detect(first)
+    if codec == "none":
+        yield first
+        for chunk in chunks:
+            yield chunk
+        return
+    if codec == "zlib":
+        decompressor = zlib.decompressobj()
+    elif codec == "bz2":
+        decompressor = bz2.BZ2Decompressor()
+    elif lzma is None:
+        raise ValueError("data is lzma compressed, and lzma is not available to this interpreter")
+    else:
+        decompressor = lzma.LZMADecompressor()
+    yield decompressor.decompress(first)
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
@@ -0,0 +1,53 @@
+"""
+config.py - per database settings.
+
+Settings live in an optional config.json at the root of the database, and
+determine how the writer stores new resolves, and which rezrxt-prune
+removes. Readers do not depend on them; every storage format is detected
+when read.
+"""
+
+from os.path import join as pjoin
+import json
+
+CONFIG_NAME = "config.json"
+
+# "none"   files are replaced atomically, but not flushed to disk. a crash may
+#          lose recent resolves, but never leaves a partial one.
+# "batch"  fsyncs are deferred and issued together, once enough writes are
+#          pending, or when the writer is flushed.
+# "always" every file is flushed to disk before the write returns.
+DURABILITY_MODES = ("none", "batch", "always")
+
+DEFAULTS = {
+    # store resolves as a hot header plus cold sections
+    "split": False,
+    # codec new resolves are compressed with. one of codec.CODECS
+    "codec": "none",
+    # store the body of each resolve once, in the content addressed blob store
+    "dedup": False,
+    # when written files are flushed to disk. one of DURABILITY_MODES
+    "durability": "none",
+    # default rules of rezrxt-prune. (see prune.RetentionPolicy.from_config)
+    "retention": None,
+}
+
+
+def load_config(root_db):
+    """
+    Load the settings of the database rooted at root_db, falling back to
+    DEFAULTS for anything unset.
+
+    Returns:
+        dict
+
+    Raises:
+        ValueError: If config.json is not valid json.
+    """
+    config = dict(DEFAULTS)
+    try:
+        with open(pjoin(root_db, CONFIG_NAME)) as f_handle:
+            config.update(json.load(f_handle))
+    except (IOError, OSError):
+        pass
+    return config
@@ -0,0 +1,249 @@
+"""
+fsutil.py - file system helpers shared by the writer and its tools.
+
+Writers on several hosts may share a database. Files are therefore written
+to a uniquely named temporary file and renamed into place, so that readers
+never see a partial file, directories are created tolerating concurrent
+creation, and read-modify-write updates (indexes, catalog) are serialized
+with FileLock.
+"""
+
+__all__ = ("atomic_write", "temp_path", "makedirs_exist_ok", "fsync_path", "disk_usage", "remove_dir",
+           "FileLock", "SyncBatch")
+
+from os.path import dirname, basename
+from os.path import join as pjoin
+from os import makedirs, rename, remove, fsync, fdopen, close, getpid, urandom, lstat, walk
+from os import open as os_open, O_RDONLY, O_RDWR, O_WRONLY, O_CREAT, O_EXCL
+import binascii
+import errno
+import fcntl
+import shutil
+import socket
+import time
+
+from rezrxt import instrument
+
+
+def makedirs_exist_ok(path):
+    """
+    Create path and any missing parents, tolerating directories created
+    concurrently by another writer.
+    """
+    try:
+        makedirs(path)
+    except OSError as err:
+        if err.errno != errno.EEXIST:
+            raise
+
+
+def fsync_path(path):
+    """
+    Flush a file or directory to disk.
+    """
+    instrument.count("fs.fsync")
+    f_desc = os_open(path, O_RDONLY)
+    try:
+        fsync(f_desc)
+    finally:
+        close(f_desc)
+
+
+def disk_usage(path):
+    """
+    Return the (bytes, inodes) of the files and directories under path.
+    """
+    nbytes = inodes = 0
+    for dir_path, _, f_names in walk(path):
+        inodes += 1
+        for f_name in f_names:
+            try:
+                f_stat = lstat(pjoin(dir_path, f_name))
+            except OSError:
+                continue
+            inodes += 1
+            nbytes += f_stat.st_size
+    return nbytes, inodes
+
+
+def remove_dir(path, staged):
+    """
+    Remove a directory tree, renaming it to staged first, so that readers
+    see it either whole or not at all.
+
+    Args:
+        path   (str): directory to remove.
+        staged (str): path to rename it to, in the same directory.
+
+    Returns:
+        (bytes, inodes) removed, or None if path does not exist.
+    """
+    try:
+        rename(path, staged)
+    except OSError:
+        return None
+    usage = disk_usage(staged)
+    shutil.rmtree(staged, ignore_errors=True)
+    return usage
+
+
+def temp_path(path):
+    """
+    Return a path to write the contents of path to before renaming it into
+    place. Unique across hosts sharing the directory.
+    """
+    return pjoin(dirname(path), ".{0}.{1}.{2}.{3}.tmp".format(
+        basename(path), socket.gethostname(), getpid(), binascii.hexlify(urandom(4))))
+
+
+def atomic_write(path, data, fsync_data=False):
+    """
+    Write data to path by way of a temporary file in the same directory and
+    a rename, so that readers see either the old or the new contents.
+
+    Args:
+        path         (str): destination path.
+        data       (bytes): contents.
+        fsync_data  (bool): Whether to flush the file, and the rename, to disk
+                            before returning.
+    """
+    # created with the usual permissions, subject to the umask, unlike
+    # tempfile.mkstemp.
+    instrument.count("bytes.written", len(data))
+    tmp_path = temp_path(path)
+    f_desc = os_open(tmp_path, O_WRONLY | O_CREAT | O_EXCL, 0o666)
+    try:
+        with fdopen(f_desc, 'wb') as f_handle:
+            f_handle.write(data)
+            if fsync_data:
+                f_handle.flush()
+                instrument.count("fs.fsync")
+                fsync(f_handle.fileno())
+        rename(tmp_path, path)
+    except BaseException:
+        try:
+            remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if fsync_data:
+        fsync_path(dirname(path))
+
+
+class FileLock(object):
+    """
+    Exclusive advisory lock on a lock file, held for the duration of a with
+    block. Uses flock, which Linux emulates with byte range locks over NFS, so
+    writers on different hosts exclude one another.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path to the lock file. Created if missing.
+        """
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os_open(self.path, O_RDWR | O_CREAT, 0o666)
+        try:
+            with instrument.phase("lock.wait"):
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            close(self._fd)
+            self._fd = None
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            close(self._fd)
+            self._fd = None
+        return False
+
+
+class SyncBatch(object):
+    """
+    Written files and directories whose flush to disk has been deferred, so
+    that a batch of writes pays for its fsyncs together. Paths are flushed
+    before their parent directories.
+    """
+    def __init__(self, max_pending=256, max_delay=1.0):
+        """
+        Args:
+            max_pending   (int): number of pending files at which a batch is due.
+            max_delay   (float): seconds after the first pending file at which a
+                                 batch is due.
+        """
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self._files = []
+        self._since = None
+
+    def add(self, path):
+        """
+        Record a written file, or a created directory.
+
+        Returns:
+            True if the batch is due to be flushed.
+        """
+        if self._since is None:
+            self._since = time.time()
+        self._files.append(path)
+        return self.due()
+
+    def extend(self, paths):
+        """
+        Record several written files or created directories.
+
+        Returns:
+            True if the batch is due to be flushed.
+        """
+        for path in paths:
+            self.add(path)
+        return self.due()
+
+    def due(self):
+        """
+        Return True if the batch is due to be flushed.
+        """
+        if not self._files:
+            return False
+        return len(self._files) >= self.max_pending or time.time() - self._since >= self.max_delay
+
+    def drain(self):
+        """
+        Stop tracking, and return, the pending files, leaving it to the caller
+        to flush them.
+        """
+        files, self._files, self._since = self._files, [], None
+        return files
+
+    def flush(self):
+        """
+        Flush every pending path, then each of their parent directories, to disk.
+
+        Returns:
+            number of paths flushed.
+        """
+        files = self.drain()
+        dirs = []
+        seen = set(files)
+        for path in files:
+            try:
+                fsync_path(path)
+            except OSError as err:
+                # replaced or removed since; its replacement is flushed by its writer.
+                if err.errno != errno.ENOENT:
+                    raise
+            if dirname(path) not in seen:
+                seen.add(dirname(path))
+                dirs.append(dirname(path))
+        for d_path in dirs:
+            fsync_path(d_path)
+        return len(files)
+
+    def __len__(self):
+        return len(self._files)
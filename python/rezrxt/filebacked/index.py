@@ -0,0 +1,214 @@
+"""
+index.py - persistent, sorted timestamp index.
+
+Each context/name pair keeps a sorted list of its timestamps next to the
+timestamp directory:
+
+root/
+    context/
+        name/
+            timestamps.idx
+            timestamp/
+                ...
+
+The index records the mtime of the timestamp directory it was built from.
+Adding or removing a timestamp directory changes that mtime, which is how
+a stale index is detected without listing the directory.
+
+Timestamps rolled into the pack of the name (see pack.py) have no directory.
+The index lists them with the others, and a rebuild reads them from the
+index of the pack. Timestamp directories may be bucketed (see layout.py); a
+rebuild walks the buckets.
+"""
+
+from os.path import dirname
+from os import stat
+import bisect
+import json
+
+from rezrxt import instrument
+from rezrxt.filebacked.fsutil import atomic_write
+from rezrxt.filebacked.layout import list_timestamps
+from rezrxt.filebacked.pack import PackIndex
+
+INDEX_NAME = "timestamps.idx"
+
+
+def _dir_mtime(path):
+    """
+    Return the mtime of path, or None if it does not exist.
+    """
+    instrument.count("fs.stat")
+    try:
+        return stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def select_range(timestamps, start=None, end=None, include_start=True, include_end=True,
+                 reverse=False, limit=None):
+    """
+    Select a range of a sorted list of timestamps by bisection.
+
+    Args:
+        timestamps    (list): sorted timestamps.
+        start          (int): lower bound. (default: unbounded)
+        end            (int): upper bound. (default: unbounded)
+        include_start (bool): Whether the lower bound is inclusive.
+        include_end   (bool): Whether the upper bound is inclusive.
+        reverse       (bool): Whether to return the range newest first.
+        limit          (int): maximum number of timestamps to return, taken
+                              from the start of the range in the requested
+                              order. (default: unlimited)
+
+    Returns:
+        list of timestamps.
+    """
+    low, high = 0, len(timestamps)
+    if start is not None:
+        low = (bisect.bisect_left if include_start else bisect.bisect_right)(timestamps, int(start))
+    if end is not None:
+        high = (bisect.bisect_right if include_end else bisect.bisect_left)(timestamps, int(end))
+    if limit is not None and high - low > limit:
+        if reverse:
+            low = high - limit
+        else:
+            high = low + limit
+    selected = timestamps[low:high] if high > low else []
+    return selected[::-1] if reverse else selected
+
+
+class TimestampIndex(object):
+    """
+    Sorted timestamps of a single context/name pair.
+    """
+    def __init__(self, index_path, timestamps_dir):
+        """
+        Args:
+            index_path     (str): Path to the index file.
+            timestamps_dir (str): Path to the directory holding the timestamps.
+        """
+        self.index_path = index_path
+        self.timestamps_dir = timestamps_dir
+        self.timestamps = []
+        self.dir_mtime = None
+
+    def load(self, dir_mtime=None, rebuild=True):
+        """
+        Load the index from disk. If the index file is missing or stale, rebuild
+        it, in memory, from the timestamp directory.
+
+        Args:
+            dir_mtime (float): mtime of the timestamp directory, if the caller
+                               has already stat'd it. (default: stat it)
+            rebuild    (bool): Whether to rebuild a missing or stale index.
+
+        Returns:
+            self, or None if the index is missing or stale, and not rebuilt.
+
+        Raises:
+            KeyError: If the timestamp directory does not exist.
+        """
+        dir_mtime = _dir_mtime(self.timestamps_dir) if dir_mtime is None else dir_mtime
+        if dir_mtime is None:
+            raise KeyError("TimestampIndex.load() - {0} does not exist".format(self.timestamps_dir))
+
+        data = self.read_current(dir_mtime)
+        if data is None:
+            if not rebuild:
+                return None
+            self.rebuild(dir_mtime)
+        else:
+            self.timestamps = data["timestamps"]
+            self.dir_mtime = dir_mtime
+        return self
+
+    def read(self):
+        """
+        Read the raw index file.
+
+        Returns:
+            dict, or None if the index is missing or unreadable.
+        """
+        instrument.count("fs.open")
+        try:
+            with open(self.index_path) as f_handle:
+                return json.load(f_handle)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def read_current(self, dir_mtime=None):
+        """
+        Read the raw index file, provided it matches the timestamp directory.
+
+        Returns:
+            dict, or None if the index is missing or stale.
+        """
+        dir_mtime = dir_mtime if dir_mtime is not None else _dir_mtime(self.timestamps_dir)
+        data = self.read()
+        if data is None or dir_mtime is None or data.get("mtime") != dir_mtime:
+            return None
+        return data
+
+    def rebuild(self, dir_mtime=None):
+        """
+        Rebuild the index by listing the timestamp directory, and its buckets,
+        and reading the index of the pack.
+        """
+        self.dir_mtime = dir_mtime if dir_mtime is not None else _dir_mtime(self.timestamps_dir)
+        timestamps = list_timestamps(self.timestamps_dir)
+        pack = PackIndex.read(dirname(self.index_path))
+        if pack is not None:
+            timestamps.update(pack.entries)
+        self.timestamps = sorted(timestamps)
+        return self
+
+    def insert(self, timestamp):
+        """
+        Insert a timestamp, keeping the index sorted.
+        """
+        timestamp = int(timestamp)
+        pos = bisect.bisect_left(self.timestamps, timestamp)
+        if pos == len(self.timestamps) or self.timestamps[pos] != timestamp:
+            self.timestamps.insert(pos, timestamp)
+
+    def save(self):
+        """
+        Write the index to disk, replacing any existing index atomically.
+        The current mtime of the timestamp directory is recorded.
+        """
+        self.dir_mtime = _dir_mtime(self.timestamps_dir)
+        atomic_write(self.index_path,
+                     json.dumps({"mtime": self.dir_mtime, "timestamps": self.timestamps}).encode())
+
+    def floor(self, timestamp):
+        """
+        Return the greatest timestamp less than or equal to the supplied one.
+        If the supplied timestamp predates every entry, return the earliest one.
+
+        Raises:
+            KeyError: If the index is empty.
+        """
+        if not self.timestamps:
+            raise KeyError("TimestampIndex.floor({0}) - {1} is empty"\
+                           .format(timestamp, self.timestamps_dir))
+        pos = bisect.bisect_right(self.timestamps, int(timestamp))
+        return self.timestamps[pos - 1] if pos else self.timestamps[0]
+
+    def range(self, start=None, end=None, include_start=True, include_end=True, reverse=False,
+              limit=None):
+        """
+        Return the timestamps between start and end. (see select_range)
+        """
+        return select_range(self.timestamps, start, end, include_start, include_end,
+                            reverse, limit)
+
+    def __contains__(self, timestamp):
+        pos = bisect.bisect_left(self.timestamps, int(timestamp))
+        return pos < len(self.timestamps) and self.timestamps[pos] == int(timestamp)
+
+    def __iter__(self):
+        return iter(self.timestamps)
+
+    def __len__(self):
+        return len(self.timestamps)
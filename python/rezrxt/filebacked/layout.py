@@ -0,0 +1,223 @@
+"""
+layout.py - where the timestamp directories of a name live.
+
+The layout of a database is described by layout.json at its root:
+
+{"version": 2, "buckets": "day"}
+
+Version 1, the default when there is no layout.json, keeps every timestamp
+of a name in one flat directory:
+
+name/<name>/timestamp/<epoc>/
+
+Version 2 buckets the timestamps by their gmt date, so that no directory
+grows past the timestamps of a day, month or year:
+
+name/<name>/timestamp/<yyyy>/<mm>/<dd>/<epoc>/     "day"
+name/<name>/timestamp/<yyyy>/<mm>/<epoc>/          "month"
+name/<name>/timestamp/<yyyy>/<epoc>/               "year"
+
+Bucket names have at most BUCKET_DIGITS digits, and timestamps more, so a
+timestamp directory may be listed without knowing its layout. A database
+being migrated from one layout to another (see migrate.relayout) holds
+timestamp directories in both.
+
+Adding a timestamp to an existing bucket does not change the mtime of the
+timestamp directory, which is how readers detect a stale index (see
+index.py), so writers of a bucketed name touch it.
+"""
+
+__all__ = ("Layout", "LAYOUTS", "LAYOUT_NAME", "BUCKETS", "BUCKET_DIGITS", "walk_timestamps",
+           "list_timestamps")
+
+from os.path import join as pjoin
+from os import listdir
+import json
+import time
+
+from rezrxt import instrument
+from rezrxt.filebacked.fsutil import atomic_write
+
+LAYOUT_NAME = "layout.json"
+
+# bucket granularity -> strftime format of each level of bucket
+_BUCKET_FORMATS = {
+    "year": ("%Y",),
+    "month": ("%Y", "%m"),
+    "day": ("%Y", "%m", "%d"),
+}
+BUCKETS = ("year", "month", "day")
+
+BUCKET_DIGITS = 4
+
+
+def _is_bucket(entry):
+    """
+    Return whether an entry of a timestamp directory is a bucket.
+    """
+    return entry.isdigit() and len(entry) <= BUCKET_DIGITS
+
+
+def _is_timestamp(entry):
+    """
+    Return whether an entry of a timestamp directory, or bucket, is a timestamp.
+    """
+    return entry.isdigit() and len(entry) > BUCKET_DIGITS
+
+
+def walk_timestamps(timestamps_dir):
+    """
+    Return a generator over the timestamp directories under a timestamp
+    directory, whatever their layout.
+
+    Returns:
+        generator of (timestamp, path)
+
+    Raises:
+        OSError: If timestamps_dir does not exist.
+    """
+    instrument.count("fs.listdir")
+    for entry in listdir(timestamps_dir):
+        path = pjoin(timestamps_dir, entry)
+        if _is_timestamp(entry):
+            yield int(entry), path
+        elif _is_bucket(entry):
+            for found in walk_timestamps(path):
+                yield found
+
+
+def list_timestamps(timestamps_dir):
+    """
+    Return the set of timestamps under a timestamp directory, whatever their
+    layout.
+
+    Raises:
+        OSError: If timestamps_dir does not exist.
+    """
+    return set(t_stamp for t_stamp, _ in walk_timestamps(timestamps_dir))
+
+
+def _floor(path, key, timestamp):
+    """
+    Return the greatest timestamp under a bucket not after timestamp, visiting
+    only the buckets which may hold it, latest first.
+
+    Args:
+        path      (str): path of the bucket.
+        key      (list): names of the buckets of timestamp below path. None,
+                         or empty once used up by a finer layout than the
+                         one in use, to visit every bucket under path.
+        timestamp (int): the timestamp.
+
+    Returns:
+        int, or None if there is none.
+    """
+    instrument.count("fs.listdir")
+    try:
+        entries = listdir(path)
+    except OSError:
+        return None
+    best = None
+    buckets = []
+    for entry in entries:
+        if _is_timestamp(entry):
+            # a timestamp not moved to its bucket yet, or one of a leaf bucket
+            if int(entry) <= timestamp and (best is None or int(entry) > best):
+                best = int(entry)
+        elif _is_bucket(entry) and (not key or entry <= key[0]):
+            buckets.append(entry)
+    for entry in sorted(buckets, reverse=True):
+        found = _floor(pjoin(path, entry), key[1:] if key and entry == key[0] else None,
+                       timestamp)
+        if found is not None:
+            return found if best is None else max(best, found)
+    return best
+
+
+class Layout(object):
+    """
+    Layout of the timestamp directories of a database.
+    """
+    def __init__(self, buckets=None):
+        """
+        Args:
+            buckets (str): one of BUCKETS, or None for the flat layout.
+
+        Raises:
+            ValueError: If buckets is unknown.
+        """
+        if buckets is not None and buckets not in _BUCKET_FORMATS:
+            raise ValueError("unknown buckets \"{0}\" (choose from {1})"\
+                             .format(buckets, ", ".join(BUCKETS)))
+        self.buckets = buckets
+
+    @property
+    def version(self):
+        """
+        Version of the layout. 1 is flat, 2 is bucketed.
+        """
+        return 1 if self.buckets is None else 2
+
+    @classmethod
+    def read(cls, root_db):
+        """
+        Read the layout of a database.
+
+        Returns:
+            Layout. The flat layout if the database has no layout.json.
+
+        Raises:
+            ValueError: If layout.json is not valid.
+        """
+        instrument.count("fs.open")
+        try:
+            with open(pjoin(root_db, LAYOUT_NAME)) as f_handle:
+                data = json.load(f_handle)
+        except (IOError, OSError):
+            return cls()
+        return cls(data.get("buckets"))
+
+    def save(self, root_db):
+        """
+        Write the layout to the root of a database, atomically.
+        """
+        atomic_write(pjoin(root_db, LAYOUT_NAME),
+                     json.dumps({"version": self.version, "buckets": self.buckets}).encode(),
+                     fsync_data=True)
+
+    def bucket(self, timestamp):
+        """
+        Return the names of the buckets of a timestamp, outermost first.
+        (eg ["2017", "08", "20"])
+        """
+        if self.buckets is None:
+            return []
+        date = time.gmtime(int(timestamp))
+        return [time.strftime(fmt, date) for fmt in _BUCKET_FORMATS[self.buckets]]
+
+    def timestamp_dir(self, timestamps_dir, timestamp):
+        """
+        Return the path of the directory of a timestamp.
+        """
+        return pjoin(timestamps_dir, *(self.bucket(timestamp) + [str(timestamp)]))
+
+    def floor(self, timestamps_dir, timestamp):
+        """
+        Return the greatest timestamp under a timestamp directory less than or
+        equal to the one supplied, listing only the bucket of the timestamp
+        and, if it holds none that early, the latest earlier bucket which does.
+
+        Returns:
+            int, or None if every timestamp is later, or there are none.
+        """
+        return _floor(timestamps_dir, self.bucket(timestamp), int(timestamp))
+
+    def __eq__(self, other):
+        return isinstance(other, Layout) and other.buckets == self.buckets
+
+    def __ne__(self, other):
+        return not self == other
+
+
+# every layout, for locating a resolve whose layout is not known
+LAYOUTS = (Layout(),) + tuple(Layout(buckets) for buckets in BUCKETS)
@@ -0,0 +1,178 @@
+"""
+migrate.py - rewrite every resolve of a database in another storage format,
+or move every resolve to another layout.
+
+Resolves are rewritten in parallel by a pool of processes, since
+compression is cpu bound. Each resolve is replaced atomically, so the
+database stays readable throughout.
+
+A layout migration records the new layout first, so that resolves written
+from then on are written in it, and then moves the timestamp directories of
+each name into place, one rename each, under the lock of the name. Readers
+look for a resolve which is not where their layout puts it under every
+layout (see reader.py), so they read the database throughout. A writer
+which read the layout before it changed may still add a resolve in the old
+one, which is read the same way, and is moved by migrating again.
+"""
+
+__all__ = ("recompress", "relayout")
+
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from os.path import dirname
+from os import rename
+import time
+
+from rezrxt import instrument
+from rezrxt.filebacked.fsutil import FileLock, fsync_path, makedirs_exist_ok
+from rezrxt.filebacked.layout import Layout, walk_timestamps
+from rezrxt.filebacked.writer import RezRxtDbWriteMgr
+
+# names moved in parallel by relayout. moving is bound by file system latency.
+DEFAULT_JOBS = 8
+
+
+def _rewrite(task):
+    """
+    Pool worker. Rewrite a single resolve.
+
+    Args:
+        task (tuple): (root_db, context, name, timestamp, split, codec, dedup)
+
+    Returns:
+        (context, name, timestamp, bytes before, bytes after, error message or None)
+    """
+    root_db, context, name, timestamp, split, codec, dedup = task
+    try:
+        before, after = RezRxtDbWriteMgr(root_db).rewrite_rxt(context, name, timestamp,
+                                                              split, codec, dedup)
+        return context, name, timestamp, before, after, None
+    except Exception as err:
+        return context, name, timestamp, 0, 0, "{0}: {1}".format(type(err).__name__, err)
+
+
+def recompress(root_db, codec=None, split=None, processes=None, callback=None, dedup=None):
+    """
+    Rewrite every resolve in the database with the supplied codec and split
+    and dedup settings.
+
+    Args:
+        root_db      (str): path to the root of the database.
+        codec        (str): codec to compress with. (default: database config)
+        split       (bool): whether to split resolves. (default: database config)
+        processes    (int): number of worker processes. (default: cpu count)
+        callback (callable): called with each worker result as it completes.
+        dedup       (bool): whether to store bodies in the blob store. (default:
+                            database config)
+
+    Returns:
+        dict with the number of resolves rewritten, the failures, and the
+        total bytes before and after.
+    """
+    mgr = RezRxtDbWriteMgr(root_db)
+    # packed resolves keep the format they were packed in
+    tasks = [(root_db, context, name, timestamp, split, codec, dedup)
+             for context in mgr.contexts()
+             for name in mgr.names(context)
+             for timestamp in mgr.timestamps(context, name)
+             if mgr.packed(context, name, timestamp) is None]
+
+    summary = {"count": 0, "failures": [], "before": 0, "after": 0}
+    pool = Pool(processes)
+    try:
+        for result in pool.imap_unordered(_rewrite, tasks, chunksize=16):
+            context, name, timestamp, before, after, error = result
+            if error is None:
+                summary["count"] += 1
+                summary["before"] += before
+                summary["after"] += after
+            else:
+                summary["failures"].append(((context, name, timestamp), error))
+            if callback is not None:
+                callback(result)
+    finally:
+        pool.close()
+        pool.join()
+    return summary
+
+
+def _move_name(task):
+    """
+    Pool worker. Move the timestamp directories of a name to the layout of
+    the write manager, under the lock of the name.
+
+    Args:
+        task (tuple): (write manager, context, name)
+
+    Returns:
+        number of timestamp directories moved.
+    """
+    mgr, context, name = task
+    t_dir = mgr.timestamps_dir(context, name)
+    moved = 0
+    with instrument.phase("migrate.relayout"), FileLock(mgr.lock_path(context, name)):
+        try:
+            found = list(walk_timestamps(t_dir))
+        except OSError:
+            # every timestamp is packed, or the name was removed
+            return moved
+        for t_stamp, ts_dir in found:
+            target = mgr.layout.timestamp_dir(t_dir, t_stamp)
+            if ts_dir == target:
+                continue
+            makedirs_exist_ok(dirname(target))
+            rename(ts_dir, target)
+            moved += 1
+        if moved:
+            # empty buckets are left behind, as a writer may be about to use one
+            mgr.touch_timestamps_dir(context, name)
+            if mgr.durability != "none":
+                fsync_path(t_dir)
+    return moved
+
+
+def relayout(root_db, buckets=None, jobs=DEFAULT_JOBS, callback=None):
+    """
+    Move every resolve of a live database to another layout.
+
+    Args:
+        root_db      (str): path to the root of the database.
+        buckets      (str): one of layout.BUCKETS, or None for the flat layout.
+        jobs         (int): number of names moved in parallel.
+        callback (callable): called with (context, name, timestamp directories
+                             moved) as each name is moved.
+
+    Returns:
+        dict with the number of names and timestamp directories moved, and the
+        elapsed seconds.
+
+    Raises:
+        ValueError: If buckets is unknown.
+    """
+    start = time.time()
+    layout = Layout(buckets)
+    layout.save(root_db)
+    mgr = RezRxtDbWriteMgr(root_db)
+    mgr.layout = layout
+
+    tasks = [(mgr, context, name) for context in mgr.contexts() for name in mgr.names(context)]
+    summary = {"names": 0, "moved": 0, "seconds": 0.0}
+    changed = []
+    pool = ThreadPool(max(1, jobs))
+    try:
+        for task, moved in zip(tasks, pool.imap(_move_name, tasks)):
+            if moved:
+                changed.append(task[1:])
+                summary["names"] += 1
+                summary["moved"] += moved
+            if callback is not None:
+                callback(task[1], task[2], moved)
+    finally:
+        pool.close()
+        pool.join()
+
+    # readers would rebuild them anyway, as the timestamp directories were touched
+    if changed:
+        mgr.update_indexes(changed)
+    summary["seconds"] = time.time() - start
+    return summary
@@ -0,0 +1,258 @@
+"""
+pack.py - pack files, holding the older resolves of a name in a single file.
+
+root/
+    context/
+        name/
+            timestamps.idx
+            timestamps.pack.idx       offset index of the current pack
+            timestamps.<N>.pack       pack file, generation N
+            timestamp/
+                <epoc>/...            loose resolves
+
+A pack file starts with PACK_MAGIC, followed by records appended one after
+the other. Each record is the rxt file of a resolve - a plain rxt, possibly
+compressed, or the header of a deduplicated resolve - made self contained:
+a split resolve is merged with its cold file before it is packed. The tools
+manifest of the resolve, if it has one, follows its record.
+
+The offset index maps each timestamp to the offset and length of its record,
+and of its tools:
+
+{"version": 1, "pack": "timestamps.3.pack", "size": 123456,
+ "entries": {"1503265457": [offset, length, tools offset, tools length]}}
+
+Records are appended past "size", the pack is flushed to disk, and only
+then is the index replaced, atomically. A packing which fails part way
+leaves bytes which no entry refers to, and which the next packing
+overwrites. Removing records writes the next generation of the pack without
+them, and replaces the index; readers which hold the index of the previous
+generation re-read it when the pack is gone.
+
+Launch scripts are not packed, so packed resolves are launched through rez.
+"""
+
+__all__ = ("PackIndex", "PackEntry", "PACK_INDEX_NAME", "PACK_MAGIC")
+
+from os.path import join as pjoin
+from os import fsync, remove
+import json
+import re
+
+from rezrxt import instrument
+from rezrxt.filebacked.fsutil import atomic_write
+
+PACK_INDEX_NAME = "timestamps.pack.idx"
+PACK_MAGIC = b"RZXPACK1\n"
+
+_PACK_RE = re.compile(r"^timestamps\.(\d+)\.pack$")
+
+
+def _read_range(path, offset, length):
+    """
+    Read length bytes of a file from offset.
+    """
+    instrument.count("fs.open")
+    with open(path, "rb") as f_handle:
+        f_handle.seek(offset)
+        data = f_handle.read(length)
+    instrument.count("bytes.read", len(data))
+    if len(data) != length:
+        raise IOError("{0} is truncated at {1}".format(path, offset))
+    return data
+
+
+class PackEntry(object):
+    """
+    A resolve stored in a pack.
+    """
+    __slots__ = ("pack_path", "timestamp", "offset", "length", "tools")
+
+    def __init__(self, pack_path, timestamp, entry):
+        """
+        Args:
+            pack_path (str): path to the pack file.
+            timestamp (int): timestamp of the resolve.
+            entry    (list): [offset, length] of the record, followed by the
+                             [offset, length] of the tools, if any.
+        """
+        self.pack_path = pack_path
+        self.timestamp = timestamp
+        self.offset, self.length = entry[:2]
+        self.tools = entry[2:4] if len(entry) > 2 else None
+
+    def location(self):
+        """
+        Return the location of the resolve, for display.
+        """
+        return "{0}#{1}".format(self.pack_path, self.timestamp)
+
+    def read(self):
+        """
+        Return the bytes of the record.
+
+        Raises:
+            IOError: If the pack has been replaced by another generation.
+        """
+        return _read_range(self.pack_path, self.offset, self.length)
+
+    def read_tools(self):
+        """
+        Return the tools manifest of the resolve, or None if it has none.
+        """
+        if self.tools is None:
+            return None
+        return json.loads(_read_range(self.pack_path, *self.tools).decode())
+
+
+class PackIndex(object):
+    """
+    Offset index of the pack of a single context/name pair.
+    """
+    def __init__(self, name_dir):
+        """
+        Args:
+            name_dir (str): Path to the directory of the name.
+        """
+        self.name_dir = name_dir
+        self.pack = None
+        self.size = len(PACK_MAGIC)
+        self.entries = {}
+
+    @property
+    def path(self):
+        """
+        Path to the index file.
+        """
+        return pjoin(self.name_dir, PACK_INDEX_NAME)
+
+    def pack_path(self):
+        """
+        Return the path to the current pack file, or None if there is none.
+        """
+        return None if self.pack is None else pjoin(self.name_dir, self.pack)
+
+    @classmethod
+    def read(cls, name_dir):
+        """
+        Read the index of the pack of a name.
+
+        Returns:
+            PackIndex, or None if the name has no pack, or its index is unreadable.
+        """
+        index = cls(name_dir)
+        instrument.count("fs.open")
+        try:
+            with open(index.path) as f_handle:
+                data = json.load(f_handle)
+        except (IOError, OSError, ValueError):
+            return None
+        index.pack = data["pack"]
+        index.size = data["size"]
+        index.entries = dict((int(t_stamp), entry) for t_stamp, entry in data["entries"].items())
+        return index
+
+    def save(self):
+        """
+        Write the index to disk, replacing any existing index atomically.
+        """
+        entries = dict((str(t_stamp), entry) for t_stamp, entry in self.entries.items())
+        atomic_write(self.path, json.dumps({"version": 1, "pack": self.pack, "size": self.size,
+                                            "entries": entries}).encode(), fsync_data=True)
+
+    def entry(self, timestamp):
+        """
+        Return the PackEntry of a timestamp, or None if it is not packed.
+        """
+        entry = self.entries.get(int(timestamp))
+        return None if entry is None else PackEntry(self.pack_path(), int(timestamp), entry)
+
+    def timestamps(self):
+        """
+        Return the sorted timestamps held by the pack.
+        """
+        return sorted(self.entries)
+
+    def _next_pack(self):
+        """
+        Return the file name of the next generation of the pack.
+        """
+        match = _PACK_RE.match(self.pack or "")
+        return "timestamps.{0}.pack".format(int(match.group(1)) + 1 if match else 1)
+
+    def _start(self):
+        """
+        Start the next generation of the pack, empty.
+        """
+        self.pack = self._next_pack()
+        self.size = len(PACK_MAGIC)
+        self.entries = {}
+        instrument.count("fs.open")
+        with open(self.pack_path(), "wb") as f_handle:
+            f_handle.write(PACK_MAGIC)
+
+    def append(self, records):
+        """
+        Append records to the pack, creating it if required, flush them to
+        disk, and save the index.
+
+        Args:
+            records (iterable): (timestamp, record bytes, tools bytes or None)
+
+        Returns:
+            number of bytes appended.
+        """
+        if self.pack is None:
+            self._start()
+        start = self.size
+        instrument.count("fs.open")
+        with open(self.pack_path(), "r+b") as f_handle:
+            # overwrites anything left by a packing which failed part way
+            f_handle.seek(self.size)
+            for t_stamp, data, tools in records:
+                entry = [self.size, len(data)]
+                f_handle.write(data)
+                self.size += len(data)
+                if tools is not None:
+                    entry.extend([self.size, len(tools)])
+                    f_handle.write(tools)
+                    self.size += len(tools)
+                self.entries[int(t_stamp)] = entry
+            f_handle.truncate()
+            f_handle.flush()
+            instrument.count("fs.fsync")
+            fsync(f_handle.fileno())
+        instrument.count("bytes.written", self.size - start)
+        self.save()
+        return self.size - start
+
+    def remove(self, timestamps):
+        """
+        Remove records from the pack, by writing the next generation of the
+        pack without them, and save the index.
+
+        Args:
+            timestamps (iterable): timestamps to remove.
+
+        Returns:
+            number of bytes reclaimed.
+        """
+        timestamps = set(int(t_stamp) for t_stamp in timestamps).intersection(self.entries)
+        if not timestamps:
+            return 0
+        old_path, old_size = self.pack_path(), self.size
+        kept = []
+        for t_stamp in sorted(self.entries):
+            if t_stamp in timestamps:
+                continue
+            entry = self.entries[t_stamp]
+            tools = entry[2:4]
+            kept.append((t_stamp, _read_range(old_path, entry[0], entry[1]),
+                         _read_range(old_path, *tools) if tools else None))
+        self._start()
+        self.append(kept)
+        try:
+            remove(old_path)
+        except OSError:
+            pass
+        return old_size - self.size
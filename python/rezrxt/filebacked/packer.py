@@ -0,0 +1,179 @@
+"""
+packer.py - roll the older resolves of each name into its pack file.
+
+Each name is packed under the lock of its index, as writers update it.
+Loose resolves older than a cutoff are appended to the pack of the name
+(see pack.py), which is flushed to disk and indexed before their timestamp
+directories are removed. Readers find a resolve in either place throughout,
+and the set of timestamps of the name does not change, so the catalog is
+left alone. Names are packed in parallel.
+"""
+
+__all__ = ("pack_db", "pack_name", "DEFAULT_JOBS", "DEFAULT_AGE")
+
+from multiprocessing.pool import ThreadPool
+from os.path import basename
+from os.path import join as pjoin
+import json
+import time
+
+from rezrxt import instrument
+from rezrxt.filebacked.fsutil import FileLock, fsync_path, remove_dir
+from rezrxt.filebacked.pack import PackIndex
+from rezrxt.filebacked.writer import RezRxtDbWriteMgr
+from rezrxt.filebacked import record
+
+DEFAULT_JOBS = 8
+# days after which resolves are packed
+DEFAULT_AGE = 30
+DAY = 86400
+# prefix of timestamp directories being removed once packed
+STAGING_PREFIX = ".pack."
+
+
+def _record(mgr, context, name, t_stamp, ts_dir):
+    """
+    Return the bytes of the record of a loose resolve, and of its tools, to
+    be packed. A split resolve is merged with its cold file, and stored in
+    the codec of the database config.
+
+    Args:
+        ts_dir (str): directory of the resolve. (see find_timestamp_dir)
+
+    Returns:
+        (record bytes, tools bytes or None)
+
+    Raises:
+        IOError: If the resolve cannot be read.
+    """
+    path = pjoin(ts_dir, mgr.rxt_name(context, name, t_stamp))
+    instrument.count("fs.open")
+    with open(path, "rb") as f_handle:
+        data = f_handle.read()
+    instrument.count("bytes.read", len(data))
+    header = record.decode_doc(data)
+    if "cold" in header.get(record.META_KEY, {}):
+        rxt_dict, _, _ = record.complete_doc(header, len(data), path, mgr.blobs_dir())
+        data = record.encode_plain(rxt_dict, mgr.config["codec"])
+    tools = mgr.read_sidecar(pjoin(ts_dir, basename(mgr.tools_path(context, name, t_stamp))),
+                             context, name, t_stamp)
+    return data, None if tools is None else json.dumps(tools["tools"]).encode()
+
+
+def pack_name(mgr, context, name, before):
+    """
+    Pack the loose resolves of a name older than a timestamp.
+
+    Args:
+        mgr (RezRxtDbWriteMgr): manager of the database.
+        context          (str): context of the name.
+        name             (str): name.
+        before         (float): resolves with an earlier timestamp are packed.
+
+    Returns:
+        (timestamps packed, bytes appended to the pack, bytes and inodes of
+         the timestamp directories removed)
+    """
+    with instrument.phase("pack.name"), FileLock(mgr.lock_path(context, name)):
+        try:
+            index = mgr.timestamp_index(context, name)
+        except KeyError:
+            # removed since the catalog was read
+            return [], 0, 0, 0
+        pack = mgr.pack_index(context, name)
+        pack = PackIndex(mgr.name_dir(context, name)) if pack is None else pack
+        loose = [t_stamp for t_stamp in index.timestamps
+                 if t_stamp < before and t_stamp not in pack.entries]
+        records = []
+        ts_dirs = []
+        for t_stamp in loose:
+            ts_dir = mgr.find_timestamp_dir(context, name, t_stamp)
+            if ts_dir is None:
+                # removed since the index was read
+                continue
+            try:
+                records.append((t_stamp,) + _record(mgr, context, name, t_stamp, ts_dir))
+            except (IOError, OSError):
+                continue
+            ts_dirs.append(ts_dir)
+        if not records:
+            return [], 0, 0, 0
+        appended = pack.append(records)
+
+        nbytes = inodes = 0
+        t_dir = mgr.timestamps_dir(context, name)
+        for (t_stamp, _, _), ts_dir in zip(records, ts_dirs):
+            usage = remove_dir(ts_dir, pjoin(t_dir, "{0}{1}".format(STAGING_PREFIX, t_stamp)))
+            if usage is not None:
+                nbytes += usage[0]
+                inodes += usage[1]
+        # bucketed timestamps are not removed from the timestamp directory itself
+        mgr.touch_timestamps_dir(context, name)
+        if mgr.durability != "none":
+            fsync_path(t_dir)
+        # the same timestamps, recorded against the new mtime of the directory
+        index.save()
+        return [t_stamp for t_stamp, _, _ in records], appended, nbytes, inodes
+
+
+def _pack_task(task):
+    """
+    Pool worker. (see pack_name)
+
+    Args:
+        task (tuple): (write manager, context, name, before)
+    """
+    return pack_name(*task)
+
+
+def pack_db(root_db, before=None, contexts=None, names=None, jobs=DEFAULT_JOBS, callback=None):
+    """
+    Pack the loose resolves of every name older than a timestamp.
+
+    Args:
+        root_db      (str): path to the root of the database.
+        before     (float): resolves with an earlier timestamp are packed.
+                            (default: DEFAULT_AGE days ago)
+        contexts    (list): contexts to pack. (default: all)
+        names       (list): names to pack. (default: all)
+        jobs         (int): number of names packed in parallel.
+        callback (callable): called with (context, name, timestamps packed)
+                             as each name is packed.
+
+    Returns:
+        dict with the names packed, the resolves packed, the bytes appended
+        to packs, the bytes and inodes of the loose files removed, and the
+        elapsed seconds.
+
+    Raises:
+        KeyError: If the database does not contain one of the contexts.
+    """
+    start = time.time()
+    before = start - DEFAULT_AGE * DAY if before is None else before
+    mgr = RezRxtDbWriteMgr(root_db)
+    catalog = mgr.catalog()
+    contexts = list(catalog) if contexts is None else contexts
+    tasks = [(mgr, context, name, before)
+             for context in contexts for name in catalog.names(context)
+             if names is None or name in names]
+
+    summary = {"names": 0, "packed": 0, "pack_bytes": 0, "bytes": 0, "inodes": 0,
+               "seconds": 0.0}
+    pool = ThreadPool(max(1, jobs))
+    try:
+        for task, result in zip(tasks, pool.imap(_pack_task, tasks)):
+            packed, appended, nbytes, inodes = result
+            if packed:
+                summary["names"] += 1
+            summary["packed"] += len(packed)
+            summary["pack_bytes"] += appended
+            summary["bytes"] += nbytes
+            summary["inodes"] += inodes
+            if callback is not None:
+                callback(task[1], task[2], packed)
+    finally:
+        pool.close()
+        pool.join()
+
+    summary["seconds"] = time.time() - start
+    return summary
@@ -0,0 +1,406 @@
+"""
+pkgindex.py - inverted index from package versions to the resolves using them.
+
+The index lives in root/pkgindex/, as a file per package, holding a row per
+resolve which resolved a variant of it, sorted:
+
+pkgindex/<package>.json     {"rows": [[version, variant, context, name, timestamp], ...]}
+
+variant is the index of the variant, or null for a package without variants.
+
+Writers append a line per resolve to a journal alongside, rather than
+rewriting the file of every package the resolve uses:
+
+pkgindex/journal            [context, name, timestamp, [[package, version, variant], ...]]
+
+Once the journal grows past JOURNAL_BYTES, the writer which appended to it
+folds it into the package files, and empties it. Both happen under the lock
+of the index, and files are replaced atomically. Readers read the journal
+before the package file, so that a resolve moved from one to the other in
+between is seen in the package file, and rows are deduplicated, so that
+folding the journal twice, after a crash, is harmless.
+
+A query reads one package file and the journal, however large the database.
+The index may be rebuilt from the resolves in parallel. (see rebuild)
+"""
+
+__all__ = ("PackageIndex", "PKGINDEX_DIR", "JOURNAL_BYTES", "DEFAULT_JOBS", "package_rows",
+           "parse_package", "rebuild")
+
+from multiprocessing import Pool
+from os.path import join as pjoin
+from os import listdir, remove, fstat, fsync
+import json
+import re
+import time
+
+from rezrxt import instrument
+from rezrxt.filebacked.fsutil import atomic_write, makedirs_exist_ok, FileLock
+
+PKGINDEX_DIR = "pkgindex"
+JOURNAL_NAME = "journal"
+LOCK_NAME = ".lock"
+SUFFIX = ".json"
+# size past which the journal is folded into the package files
+JOURNAL_BYTES = 1024 * 1024
+# worker processes rebuilding the index
+DEFAULT_JOBS = None
+
+# <package>[-<version>][[<variant>]] (eg maya, maya-2017, maya-2017[1])
+_PACKAGE_SPEC = re.compile(r"^(?P<package>[^-\[\]]+)(-(?P<version>[^\[\]]+))?"
+                           r"(\[(?P<variant>\d+)\])?$")
+
+
+def package_rows(rxt_dict):
+    """
+    Return the (package, version, variant) of each variant resolved by a
+    resolve, from its "resolved_packages".
+    """
+    rows = []
+    for variant in rxt_dict.get("resolved_packages") or ():
+        variables = variant.get("variables") or {}
+        if variables.get("name") is None:
+            continue
+        rows.append((variables["name"], variables.get("version") or "", variables.get("index")))
+    return rows
+
+
+def parse_package(spec):
+    """
+    Parse a package request of the form <package>[-<version>][[<variant>]].
+
+    Returns:
+        (package, version or None, variant or None)
+
+    Raises:
+        ValueError: If spec is not of that form.
+    """
+    match = _PACKAGE_SPEC.match(spec)
+    if match is None:
+        raise ValueError("invalid package \"{0}\" (expected <package>[-<version>][[<variant>]])"\
+                         .format(spec))
+    variant = match.group("variant")
+    return (match.group("package"), match.group("version"),
+            None if variant is None else int(variant))
+
+
+def _row(version, variant, context, name, timestamp):
+    """
+    Return a row of a package file, as a hashable tuple.
+    """
+    return (version, variant, context, name, int(timestamp))
+
+
+def _row_key(row):
+    """
+    Sort key of a row, placing a package without variants before its variants.
+    """
+    return (row[0], -1 if row[1] is None else row[1]) + row[2:]
+
+
+class PackageIndex(object):
+    """
+    Package -> version -> variant -> resolves using it.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path to the directory of the index. Created by the
+                        first write.
+        """
+        self.path = path
+
+    def journal_path(self):
+        """
+        Return the path to the journal of the index.
+        """
+        return pjoin(self.path, JOURNAL_NAME)
+
+    def package_path(self, package):
+        """
+        Return the path to the file of a package.
+        """
+        return pjoin(self.path, package + SUFFIX)
+
+    def lock_path(self):
+        """
+        Return the path to the lock file guarding the index.
+        """
+        return pjoin(self.path, LOCK_NAME)
+
+    def read_journal(self):
+        """
+        Read the journal. A line being appended as it is read is skipped.
+
+        Returns:
+            list of (context, name, timestamp, [(package, version, variant), ...])
+        """
+        instrument.count("fs.open")
+        try:
+            with open(self.journal_path(), "rb") as f_handle:
+                data = f_handle.read()
+        except (IOError, OSError):
+            return []
+        instrument.count("bytes.read", len(data))
+        entries = []
+        for line in data.splitlines():
+            try:
+                entries.append(json.loads(line.decode("utf-8")))
+            except ValueError:
+                continue
+        return entries
+
+    def read_package(self, package):
+        """
+        Read the rows of the file of a package.
+
+        Returns:
+            set of (version, variant, context, name, timestamp)
+        """
+        instrument.count("fs.open")
+        try:
+            with open(self.package_path(package), "rb") as f_handle:
+                data = f_handle.read()
+        except (IOError, OSError):
+            return set()
+        instrument.count("bytes.read", len(data))
+        return set(_row(*row) for row in json.loads(data.decode("utf-8"))["rows"])
+
+    def _write_package(self, package, rows, fsync_data):
+        """
+        Replace the file of a package with rows, or remove it if there are none.
+        """
+        if rows:
+            atomic_write(self.package_path(package),
+                         json.dumps({"rows": sorted(rows, key=_row_key)}).encode(),
+                         fsync_data=fsync_data)
+            return
+        try:
+            remove(self.package_path(package))
+        except OSError:
+            pass
+
+    def packages(self):
+        """
+        Return the sorted names of the packages in the index.
+        """
+        found = set(package for entry in self.read_journal() for package, _, _ in entry[3])
+        instrument.count("fs.listdir")
+        try:
+            found.update(f_name[:-len(SUFFIX)] for f_name in listdir(self.path)
+                         if f_name.endswith(SUFFIX) and not f_name.startswith("."))
+        except OSError:
+            pass
+        return sorted(found)
+
+    def keys(self):
+        """
+        Return the resolves in the index.
+
+        Returns:
+            set of (context, name, timestamp)
+        """
+        # the journal first, so that resolves folded from it since are in the package files
+        keys = set((context, name, int(timestamp))
+                   for context, name, timestamp, _ in self.read_journal())
+        for package in self.packages():
+            keys.update(row[2:] for row in self.read_package(package))
+        return keys
+
+    def find(self, package, version=None, variant=None):
+        """
+        Return the resolves which resolved a package.
+
+        Args:
+            package (str): name of the package.
+            version (str): only those which resolved this version. (default: any)
+            variant (int): only those which resolved this variant. (default: any)
+
+        Returns:
+            sorted list of (context, name, timestamp, version, variant)
+        """
+        with instrument.phase("pkgindex.find"):
+            # the journal first, so that rows folded from it since are in the package file
+            rows = set(_row(p_version, p_variant, context, name, timestamp)
+                       for context, name, timestamp, used in self.read_journal()
+                       for p_name, p_version, p_variant in used if p_name == package)
+            rows.update(self.read_package(package))
+            return sorted((context, name, timestamp, p_version, p_variant)
+                          for p_version, p_variant, context, name, timestamp in rows
+                          if (version is None or p_version == version) and
+                          (variant is None or p_variant == variant))
+
+    def add(self, context, name, timestamp, rows, fsync_data=False):
+        """
+        Record the packages resolved by a resolve, appending to the journal,
+        and folding it into the package files once it is large enough.
+
+        Args:
+            context     (str): Context of the resolve.
+            name        (str): Name of the resolve.
+            timestamp   (int): Timestamp of the resolve.
+            rows       (list): (package, version, variant) resolved. (see package_rows)
+            fsync_data (bool): Whether to flush the journal to disk before returning.
+
+        Returns:
+            True if the journal was folded into the package files.
+        """
+        line = json.dumps([context, name, int(timestamp), [list(row) for row in rows]]) + "\n"
+        makedirs_exist_ok(self.path)
+        with instrument.phase("pkgindex.add"), FileLock(self.lock_path()):
+            instrument.count("bytes.written", len(line))
+            with open(self.journal_path(), "ab") as f_handle:
+                f_handle.write(line.encode("utf-8"))
+                f_handle.flush()
+                if fsync_data:
+                    instrument.count("fs.fsync")
+                    fsync(f_handle.fileno())
+                size = fstat(f_handle.fileno()).st_size
+            if size < JOURNAL_BYTES:
+                return False
+            self._fold(fsync_data=fsync_data)
+            return True
+
+    def _fold(self, removed=(), replace=None, before=None, fsync_data=False):
+        """
+        Fold the journal into the package files, and empty it. Must be called
+        under the lock of the index.
+
+        Args:
+            removed  (iterable): (context, name, timestamp) of resolves to drop
+                                 from every package file.
+            replace      (dict): package -> rows, replacing the package files.
+                                 Packages missing from it are removed.
+            before        (set): (context, name, timestamp) in the index when
+                                 replace was read. Rows of the package files
+                                 for other resolves are kept. (default: none are)
+            fsync_data   (bool): Whether to flush the files to disk.
+        """
+        added = {}
+        for context, name, timestamp, used in self.read_journal():
+            for package, version, variant in used:
+                added.setdefault(package, set()).add(_row(version, variant, context, name,
+                                                          timestamp))
+        removed = set((context, name, int(timestamp)) for context, name, timestamp in removed)
+        if replace is not None or removed:
+            packages = set(self.packages()) | set(replace or ())
+        else:
+            packages = set(added)
+
+        for package in packages:
+            current = self.read_package(package)
+            rows = set(current if replace is None else replace.get(package, ()))
+            if replace is not None and before is not None:
+                # added, and maybe folded from the journal, since replace was read
+                rows.update(row for row in current if row[2:] not in before)
+            rows.update(added.get(package, ()))
+            if removed:
+                rows = set(row for row in rows if row[2:] not in removed)
+            if rows != current:
+                self._write_package(package, rows, fsync_data)
+        atomic_write(self.journal_path(), b"", fsync_data=fsync_data)
+
+    def fold(self, fsync_data=False):
+        """
+        Fold the journal into the package files, and empty it.
+        """
+        makedirs_exist_ok(self.path)
+        with instrument.phase("pkgindex.fold"), FileLock(self.lock_path()):
+            self._fold(fsync_data=fsync_data)
+
+    def remove(self, keys, fsync_data=False):
+        """
+        Drop removed resolves from the index. Every package file holding one
+        is rewritten.
+
+        Args:
+            keys (iterable): (context, name, timestamp) of the removed resolves.
+        """
+        makedirs_exist_ok(self.path)
+        with instrument.phase("pkgindex.remove"), FileLock(self.lock_path()):
+            self._fold(removed=keys, fsync_data=fsync_data)
+
+    def replace(self, entries, fsync_data=False, before=None):
+        """
+        Replace the contents of the index. Resolves in the journal are kept,
+        and, if before is supplied, so are resolves of the package files
+        which are not in it: those added since entries were read, whose rows
+        a writer may have folded from the journal meanwhile.
+
+        Args:
+            entries (iterable): (context, name, timestamp, [(package, version,
+                                variant), ...]) of every resolve.
+            before       (set): the keys of the index before entries were
+                                read. (see keys)
+        """
+        packages = {}
+        for context, name, timestamp, used in entries:
+            for package, version, variant in used:
+                packages.setdefault(package, set()).add(_row(version, variant, context, name,
+                                                             timestamp))
+        makedirs_exist_ok(self.path)
+        with instrument.phase("pkgindex.replace"), FileLock(self.lock_path()):
+            self._fold(replace=packages, before=before, fsync_data=fsync_data)
+
+
+def _scan_name(task):
+    """
+    Pool worker. Read the packages resolved by every resolve of a name.
+
+    Args:
+        task (tuple): (root_db, context, name)
+
+    Returns:
+        list of (context, name, timestamp, [(package, version, variant), ...])
+    """
+    # imported here, as the reader imports this module
+    from rezrxt.filebacked.reader import RezRxtDbReader
+
+    root_db, context, name = task
+    reader = RezRxtDbReader(root_db, cache=False)
+    try:
+        return [(context, name, t_stamp, package_rows(fields))
+                for t_stamp, fields in reader.stream_rxt_fields(context, name,
+                                                                ["resolved_packages"])]
+    except KeyError:
+        # removed since the catalog was read
+        return []
+
+
+def rebuild(root_db, jobs=DEFAULT_JOBS, callback=None):
+    """
+    Rebuild the package index of a database from its resolves, reading the
+    resolves of each name in parallel. Resolves added meanwhile are kept.
+
+    Args:
+        root_db      (str): path to the root of the database.
+        jobs         (int): number of worker processes. (default: cpu count)
+        callback (callable): called with (context, name, resolves read) as
+                             each name is read.
+
+    Returns:
+        dict with the names, resolves and packages indexed, and the elapsed seconds.
+    """
+    from rezrxt.filebacked.reader import RezRxtDbReadMgr
+
+    start = time.time()
+    mgr = RezRxtDbReadMgr(root_db)
+    index = PackageIndex(mgr.pkgindex_dir())
+    # resolves added during the scan are kept, whether or not it sees them
+    before = index.keys()
+    tasks = [(root_db, context, name) for context in mgr.contexts()
+             for name in mgr.names(context)]
+    entries = []
+    pool = Pool(jobs)
+    try:
+        for task, found in zip(tasks, pool.imap(_scan_name, tasks, chunksize=4)):
+            entries.extend(found)
+            if callback is not None:
+                callback(task[1], task[2], len(found))
+    finally:
+        pool.close()
+        pool.join()
+
+    index.replace(entries, before=before)
+    return {"names": len(tasks), "resolves": len(entries), "packages": len(index.packages()),
+            "seconds": time.time() - start}
@@ -0,0 +1,414 @@
+"""
+prune.py - remove resolves according to a retention policy.
+
+A RetentionPolicy keeps a timestamp of a name if any of its rules does:
+
+keep_last    the most recent N timestamps of every name.
+daily_after  every timestamp of the last M days, and, before that, the
+             latest timestamp of each day (gmt).
+pinned       every timestamp pinned by a job manifest. (see manifest.py)
+
+At least one of keep_last and daily_after must be set, so that the most
+recent resolve of a name is never removed. Policies may also be declared
+under "retention" in the database config:
+
+    "retention": {"keep_last": 20, "daily_after": 30,
+                  "manifests": ["/jobs/manifests"]}
+
+Names are pruned in parallel. Each timestamp directory is renamed out of
+the way before it is removed, so readers never see a partial resolve, and
+the index of the name is updated under its lock, as writers update it.
+Packed resolves are removed by writing the next generation of the pack of
+the name. (see pack.py) The catalog, and the package index (see
+pkgindex.py), are then updated once.
+
+Blobs (see record.py) no longer referenced by any resolve are collected
+afterwards. A writer reusing a blob touches it first, and only blobs older
+than a grace period are collected, so that a resolve written during the
+prune does not lose its blob.
+"""
+
+__all__ = ("RetentionPolicy", "prune", "manifest_pins", "DEFAULT_JOBS", "BLOB_GRACE")
+
+from multiprocessing.pool import ThreadPool
+from os.path import isdir
+from os.path import join as pjoin
+from os import listdir, lstat, remove, walk
+import time
+
+from rezrxt import instrument
+from rezrxt.manifest import read_manifest
+from rezrxt.filebacked.catalog import Catalog
+from rezrxt.filebacked.fsutil import FileLock, fsync_path, disk_usage, remove_dir
+from rezrxt.filebacked.pkgindex import PackageIndex
+from rezrxt.filebacked.writer import RezRxtDbWriteMgr
+from rezrxt.filebacked import record
+
+DEFAULT_JOBS = 8
+# seconds a blob must go unreferenced and untouched before it is collected
+BLOB_GRACE = 3600
+DAY = 86400
+# prefix of timestamp directories being removed
+STAGING_PREFIX = ".prune."
+
+
+def manifest_pins(paths):
+    """
+    Return the timestamps pinned by job manifests.
+
+    Args:
+        paths (iterable): manifests, or directories searched for manifests
+                          (*.json files which are not manifests are skipped).
+
+    Returns:
+        set of (context, name, timestamp)
+
+    Raises:
+        IOError: If a manifest cannot be read.
+        ValueError: If a path supplied as a file is not a manifest.
+    """
+    pins = set()
+    manifests = []
+    for path in paths:
+        if isdir(path):
+            for dir_path, _, f_names in walk(path):
+                for f_name in sorted(f_names):
+                    if not f_name.endswith(".json"):
+                        continue
+                    try:
+                        manifests.append(read_manifest(pjoin(dir_path, f_name)))
+                    except (IOError, ValueError):
+                        continue
+        else:
+            manifests.append(read_manifest(path))
+    for manifest in manifests:
+        for context, names in manifest["contexts"].items():
+            for name, entry in names.items():
+                pins.add((context, name, int(entry["timestamp"])))
+    return pins
+
+
+class RetentionPolicy(object):
+    """
+    Rules deciding which timestamps of a name to keep. (see the module docstring)
+    """
+    def __init__(self, keep_last=None, daily_after=None, pinned=()):
+        """
+        Args:
+            keep_last     (int): number of most recent timestamps to keep.
+            daily_after (float): days after which only the latest timestamp of
+                                 each day is kept.
+            pinned   (iterable): (context, name, timestamp) never to remove.
+
+        Raises:
+            ValueError: If neither keep_last nor daily_after is set, or either
+                        is out of range.
+        """
+        if keep_last is None and daily_after is None:
+            raise ValueError("a retention policy needs keep_last or daily_after")
+        if keep_last is not None and keep_last < 1:
+            raise ValueError("keep_last must be at least 1, not {0}".format(keep_last))
+        if daily_after is not None and daily_after < 0:
+            raise ValueError("daily_after must not be negative, not {0}".format(daily_after))
+        self.keep_last = keep_last
+        self.daily_after = daily_after
+        self.pinned = set((context, name, int(t_stamp)) for context, name, t_stamp in pinned)
+
+    @classmethod
+    def from_config(cls, config, keep_last=None, daily_after=None, manifests=()):
+        """
+        Build the policy declared under "retention" in a database config,
+        overridden by any rules supplied.
+
+        Args:
+            config     (dict): database config. (see config.load_config)
+            keep_last   (int): overrides "keep_last".
+            daily_after (float): overrides "daily_after".
+            manifests  (list): manifests pinning timestamps, in addition to
+                               those of "manifests".
+
+        Raises:
+            ValueError: If no rule is set, or a manifest is invalid.
+            IOError: If a manifest cannot be read.
+        """
+        settings = config.get("retention") or {}
+        keep_last = settings.get("keep_last") if keep_last is None else keep_last
+        daily_after = settings.get("daily_after") if daily_after is None else daily_after
+        paths = list(settings.get("manifests", ())) + list(manifests)
+        return cls(keep_last, daily_after, manifest_pins(paths))
+
+    def keep(self, context, name, timestamps, now=None):
+        """
+        Return the timestamps of a name the policy keeps.
+
+        Args:
+            context      (str): context of the name.
+            name         (str): name.
+            timestamps  (list): sorted timestamps of the name.
+            now        (float): time the age of timestamps is measured from.
+                                (default: the current time)
+
+        Returns:
+            set of timestamps
+        """
+        now = time.time() if now is None else now
+        kept = set(t_stamp for t_stamp in timestamps if (context, name, t_stamp) in self.pinned)
+        if self.keep_last is not None:
+            kept.update(timestamps[-self.keep_last:])
+        if self.daily_after is not None:
+            cutoff = now - self.daily_after * DAY
+            days = {}
+            for t_stamp in timestamps:
+                if t_stamp >= cutoff:
+                    kept.add(t_stamp)
+                else:
+                    # sorted, so the last of each day wins
+                    days[t_stamp // DAY] = t_stamp
+            kept.update(days.values())
+        return kept
+
+
+def _prune_name(task):
+    """
+    Pool worker. Remove the timestamps of one name the policy does not keep,
+    and update its index.
+
+    Args:
+        task (tuple): (write manager, policy, now, dry run, context, name)
+
+    Returns:
+        (timestamps removed, timestamps kept, bytes, inodes)
+    """
+    mgr, policy, now, dry_run, context, name = task
+    with instrument.phase("prune.name"):
+        if dry_run:
+            return _select(mgr, policy, now, True, context, name)
+        with FileLock(mgr.lock_path(context, name)):
+            return _select(mgr, policy, now, False, context, name)
+
+
+def _select(mgr, policy, now, dry_run, context, name):
+    """
+    Select, measure and, unless dry_run, remove the timestamps of a name.
+    (see _prune_name)
+    """
+    try:
+        index = mgr.timestamp_index(context, name)
+    except KeyError:
+        # removed since the catalog was read
+        return [], [], 0, 0
+    kept = policy.keep(context, name, index.timestamps, now)
+    removed = [t_stamp for t_stamp in index.timestamps if t_stamp not in kept]
+    pack = mgr.pack_index(context, name)
+    packed = [t_stamp for t_stamp in removed if pack is not None and t_stamp in pack.entries]
+    nbytes = inodes = 0
+    t_dir = mgr.timestamps_dir(context, name)
+    for t_stamp in removed:
+        if t_stamp in packed:
+            continue
+        ts_dir = mgr.find_timestamp_dir(context, name, t_stamp)
+        if ts_dir is None:
+            continue
+        if dry_run:
+            usage = disk_usage(ts_dir)
+        else:
+            # out of sight of readers first, so they never see a partial resolve
+            usage = remove_dir(ts_dir, pjoin(t_dir, "{0}{1}".format(STAGING_PREFIX, t_stamp)))
+            if usage is None:
+                continue
+        nbytes += usage[0]
+        inodes += usage[1]
+    if packed:
+        if dry_run:
+            for t_stamp in packed:
+                entry = pack.entry(t_stamp)
+                nbytes += entry.length + (entry.tools[1] if entry.tools else 0)
+        else:
+            nbytes += pack.remove(packed)
+    if removed and not dry_run:
+        # packed and bucketed timestamps are not removed from the timestamp
+        # directory itself. (see touch_timestamps_dir)
+        mgr.touch_timestamps_dir(context, name)
+        if mgr.durability != "none":
+            fsync_path(t_dir)
+        index.timestamps = sorted(kept)
+        index.save()
+    return removed, sorted(kept), nbytes, inodes
+
+
+def _read_header(mgr, context, name, t_stamp):
+    """
+    Read the rxt file of a loose resolve, under whichever layout holds it.
+
+    Raises:
+        IOError: If the resolve does not exist.
+    """
+    try:
+        header, _ = record.read_doc(mgr.rxt_path(context, name, t_stamp))
+    except (IOError, OSError):
+        # not moved to the layout of the database yet
+        ts_dir = mgr.find_timestamp_dir(context, name, t_stamp)
+        if ts_dir is None:
+            raise
+        header, _ = record.read_doc(pjoin(ts_dir, mgr.rxt_name(context, name, t_stamp)))
+    return header
+
+
+def _blob_refs(task):
+    """
+    Pool worker. Return the digests of the blobs referenced by the resolves
+    of one name.
+
+    Args:
+        task (tuple): (write manager, context, name, timestamps to skip)
+    """
+    mgr, context, name, skip = task
+    digests = set()
+    try:
+        timestamps = mgr.timestamp_index(context, name).timestamps
+    except KeyError:
+        return digests
+    pack = mgr.pack_index(context, name)
+    for t_stamp in timestamps:
+        if t_stamp in skip:
+            continue
+        entry = None if pack is None else pack.entry(t_stamp)
+        try:
+            if entry is None:
+                header = _read_header(mgr, context, name, t_stamp)
+            else:
+                header = record.decode_doc(entry.read())
+        except (IOError, OSError):
+            # removed since it was listed
+            continue
+        meta = header.get(record.META_KEY) if isinstance(header, dict) else None
+        if meta and meta.get("blob"):
+            digests.add(meta["blob"])
+    return digests
+
+
+def _collect_blobs(mgr, pool, removed, dry_run, cutoff):
+    """
+    Remove the blobs which no resolve references, and which have not been
+    touched since cutoff.
+
+    Args:
+        mgr (RezRxtDbWriteMgr): manager of the database.
+        pool      (ThreadPool): pool to read headers with.
+        removed         (dict): (context, name) -> timestamps removed, which
+                                are not read. (only matters for a dry run)
+        dry_run         (bool): count, rather than remove, the blobs.
+        cutoff         (float): blobs modified since are kept.
+
+    Returns:
+        (blobs, bytes)
+    """
+    blob_dir = mgr.blobs_dir()
+    if not isdir(blob_dir):
+        return 0, 0
+    catalog = mgr.catalog()
+    tasks = [(mgr, context, name, set(removed.get((context, name), ())))
+             for context in catalog for name in catalog.names(context)]
+    referenced = set()
+    for digests in pool.imap_unordered(_blob_refs, tasks):
+        referenced.update(digests)
+
+    blobs = nbytes = 0
+    for fan_out in listdir(blob_dir):
+        if fan_out.startswith("."):
+            continue
+        for f_name in listdir(pjoin(blob_dir, fan_out)):
+            path = pjoin(blob_dir, fan_out, f_name)
+            if f_name.startswith(".") or f_name in referenced:
+                continue
+            try:
+                b_stat = lstat(path)
+                if b_stat.st_mtime >= cutoff:
+                    continue
+                if not dry_run:
+                    remove(path)
+            except OSError:
+                continue
+            blobs += 1
+            nbytes += b_stat.st_size
+    return blobs, nbytes
+
+
+def prune(root_db, policy, contexts=None, names=None, jobs=DEFAULT_JOBS, dry_run=False,
+          collect_blobs=True, blob_grace=BLOB_GRACE, now=None, callback=None):
+    """
+    Remove the resolves a retention policy does not keep, keeping the indexes
+    and catalog up to date, and collect the blobs left unreferenced.
+
+    Args:
+        root_db            (str): path to the root of the database.
+        policy (RetentionPolicy): which timestamps to keep.
+        contexts          (list): contexts to prune. (default: all)
+        names             (list): names to prune. (default: all)
+        jobs               (int): number of names pruned in parallel.
+        dry_run           (bool): report what would be removed, without
+                                  removing anything.
+        collect_blobs     (bool): whether to collect unreferenced blobs.
+        blob_grace       (float): seconds a blob must be untouched to be collected.
+        now              (float): time the age of timestamps is measured from.
+                                  (default: the current time)
+        callback      (callable): called with (context, name, timestamps
+                                  removed) as each name is pruned.
+
+    Returns:
+        dict with the names pruned, the resolves removed and kept, the blobs
+        collected, the bytes and inodes reclaimed, and the elapsed seconds.
+
+    Raises:
+        KeyError: If the database does not contain one of the contexts.
+    """
+    start = time.time()
+    now = start if now is None else now
+    mgr = RezRxtDbWriteMgr(root_db)
+    catalog = mgr.catalog()
+    contexts = list(catalog) if contexts is None else contexts
+    tasks = [(mgr, policy, now, dry_run, context, name)
+             for context in contexts for name in catalog.names(context)
+             if names is None or name in names]
+
+    summary = {"names": 0, "removed": 0, "kept": 0, "blobs": 0, "bytes": 0, "inodes": 0,
+               "seconds": 0.0}
+    removed_keys = {}
+    pool = ThreadPool(max(1, jobs))
+    try:
+        for task, result in zip(tasks, pool.imap(_prune_name, tasks)):
+            removed, kept, nbytes, inodes = result
+            if removed:
+                summary["names"] += 1
+                removed_keys[(task[4], task[5])] = removed
+            summary["removed"] += len(removed)
+            summary["kept"] += len(kept)
+            summary["bytes"] += nbytes
+            summary["inodes"] += inodes
+            if callback is not None:
+                callback(task[4], task[5], removed)
+
+        if removed_keys and not dry_run:
+            with instrument.phase("writer.catalog"), FileLock(mgr.catalog_lock_path()):
+                catalog = Catalog(mgr.catalog_path(), mgr.contexts_dir()).load(mgr)
+                for context, name in removed_keys:
+                    index = mgr.timestamp_index(context, name)
+                    catalog.update(context, name, mgr.saved_index(context, name, index))
+                catalog.save()
+            PackageIndex(mgr.pkgindex_dir()).remove(
+                [(context, name, t_stamp) for (context, name), removed in removed_keys.items()
+                 for t_stamp in removed], fsync_data=mgr.durability != "none")
+
+        if collect_blobs:
+            with instrument.phase("prune.blobs"):
+                blobs, nbytes = _collect_blobs(mgr, pool, removed_keys, dry_run,
+                                               start - blob_grace)
+            summary["blobs"] = blobs
+            summary["bytes"] += nbytes
+            summary["inodes"] += blobs
+    finally:
+        pool.close()
+        pool.join()
+
+    summary["seconds"] = time.time() - start
+    return summary
@@ -7,35 +7,123 @@ root/
         name/
             timestamp/
                 context-name-timestamp.rxt
+
+Older resolves may instead be rolled into a pack file of their name. (see
+pack.py) Every lookup consults the index of the pack first, and reads the
+loose file otherwise.
+
+Stat results, including failures, and parsed timestamp indexes are reused
+by a reader for a short time (see RezRxtDbReadMgr.stat), so that a burst of
+lookups stats each directory and reads each index once.
+
+The timestamp directories of a name may instead be bucketed by date. (see
+layout.py) A resolve missing from where the layout of the database puts it
+is looked for under every layout, so that a database may be migrated from
+one layout to another while it is read.
 """
 
-from os.path import isdir, isfile
+from os.path import isdir
 from os.path import join as pjoin
-from os import listdir
-# uncomment for python3
-# from functools import reduce
+from os import stat, environ
+from stat import S_ISDIR
 import json
+import time
 
+from rezrxt import constants, instrument
 from rezrxt.dbinterface import RezRxtDbReaderI
+from rezrxt.exceptions import PackedResolveError
+from rezrxt.cache import copy_doc, shared_cache
+from rezrxt.filebacked.index import TimestampIndex, INDEX_NAME
+from rezrxt.filebacked.catalog import Catalog, CATALOG_NAME
+from rezrxt.filebacked.layout import Layout, LAYOUTS
+from rezrxt.filebacked.pack import PackIndex, PACK_INDEX_NAME
+from rezrxt.filebacked.pkgindex import PackageIndex, PKGINDEX_DIR
+from rezrxt.filebacked import record
+
+# seconds stat results are reused for. (see RezRxtDbReadMgr.stat)
+DEFAULT_STAT_TTL = 1.0
+
+# stat results held before they are all dropped
+_MAX_STATS = 10000
+
+
+def stat_ttl():
+    """
+    Return the seconds stat results are reused for, from the REZRXT_STAT_TTL
+    env var, or DEFAULT_STAT_TTL.
+    """
+    try:
+        return float(environ.get(constants.REZRXT_STAT_TTL, DEFAULT_STAT_TTL))
+    except ValueError:
+        return DEFAULT_STAT_TTL
 
 
 class RezRxtDbReadMgr(object):
     """
     Common file db manager operations.
     """
-    def __init__(self, root_db):
+    def __init__(self, root_db, ttl=None):
         """
         Initialize rez resolve database manager with root of database.
+
+        Args:
+            root_db (str): path to root of database.
+            ttl   (float): seconds stat results are reused for. 0 disables
+                           reuse. (default: stat_ttl())
         """
+        instrument.count("fs.isdir")
         assert isdir(root_db) is True, "root_db \"{0}\" is not a valid directory."
         self._root_db = root_db
+        self.layout = Layout.read(root_db)
+        self._catalog = None
+        self._catalog_stat = None
+        self.ttl = stat_ttl() if ttl is None else ttl
+        self._stats = {}
+        self._indexes = {}
+        self._packs = {}
+
+    def stat(self, path):
+        """
+        Stat a path, reusing the result of a previous stat of the path, or
+        its failure, for ttl seconds.
+
+        Returns:
+            os.stat_result, or None if the path does not exist.
+        """
+        if self.ttl > 0:
+            entry = self._stats.get(path)
+            if entry is not None and entry[0] > time.time():
+                return entry[1]
+        instrument.count("fs.stat")
+        try:
+            result = stat(path)
+        except OSError:
+            result = None
+        if self.ttl > 0:
+            if len(self._stats) >= _MAX_STATS:
+                self._stats.clear()
+            self._stats[path] = (time.time() + self.ttl, result)
+        return result
+
+    def forget(self, path):
+        """
+        Forget the stat result of a path, so that the next stat of it is fresh.
+        """
+        self._stats.pop(path, None)
+
+    def isdir(self, path):
+        """
+        Return whether path is a directory. (see stat)
+        """
+        p_stat = self.stat(path)
+        return p_stat is not None and S_ISDIR(p_stat.st_mode)
 
     def root_dir(self, verify=False):
         """
         Return the root directory.
         """
         if verify:
-            assert isdir(self._root_db) is True, "root_dir() {0} does not exist".format(self._root_db)
+            assert self.isdir(self._root_db) is True, "root_dir() {0} does not exist".format(self._root_db)
         return self._root_db
 
     def contexts_dir(self, verify=False):
@@ -44,7 +132,7 @@ class RezRxtDbReadMgr(object):
         """
         c_dir = pjoin(self.root_dir(), "context")
         if verify:
-            if isdir(c_dir) is False:
+            if self.isdir(c_dir) is False:
                 raise KeyError("contexts_dir() - {0} does not exist".format(c_dir))
         return c_dir
 
@@ -64,7 +152,7 @@ class RezRxtDbReadMgr(object):
         """
         c_dir = pjoin(self._root_db, "context", context)
         if verify:
-            if isdir(c_dir) is False:
+            if self.isdir(c_dir) is False:
                 raise KeyError("context_dir({0}) {1} does not exist".format(context, c_dir))
         return c_dir
 
@@ -75,7 +163,7 @@ class RezRxtDbReadMgr(object):
 
         n_dir = pjoin(self.context_dir(context), "name")
         if verify:
-            if isdir(n_dir) is False:
+            if self.isdir(n_dir) is False:
                 raise KeyError("names_dir({0}) - {1} does not exist".format(context, n_dir))
         return n_dir
 
@@ -96,7 +184,7 @@ class RezRxtDbReadMgr(object):
         """
         n_dir = pjoin(self.context_dir(context), "name", name)
         if verify:
-            if isdir(n_dir) is False:
+            if self.isdir(n_dir) is False:
                 raise KeyError("name_dir({0}, {1}) - {2} does not exist".format(context, name, n_dir))
         return n_dir
 
@@ -106,10 +194,161 @@ class RezRxtDbReadMgr(object):
         """
         t_dir = pjoin(self.name_dir(context, name), "timestamp")
         if verify:
-            if isdir(t_dir) is False:
+            if self.isdir(t_dir) is False:
                 raise KeyError("timestamps_dir({0}, {1}) - {2} does not exist".format(context, name, t_dir))
         return t_dir
 
+    def blobs_dir(self):
+        """
+        Return the path to the content addressed blob store of the database.
+        """
+        return pjoin(self._root_db, record.BLOBS_DIR)
+
+    def catalog_path(self):
+        """
+        Return the path to the catalog at the root of the database.
+        """
+        return pjoin(self._root_db, CATALOG_NAME)
+
+    def pkgindex_dir(self):
+        """
+        Return the path to the package index of the database. (see pkgindex.py)
+        """
+        return pjoin(self._root_db, PKGINDEX_DIR)
+
+    def catalog(self):
+        """
+        Return the catalog of the database. The catalog is kept in memory and
+        only re-read when the catalog file, the contexts directory or the names
+        directory of a context changes. A missing or stale catalog is rebuilt
+        in memory from the directory tree.
+
+        Returns:
+            Catalog
+        """
+        paths = [self.catalog_path(), self.contexts_dir()]
+        if self._catalog is not None:
+            paths.extend(self._catalog.names_dir(context) for context in self._catalog)
+        c_stat = []
+        for path in paths:
+            p_stat = self.stat(path)
+            c_stat.append(None if p_stat is None else (p_stat.st_mtime, p_stat.st_size))
+        if self._catalog is None or c_stat != self._catalog_stat:
+            with instrument.phase("reader.catalog"):
+                self._catalog = Catalog(self.catalog_path(), self.contexts_dir()).load(self)
+            self._catalog_stat = c_stat
+        return self._catalog
+
+    def index_path(self, context, name):
+        """
+        Return the path to the timestamp index of the supplied context and name.
+        """
+        return pjoin(self.name_dir(context, name), INDEX_NAME)
+
+    def timestamp_index(self, context, name, rebuild=True):
+        """
+        Return the sorted timestamp index for the supplied context and name. A
+        missing or stale index is rebuilt in memory from the timestamp directory.
+        The index is kept, and reused while the timestamp directory is unchanged.
+        It must be treated as read-only.
+
+        Args:
+            context  (str): context name.
+            name     (str): package name.
+            rebuild (bool): Whether to rebuild a missing or stale index.
+
+        Returns:
+            TimestampIndex, or None if the index is missing or stale, and not rebuilt.
+
+        Raises:
+            KeyError: If the database does not contain the context or name.
+        """
+        with instrument.phase("reader.timestamp_index"):
+            t_dir = self.timestamps_dir(context, name)
+            if self.ttl <= 0:
+                return TimestampIndex(self.index_path(context, name), t_dir)\
+                       .load(rebuild=rebuild)
+            t_stat = self.stat(t_dir)
+            if t_stat is None:
+                raise KeyError("timestamp_index({0}, {1}) - {2} does not exist"\
+                               .format(context, name, t_dir))
+            index = self._indexes.get(t_dir)
+            if index is None or index.dir_mtime != t_stat.st_mtime:
+                index = TimestampIndex(self.index_path(context, name), t_dir)\
+                        .load(t_stat.st_mtime, rebuild)
+                if index is None:
+                    return None
+                self._indexes[t_dir] = index
+            return index
+
+    def floor_timestamp(self, context, name, timestamp):
+        """
+        Return the greatest timestamp of a name less than or equal to the one
+        supplied, or failing that, the earliest. While the index of a bucketed
+        name is stale, only the buckets which may hold the timestamp are
+        listed, rather than every bucket to rebuild the index.
+
+        Raises:
+            KeyError: If the database does not contain the context or name.
+        """
+        index = self.timestamp_index(context, name, rebuild=self.layout.buckets is None)
+        if index is not None:
+            return index.floor(timestamp)
+        found = [self.layout.floor(self.timestamps_dir(context, name), timestamp)]
+        pack = self.pack_index(context, name)
+        if pack is not None:
+            found.extend(t_stamp for t_stamp in pack.entries if t_stamp <= int(timestamp))
+        found = [t_stamp for t_stamp in found if t_stamp is not None]
+        if found:
+            return max(found)
+        # earlier than every timestamp of the name, or the name does not exist
+        return self.timestamp_index(context, name).floor(timestamp)
+
+    def pack_index_path(self, context, name):
+        """
+        Return the path to the index of the pack of the supplied context and name.
+        """
+        return pjoin(self.name_dir(context, name), PACK_INDEX_NAME)
+
+    def pack_index(self, context, name, refresh=False):
+        """
+        Return the index of the pack of a context and name. The index is kept,
+        and reused while the index file is unchanged. It must be treated as
+        read-only.
+
+        Args:
+            context  (str): context name.
+            name     (str): package name.
+            refresh (bool): Whether to stat the index file, even if a recent
+                            stat of it may be reused.
+
+        Returns:
+            PackIndex, or None if the name has no pack.
+        """
+        path = self.pack_index_path(context, name)
+        if refresh:
+            self.forget(path)
+        p_stat = self.stat(path)
+        if p_stat is None:
+            self._packs.pop(path, None)
+            return None
+        key = (p_stat.st_ino, p_stat.st_mtime, p_stat.st_size)
+        cached = self._packs.get(path)
+        if cached is None or cached[0] != key:
+            cached = self._packs[path] = (key, PackIndex.read(self.name_dir(context, name)))
+        return cached[1]
+
+    def packed(self, context, name, timestamp, refresh=False):
+        """
+        Return the PackEntry of a resolve stored in the pack of its name. (see
+        pack_index)
+
+        Returns:
+            PackEntry, or None if the resolve is not packed.
+        """
+        pack = self.pack_index(context, name, refresh)
+        return None if pack is None else pack.entry(timestamp)
+
     def timestamp_dir(self, context, name, timestamp, verify=False):
         """
         Given a context, name, and timestamp, return the full path to the directory.
@@ -126,13 +365,37 @@ class RezRxtDbReadMgr(object):
         Raises:
             KeyError - if directory does not exist and verify is True.
         """
-        t_dir = pjoin(self.name_dir(context, name), "timestamp", str(timestamp))
+        t_dir = self.layout.timestamp_dir(self.timestamps_dir(context, name), timestamp)
         if verify:
-            if isdir(t_dir) is False:
+            if self.isdir(t_dir) is False:
                 raise KeyError("timestmap_dir({0}, {1}, {2}) {3} does not exist."\
                                .format(context, name, timestamp, t_dir))
         return t_dir
 
+    def find_timestamp_dir(self, context, name, timestamp, refresh=False):
+        """
+        Return the directory of a resolve under whichever layout holds it. A
+        database being migrated to another layout holds resolves in both, and
+        its layout may have changed since it was read.
+
+        Args:
+            refresh (bool): Whether to read the layout of the database again.
+
+        Returns:
+            directory path, or None if the resolve has no directory.
+        """
+        if refresh:
+            self.layout = Layout.read(self._root_db)
+        t_dir = self.timestamps_dir(context, name)
+        paths = [self.layout.timestamp_dir(t_dir, timestamp)]
+        paths.extend(path for path in (layout.timestamp_dir(t_dir, timestamp) for layout in LAYOUTS)
+                     if path not in paths)
+        for path in paths:
+            instrument.count("fs.isdir")
+            if isdir(path):
+                return path
+        return None
+
     def rxt_name(self, context, name, timestamp):
         """
         Given appropriate information, construct the name of the rxt file.
@@ -168,21 +431,60 @@ class RezRxtDbReadMgr(object):
         return pjoin(self.timestamp_dir(context, name, timestamp, verify),
                      self.rxt_name(context, name, timestamp))
 
-    def contexts(self):
+    def launch_env_path(self, context, name, timestamp):
+        """
+        Return the path to the launch environment manifest of a resolve. The
+        manifest lists the shells for which a launch script was baked, and the
+        mtime and size of the rxt file the scripts were baked from.
         """
-        Return an generator iterator over contexts.
+        return pjoin(self.timestamp_dir(context, name, timestamp),
+                     "{0}-{1}-{2}.env.json".format(context, name, str(timestamp)))
+
+    def launch_script_path(self, context, name, timestamp, shell):
+        """
+        Return the path to the launch script of a resolve for the supplied shell type.
         """
-        c_dir = self.contexts_dir()
-        if isdir(c_dir) is False:
-            # empty repo
-            yield None
+        return pjoin(self.timestamp_dir(context, name, timestamp),
+                     "{0}-{1}-{2}.{3}".format(context, name, str(timestamp), shell))
 
-        for context in listdir(c_dir):
+    def tools_path(self, context, name, timestamp):
+        """
+        Return the path to the tools manifest of a resolve. The manifest maps
+        each package of the resolve to its tools.
+        """
+        return pjoin(self.timestamp_dir(context, name, timestamp),
+                     "{0}-{1}-{2}.tools.json".format(context, name, str(timestamp)))
+
+    def read_sidecar(self, path, context, name, timestamp):
+        """
+        Read a json sidecar of a resolve, such as its tools or launch environment
+        manifest. Sidecars record the mtime and size of the rxt file they were
+        derived from, under "source".
+
+        Returns:
+            dict, or None if the sidecar is missing, or no longer matches the rxt file.
+        """
+        instrument.count("fs.open")
+        try:
+            with open(path) as f_handle:
+                sidecar = json.load(f_handle)
+        except (IOError, OSError, ValueError):
+            return None
+        r_stat = self.stat(self.rxt_path(context, name, timestamp))
+        if r_stat is None or sidecar.get("source") != [r_stat.st_mtime, r_stat.st_size]:
+            return None
+        return sidecar
+
+    def contexts(self):
+        """
+        Return an generator iterator over contexts, in sorted order.
+        """
+        for context in self.catalog():
             yield context
 
     def names(self, context):
         """
-        Given a context name, return an iterator over names.
+        Given a context name, return an iterator over names, in sorted order.
 
         Args:
             context (str): The context name. (eg fx, or model)
@@ -193,15 +495,12 @@ class RezRxtDbReadMgr(object):
         Raises:
             KeyError: If the db does not contain the supplied context.
         """
-        
-        namesdir = self.names_dir(context, verify=True)
-        
-        for name in listdir(namesdir):
+        for name in self.catalog().names(context):
             yield name
 
     def timestamps(self, context, name):
         """
-        Returns a generator over timestamps.
+        Returns a generator over timestamps, in ascending order.
 
         Args:
             context (str): context name.
@@ -213,42 +512,66 @@ class RezRxtDbReadMgr(object):
         Raises:
             KeyError: If the database does not contain the context or name.
         """
-        tsdir = self.timestamps_dir(context, name, verify=True)
-        for tstamp in listdir(tsdir):
-            yield int(tstamp)
+        for tstamp in self.timestamp_index(context, name):
+            yield tstamp
+
+    def timestamp_range(self, context, name, start=None, end=None, include_start=True,
+                        include_end=True, reverse=False, limit=None):
+        """
+        Return the timestamps between start and end, bisected from the
+        timestamp index. (see RezRxtDbReaderI.timestamp_range)
+
+        Raises:
+            KeyError: If the database does not contain the context or name.
+        """
+        return self.timestamp_index(context, name).range(start, end, include_start,
+                                                          include_end, reverse, limit)
+
+    def latest(self, context, name, count=1):
+        """
+        Return the most recent timestamps, newest first.
+
+        Raises:
+            KeyError: If the database does not contain the context or name.
+        """
+        return self.timestamp_index(context, name).range(reverse=True, limit=count)
+
+    def resolve_timestamp(self, context, name, timestamp, approximate=False):
+        """
+        Return the exact timestamp under which a resolve is stored.
+
+        Args:
+            context      (str): The context name.
+            name         (str): The package name.
+            timestamp    (int): The timestamp.
+            approximate (bool): Whether to find the closest timestamp less than or
+                                equal to the one provided. (see resolve)
+
+        Returns:
+            int
+
+        Raises:
+            KeyError: If approximate and the db is missing the context or name.
+        """
+        if approximate is True:
+            return self.floor_timestamp(context, name, timestamp)
+        return int(timestamp)
 
     def _resolve_approximate(self, context, name, timestamp):
         """
         Return the full path to a resolve given an approximate timestamp.
         """
-
-        # get a find the most
-        def tst(xarg, yarg):
-            """
-            Get the closest value to the timestamp.
-            """
-            if yarg <= timestamp and xarg <= timestamp:
-                return yarg if yarg >= xarg else xarg
-            if yarg <= timestamp:
-                return yarg
-            if xarg <= timestamp:
-                return xarg
-            return 0
-       
-        timestamps =  self.timestamps(context, name)
-        exact_ts = reduce(tst, (int(x) for x in timestamps))
-        if exact_ts == 0:
-            timestamps = [x for x in self.timestamps(context, name)]
-            timestamps.sort()
-            exact_ts = timestamps[0]
-            #raise KeyError("unable to resolve exact timestamp from approximate timestamp {0} for {1}"\
-            #               .format(timestamp, self.timestamps_dir(context, name, verify=True)))
-        return self.rxt_path(context, name, exact_ts, verify=True)
+        exact_ts = self.resolve_timestamp(context, name, timestamp, approximate=True)
+        return self._resolve_exact(context, name, exact_ts)
 
     def _resolve_exact(self, context, name, timestamp):
         """
         Return a full path to a resolve given an exact timestamp.
         """
+        entry = self.packed(context, name, timestamp)
+        if entry is not None:
+            raise PackedResolveError("resolve({0}, {1}, {2}) - packed in {3}"\
+                                     .format(context, name, timestamp, entry.pack_path))
         return self.rxt_path(context, name, timestamp)
 
 
@@ -270,6 +593,7 @@ class RezRxtDbReadMgr(object):
 
         Raises:
             KeyError: If db is missing either the context, name, or timestmap.
+            PackedResolveError: If the resolve is packed. (see location)
         """
 
         if approximate is True:
@@ -277,20 +601,40 @@ class RezRxtDbReadMgr(object):
         else:
             return self._resolve_exact(context, name, timestamp)
 
+    def location(self, context, name, timestamp, approximate=False):
+        """
+        Return the location of a resolve, for display: the path to its rxt
+        file, or <pack path>#<timestamp> if it is packed.
+
+        Raises:
+            KeyError: If db is missing either the context, name, or timestmap.
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        entry = self.packed(context, name, t_stamp)
+        if entry is not None:
+            return entry.location()
+        return self.rxt_path(context, name, t_stamp)
+
 
 class RezRxtDbReader(RezRxtDbReaderI):
     """
     Database Reader.
     """
-    def __init__(self, root_db):
+    def __init__(self, root_db, cache=None, ttl=None):
         """
         Args:
             root_db (str): path to root of database.
+            cache (RxtCache): cache of parsed resolves. Defaults to the process
+                              wide cache. Pass False to disable caching.
+            ttl      (float): seconds stat results are reused for. Changes to
+                              the database may go unseen for this long. 0
+                              disables reuse. (default: stat_ttl())
 
         Raises:
             AssertionError: If path does not exist.
         """
-        self.read_mgr = RezRxtDbReadMgr(root_db)
+        self.read_mgr = RezRxtDbReadMgr(root_db, ttl)
+        self.cache = shared_cache() if cache is None else (None if cache is False else cache)
         super(RezRxtDbReader, self).__init__()
 
     def rxt_dict(self, context, name, timestamp, approximate=False):
@@ -304,17 +648,232 @@ class RezRxtDbReader(RezRxtDbReaderI):
             approximate (bool): Whether to get the nearest timestamp,
                                 less than or equal to timestamp.
 
+        Returns:
+            python dict, a copy of the cached resolve, which the caller may modify.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        return copy_doc(self.rxt_dict_shared(context, name, timestamp, approximate))
+
+    def rxt_dict_shared(self, context, name, timestamp, approximate=False):
+        """
+        Retrieve the cached python dictionary of a resolve, which must be
+        treated as read-only. (see RezRxtDbReaderI.rxt_dict_shared)
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        with instrument.phase("reader.rxt_dict"):
+            return self._load(context, name, timestamp, approximate, self.load_rxt,
+                              self.load_packed)
+
+    def _load(self, context, name, timestamp, approximate, loose, packed):
+        """
+        Locate a resolve, and load it with loose(path of the rxt file) if it is
+        stored loose, or packed(PackEntry) if it is packed. A resolve packed,
+        or a pack rewritten, since the index of the pack was read, is looked
+        up again in the current index, and one moved to another layout is
+        looked for under every layout.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        mgr = self.read_mgr
+        t_stamp = mgr.resolve_timestamp(context, name, timestamp, approximate)
+        entry = mgr.packed(context, name, t_stamp)
+        try:
+            if entry is None:
+                return loose(mgr.rxt_path(context, name, t_stamp))
+            return packed(entry)
+        except (KeyError, IOError, OSError):
+            entry = mgr.packed(context, name, t_stamp, refresh=True)
+            if entry is None:
+                # moved to another layout, or into place, since it was looked for
+                ts_dir = mgr.find_timestamp_dir(context, name, t_stamp, refresh=True)
+                if ts_dir is None:
+                    raise KeyError("{0} {1} {2} does not exist".format(context, name, t_stamp))
+                path = pjoin(ts_dir, mgr.rxt_name(context, name, t_stamp))
+                mgr.forget(path)
+                try:
+                    return loose(path)
+                except (IOError, OSError):
+                    raise KeyError("{0} {1} {2} does not exist".format(context, name, t_stamp))
+        return packed(entry)
+
+    def rxt_lazy(self, context, name, timestamp, approximate=False):
+        """
+        Retrieve a read-only mapping over the resolve matching the name, context,
+        and timestamp. Only the header of the resolve is read up front. The cold
+        sections of a split resolve (graph, resolved packages, solver stats) are
+        loaded when first accessed.
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            timestamp    (int): Timestamp of the resolve.
+            approximate (bool): Whether to get the nearest timestamp,
+                                less than or equal to timestamp.
+
+        Returns:
+            record.LazyRxt
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        blob_dir = self.read_mgr.blobs_dir()
+        return self._load(context, name, timestamp, approximate,
+                          lambda path: record.load_lazy(path, blob_dir, self.cache),
+                          lambda entry: record.LazyRxt(record.decode_doc(entry.read()), None,
+                                                       blob_dir, self.cache))
+
+    def rxt_fields(self, context, name, timestamp, fields, approximate=False):
+        """
+        Retrieve selected top level keys of a resolve, reading the rxt file only
+        as far as the last of them. A resolve already in the cache is not read.
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            timestamp    (int): Timestamp of the resolve.
+            fields  (iterable): keys to retrieve. (eg ["status", "created"])
+            approximate (bool): Whether to get the nearest timestamp,
+                                less than or equal to timestamp.
+
+        Returns:
+            dict of the keys found to their values. Keys the resolve does not
+            have are left out.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        with instrument.phase("reader.rxt_fields"):
+            return self._load(context, name, timestamp, approximate,
+                              lambda path: self.load_fields(path, fields),
+                              lambda entry: self.packed_fields(entry, fields))
+
+    def stream_rxt_fields(self, context, name, fields, start=None, end=None, reverse=False):
+        """
+        Retrieve selected top level keys of every resolve of a context and name,
+        one resolve at a time. (see rxt_fields)
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            fields  (iterable): keys to retrieve.
+            start        (int): earliest timestamp. (default: unbounded)
+            end          (int): latest timestamp. (default: unbounded)
+            reverse     (bool): Whether to stream the newest resolve first.
+
+        Returns:
+            generator of (timestamp, dict of keys found to their values).
+
+        Raises:
+            KeyError: If the db is missing the context or name.
+        """
+        fields = list(fields)
+        timestamps = self.read_mgr.timestamp_range(context, name, start, end, reverse=reverse)
+        for t_stamp in timestamps:
+            try:
+                yield t_stamp, self._load(context, name, t_stamp, False,
+                                          lambda path: self.load_fields(path, fields),
+                                          lambda entry: self.packed_fields(entry, fields))
+            except KeyError:
+                # removed since the index was read
+                continue
+
+    def load_fields(self, rxt_file, fields):
+        """
+        Read selected top level keys of an rxt file, whatever its format,
+        consulting the cache for the complete resolve first.
+
+        Returns:
+            dict of the keys found to their values.
+
+        Raises:
+            KeyError: If the file does not exist.
+        """
+        if self.cache is not None:
+            f_stat = self.read_mgr.stat(rxt_file)
+            if f_stat is None:
+                raise KeyError("load_fields({0}) - does not exist".format(rxt_file))
+            data = self.cache.get(rxt_file, (f_stat.st_mtime, f_stat.st_size))
+            if data is not None:
+                return dict((key, data[key]) for key in fields if key in data)
+        try:
+            return record.read_fields(rxt_file, fields, self.read_mgr.blobs_dir(), self.cache)
+        except (IOError, OSError):
+            raise KeyError("load_fields({0}) - does not exist".format(rxt_file))
+
+    def load_rxt(self, rxt_file):
+        """
+        Load an rxt file, whatever its format, consulting the cache. Cached
+        resolves are validated against the mtime and size of the file.
+        Deduplicated resolves are cached by the digest of their blob instead,
+        so that a body shared by many resolves is parsed and held once.
+
+        Args:
+            rxt_file (str): path to the rxt file.
+
         Returns:
             python dict
 
         Raises:
-            RuntimeError if not extant.
+            KeyError: If the file does not exist.
         """
-        rxt_file = self.read_mgr.resolve(context, name, timestamp, approximate)
+        f_stat = self.read_mgr.stat(rxt_file)
+        if f_stat is None:
+            raise KeyError("load_rxt({0}) - does not exist".format(rxt_file))
+        validator = (f_stat.st_mtime, f_stat.st_size)
 
-        with open(rxt_file) as f_handle:
-            data = json.load(f_handle)
-            return data
+        if self.cache is not None:
+            data = self.cache.get(rxt_file, validator)
+            if data is not None:
+                return data
+
+        data, nbytes, blob = record.load_rxt(rxt_file, self.read_mgr.blobs_dir(), self.cache)
+
+        if self.cache is not None and blob is None:
+            self.cache.put(rxt_file, data, nbytes, validator)
+        return data
+
+    def load_packed(self, entry):
+        """
+        Load a packed resolve, consulting the cache. Records of a pack never
+        change, so cached resolves are validated against the offset and length
+        of the record. (see load_rxt)
+
+        Args:
+            entry (PackEntry): the resolve.
+
+        Returns:
+            python dict
+        """
+        location = entry.location()
+        validator = (entry.offset, entry.length)
+        if self.cache is not None:
+            data = self.cache.get(location, validator)
+            if data is not None:
+                return data
+
+        header = record.decode_doc(entry.read())
+        data, nbytes, blob = record.complete_doc(header, entry.length, None,
+                                                 self.read_mgr.blobs_dir(), self.cache)
+        if self.cache is not None and blob is None:
+            self.cache.put(location, data, nbytes, validator)
+        return data
+
+    def packed_fields(self, entry, fields):
+        """
+        Read selected top level keys of a packed resolve, consulting the cache
+        for the complete resolve first. (see load_fields)
+        """
+        if self.cache is not None:
+            data = self.cache.get(entry.location(), (entry.offset, entry.length))
+            if data is not None:
+                return dict((key, data[key]) for key in fields if key in data)
+        return record.doc_fields(record.decode_doc(entry.read()), fields,
+                                 self.read_mgr.blobs_dir(), self.cache)
 
 
     def contexts(self):
@@ -358,9 +917,25 @@ class RezRxtDbReader(RezRxtDbReaderI):
 
         return self.read_mgr.timestamps(context, name)
 
+    def timestamp_range(self, context, name, start=None, end=None, include_start=True,
+                        include_end=True, reverse=False, limit=None):
+        """
+        Return the timestamps between start and end. (see
+        RezRxtDbReadMgr.timestamp_range)
+        """
+        return self.read_mgr.timestamp_range(context, name, start, end, include_start,
+                                             include_end, reverse, limit)
+
+    def latest(self, context, name, count=1):
+        """
+        Return the most recent timestamps, newest first.
+        """
+        return self.read_mgr.latest(context, name, count)
+
     def rxt_files(self, context, name):
         """
-        Return a generator of rxt files.
+        Return a generator of rxt files, or, for packed resolves, their
+        location within their pack file, <pack path>#<timestamp>. (see location)
 
         Args:
             context (str): ontext name.
@@ -373,10 +948,143 @@ class RezRxtDbReader(RezRxtDbReaderI):
             KeyError: if supplied with non-extant keys.
         """
         for t_stamp in self.read_mgr.timestamps(context, name):
-            yield self.read_mgr.resolve(context, name, t_stamp)
+            yield self.read_mgr.location(context, name, t_stamp)
+
+    def find_package(self, package, version=None, variant=None):
+        """
+        Return the resolves which resolved a package, from the package index,
+        rather than by reading every resolve. (see pkgindex.py)
+
+        Args:
+            package (str): name of the package.
+            version (str): only those which resolved this version. (default: any)
+            variant (int): only those which resolved this variant. (default: any)
+
+        Returns:
+            sorted list of (context, name, timestamp, version, variant)
+        """
+        return PackageIndex(self.read_mgr.pkgindex_dir()).find(package, version, variant)
+
+    def resolve_timestamp(self, context, name, timestamp, approximate=False):
+        """
+        Return the exact timestamp under which a resolve is stored. (see
+        RezRxtDbReadMgr.resolve_timestamp)
+        """
+        return self.read_mgr.resolve_timestamp(context, name, timestamp, approximate)
 
     def resolve(self, context, name, timestamp, approximate=False):
         """
         Get the rxt file matching the parameters
+
+        Raises:
+            PackedResolveError: If the resolve is packed.
+        """
+        return self.read_mgr.resolve(context, name, timestamp, approximate)
+
+    def location(self, context, name, timestamp, approximate=False):
+        """
+        Return the location of a resolve, for display. (see RezRxtDbReadMgr.location)
+        """
+        return self.read_mgr.location(context, name, timestamp, approximate)
+
+    def snapshot(self, contexts, timestamp):
+        """
+        Resolve every name of the supplied contexts as of a timestamp. Names are
+        listed from the catalog, and each is resolved against its timestamp
+        index, so that no timestamp directory is listed while they are current.
+        Only the header of each resolve is read.
+
+        Args:
+            contexts (list): Contexts to resolve.
+            timestamp (int): Timestamp to resolve as of.
+
+        Returns:
+            dict of context -> name -> {"timestamp", "location", "header"}.
+            (see RezRxtDbReaderI.snapshot)
+
+        Raises:
+            KeyError: If the db is missing a context.
+        """
+        mgr = self.read_mgr
+        snapshot = {}
+        for context in contexts:
+            names = snapshot[context] = {}
+            for name in mgr.names(context):
+                try:
+                    t_stamp = mgr.timestamp_index(context, name).floor(timestamp)
+                except KeyError:
+                    # removed since the catalog was read
+                    continue
+                try:
+                    path, header = self._load(
+                        context, name, t_stamp, False,
+                        lambda path: (path, record.load_lazy(path, mgr.blobs_dir(),
+                                                             self.cache).header()),
+                        lambda entry: (entry.location(),
+                                       record.LazyRxt(record.decode_doc(entry.read()), None,
+                                                      mgr.blobs_dir(), self.cache).header()))
+                except KeyError:
+                    continue
+                names[name] = {"timestamp": t_stamp, "location": path, "header": header}
+        return snapshot
+
+    def launch_script(self, context, name, timestamp, shell, approximate=False):
+        """
+        Return the path to the baked launch script of a resolve, for the supplied
+        shell type. Sourcing the script applies the evaluated environment of the
+        resolve.
+
+        Args:
+            context      (str): Context name.
+            name         (str): Package name.
+            timestamp    (int): Timestamp of the resolve.
+            shell        (str): Shell type. (eg bash)
+            approximate (bool): Whether to get the nearest timestamp,
+                                less than or equal to timestamp.
+
+        Returns:
+            Path to the script, or None if no script was baked for the shell,
+            the rxt file has changed since the script was baked, or the resolve
+            is packed.
+
+        Raises:
+            KeyError: If approximate and the db is missing the context or name.
+        """
+        mgr = self.read_mgr
+        with instrument.phase("reader.launch_script"):
+            t_stamp = mgr.resolve_timestamp(context, name, timestamp, approximate)
+            if mgr.packed(context, name, t_stamp) is not None:
+                return None
+            manifest = mgr.read_sidecar(mgr.launch_env_path(context, name, t_stamp),
+                                        context, name, t_stamp)
+        if manifest is None or shell not in manifest.get("shells", ()):
+            return None
+        return mgr.launch_script_path(context, name, t_stamp, shell)
+
+    def tools(self, context, name, timestamp, approximate=False):
+        """
+        Return the tools provided by each package of a resolve, from the tools
+        manifest extracted when the resolve was added. Does not require rez.
+
+        Args:
+            context      (str): Context name.
+            name         (str): Package name.
+            timestamp    (int): Timestamp of the resolve.
+            approximate (bool): Whether to get the nearest timestamp,
+                                less than or equal to timestamp.
+
+        Returns:
+            dict of package name -> list of tools, or None if the resolve has no
+            tools manifest, or the rxt file has changed since it was extracted.
+
+        Raises:
+            KeyError: If approximate and the db is missing the context or name.
         """
-        return self.read_mgr.resolve(context, name, timestamp, approximate)
\ No newline at end of file
+        mgr = self.read_mgr
+        t_stamp = mgr.resolve_timestamp(context, name, timestamp, approximate)
+        entry = mgr.packed(context, name, t_stamp)
+        if entry is not None:
+            return entry.read_tools()
+        manifest = mgr.read_sidecar(mgr.tools_path(context, name, t_stamp),
+                                    context, name, t_stamp)
+        return None if manifest is None else manifest["tools"]
\ No newline at end of file
@@ -0,0 +1,497 @@
+"""
+record.py - on disk format of a single resolve.
+
+A resolve is stored either as a plain rxt (the json rez writes, possibly
+compressed - see codec.py), or split into a small header and a cold file
+holding the bulky, rarely read keys:
+
+timestamp/<epoc>/
+    <context>-<name>-<epoc>.rxt         header: hot keys + "__rezrxt__" meta
+    <context>-<name>-<epoc>.rxt.cold    cold sections
+
+The meta entry of a split header names the cold file and lists the keys
+held by each cold section:
+
+"__rezrxt__": {"version": 1,
+               "cold": "<context>-<name>-<epoc>.rxt.cold",
+               "sections": {"graph": ["graph"], ...}}
+
+The cold file is self describing. A magic line is followed by a json line
+mapping each section to the [offset, length] of its payload, relative to
+the end of that line, and then the payloads themselves. Each payload is a
+json object of the keys of the section, possibly compressed. Reading a
+section is a single open, two short reads and a seek.
+
+Deduplicated resolves keep only their VOLATILE_KEYS (and, if split, their
+hot keys) in the rxt file. The rest is stored once in a content addressed
+blob store at the root of the database, named by the sha256 of its
+canonical json:
+
+root/blobs/<digest[:2]>/<digest>
+
+"__rezrxt__": {"version": 1, "blob": <digest>, "keys": [...]}
+    the blob is a plain document holding the listed keys.
+"__rezrxt__": {"version": 1, "blob": <digest>, "sections": {...}}
+    the blob is a cold file.
+
+Blobs are immutable, so parsed blobs may be cached by digest alone.
+"""
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+from os.path import dirname, basename
+from os.path import join as pjoin
+import hashlib
+import json
+
+from rezrxt.filebacked import codec as rxt_codec
+from rezrxt import instrument, jsonscan
+
+META_KEY = "__rezrxt__"
+COLD_MAGIC = "RZXCOLD1\n"
+COLD_SUFFIX = ".cold"
+BLOBS_DIR = "blobs"
+
+# section name -> keys of the resolve stored in it
+COLD_SECTIONS = (
+    ("graph", ("graph",)),
+    ("packages", ("resolved_packages", "package_paths")),
+    ("stats", ("solve_time", "load_time", "num_loaded_packages")),
+)
+
+# keys which differ between otherwise identical resolves. they are kept in
+# the rxt file of a deduplicated resolve, and left out of its digest.
+VOLATILE_KEYS = ("timestamp", "created", "solve_time", "load_time", "from_cache",
+                 "host", "user")
+
+# name of the single section of a plain blob
+BODY_SECTION = "body"
+
+
+def split_rxt(rxt_dict, keep=()):
+    """
+    Split a resolve into its hot keys and its cold sections.
+
+    Args:
+        rxt_dict (dict): resolve python dict.
+        keep (iterable): keys to keep hot, regardless of COLD_SECTIONS.
+
+    Returns:
+        (hot dict, list of (section name, dict of keys))
+    """
+    hot = dict(rxt_dict)
+    sections = []
+    for section, keys in COLD_SECTIONS:
+        payload = dict((key, hot.pop(key)) for key in keys if key in hot and key not in keep)
+        if payload:
+            sections.append((section, payload))
+    return hot, sections
+
+
+def digest(kind, content):
+    """
+    Return the content address of a blob: the sha256 of its kind and the
+    canonical json of its content.
+    """
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256((kind + ":" + canonical).encode()).hexdigest()
+
+
+def blob_path(blob_dir, blob_digest):
+    """
+    Return the path to a blob within the blob store.
+    """
+    return pjoin(blob_dir, blob_digest[:2], blob_digest)
+
+
+def encode_cold(sections, codec="none"):
+    """
+    Encode cold sections as the contents of a cold file.
+
+    Args:
+        sections (list): (section name, dict of keys) pairs.
+        codec     (str): codec to compress each section with.
+
+    Returns:
+        bytes
+    """
+    payloads = []
+    index = {}
+    offset = 0
+    for section, payload in sections:
+        data = rxt_codec.encode(json.dumps(payload).encode(), codec)
+        index[section] = [offset, len(data)]
+        payloads.append(data)
+        offset += len(data)
+    return COLD_MAGIC.encode() + json.dumps(index).encode() + b"\n" + b"".join(payloads)
+
+
+def encode_plain(rxt_dict, codec="none"):
+    """
+    Encode a resolve as a plain rxt, compressed with codec.
+
+    Returns:
+        bytes
+    """
+    return rxt_codec.encode(json.dumps(rxt_dict).encode(), codec)
+
+
+def _section_keys(sections):
+    """
+    Map each section to the sorted keys it holds.
+    """
+    return dict((section, sorted(payload)) for section, payload in sections)
+
+
+def cold_name(path):
+    """
+    Return the file name of the cold file of the header at path.
+    """
+    return basename(path) + COLD_SUFFIX
+
+
+def encode_record(path, rxt_dict, split=False, codec="none", blob_dir=None):
+    """
+    Encode a resolve to be stored at path.
+
+    Args:
+        path      (str): path of the rxt file.
+        rxt_dict (dict): resolve python dict.
+        split    (bool): whether to store a header plus cold sections.
+        codec     (str): codec to compress with.
+        blob_dir  (str): path to the blob store. If supplied, the resolve is
+                         deduplicated through it.
+
+    Returns:
+        list of (path, bytes, is blob), in the order they must be written. The
+        rxt file comes last, so that it is never visible without its cold file
+        or blob. Blobs are immutable, and need not be written if they exist.
+    """
+    if blob_dir is None:
+        if not split:
+            return [(path, encode_plain(rxt_dict, codec), False)]
+        hot, sections = split_rxt(rxt_dict)
+        hot[META_KEY] = {"version": 1, "cold": cold_name(path),
+                         "sections": _section_keys(sections)}
+        return [(pjoin(dirname(path), cold_name(path)), encode_cold(sections, codec), False),
+                (path, json.dumps(hot).encode(), False)]
+
+    if split:
+        header, sections = split_rxt(rxt_dict, keep=VOLATILE_KEYS)
+        blob_digest = digest("cold", dict(sections))
+        header[META_KEY] = {"version": 1, "blob": blob_digest,
+                            "sections": _section_keys(sections)}
+        blob = encode_cold(sections, codec)
+    else:
+        header = dict((key, rxt_dict[key]) for key in VOLATILE_KEYS if key in rxt_dict)
+        body = dict((key, val) for key, val in rxt_dict.items() if key not in header)
+        blob_digest = digest("body", body)
+        header[META_KEY] = {"version": 1, "blob": blob_digest, "keys": sorted(body)}
+        blob = encode_plain(body, codec)
+    return [(blob_path(blob_dir, blob_digest), blob, True),
+            (path, json.dumps(header).encode(), False)]
+
+
+def read_cold_sections(cold_path, sections):
+    """
+    Read and parse sections of a cold file, in a single open.
+
+    Args:
+        cold_path   (str): path to the cold file.
+        sections (iterable): names of the sections to read.
+
+    Returns:
+        list of (section name, dict of the keys it holds, payload bytes read)
+    """
+    results = []
+    instrument.count("fs.open")
+    with open(cold_path, 'rb') as cold_file:
+        if cold_file.readline() != COLD_MAGIC.encode():
+            raise ValueError("{0} is not a cold file".format(cold_path))
+        index = json.loads(cold_file.readline().decode())
+        start = cold_file.tell()
+        for section in sections:
+            offset, length = index[section]
+            cold_file.seek(start + offset)
+            payload = cold_file.read(length)
+            instrument.count("bytes.read", length)
+            with instrument.phase("record.parse"):
+                data = json.loads(rxt_codec.decode(payload).decode())
+            results.append((section, data, length))
+    return results
+
+
+def read_doc(path):
+    """
+    Read and parse a plain rxt, header, or plain blob, decompressing it if required.
+
+    Returns:
+        (dict, bytes read)
+    """
+    instrument.count("fs.open")
+    with open(path, 'rb') as rxt_file:
+        data = rxt_file.read()
+    instrument.count("bytes.read", len(data))
+    return decode_doc(data), len(data)
+
+
+def decode_doc(data):
+    """
+    Parse the bytes of a plain rxt, header, or plain blob, decompressing them
+    if required. (eg a record of a pack file, or a buffer over a record of a
+    frozen database)
+
+    Returns:
+        dict
+    """
+    with instrument.phase("record.parse"):
+        return json.loads(bytes(rxt_codec.decode(data)).decode())
+
+
+class LazyRxt(Mapping):
+    """
+    Read-only mapping over a resolve. Hot keys are available immediately;
+    each cold section, or the blob of a deduplicated resolve, is loaded the
+    first time one of its keys is accessed.
+    """
+    def __init__(self, header, path=None, blob_dir=None, cache=None):
+        """
+        Args:
+            header     (dict): the parsed header (or a complete plain rxt).
+            path        (str): path of the rxt file the header was read from.
+            blob_dir    (str): path to the blob store.
+            cache  (RxtCache): cache for parsed blob sections, keyed by digest.
+        """
+        self._meta = header.get(META_KEY, {})
+        self._data = dict((key, val) for key, val in header.items() if key != META_KEY)
+        self._cache = cache
+        self._blob = self._meta.get("blob")
+        if self._blob is not None:
+            self._cold_path = blob_path(blob_dir, self._blob)
+        elif "cold" in self._meta:
+            self._cold_path = pjoin(dirname(path), self._meta["cold"])
+        else:
+            self._cold_path = None
+
+        sections = self._meta.get("sections", {})
+        if "keys" in self._meta:
+            sections = {BODY_SECTION: self._meta["keys"]}
+        self._cold_keys = {}
+        for section, keys in sections.items():
+            for key in keys:
+                self._cold_keys[key] = section
+        self.loaded_sections = set()
+        # bytes of cold payload read so far
+        self.cold_bytes = 0
+
+    def _read_sections(self, sections):
+        """
+        Read sections from the cold file or blob.
+
+        Returns:
+            list of (section name, dict of keys, payload bytes read)
+        """
+        if "keys" in self._meta:
+            data, nbytes = read_doc(self._cold_path)
+            return [(BODY_SECTION, data, nbytes)]
+        return read_cold_sections(self._cold_path, sections)
+
+    def _load_sections(self, sections):
+        """
+        Load cold sections into the mapping. Sections of a blob are looked up
+        in, and added to, the cache by digest.
+        """
+        use_cache = self._cache is not None and self._blob is not None
+        missing = []
+        for section in sections:
+            cached = self._cache.get((self._blob, section)) if use_cache else None
+            if cached is None:
+                missing.append(section)
+            else:
+                self._data.update(cached)
+                self.loaded_sections.add(section)
+
+        if missing:
+            for section, data, nbytes in self._read_sections(missing):
+                if use_cache:
+                    self._cache.put((self._blob, section), data, nbytes)
+                self._data.update(data)
+                self.loaded_sections.add(section)
+                self.cold_bytes += nbytes
+
+    def __getitem__(self, key):
+        if key not in self._data and key in self._cold_keys:
+            self._load_sections([self._cold_keys[key]])
+        return self._data[key]
+
+    def __iter__(self):
+        # listed up front, as loading a section while iterating moves its keys
+        keys = list(self._data)
+        keys.extend(key for key in self._cold_keys if key not in self._data)
+        return iter(keys)
+
+    def __len__(self):
+        return len(set(self._data).union(self._cold_keys))
+
+    def __contains__(self, key):
+        return key in self._data or key in self._cold_keys
+
+    def is_split(self):
+        """
+        Return True if the resolve has cold sections, or a blob.
+        """
+        return bool(self._cold_keys)
+
+    def header(self):
+        """
+        Return the keys of the resolve outside of COLD_SECTIONS as a plain dict,
+        whatever its format. Only the body of a deduplicated resolve which is
+        not split is loaded to do so.
+        """
+        cold = set(key for _, keys in COLD_SECTIONS for key in keys)
+        return dict((key, self[key]) for key in self if key not in cold)
+
+    def blob(self):
+        """
+        Return the digest of the blob holding the body of the resolve, or None
+        if it is not deduplicated.
+        """
+        return self._blob
+
+    def to_dict(self):
+        """
+        Load every cold section and return the resolve as a plain dict.
+        """
+        missing = set(self._cold_keys.values()) - self.loaded_sections
+        if missing:
+            self._load_sections(sorted(missing))
+        return dict(self._data)
+
+
+def standalone(path):
+    """
+    Return whether the rxt file at path is a complete, uncompressed rxt, as
+    rez writes, which rez may load by itself. Split, compressed and
+    deduplicated resolves are not.
+    """
+    instrument.count("fs.open")
+    with open(path, 'rb') as rxt_file:
+        data = rxt_file.read()
+    instrument.count("bytes.read", len(data))
+    return rxt_codec.detect(data) == "none" and META_KEY not in json.loads(data.decode())
+
+
+def load_lazy(path, blob_dir=None, cache=None):
+    """
+    Load a resolve from path as a LazyRxt, reading only its header.
+
+    Args:
+        path      (str): path of the rxt file.
+        blob_dir  (str): path to the blob store.
+        cache (RxtCache): cache for parsed blob sections.
+    """
+    header, _ = read_doc(path)
+    return LazyRxt(header, path, blob_dir, cache)
+
+
+def load_rxt(path, blob_dir=None, cache=None):
+    """
+    Load a complete resolve from path, whatever its format.
+
+    Args:
+        path      (str): path of the rxt file.
+        blob_dir  (str): path to the blob store.
+        cache (RxtCache): cache for parsed blob sections.
+
+    Returns:
+        (dict, bytes read, digest of the blob of the resolve or None)
+    """
+    header, nbytes = read_doc(path)
+    return complete_doc(header, nbytes, path, blob_dir, cache)
+
+
+def complete_doc(header, nbytes, path=None, blob_dir=None, cache=None):
+    """
+    Complete a parsed rxt file, loading the cold sections or blob of a split
+    or deduplicated resolve.
+
+    Args:
+        header    (dict): the parsed rxt file.
+        nbytes     (int): bytes read to parse it.
+        path       (str): path of the rxt file. Only required if it has a cold file.
+        blob_dir   (str): path to the blob store.
+        cache (RxtCache): cache for parsed blob sections.
+
+    Returns:
+        (dict, bytes read, digest of the blob of the resolve or None)
+    """
+    if META_KEY not in header:
+        return header, nbytes, None
+    lazy = LazyRxt(header, path, blob_dir, cache)
+    return lazy.to_dict(), nbytes + lazy.cold_bytes, lazy.blob()
+
+
+def doc_fields(header, fields, blob_dir=None, cache=None):
+    """
+    Select top level keys of a parsed rxt file, loading them from the blob of
+    a deduplicated resolve if it holds them. (see read_fields)
+
+    Returns:
+        dict of the keys found to their values.
+    """
+    found = dict((key, header[key]) for key in fields if key in header and key != META_KEY)
+    missing = set(fields).difference(found)
+    if missing and META_KEY in header:
+        lazy = LazyRxt(header, None, blob_dir, cache)
+        found.update((key, lazy[key]) for key in missing if key in lazy)
+    return found
+
+
+def scan_doc(path, fields):
+    """
+    Extract top level keys of a plain rxt, header, or plain blob, streaming
+    and decompressing it only as far as the last of them.
+
+    Returns:
+        dict of the keys found to their values.
+    """
+    instrument.count("fs.open")
+    with open(path, 'rb') as rxt_file:
+        return jsonscan.scan_fields(rxt_codec.decode_stream(jsonscan.iter_chunks(rxt_file)),
+                                    fields)
+
+
+def read_fields(path, fields, blob_dir=None, cache=None):
+    """
+    Read selected top level keys of a resolve, whatever its format, without
+    parsing the rest of it. Keys held in the cold file or blob of the resolve
+    are read from it only if missing from the rxt file.
+
+    Args:
+        path        (str): path of the rxt file.
+        fields (iterable): keys to read.
+        blob_dir    (str): path to the blob store.
+        cache  (RxtCache): cache for parsed blob sections.
+
+    Returns:
+        dict of the keys found to their values. Keys the resolve does not have
+        are left out.
+    """
+    fields = set(fields)
+    found = scan_doc(path, fields)
+    missing = fields.difference(found)
+    if not missing:
+        return found
+
+    meta = scan_doc(path, [META_KEY]).get(META_KEY)
+    if meta is None:
+        return found
+    if "keys" in meta:
+        # the body of a deduplicated resolve is a plain document, so streams too
+        found.update(scan_doc(blob_path(blob_dir, meta["blob"]), missing))
+    else:
+        lazy = LazyRxt({META_KEY: meta}, path, blob_dir, cache)
+        found.update((key, lazy[key]) for key in missing if key in lazy)
+    return found
@@ -0,0 +1,542 @@
+"""
+replica.py - node local copies of a database.
+
+A replica is a symlink to the latest of a series of generations, each a
+complete copy of the primary database as of a sync:
+
+<dir>/
+    replica -> .replica.3
+    .replica.2
+    .replica.3/
+        .rezrxt-sync.json
+        catalog.json
+        context/...
+        blobs/...
+
+Each generation records, in its directory manifest, the mtime of every
+timestamp directory of the primary it copied, and the mtime and size of each
+of their files. A sync lists the timestamps of each name of the primary, and stats
+each timestamp directory. Directories whose mtime is unchanged - files are
+only ever added to or replaced in them by a rename, which updates the mtime
+- are hard linked from the previous generation without being listed. Only
+new or changed files are copied. Blobs are content addressed, so those the
+previous generation holds are linked without being compared. Packs (see
+pack.py) are only appended to, so those whose size is unchanged are linked
+too. Names are synced in parallel. Indexes and the catalog are rebuilt for the copy, and
+the replica symlink is then replaced, atomically, by one to the new
+generation. Readers which resolved the previous generation continue to use
+it until they are done; the oldest generations are removed.
+
+ReplicaReader reads resolves from a replica, falling back to the primary
+for resolves the replica does not have yet. (see REZRXT_REPLICA) Each name
+of the replica records the mtime its timestamp directory had in the primary
+when it was copied, so that the replica may answer approximate lookups for
+as long as no timestamp of the name has been added to the primary since.
+"""
+
+__all__ = ("sync_replica", "read_sync_manifest", "ReplicaReader", "SYNC_MANIFEST",
+           "SYNC_DIRS", "SYNC_NAME")
+
+from multiprocessing.pool import ThreadPool
+from os.path import basename, dirname, exists, isdir, islink, realpath
+from os.path import join as pjoin
+from os import link, listdir, makedirs, rename, stat, symlink, getpid
+import json
+import re
+import shutil
+import time
+
+from rezrxt.dbinterface import RezRxtDbReaderI
+from rezrxt.filebacked.catalog import Catalog
+from rezrxt.filebacked.config import CONFIG_NAME
+from rezrxt.filebacked.fsutil import atomic_write, makedirs_exist_ok
+from rezrxt.filebacked.index import TimestampIndex
+from rezrxt.filebacked.layout import LAYOUT_NAME
+from rezrxt.filebacked.pack import PackIndex
+from rezrxt.filebacked.reader import RezRxtDbReadMgr, RezRxtDbReader
+from rezrxt.filebacked import record
+
+# source and time of the sync, at the root of a generation
+SYNC_MANIFEST = ".rezrxt-sync.json"
+# timestamp directories copied, at the root of a generation. read by the next sync.
+SYNC_DIRS = ".rezrxt-sync-dirs.json"
+# mtime of the timestamp directory of the primary, in each name directory
+SYNC_NAME = ".rezrxt-sync"
+
+# number of threads copying names
+DEFAULT_JOBS = 8
+
+# generations kept, including the current one. the previous generation is
+# kept for readers which resolved it before the swap.
+DEFAULT_KEEP = 2
+
+
+def read_sync_manifest(root):
+    """
+    Read the sync manifest of a replica, or of one of its generations.
+
+    Returns:
+        dict, or None if root is not a replica.
+    """
+    return _read_json(pjoin(root, SYNC_MANIFEST))
+
+
+def _read_json(path):
+    """
+    Read a json file.
+
+    Returns:
+        the parsed json, or None if it is missing or unreadable.
+    """
+    try:
+        with open(path) as f_handle:
+            return json.load(f_handle)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _generations(replica):
+    """
+    Return the generations of a replica, as (number, path) pairs, oldest first.
+    """
+    pattern = re.compile(r"^\.{0}\.(\d+)$".format(re.escape(basename(replica))))
+    parent = dirname(replica) or "."
+    gens = []
+    for entry in listdir(parent):
+        match = pattern.match(entry)
+        if match is not None:
+            gens.append((int(match.group(1)), pjoin(parent, entry)))
+    return sorted(gens)
+
+
+def _copy(src, dst):
+    """
+    Copy a file, preserving its mtime, so that sidecars recording the mtime
+    and size of the rxt file still match it.
+
+    Returns:
+        bytes copied
+    """
+    shutil.copy2(src, dst)
+    return stat(dst).st_size
+
+
+def _sync_name(task):
+    """
+    Pool worker. Copy or link the timestamp directories of one name.
+
+    Args:
+        task (tuple): (primary, previous generation or None, new generation,
+                       previous manifest dirs, context, name)
+
+    Returns:
+        (manifest dirs of the name, files copied, files linked, bytes copied)
+    """
+    primary, previous, generation, old_dirs, context, name = task
+    src_mgr = RezRxtDbReadMgr(primary)
+    dst_mgr = RezRxtDbReadMgr(generation)
+    prev_mgr = RezRxtDbReadMgr(previous) if previous else None
+    dirs = {}
+    copied = linked = nbytes = 0
+    try:
+        index = src_mgr.timestamp_index(context, name)
+        timestamps = list(index)
+    except KeyError:
+        # removed since the catalog was read
+        return dirs, copied, linked, nbytes
+
+    for t_stamp in timestamps:
+        # the primary may be part way through a migration to another layout
+        src_dir = src_mgr.find_timestamp_dir(context, name, t_stamp)
+        if src_dir is None:
+            # packed, or removed since the index was read
+            continue
+        dst_dir = dst_mgr.timestamp_dir(context, name, t_stamp)
+        rel_dir = "{0}/{1}/{2}".format(context, name, t_stamp)
+        try:
+            mtime = stat(src_dir).st_mtime
+        except OSError:
+            continue
+        old = old_dirs.get(rel_dir)
+        makedirs(dst_dir)
+        if old is not None and old["mtime"] == mtime:
+            # unchanged since the last sync. no need to list it.
+            files = old["files"]
+            old_dir = prev_mgr.timestamp_dir(context, name, t_stamp)
+            for f_name in files:
+                link(pjoin(old_dir, f_name), pjoin(dst_dir, f_name))
+                linked += 1
+        else:
+            files = {}
+            old_files = old["files"] if old is not None else {}
+            for f_name in listdir(src_dir):
+                if f_name.startswith("."):
+                    # locks and temporary files of writers
+                    continue
+                try:
+                    f_stat = stat(pjoin(src_dir, f_name))
+                except OSError:
+                    continue
+                if old_files.get(f_name) == [f_stat.st_mtime, f_stat.st_size]:
+                    link(pjoin(prev_mgr.timestamp_dir(context, name, t_stamp), f_name),
+                         pjoin(dst_dir, f_name))
+                    linked += 1
+                else:
+                    try:
+                        nbytes += _copy(pjoin(src_dir, f_name), pjoin(dst_dir, f_name))
+                    except (IOError, OSError):
+                        # removed since it was listed
+                        continue
+                    copied += 1
+                files[f_name] = [f_stat.st_mtime, f_stat.st_size]
+        dirs[rel_dir] = {"mtime": mtime, "files": files}
+
+    pack = src_mgr.pack_index(context, name)
+    if pack is not None:
+        # records are only ever appended to a generation of the pack, so an
+        # unchanged size means an unchanged pack
+        dst_pack = pjoin(dst_mgr.name_dir(context, name), pack.pack)
+        old_pack = pjoin(prev_mgr.name_dir(context, name), pack.pack) if prev_mgr else None
+        old_stat = stat(old_pack) if old_pack is not None and exists(old_pack) else None
+        makedirs_exist_ok(dst_mgr.timestamps_dir(context, name))
+        if old_stat is not None and old_stat.st_size == pack.size:
+            link(old_pack, dst_pack)
+            linked += 1
+        else:
+            nbytes += _copy(pack.pack_path(), dst_pack)
+            copied += 1
+        # the index last, so that it never refers to a pack the replica lacks
+        dst_index = PackIndex(dst_mgr.name_dir(context, name))
+        dst_index.pack, dst_index.size, dst_index.entries = pack.pack, pack.size, pack.entries
+        dst_index.save()
+
+    if timestamps:
+        TimestampIndex(dst_mgr.index_path(context, name),
+                       dst_mgr.timestamps_dir(context, name)).rebuild().save()
+        atomic_write(pjoin(dst_mgr.name_dir(context, name), SYNC_NAME),
+                     json.dumps(index.dir_mtime).encode())
+    return dirs, copied, linked, nbytes
+
+
+def _sync_blobs(primary, previous, generation):
+    """
+    Copy the blobs of the primary which the previous generation does not
+    hold, and link those it does.
+
+    Returns:
+        (files copied, files linked, bytes copied)
+    """
+    src_dir = pjoin(primary, record.BLOBS_DIR)
+    if not isdir(src_dir):
+        return 0, 0, 0
+    copied = linked = nbytes = 0
+    for fan_out in listdir(src_dir):
+        if fan_out.startswith("."):
+            continue
+        dst_fan_out = pjoin(generation, record.BLOBS_DIR, fan_out)
+        makedirs_exist_ok(dst_fan_out)
+        for f_name in listdir(pjoin(src_dir, fan_out)):
+            if f_name.startswith("."):
+                continue
+            old = pjoin(previous, record.BLOBS_DIR, fan_out, f_name) if previous else None
+            if old is not None and exists(old):
+                link(old, pjoin(dst_fan_out, f_name))
+                linked += 1
+            else:
+                nbytes += _copy(pjoin(src_dir, fan_out, f_name), pjoin(dst_fan_out, f_name))
+                copied += 1
+    return copied, linked, nbytes
+
+
+def sync_replica(primary, replica, jobs=DEFAULT_JOBS, keep=DEFAULT_KEEP, callback=None):
+    """
+    Bring a replica up to date with the primary database, creating it if
+    it does not exist. (see the module docstring)
+
+    Args:
+        primary    (str): path to the root of the primary database.
+        replica    (str): path of the replica symlink.
+        jobs       (int): number of names copied in parallel.
+        keep       (int): number of generations to keep, including the new one.
+        callback (callable): called with (context, name, files copied) as
+                             each name is synced.
+
+    Returns:
+        dict with the new generation, the number of files copied and linked,
+        the bytes copied, and the elapsed seconds.
+
+    Raises:
+        ValueError: If replica exists, and is not a replica symlink.
+    """
+    start = time.time()
+    primary = realpath(primary)
+    if exists(replica) and not islink(replica):
+        raise ValueError("{0} exists, and is not a replica".format(replica))
+    parent = dirname(replica) or "."
+    makedirs_exist_ok(parent)
+
+    previous = realpath(replica) if islink(replica) else None
+    old_manifest = read_sync_manifest(previous) if previous else None
+    old_dirs = _read_json(pjoin(previous, SYNC_DIRS)) if previous else None
+    if old_manifest is None or old_manifest.get("source") != primary or old_dirs is None:
+        # copy everything afresh
+        previous, old_dirs = None, {}
+
+    gens = _generations(replica)
+    number = gens[-1][0] + 1 if gens else 1
+    generation = pjoin(parent, ".{0}.{1}".format(basename(replica), number))
+    makedirs(pjoin(generation, "context"))
+    # before the names, which are copied in the layout of the primary
+    if exists(pjoin(primary, LAYOUT_NAME)):
+        _copy(pjoin(primary, LAYOUT_NAME), pjoin(generation, LAYOUT_NAME))
+
+    summary = {"generation": generation, "copied": 0, "linked": 0, "bytes": 0, "seconds": 0.0}
+    dirs = {}
+    try:
+        catalog = RezRxtDbReadMgr(primary).catalog()
+        tasks = [(primary, previous, generation, old_dirs, context, name)
+                 for context in catalog for name in catalog.names(context)]
+        pool = ThreadPool(max(1, jobs))
+        try:
+            for task, result in zip(tasks, pool.imap(_sync_name, tasks)):
+                name_dirs, copied, linked, nbytes = result
+                dirs.update(name_dirs)
+                summary["copied"] += copied
+                summary["linked"] += linked
+                summary["bytes"] += nbytes
+                if callback is not None:
+                    callback(task[4], task[5], copied)
+        finally:
+            pool.close()
+            pool.join()
+
+        # after the names, so that the blobs of every resolve copied are present
+        copied, linked, nbytes = _sync_blobs(primary, previous, generation)
+        summary["copied"] += copied
+        summary["linked"] += linked
+        summary["bytes"] += nbytes
+        if exists(pjoin(primary, CONFIG_NAME)):
+            _copy(pjoin(primary, CONFIG_NAME), pjoin(generation, CONFIG_NAME))
+
+        dst_mgr = RezRxtDbReadMgr(generation)
+        Catalog(dst_mgr.catalog_path(), dst_mgr.contexts_dir()).rebuild(dst_mgr).save()
+        # resolves older than the start of the sync are all in the replica.
+        atomic_write(pjoin(generation, SYNC_DIRS), json.dumps(dirs).encode())
+        atomic_write(pjoin(generation, SYNC_MANIFEST),
+                     json.dumps({"source": primary, "synced": int(start)}).encode())
+    except BaseException:
+        shutil.rmtree(generation, ignore_errors=True)
+        raise
+
+    # swap the new generation in
+    tmp_link = pjoin(parent, ".{0}.{1}.tmp".format(basename(replica), getpid()))
+    symlink(basename(generation), tmp_link)
+    rename(tmp_link, replica)
+
+    for _, path in _generations(replica)[:-max(1, keep)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+    summary["seconds"] = time.time() - start
+    return summary
+
+
+class ReplicaReader(RezRxtDbReaderI):
+    """
+    Database Reader, reading resolves from a replica where it has them, and
+    from the primary otherwise.
+
+    Names and timestamps are listed from the primary, which is cheap - a
+    catalog and a timestamp index - so that resolves added since the last
+    sync are seen. Approximate lookups are answered by the replica, at the
+    cost of a stat of the primary, while it holds every timestamp of the name.
+    """
+    def __init__(self, replica, primary, cache=None):
+        """
+        Args:
+            replica   (str): path of the replica symlink.
+            primary   (str): path to the root of the primary database.
+            cache (RxtCache): cache of parsed resolves. (see RezRxtDbReader)
+
+        The replica is ignored if it is missing, or a replica of another database.
+        """
+        self.primary = RezRxtDbReader(primary, cache)
+        self.replica = None
+        # resolve the symlink once, so that a swap does not change the
+        # generation read from part way through.
+        generation = realpath(replica)
+        manifest = read_sync_manifest(generation)
+        if manifest is not None and manifest["source"] == realpath(primary):
+            self.replica = RezRxtDbReader(generation, cache)
+        super(ReplicaReader, self).__init__()
+
+    def _reader(self, context, name, timestamp):
+        """
+        Return the reader holding the resolve stored under an exact timestamp.
+        """
+        mgr = None if self.replica is None else self.replica.read_mgr
+        if mgr is not None and (mgr.stat(mgr.rxt_path(context, name, timestamp)) or
+                                mgr.packed(context, name, timestamp) is not None):
+            return self.replica
+        return self.primary
+
+    def resolve_timestamp(self, context, name, timestamp, approximate=False):
+        """
+        Return the exact timestamp under which a resolve is stored. (see
+        RezRxtDbReadMgr.resolve_timestamp)
+        """
+        if approximate is True and self._current(context, name):
+            return self.replica.resolve_timestamp(context, name, timestamp, approximate)
+        return self.primary.resolve_timestamp(context, name, timestamp, approximate)
+
+    def _current(self, context, name):
+        """
+        Return whether the replica holds every timestamp the primary has of a
+        name - whether the timestamp directory of the primary is unchanged
+        since the name was synced.
+        """
+        if self.replica is None:
+            return False
+        synced = _read_json(pjoin(self.replica.read_mgr.name_dir(context, name), SYNC_NAME))
+        if synced is None:
+            return False
+        mgr = self.primary.read_mgr
+        t_stat = mgr.stat(mgr.timestamps_dir(context, name))
+        return t_stat is not None and t_stat.st_mtime == synced
+
+    def resolve(self, context, name, timestamp, approximate=False):
+        """
+        Return the full path to a resolve, in the replica if it holds it.
+
+        Raises:
+            KeyError: If db is missing either the context, name, or timestamp.
+            PackedResolveError: If the resolve is packed.
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        return self._reader(context, name, t_stamp).resolve(context, name, t_stamp)
+
+    def location(self, context, name, timestamp, approximate=False):
+        """
+        Return the location of a resolve, for display, in the replica if it
+        holds it. (see RezRxtDbReader.location)
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        return self._reader(context, name, t_stamp).location(context, name, t_stamp)
+
+    def rxt_dict(self, context, name, timestamp, approximate=False):
+        """
+        Retrieve a python dictionary matching the name, context, and timestamp.
+        (see RezRxtDbReader.rxt_dict)
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        return self._reader(context, name, t_stamp).rxt_dict(context, name, t_stamp)
+
+    def rxt_dict_shared(self, context, name, timestamp, approximate=False):
+        """
+        Retrieve the cached python dictionary of a resolve, which must be
+        treated as read-only. (see RezRxtDbReader.rxt_dict_shared)
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        return self._reader(context, name, t_stamp).rxt_dict_shared(context, name, t_stamp)
+
+    def rxt_fields(self, context, name, timestamp, fields, approximate=False):
+        """
+        Retrieve selected top level keys of a resolve. (see RezRxtDbReader.rxt_fields)
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        return self._reader(context, name, t_stamp).rxt_fields(context, name, t_stamp, fields)
+
+    def stream_rxt_fields(self, context, name, fields, start=None, end=None, reverse=False):
+        """
+        Retrieve selected top level keys of every resolve of a context and name.
+        (see RezRxtDbReader.stream_rxt_fields)
+        """
+        fields = list(fields)
+        for t_stamp in self.timestamp_range(context, name, start, end, reverse=reverse):
+            try:
+                yield t_stamp, self.rxt_fields(context, name, t_stamp, fields)
+            except KeyError:
+                continue
+
+    def launch_script(self, context, name, timestamp, shell, approximate=False):
+        """
+        Return the path to the baked launch script of a resolve, in the replica
+        if it holds it. (see RezRxtDbReader.launch_script)
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        return self._reader(context, name, t_stamp).launch_script(context, name, t_stamp, shell)
+
+    def tools(self, context, name, timestamp, approximate=False):
+        """
+        Return the tools provided by each package of a resolve. (see RezRxtDbReader.tools)
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        return self._reader(context, name, t_stamp).tools(context, name, t_stamp)
+
+    def snapshot(self, contexts, timestamp):
+        """
+        Resolve every name of the supplied contexts as of a timestamp, reading
+        the headers from the replica where it holds them. (see RezRxtDbReader.snapshot)
+
+        Raises:
+            KeyError: If the db is missing a context.
+        """
+        snapshot = {}
+        for context in contexts:
+            names = snapshot[context] = {}
+            for name in self.names(context):
+                try:
+                    t_stamp = self.resolve_timestamp(context, name, timestamp, True)
+                    reader = self._reader(context, name, t_stamp)
+                    location = reader.location(context, name, t_stamp)
+                    header = reader.rxt_lazy(context, name, t_stamp).header()
+                except KeyError:
+                    # removed since the catalog was read
+                    continue
+                names[name] = {"timestamp": t_stamp, "location": location, "header": header}
+        return snapshot
+
+    def contexts(self):
+        """
+        Return a generator of contexts.
+        """
+        return self.primary.contexts()
+
+    def names(self, context):
+        """
+        Return a generator of names within the supplied context.
+
+        Raises:
+            KeyError: If context does not exist in DB.
+        """
+        return self.primary.names(context)
+
+    def find_package(self, package, version=None, variant=None):
+        """
+        Return the resolves which resolved a package, from the package index of
+        the primary. (see RezRxtDbReader.find_package)
+        """
+        return self.primary.find_package(package, version, variant)
+
+    def timestamps(self, context, name):
+        """
+        Return a generator of timestamps within the supplied context and name.
+
+        Raises:
+            KeyError: If supplied with non-extant keys.
+        """
+        return self.primary.timestamps(context, name)
+
+    def timestamp_range(self, context, name, start=None, end=None, include_start=True,
+                        include_end=True, reverse=False, limit=None):
+        """
+        Return the timestamps between start and end. (see
+        RezRxtDbReadMgr.timestamp_range)
+        """
+        return self.primary.timestamp_range(context, name, start, end, include_start,
+                                            include_end, reverse, limit)
+
+    def latest(self, context, name, count=1):
+        """
+        Return the most recent timestamps, newest first.
+        """
+        return self.primary.latest(context, name, count)
@@ -2,52 +2,453 @@
 writer implementation.
 """
 
-from os.path import isdir, isfile
+from os.path import isfile, dirname, getsize
 from os.path import join as pjoin
-from os import listdir, makedirs
+from os import mkdir, stat, remove, utime
+import errno
 import json
 
+from rezrxt import instrument
 from rezrxt.dbinterface import RezRxtDbWriterI
+from rezrxt.exceptions import DuplicateKeyError
+from rezrxt.bake import load_context, launch_scripts, tools_manifest
 from rezrxt.filebacked.reader import RezRxtDbReadMgr
+from rezrxt.filebacked.index import TimestampIndex
+from rezrxt.filebacked.catalog import Catalog
+from rezrxt.filebacked.pkgindex import PackageIndex, package_rows
+from rezrxt.filebacked.config import load_config, DURABILITY_MODES
+from rezrxt.filebacked import record
+from rezrxt.filebacked.fsutil import atomic_write, makedirs_exist_ok, fsync_path, FileLock, SyncBatch
+from rezrxt.filebacked.fsutil import remove_dir, temp_path
+
+LOCK_NAME = ".lock"
+CATALOG_LOCK_NAME = ".catalog.lock"
 
 class RezRxtDbWriteMgr(RezRxtDbReadMgr):
     """
     class responsible for updating db.
+
+    Several writers, on several hosts, may update a database at once. Each
+    file is written atomically, a timestamp is claimed by creating its
+    directory, and the index of each name, and the catalog, are updated under
+    a lock.
     """
-    def __init__(self, root_db):
+    def __init__(self, root_db, durability=None):
         """
         Args:
-            root_db (str): path to root of database.
+            root_db    (str): path to root of database.
+            durability (str): one of DURABILITY_MODES. (default: the "durability"
+                              setting of the database config)
 
         Raises:
             AssertionError: If root_db does not exist
+            ValueError: If durability is unknown.
+        """
+        # writers always see the directory tree as it is
+        super(RezRxtDbWriteMgr, self).__init__(root_db, ttl=0)
+        self.config = load_config(root_db)
+        self.durability = durability or self.config["durability"]
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError("unknown durability \"{0}\" (choose from {1})"\
+                             .format(self.durability, ", ".join(DURABILITY_MODES)))
+        self.sync_batch = SyncBatch()
+
+    def lock_path(self, context, name):
+        """
+        Return the path to the lock file guarding the index of a context and name.
+        """
+        return pjoin(self.name_dir(context, name), LOCK_NAME)
+
+    def catalog_lock_path(self):
+        """
+        Return the path to the lock file guarding the catalog.
         """
-        super(RezRxtDbWriteMgr, self).__init__(root_db)
+        return pjoin(self.root_dir(), CATALOG_LOCK_NAME)
 
     def build_dirs(self, context, name, timestamp):
         """
-        Create directory if it does not exist
+        Create the directory of a resolve, and any missing parents. Parents may
+        be created concurrently by other writers. Creating the timestamp
+        directory itself claims the timestamp, so only one writer may succeed.
+
+        Raises:
+            DuplicateKeyError: If the timestamp directory already exists, or the
+                               timestamp is packed.
+        """
+        if self.packed(context, name, timestamp) is not None:
+            raise DuplicateKeyError("build_dirs({0}, {1}, {2}) - already packed"\
+                                    .format(context, name, timestamp))
+        t_dir = self.timestamps_dir(context, name)
+        ts_dir = self.timestamp_dir(context, name, timestamp)
+        # the timestamp directory, or the bucket of the timestamp
+        makedirs_exist_ok(dirname(ts_dir))
+        try:
+            mkdir(ts_dir)
+        except OSError as err:
+            if err.errno == errno.EEXIST:
+                raise DuplicateKeyError("build_dirs({0}, {1}, {2}) - {3} already exists"\
+                                        .format(context, name, timestamp, ts_dir))
+            raise
+        if self.layout.buckets is not None:
+            self.touch_timestamps_dir(context, name)
+        if self.durability == "always":
+            fsync_path(dirname(ts_dir))
+            if dirname(ts_dir) != t_dir:
+                fsync_path(t_dir)
+        elif self.durability == "batch":
+            self._defer_sync(ts_dir)
+
+    def touch_timestamps_dir(self, context, name):
+        """
+        Update the mtime of the timestamp directory of a name, so that indexes
+        of it are seen to be stale. Adding or removing a timestamp only updates
+        it by itself when the timestamp directory holds the timestamp directly,
+        rather than in a bucket, or in the pack of the name.
+        """
+        utime(self.timestamps_dir(context, name), None)
+
+    def blob_dir(self, dedup=None):
+        """
+        Return the path to the blob store if resolves are to be deduplicated,
+        otherwise None.
+
+        Args:
+            dedup (bool): Whether to deduplicate. (default: the "dedup" setting
+                          of the database config)
+        """
+        dedup = self.config["dedup"] if dedup is None else dedup
+        return self.blobs_dir() if dedup else None
+
+    def _defer_sync(self, path):
+        """
+        Add a path to the pending batch of fsyncs, flushing the batch if it is due.
+        """
+        if self.sync_batch.add(path):
+            self.sync_batch.flush()
+
+    def _write_file(self, path, data):
+        """
+        Write a file atomically, with the durability of the write manager.
+        """
+        atomic_write(path, data, fsync_data=self.durability == "always")
+        if self.durability == "batch":
+            self._defer_sync(path)
+
+    def flush(self):
+        """
+        Flush any writes pending in the batch of fsyncs to disk.
+
+        Returns:
+            number of paths flushed.
+        """
+        return self.sync_batch.flush()
+
+    def _write_encoded(self, encoded):
+        """
+        Write the files of an encoded record, skipping blobs which are already
+        stored.
+
+        Args:
+            encoded (list): (path, bytes, is blob) as returned by record.encode_record.
+
+        Returns:
+            number of bytes written.
+        """
+        written = 0
+        for path, data, is_blob in encoded:
+            if is_blob:
+                try:
+                    # reuse the stored blob. touching it keeps a concurrent
+                    # prune, which only collects untouched blobs, from removing it.
+                    utime(path, None)
+                    continue
+                except OSError:
+                    makedirs_exist_ok(dirname(path))
+            self._write_file(path, data)
+            written += len(data)
+        return written
+
+    def write_rxt(self, context, name, timestamp, rxt_dict, split=None, codec=None,
+                  dedup=None):
+        """
+        Write rxt data to directory, and add the timestamp to the index and catalog.
+
+        Args:
+            context   (str): Context of the package.
+            name      (str): Name of the package.
+            timestamp (str): Timestamp of the resolve.
+            rxt_dict (dict): resolve python dict.
+            split    (bool): Whether to store the resolve as a hot header plus
+                             cold sections. (default: the "split" setting of the
+                             database config)
+            codec     (str): Codec to compress the resolve with. (default: the
+                             "codec" setting of the database config)
+            dedup    (bool): Whether to store the body of the resolve in the
+                             content addressed blob store. (default: the "dedup"
+                             setting of the database config)
+
+        Raises:
+            DuplicateKeyError: If the resolve already exists.
+        """
+        # the index and catalog may be updated in place if they are current
+        # with respect to the directory tree as it was before we add to it.
+        catalog = Catalog(self.catalog_path(), self.contexts_dir())
+        cat_before = catalog.read_current()
+        index = TimestampIndex(self.index_path(context, name), self.timestamps_dir(context, name))
+        before = index.read_current()
+
+        self.write_record(context, name, timestamp, rxt_dict, split, codec, dedup)
+
+        with instrument.phase("writer.index"), FileLock(self.lock_path(context, name)):
+            data = index.read_current()
+            if data is None and before is not None and index.read() == before:
+                # stale only through timestamps added since we read it. every
+                # writer adds its own timestamp under the lock, so it is still
+                # safe to update in place.
+                data = before
+            if data is not None:
+                index.timestamps = data["timestamps"]
+                index.insert(timestamp)
+            else:
+                index.rebuild()
+            index.save()
+
+        with instrument.phase("writer.catalog"), FileLock(self.catalog_lock_path()):
+            cat_data = catalog.read_current()
+            if cat_data is None and cat_before is not None and catalog.read() == cat_before:
+                cat_data = cat_before
+            if cat_data is not None:
+                catalog.contexts = cat_data["contexts"]
+                catalog.update(context, name, self.saved_index(context, name, index))
+            else:
+                catalog.rebuild(self)
+            catalog.save()
+
+    def write_record(self, context, name, timestamp, rxt_dict, split=None, codec=None,
+                     dedup=None):
+        """
+        Write the files of a resolve, and record the packages it resolved in
+        the package index, leaving the timestamp index and catalog alone. Used
+        to write many resolves before bringing the indexes up to date once, via
+        update_indexes. Until then, readers see the indexes as stale, and fall
+        back to the directory tree.
+
+        Args:
+            As write_rxt.
+
+        Raises:
+            DuplicateKeyError: If the resolve already exists.
+        """
+        split = self.config["split"] if split is None else split
+        codec = self.config["codec"] if codec is None else codec
+
+        with instrument.phase("writer.write_record"):
+            # encoded before claiming the timestamp, so a resolve which cannot
+            # be encoded leaves nothing behind.
+            encoded = record.encode_record(self.rxt_path(context, name, timestamp), rxt_dict,
+                                           split, codec, self.blob_dir(dedup))
+            self.build_dirs(context, name, timestamp)
+            written = False
+            try:
+                self._write_encoded(encoded)
+                written = True
+            finally:
+                if not written:
+                    # give the timestamp up, so that the resolve may be written again
+                    ts_dir = self.timestamp_dir(context, name, timestamp)
+                    remove_dir(ts_dir, temp_path(ts_dir))
+        packages = PackageIndex(self.pkgindex_dir())
+        packages.add(context, name, timestamp, package_rows(rxt_dict),
+                     fsync_data=self.durability == "always")
+        if self.durability == "batch":
+            self._defer_sync(packages.journal_path())
+
+    def update_indexes(self, keys):
+        """
+        Rebuild the timestamp indexes of the supplied contexts and names from the
+        directory tree, and update the catalog with them, writing each once.
+
+        Args:
+            keys (iterable): (context, name) pairs.
+
+        Returns:
+            Catalog
+        """
+        indexes = [(context, name, self.reindex(context, name)) for context, name in keys]
+        with instrument.phase("writer.catalog"), FileLock(self.catalog_lock_path()):
+            catalog = Catalog(self.catalog_path(), self.contexts_dir())
+            catalog.load(self)
+            for context, name, index in indexes:
+                catalog.update(context, name, self.saved_index(context, name, index))
+            catalog.save()
+        return catalog
+
+    def saved_index(self, context, name, index):
+        """
+        Bring an index up to date with the index file of its name, read under
+        the lock of the name. Called under the catalog lock, so whichever
+        writer, or prune, updates the catalog last records the index as last
+        saved, even if they took the catalog lock in a different order to the
+        name lock. The lock of a name is only ever taken after the catalog lock.
+        """
+        with FileLock(self.lock_path(context, name)):
+            data = index.read()
+        if data is not None:
+            index.timestamps = data["timestamps"]
+        return index
+
+    def write_launch_env(self, context, name, timestamp, scripts):
+        """
+        Write the baked launch scripts of a resolve next to its rxt file. The
+        manifest is written last, recording the mtime and size of the rxt file,
+        so that scripts are only used while they match the resolve.
+
+        Args:
+            context   (str): Context of the package.
+            name      (str): Name of the package.
+            timestamp (str): Timestamp of the resolve.
+            scripts  (dict): shell type -> script.
         """
-        makedirs(self.timestamp_dir(context, name, timestamp))
+        for shell, script in scripts.items():
+            self._write_file(self.launch_script_path(context, name, timestamp, shell),
+                             script.encode())
 
-    def write_rxt(self, context, name, timestamp, rxt_dict):
+        r_stat = stat(self.rxt_path(context, name, timestamp))
+        manifest = {"source": [r_stat.st_mtime, r_stat.st_size],
+                    "shells": sorted(scripts)}
+        self._write_file(self.launch_env_path(context, name, timestamp),
+                         json.dumps(manifest).encode())
+
+    def write_tools(self, context, name, timestamp, tools):
         """
-        Write rxt data to directory.
+        Write the tools manifest of a resolve next to its rxt file, recording the
+        mtime and size of the rxt file it was extracted from.
+
+        Args:
+            context   (str): Context of the package.
+            name      (str): Name of the package.
+            timestamp (str): Timestamp of the resolve.
+            tools    (dict): package name -> list of tools.
         """
-        self.build_dirs(context, name, timestamp)
+        r_stat = stat(self.rxt_path(context, name, timestamp))
+        manifest = {"source": [r_stat.st_mtime, r_stat.st_size],
+                    "tools": tools}
+        self._write_file(self.tools_path(context, name, timestamp), json.dumps(manifest).encode())
+
+    def rewrite_rxt(self, context, name, timestamp, split=None, codec=None, dedup=None):
+        """
+        Rewrite a stored resolve in another storage format, in place. Each file
+        is replaced atomically, so concurrent readers see either format. Tools
+        and launch environment sidecars which matched the resolve before the
+        rewrite are re-stamped to match it afterwards.
+
+        Args:
+            context   (str): Context of the package.
+            name      (str): Name of the package.
+            timestamp (str): Timestamp of the resolve.
+            split    (bool): Whether to store a header plus cold file.
+                             (default: the "split" setting of the database config)
+            codec     (str): Codec to compress with. (default: the "codec"
+                             setting of the database config)
+            dedup    (bool): Whether to store the body in the blob store.
+                             (default: the "dedup" setting of the database config)
+
+        Returns:
+            (bytes before, bytes after). Blobs count towards these only when
+            they are written, as they may be shared with other resolves.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        split = self.config["split"] if split is None else split
+        codec = self.config["codec"] if codec is None else codec
+
         rxtpath = self.rxt_path(context, name, timestamp)
-        with open(rxtpath, 'w') as rxt_file:
-            json.dump(rxt_dict, rxt_file)
+        cold_path = pjoin(dirname(rxtpath), record.cold_name(rxtpath))
+        try:
+            rxt_dict, _, _ = record.load_rxt(rxtpath, self.blobs_dir())
+        except (IOError, OSError):
+            raise KeyError("rewrite_rxt({0}, {1}, {2}) - {3} does not exist"\
+                           .format(context, name, timestamp, rxtpath))
+        before = sum(getsize(path) for path in (rxtpath, cold_path) if isfile(path))
+
+        sidecars = []
+        for path in (self.tools_path(context, name, timestamp),
+                     self.launch_env_path(context, name, timestamp)):
+            sidecar = self.read_sidecar(path, context, name, timestamp)
+            if sidecar is not None:
+                sidecars.append((path, sidecar))
+
+        blob_dir = self.blob_dir(dedup)
+        encoded = record.encode_record(rxtpath, rxt_dict, split, codec, blob_dir)
+        after = self._write_encoded(encoded)
+        # only a split resolve which is not deduplicated has a cold file of its own
+        if (not split or blob_dir is not None) and isfile(cold_path):
+            remove(cold_path)
+
+        r_stat = stat(rxtpath)
+        for path, sidecar in sidecars:
+            sidecar["source"] = [r_stat.st_mtime, r_stat.st_size]
+            self._write_file(path, json.dumps(sidecar).encode())
+
+        return before, after
+
+    def reindex(self, context, name):
+        """
+        Rebuild the timestamp index for the supplied context and name from the
+        directory tree, and write it to disk.
+
+        Raises:
+            KeyError: If the database does not contain the context or name.
+        """
+        index = self.timestamp_index(context, name)
+        with FileLock(self.lock_path(context, name)):
+            index.rebuild()
+            index.save()
+        return index
+
+    def rebuild_catalog(self):
+        """
+        Rebuild every timestamp index and the catalog from the directory tree,
+        and write them to disk.
+
+        Returns:
+            Catalog
+        """
+        catalog = Catalog(self.catalog_path(), self.contexts_dir())
+        with FileLock(self.catalog_lock_path()):
+            catalog.rebuild(self)
+            for context, names in catalog.contexts.items():
+                for name in names:
+                    catalog.update(context, name, self.reindex(context, name))
+            catalog.save()
+        return catalog
 
 
 class RezRxtDbWriter(RezRxtDbWriterI):
     """
     Write rxt to database.
     """
-    def __init__(self, root_db, write_mgr_cls=RezRxtDbWriteMgr):
+    def __init__(self, root_db, write_mgr_cls=RezRxtDbWriteMgr, bake=False, durability=None):
         """
+        Args:
+            root_db        (str): path to root of database.
+            write_mgr_cls (type): class of the write manager.
+            bake          (bool): Whether to evaluate each resolve as it is added,
+                                  storing its tools manifest and launch scripts
+                                  alongside it. Requires rez.
+            durability     (str): one of config.DURABILITY_MODES. (default: the
+                                  "durability" setting of the database config)
+        """
+        self.mgr = write_mgr_cls(root_db, durability=durability)
+        self.bake = bake
+
+    def flush(self):
+        """
+        Flush writes deferred by the "batch" durability mode to disk. Should be
+        called once done adding resolves.
         """
-        self.mgr = write_mgr_cls(root_db)
+        return self.mgr.flush()
 
     def add_rxt(self, context, name, rxt_dict):
         """
@@ -62,9 +463,56 @@ class RezRxtDbWriter(RezRxtDbWriterI):
         Raises:
             DuplicateKeyError: If a context already exists with the supplied data.
         """
+        timestamp = str(rxt_dict["timestamp"])
+        baked = self._bake(rxt_dict)
+        self.mgr.write_rxt(context, name, timestamp, rxt_dict)
+        self._write_baked(context, name, timestamp, baked)
+
+    def store_rxt(self, context, name, rxt_dict):
+        """
+        Write a resolve, and bake it if required, without updating the index
+        and catalog. The caller is responsible for calling mgr.update_indexes
+        once it is done writing.
+
+        Args:
+            context   (str): Context of the package.
+            name      (str): Name of the package.
+            rxt_dict (dict): resolve python dict.
+
+        Returns:
+            timestamp of the resolve (str)
+
+        Raises:
+            DuplicateKeyError: If a context already exists with the supplied data.
+        """
+        timestamp = str(rxt_dict["timestamp"])
+        baked = self._bake(rxt_dict)
+        self.mgr.write_record(context, name, timestamp, rxt_dict)
+        self._write_baked(context, name, timestamp, baked)
+        return timestamp
+
+    def _bake(self, rxt_dict):
+        """
+        Evaluate a resolve, if baking. Done before the resolve is written, so
+        that one which fails to evaluate is not stored without its sidecars.
 
-        timestamp = rxt_dict["timestamp"]
-        self.mgr.write_rxt(context, name, str(timestamp), rxt_dict)
+        Returns:
+            (tools manifest, launch scripts), or None if not baking.
+        """
+        if not self.bake:
+            return None
+        with instrument.phase("writer.bake"):
+            resolved = load_context(rxt_dict)
+        return tools_manifest(resolved), launch_scripts(resolved)
+
+    def _write_baked(self, context, name, timestamp, baked):
+        """
+        Store the tools manifest and launch scripts of a written resolve. (see _bake)
+        """
+        if baked is not None:
+            tools, scripts = baked
+            self.mgr.write_tools(context, name, timestamp, tools)
+            self.mgr.write_launch_env(context, name, timestamp, scripts)
 
     def update_rxt(self, context, name, timestamp, rxt_dict):
         """
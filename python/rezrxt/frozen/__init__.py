@@ -0,0 +1,3 @@
+"""
+read-only reader of a whole database exported to a single file. (see layout.py)
+"""
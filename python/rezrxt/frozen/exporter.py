@@ -0,0 +1,152 @@
+"""
+exporter.py - export a database to a single frozen database file.
+
+Resolves are read through the reader of any backend, and streamed to a
+temporary file in the order of the record table, merged with their cold
+file or blob so that each record is self contained. The tables follow the
+data, the header is written last, and the file is flushed to disk and
+renamed into place, so readers see either the previous export or the new
+one. (see layout.py)
+"""
+
+__all__ = ("export_db", "DEFAULT_CODEC")
+
+from os.path import dirname
+from os import fdopen, fsync, remove, rename
+from os import open as os_open, O_WRONLY, O_CREAT, O_EXCL
+import json
+import time
+
+from rezrxt import backends, instrument
+from rezrxt.filebacked import record
+from rezrxt.filebacked.fsutil import fsync_path, temp_path
+from rezrxt.frozen.layout import MAGIC, VERSION, HEADER, CONTEXT, NAME, TIMESTAMP, RECORD
+
+DEFAULT_CODEC = "none"
+
+
+def _encode_name(text):
+    """
+    Return the utf-8 bytes of a context or name.
+    """
+    return text if isinstance(text, bytes) else text.encode("utf-8")
+
+
+def _write_tables(f_handle, offset, contexts, names, records):
+    """
+    Write the strings and tables of an export, from offset.
+
+    Args:
+        f_handle (file): the export, positioned at offset.
+        offset    (int): offset of the end of the data.
+        contexts (list): (context, first name, names) per context.
+        names    (list): (name, first record, records) per name.
+        records  (list): (timestamp, RECORD fields) per resolve.
+
+    Returns:
+        (offsets of strings, contexts, names, timestamps and records, end of
+         the file)
+    """
+    strings = []
+    strings_size = 0
+    context_rows = []
+    name_rows = []
+    for rows, entries in ((context_rows, contexts), (name_rows, names)):
+        for text, first, count in entries:
+            data = _encode_name(text)
+            rows.append((strings_size, len(data), first, count))
+            strings.append(data)
+            strings_size += len(data)
+
+    strings_at = offset
+    f_handle.write(b"".join(strings))
+    contexts_at = strings_at + strings_size
+    f_handle.write(b"".join(CONTEXT.pack(*row) for row in context_rows))
+    names_at = contexts_at + CONTEXT.size * len(context_rows)
+    f_handle.write(b"".join(NAME.pack(*row) for row in name_rows))
+    timestamps_at = names_at + NAME.size * len(name_rows)
+    f_handle.write(b"".join(TIMESTAMP.pack(row[0]) for row in records))
+    records_at = timestamps_at + TIMESTAMP.size * len(records)
+    f_handle.write(b"".join(RECORD.pack(*row[1:]) for row in records))
+    return (strings_at, contexts_at, names_at, timestamps_at, records_at,
+            records_at + RECORD.size * len(records))
+
+
+def export_db(db, path, codec=DEFAULT_CODEC, contexts=None, callback=None):
+    """
+    Export every resolve of a database to a frozen database file, replacing
+    any previous export atomically.
+
+    Args:
+        db           (str): database location. (see backends.parse_db)
+        path         (str): path of the frozen database file.
+        codec        (str): codec to compress each resolve with.
+        contexts    (list): contexts to export. (default: all)
+        callback (callable): called with (context, name, resolves exported)
+                             as each name is exported.
+
+    Returns:
+        dict with the contexts, names and resolves exported, the size of the
+        file, and the elapsed seconds.
+
+    Raises:
+        KeyError: If the database does not contain one of the contexts.
+    """
+    start = time.time()
+    reader = backends.get_reader(db, cache=False)
+    contexts = sorted(reader.contexts() if contexts is None else contexts)
+
+    context_entries = []
+    name_entries = []
+    records = []
+    tmp_path = temp_path(path)
+    f_desc = os_open(tmp_path, O_WRONLY | O_CREAT | O_EXCL, 0o666)
+    try:
+        with fdopen(f_desc, "wb") as f_handle:
+            # the header is written once the offsets of the tables are known
+            f_handle.write(b"\0" * HEADER.size)
+            offset = HEADER.size
+            for context in contexts:
+                first_name = len(name_entries)
+                for name in sorted(reader.names(context)):
+                    first_record = len(records)
+                    for t_stamp in reader.timestamps(context, name):
+                        try:
+                            data = record.encode_plain(reader.rxt_dict_shared(context, name, t_stamp),
+                                                       codec)
+                            tools = reader.tools(context, name, t_stamp)
+                        except KeyError:
+                            # removed since the timestamps were listed
+                            continue
+                        tools = b"" if tools is None else json.dumps(tools).encode()
+                        f_handle.write(data)
+                        f_handle.write(tools)
+                        records.append((int(t_stamp), offset, len(data), offset + len(data),
+                                        len(tools)))
+                        offset += len(data) + len(tools)
+                    if len(records) > first_record:
+                        name_entries.append((name, first_record, len(records) - first_record))
+                    if callback is not None:
+                        callback(context, name, len(records) - first_record)
+                if len(name_entries) > first_name:
+                    context_entries.append((context, first_name, len(name_entries) - first_name))
+
+            offsets = _write_tables(f_handle, offset, context_entries, name_entries, records)
+            f_handle.seek(0)
+            f_handle.write(HEADER.pack(MAGIC, VERSION, len(context_entries), len(name_entries),
+                                       len(records), *offsets[:5]))
+            f_handle.flush()
+            instrument.count("fs.fsync")
+            fsync(f_handle.fileno())
+        instrument.count("bytes.written", offsets[5])
+        rename(tmp_path, path)
+    except BaseException:
+        try:
+            remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_path(dirname(path) or ".")
+
+    return {"contexts": len(context_entries), "names": len(name_entries),
+            "resolves": len(records), "bytes": offsets[5], "seconds": time.time() - start}
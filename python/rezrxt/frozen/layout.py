@@ -0,0 +1,44 @@
+"""
+layout.py - layout of a frozen database, a single immutable file holding
+every resolve of a database.
+
+All integers are little endian. The file is laid out as:
+
+header      HEADER: MAGIC, VERSION, the number of contexts, names and
+            resolves, and the offsets of the tables below.
+data        the record of each resolve - its plain rxt, self contained and
+            possibly compressed - followed by its tools manifest json, if it
+            was baked. Records are in the order of the record table.
+strings     the utf-8 names of the contexts and names, back to back.
+contexts    CONTEXT per context, sorted by name: the offset and length of its
+            name in strings, and the first and number of its names.
+names       NAME per name, sorted by context and then name: the offset and
+            length of its name in strings, and the first and number of its
+            records.
+timestamps  TIMESTAMP per resolve, sorted by context, name and timestamp.
+records     RECORD per resolve, in the same order: the offset and length of
+            its record and tools. A resolve without tools has a tools length
+            of 0.
+
+Every table is a fixed size array, so a reader finds a context, a name, and
+an exact or approximate timestamp by bisecting the tables in place. The
+timestamps of a name are contiguous, and are listed with a single unpack.
+"""
+
+__all__ = ("MAGIC", "VERSION", "HEADER", "CONTEXT", "NAME", "TIMESTAMP", "RECORD")
+
+import struct
+
+MAGIC = b"RZXFRZN1"
+VERSION = 1
+
+# magic, version, contexts, names, resolves, offsets of strings, contexts,
+# names, timestamps and records
+HEADER = struct.Struct("<8sIIIIQQQQQ")
+# name offset, name length, first name, names
+CONTEXT = struct.Struct("<QIII")
+# name offset, name length, first record, records
+NAME = struct.Struct("<QIQI")
+TIMESTAMP = struct.Struct("<q")
+# record offset, record length, tools offset, tools length
+RECORD = struct.Struct("<QIQI")
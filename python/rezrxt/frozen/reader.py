@@ -0,0 +1,434 @@
+"""
+reader implementation, backed by a frozen database file. (see layout.py)
+
+The file is memory mapped once, when the reader is created. Contexts, names
+and timestamps are found by bisecting its tables in place, and records are
+parsed from buffers over the mapping, so a lookup makes no system calls and
+copies nothing but the record it parses. An export replacing the file is
+seen by readers created after it.
+"""
+
+__all__ = ("RezRxtDbReader",)
+
+from os import fstat
+import json
+import mmap
+import struct
+
+from rezrxt import instrument, jsonscan
+from rezrxt.dbinterface import RezRxtDbReaderI
+from rezrxt.cache import copy_doc, shared_cache
+from rezrxt.filebacked import codec as rxt_codec
+from rezrxt.filebacked import record
+from rezrxt.frozen.layout import MAGIC, VERSION, HEADER, CONTEXT, NAME, TIMESTAMP, RECORD
+
+try:
+    # python 2 maps provide the old buffer interface only
+    _view = buffer
+except NameError:
+    def _view(data, offset, length):
+        """
+        Return a buffer over length bytes of data from offset, without copying them.
+        """
+        return memoryview(data)[offset:offset + length]
+
+
+def _encode_name(text):
+    """
+    Return the utf-8 bytes of a context or name, as stored in the file.
+    """
+    return text if isinstance(text, bytes) else text.encode("utf-8")
+
+
+def _native(data):
+    """
+    Return a context or name stored in the file as a native string.
+    """
+    return data if str is bytes else data.decode("utf-8")
+
+
+def _bisect(low, high, key, target, right=False):
+    """
+    Bisect the entries low to high of a table, sorted by key(index).
+
+    Returns:
+        the index of the first entry not less than target, or greater than
+        it if right.
+    """
+    while low < high:
+        mid = (low + high) // 2
+        value = key(mid)
+        if value < target or (right and value == target):
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+class RezRxtDbReader(RezRxtDbReaderI):
+    """
+    Database Reader.
+    """
+    def __init__(self, path, cache=None):
+        """
+        Args:
+            path      (str): path to the frozen database file.
+            cache (RxtCache): cache of parsed resolves. Defaults to the process
+                              wide cache. Pass False to disable caching.
+
+        Raises:
+            IOError: If the file does not exist.
+            ValueError: If the file is not a frozen database.
+        """
+        self.path = path
+        instrument.count("fs.open")
+        with open(path, "rb") as f_handle:
+            f_stat = fstat(f_handle.fileno())
+            if f_stat.st_size < HEADER.size:
+                raise ValueError("{0} is not a frozen rezrxt database".format(path))
+            self._map = mmap.mmap(f_handle.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self._n_contexts, _, _, self._strings_at, self._contexts_at,
+         self._names_at, self._timestamps_at, self._records_at) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError("{0} is not a frozen rezrxt database".format(path))
+        # resolves are never modified in place, but the file may be replaced
+        # by another export, so are cached against the file they came from.
+        self._key = (path, f_stat.st_ino, f_stat.st_mtime)
+        # (context, name) -> (first record, records), as names are looked up
+        self._names = {}
+        self.cache = shared_cache() if cache is None else (None if cache is False else cache)
+        super(RezRxtDbReader, self).__init__()
+
+    def close(self):
+        """
+        Unmap the file.
+        """
+        self._map.close()
+
+    def _string(self, offset, length):
+        """
+        Return the bytes of a string of the string table.
+        """
+        start = self._strings_at + offset
+        return self._map[start:start + length]
+
+    def _context_entry(self, index):
+        """
+        Return the CONTEXT fields of a context.
+        """
+        return CONTEXT.unpack_from(self._map, self._contexts_at + CONTEXT.size * index)
+
+    def _name_entry(self, index):
+        """
+        Return the NAME fields of a name.
+        """
+        return NAME.unpack_from(self._map, self._names_at + NAME.size * index)
+
+    def _timestamp(self, index):
+        """
+        Return the timestamp of a record.
+        """
+        return TIMESTAMP.unpack_from(self._map, self._timestamps_at + TIMESTAMP.size * index)[0]
+
+    def _context(self, context):
+        """
+        Return the (first name, names) of a context.
+
+        Raises:
+            KeyError: If the context does not exist.
+        """
+        target = _encode_name(context)
+        key = lambda index: self._string(*self._context_entry(index)[:2])
+        index = _bisect(0, self._n_contexts, key, target)
+        if index < self._n_contexts:
+            entry = self._context_entry(index)
+            if self._string(*entry[:2]) == target:
+                return entry[2:]
+        raise KeyError("{0} - context does not exist in {1}".format(context, self.path))
+
+    def _name(self, context, name):
+        """
+        Return the (first record, records) of a name.
+
+        Raises:
+            KeyError: If the context or name does not exist.
+        """
+        found = self._names.get((context, name))
+        if found is not None:
+            return found
+        first, count = self._context(context)
+        target = _encode_name(name)
+        key = lambda index: self._string(*self._name_entry(index)[:2])
+        index = _bisect(first, first + count, key, target)
+        if index < first + count:
+            entry = self._name_entry(index)
+            if self._string(*entry[:2]) == target:
+                found = self._names[(context, name)] = entry[2:]
+                return found
+        raise KeyError("{0} {1} - does not exist in {2}".format(context, name, self.path))
+
+    def _range(self, context, name, start=None, end=None, include_start=True, include_end=True):
+        """
+        Return the (low, high) records of a name between two timestamps.
+
+        Raises:
+            KeyError: If the context or name does not exist.
+        """
+        low, count = self._name(context, name)
+        high = low + count
+        if start is not None:
+            low = _bisect(low, high, self._timestamp, int(start), right=not include_start)
+        if end is not None:
+            high = _bisect(low, high, self._timestamp, int(end), right=include_end)
+        return low, max(low, high)
+
+    def _find(self, context, name, timestamp, approximate=False):
+        """
+        Return the record of a resolve. An approximate lookup finds the
+        greatest timestamp not after the one supplied, or failing that, the
+        earliest.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        first, count = self._name(context, name)
+        if approximate is True:
+            index = _bisect(first, first + count, self._timestamp, int(timestamp), right=True)
+            return max(first, index - 1)
+        index = _bisect(first, first + count, self._timestamp, int(timestamp))
+        if index < first + count and self._timestamp(index) == int(timestamp):
+            return index
+        raise KeyError("{0}, {1}, {2} does not exist in {3}"\
+                       .format(context, name, timestamp, self.path))
+
+    def _record(self, index):
+        """
+        Return the RECORD fields of a record.
+        """
+        return RECORD.unpack_from(self._map, self._records_at + RECORD.size * index)
+
+    def resolve_timestamp(self, context, name, timestamp, approximate=False):
+        """
+        Return the exact timestamp under which a resolve is stored.
+        (see RezRxtDbReaderI.resolve_timestamp)
+
+        Raises:
+            KeyError: If approximate and the db is missing the context or name.
+        """
+        if approximate is not True:
+            return int(timestamp)
+        return self._timestamp(self._find(context, name, timestamp, approximate))
+
+    def resolve(self, context, name, timestamp, approximate=False):
+        """
+        Return the location of a resolve, as resolves are not stored in files
+        of their own. (see location)
+        """
+        return self.location(context, name, timestamp, approximate)
+
+    def location(self, context, name, timestamp, approximate=False):
+        """
+        Return a locator for a resolve, of the form <path>#<context>/<name>/<timestamp>.
+
+        Raises:
+            KeyError: If db is missing either the context, name, or timestamp.
+        """
+        t_stamp = self._timestamp(self._find(context, name, timestamp, approximate))
+        return "{0}#{1}/{2}/{3}".format(self.path, context, name, t_stamp)
+
+    def _parse(self, index):
+        """
+        Parse the record of a resolve.
+        """
+        offset, length, _, _ = self._record(index)
+        instrument.count("bytes.read", length)
+        return record.decode_doc(_view(self._map, offset, length))
+
+    def rxt_dict(self, context, name, timestamp, approximate=False):
+        """
+        Retrieve a python dictionary matching the name, context, and timestamp.
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            timestamp    (int): Timestamp of the resolve.
+            approximate (bool): Whether to get the nearest timestamp,
+                                less than or equal to timestamp.
+
+        Returns:
+            python dict, a copy of the cached resolve, which the caller may modify.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        return copy_doc(self.rxt_dict_shared(context, name, timestamp, approximate))
+
+    def rxt_dict_shared(self, context, name, timestamp, approximate=False):
+        """
+        Retrieve the cached python dictionary of a resolve, which must be
+        treated as read-only. (see RezRxtDbReaderI.rxt_dict_shared)
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        index = self._find(context, name, timestamp, approximate)
+        key = self._key + (context, name, self._timestamp(index))
+        if self.cache is not None:
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+
+        with instrument.phase("reader.rxt_dict"):
+            data = self._parse(index)
+        if self.cache is not None:
+            self.cache.put(key, data, self._record(index)[1])
+        return data
+
+    def _fields(self, index, context, name, fields):
+        """
+        Select top level keys of the resolve of a record, from the cache if
+        it holds the resolve, or else scanning its json only as far as the
+        last of them.
+        """
+        if self.cache is not None:
+            data = self.cache.get(self._key + (context, name, self._timestamp(index)))
+            if data is not None:
+                return dict((key, data[key]) for key in fields if key in data)
+        offset, length, _, _ = self._record(index)
+        instrument.count("bytes.read", length)
+        chunks = (self._map[start:min(start + jsonscan.CHUNK_SIZE, offset + length)]
+                  for start in range(offset, offset + length, jsonscan.CHUNK_SIZE))
+        return jsonscan.scan_fields(rxt_codec.decode_stream(chunks), fields)
+
+    def rxt_fields(self, context, name, timestamp, fields, approximate=False):
+        """
+        Retrieve selected top level keys of a resolve, scanning its json only
+        as far as the last of them. A resolve already in the cache is not read.
+        (see RezRxtDbReaderI.rxt_fields)
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        return self._fields(self._find(context, name, timestamp, approximate), context, name,
+                            fields)
+
+    def stream_rxt_fields(self, context, name, fields, start=None, end=None, reverse=False):
+        """
+        Retrieve selected top level keys of every resolve of a context and name,
+        walking its records in order. (see RezRxtDbReaderI.stream_rxt_fields)
+
+        Raises:
+            KeyError: If the db is missing the context or name.
+        """
+        fields = list(fields)
+        low, high = self._range(context, name, start, end)
+        for index in (range(high - 1, low - 1, -1) if reverse else range(low, high)):
+            yield self._timestamp(index), self._fields(index, context, name, fields)
+
+    def snapshot(self, contexts, timestamp):
+        """
+        Resolve every name of the supplied contexts as of a timestamp, bisecting
+        the records of each name. (see RezRxtDbReaderI.snapshot)
+
+        Raises:
+            KeyError: If the db is missing a context.
+        """
+        snapshot = {}
+        for context in contexts:
+            first, count = self._context(context)
+            snapshot[context] = {}
+            for entry in (self._name_entry(index) for index in range(first, first + count)):
+                name = _native(self._string(*entry[:2]))
+                t_stamp = self.resolve_timestamp(context, name, timestamp, approximate=True)
+                snapshot[context][name] = {
+                    "timestamp": t_stamp,
+                    "location": "{0}#{1}/{2}/{3}".format(self.path, context, name, t_stamp),
+                    "header": record.split_rxt(self.rxt_dict_shared(context, name, t_stamp))[0]}
+        return snapshot
+
+    def tools(self, context, name, timestamp, approximate=False):
+        """
+        Return the tools provided by each package of a resolve, from the tools
+        manifest exported with it.
+
+        Returns:
+            dict of package name -> list of tools, or None if the resolve was not baked.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        _, _, offset, length = self._record(self._find(context, name, timestamp, approximate))
+        if not length:
+            return None
+        instrument.count("bytes.read", length)
+        return json.loads(bytes(_view(self._map, offset, length)).decode())
+
+    def launch_script(self, context, name, timestamp, shell, approximate=False):
+        """
+        Launch scripts are not exported, so frozen resolves are launched through rez.
+
+        Returns:
+            None
+
+        Raises:
+            KeyError: If approximate and the db is missing the context or name.
+        """
+        self.resolve_timestamp(context, name, timestamp, approximate)
+        return None
+
+    def contexts(self):
+        """
+        Return a generator of contexts, in sorted order.
+        """
+        for index in range(self._n_contexts):
+            yield _native(self._string(*self._context_entry(index)[:2]))
+
+    def names(self, context):
+        """
+        Return a list of the names within the supplied context, in sorted order.
+
+        Raises:
+            KeyError: If context does not exist in DB.
+        """
+        first, count = self._context(context)
+        return [_native(self._string(*self._name_entry(index)[:2]))
+                for index in range(first, first + count)]
+
+    def timestamps(self, context, name):
+        """
+        Return a list of the timestamps within the supplied context and name, in
+        ascending order.
+
+        Raises:
+            KeyError: If supplied with non-extant keys.
+        """
+        return self.timestamp_range(context, name)
+
+    def timestamp_range(self, context, name, start=None, end=None, include_start=True,
+                        include_end=True, reverse=False, limit=None):
+        """
+        Return the timestamps between start and end, bisecting the records of
+        the name. (see RezRxtDbReaderI.timestamp_range)
+
+        Raises:
+            KeyError: If supplied with non-extant keys.
+        """
+        low, high = self._range(context, name, start, end, include_start, include_end)
+        if limit is not None and high - low > limit:
+            if reverse:
+                low = high - limit
+            else:
+                high = low + limit
+        timestamps = list(struct.unpack_from("<{0}q".format(high - low), self._map,
+                                             self._timestamps_at + TIMESTAMP.size * low))
+        return timestamps[::-1] if reverse else timestamps
+
+    def latest(self, context, name, count=1):
+        """
+        Return the most recent timestamps, newest first.
+
+        Raises:
+            KeyError: If supplied with non-extant keys.
+        """
+        return self.timestamp_range(context, name, reverse=True, limit=count)
@@ -0,0 +1,201 @@
+"""
+instrument.py - per phase timings and counters, written as json lines.
+
+Instrumentation is disabled unless the REZRXT_TRACE env var names a file, or
+enable is called (the wrapper does so for --rropt trace=<path>). While it is
+disabled, phase returns a shared context manager which does nothing, and
+count returns at once.
+
+While enabled, the process accumulates the calls and seconds of each phase
+(eg reader.rxt_dict, wrapper.execute_shell) and the totals of counters (eg
+fs.stat, bytes.read, cache.hit), and appends them to the file as a single
+json line when it exits, or before the wrapper execs a launch script:
+
+    {"time": 1503266474.1, "pid": 123, "host": "render01", "argv": [...],
+     "seconds": 0.042, "meta": {"context": "fx", ...},
+     "phases": {"reader.rxt_dict": {"calls": 1, "seconds": 0.003}, ...},
+     "counters": {"fs.stat": 4, "bytes.read": 3547, ...}}
+
+Phases may nest, and each records its own inclusive time.
+"""
+
+__all__ = ("enable", "enabled", "phase", "count", "add_time", "annotate", "write")
+
+from os import environ, getpid
+import atexit
+import json
+import socket
+import sys
+import time
+
+from rezrxt import constants
+
+# the active Trace, or None while disabled
+_TRACE = None
+
+
+class Trace(object):
+    """
+    Timings and counters of the current process.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): json lines file the trace is appended to.
+        """
+        self.path = path
+        self.start = time.time()
+        self.phases = {}
+        self.counters = {}
+        self.meta = {}
+        self.written = False
+
+    def add_time(self, name, seconds):
+        """
+        Add a call of a phase.
+        """
+        entry = self.phases.get(name)
+        if entry is None:
+            entry = self.phases[name] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def record(self):
+        """
+        Return the trace as a json serializable dict.
+        """
+        return {"time": self.start,
+                "pid": getpid(),
+                "host": socket.gethostname(),
+                "argv": sys.argv,
+                "seconds": time.time() - self.start,
+                "meta": self.meta,
+                "phases": dict((name, {"calls": calls, "seconds": seconds})
+                               for name, (calls, seconds) in self.phases.items()),
+                "counters": self.counters}
+
+
+class _Phase(object):
+    """
+    Context manager adding its duration to a phase of a trace.
+    """
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.add_time(self.name, time.time() - self.start)
+        return False
+
+
+class _NoPhase(object):
+    """
+    Context manager standing in for a phase while instrumentation is disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_PHASE = _NoPhase()
+
+
+def enable(path):
+    """
+    Start recording, to be appended to path when the process exits. Does
+    nothing if already enabled.
+
+    Returns:
+        Trace
+    """
+    global _TRACE
+    if _TRACE is None:
+        _TRACE = Trace(path)
+        atexit.register(write)
+    return _TRACE
+
+
+def enabled():
+    """
+    Return whether instrumentation is enabled.
+    """
+    return _TRACE is not None
+
+
+def phase(name):
+    """
+    Return a context manager timing a phase.
+
+    Args:
+        name (str): name of the phase. (eg reader.rxt_dict)
+    """
+    if _TRACE is None:
+        return _NO_PHASE
+    return _Phase(_TRACE, name)
+
+
+def count(name, value=1):
+    """
+    Add to a counter.
+
+    Args:
+        name  (str): name of the counter. (eg fs.stat)
+        value (int): amount to add.
+    """
+    if _TRACE is None:
+        return
+    _TRACE.counters[name] = _TRACE.counters.get(name, 0) + value
+
+
+def add_time(name, seconds):
+    """
+    Add a call of a phase timed by the caller, such as one which ran before
+    instrumentation was enabled.
+    """
+    if _TRACE is None:
+        return
+    _TRACE.add_time(name, seconds)
+
+
+def annotate(**meta):
+    """
+    Add keys to the "meta" of the trace. (eg context, name, timestamp)
+    """
+    if _TRACE is None:
+        return
+    _TRACE.meta.update(meta)
+
+
+def write():
+    """
+    Append the trace to its file, once. Called when the process exits, and
+    by the wrapper before it execs. A trace which cannot be written is
+    reported on stderr, but does not fail the process.
+    """
+    trace = _TRACE
+    if trace is None or trace.written:
+        return
+    trace.written = True
+    line = json.dumps(trace.record(), sort_keys=True) + "\n"
+    try:
+        # a single write in append mode, so that lines of concurrent
+        # processes are not interleaved
+        with open(trace.path, "a") as f_handle:
+            f_handle.write(line)
+    except (IOError, OSError) as err:
+        print >> sys.stderr, "cannot write {0} {1} - {2}".format(constants.REZRXT_TRACE,
+                                                              trace.path, err)
+
+
+if environ.get(constants.REZRXT_TRACE):
+    enable(environ[constants.REZRXT_TRACE])
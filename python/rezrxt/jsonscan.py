@@ -0,0 +1,194 @@
+"""
+jsonscan.py - extract top level keys of a json object without parsing it all.
+
+The document is consumed as a stream of chunks. Values of keys which are not
+wanted are skipped by scanning for the brackets and quotes that delimit
+them, without being parsed or retained, and scanning stops as soon as every
+wanted key has been found. Only the wanted values are parsed, so memory use
+is bounded by the chunk size plus the size of those values.
+"""
+
+__all__ = ("scan_fields", "iter_chunks")
+
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+_WS = re.compile(r"[ \t\r\n]*")
+# string content, up to the closing quote, an escape split across chunks, or
+# the end of the buffer
+_STRING_BODY = re.compile(r'(?:[^"\\]+|\\.)*', re.S)
+# container content, up to a bracket, or a string split across chunks
+_CONTAINER_BODY = re.compile(r'(?:[^"\[\]{}]+|"(?:[^"\\]+|\\.)*")*', re.S)
+# characters ending a number or literal
+_PRIMITIVE_END = re.compile(r"[,}\] \t\r\n]")
+
+
+def iter_chunks(f_handle, size=CHUNK_SIZE):
+    """
+    Return a generator over the chunks of an open file.
+    """
+    while True:
+        chunk = f_handle.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class _Scanner(object):
+    """
+    Cursor over a stream of chunks. Consumed data is discarded as more is
+    read, unless it lies after the mark, which holds the start of a value
+    being captured.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self.buf = ""
+        self.pos = 0
+        self.mark = None
+
+    def more(self):
+        """
+        Append the next chunk to the buffer.
+
+        Returns:
+            False at the end of the stream.
+        """
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        keep = self.pos if self.mark is None else self.mark
+        self.buf = self.buf[keep:] + chunk
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark = 0
+        return True
+
+    def need_more(self):
+        """
+        Append the next chunk, failing at the end of the stream.
+        """
+        if not self.more():
+            raise ValueError("truncated json document")
+
+    def peek(self):
+        """
+        Skip whitespace, and return the next character.
+        """
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self.need_more()
+
+    def skip_string(self):
+        """
+        Skip the string starting at the cursor.
+        """
+        self.pos += 1
+        while True:
+            self.pos = _STRING_BODY.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) and self.buf[self.pos] == '"':
+                self.pos += 1
+                return
+            self.need_more()
+
+    def skip_container(self):
+        """
+        Skip the object or array starting at the cursor.
+        """
+        self.pos += 1
+        depth = 1
+        while depth:
+            self.pos = _CONTAINER_BODY.match(self.buf, self.pos).end()
+            if self.pos == len(self.buf):
+                self.need_more()
+                continue
+            char = self.buf[self.pos]
+            if char == '"':
+                self.skip_string()
+                continue
+            depth += 1 if char in "[{" else -1
+            self.pos += 1
+
+    def skip_primitive(self):
+        """
+        Skip the number or literal starting at the cursor.
+        """
+        while True:
+            match = _PRIMITIVE_END.search(self.buf, self.pos)
+            if match is not None:
+                self.pos = match.start()
+                return
+            self.pos = len(self.buf)
+            if not self.more():
+                return
+
+    def skip_value(self):
+        """
+        Skip the value starting at the next non whitespace character.
+        """
+        char = self.peek()
+        if char == '"':
+            self.skip_string()
+        elif char in "[{":
+            self.skip_container()
+        else:
+            self.skip_primitive()
+
+    def read_value(self):
+        """
+        Parse the value starting at the next non whitespace character.
+        """
+        self.peek()
+        self.mark = self.pos
+        try:
+            self.skip_value()
+            return json.loads(self.buf[self.mark:self.pos])
+        finally:
+            self.mark = None
+
+
+def scan_fields(chunks, fields):
+    """
+    Extract top level keys of a json object.
+
+    Args:
+        chunks (iterable): the document, as a sequence of strings.
+        fields (iterable): keys to extract.
+
+    Returns:
+        dict of the keys found to their values. Scanning stops once every
+        key has been found, so the rest of the document is neither read nor
+        checked.
+
+    Raises:
+        ValueError: If the document is not a json object.
+    """
+    wanted = set(fields)
+    found = {}
+    scanner = _Scanner(chunks)
+    if scanner.peek() != "{":
+        raise ValueError("json document is not an object")
+    scanner.pos += 1
+
+    while len(found) < len(wanted):
+        char = scanner.peek()
+        if char == "}":
+            break
+        if char == ",":
+            scanner.pos += 1
+            continue
+        if char != '"':
+            raise ValueError("malformed json object at {0!r}".format(
+                scanner.buf[scanner.pos:scanner.pos + 20]))
+        key = scanner.read_value()
+        if scanner.peek() != ":":
+            raise ValueError("malformed json object - expected \":\" after {0!r}".format(key))
+        scanner.pos += 1
+        if key in wanted:
+            found[key] = scanner.read_value()
+        else:
+            scanner.skip_value()
+    return found
@@ -0,0 +1,91 @@
+"""
+manifest.py - job manifests, pinning the resolves of a job as of a timestamp.
+
+A manifest records a snapshot (see RezRxtDbReaderI.snapshot) of one or more
+contexts, together with the database it was taken from:
+
+{
+    "version": 1,
+    "db": "filebacked:/path/to/root",
+    "timestamp": 1503266000,
+    "contexts": {
+        "model": {
+            "houdini": {"timestamp": 1503265457, "location": ..., "header": {...}}
+        }
+    }
+}
+
+Wrappers run with REZRXT_MANIFEST set to the path of a manifest use the
+timestamps it pins, and its database unless one is supplied, without
+consulting the timestamp index.
+"""
+
+__all__ = ("MANIFEST_VERSION", "build_manifest", "write_manifest", "read_manifest",
+           "pinned_timestamp")
+
+import json
+
+from rezrxt import backends
+from rezrxt.filebacked.fsutil import atomic_write
+
+MANIFEST_VERSION = 1
+
+
+def build_manifest(db_reader, db, contexts, timestamp):
+    """
+    Snapshot the supplied contexts as of a timestamp.
+
+    Args:
+        db_reader (RezRxtDbReaderI): reader of the database.
+        db                    (str): location of the database.
+        contexts             (list): contexts to snapshot.
+        timestamp             (int): timestamp to resolve as of.
+
+    Returns:
+        dict
+
+    Raises:
+        KeyError: If the db is missing a context.
+    """
+    return {"version": MANIFEST_VERSION,
+            "db": backends.realdb(db),
+            "timestamp": int(timestamp),
+            "contexts": db_reader.snapshot(contexts, int(timestamp))}
+
+
+def write_manifest(path, manifest):
+    """
+    Write a manifest to path, replacing any existing one atomically.
+    """
+    atomic_write(path, json.dumps(manifest, indent=1, sort_keys=True).encode())
+
+
+def read_manifest(path):
+    """
+    Read a manifest.
+
+    Returns:
+        dict
+
+    Raises:
+        IOError: If the manifest cannot be read.
+        ValueError: If path is not a manifest, or was written by a newer version.
+    """
+    with open(path) as f_handle:
+        manifest = json.load(f_handle)
+    if not isinstance(manifest, dict) or "contexts" not in manifest:
+        raise ValueError("{0} is not a rezrxt manifest".format(path))
+    if manifest.get("version", 0) > MANIFEST_VERSION:
+        raise ValueError("{0} was written by a newer version of rezrxt".format(path))
+    return manifest
+
+
+def pinned_timestamp(manifest, context, name):
+    """
+    Return the exact timestamp a manifest pins a context and name to.
+
+    Returns:
+        int, or None if the manifest does not include the context and name.
+    """
+    entry = manifest["contexts"].get(context, {}).get(name)
+    return None if entry is None else entry["timestamp"]
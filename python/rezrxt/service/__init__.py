@@ -0,0 +1,33 @@
+"""
+service - long running read service over a database, and its client.
+
+Wrappers call connect_reader at every launch, so the client, and the http
+modules it needs, are only imported once a service is configured.
+"""
+
+__all__ = ("connect_reader",)
+
+from os import environ
+
+from rezrxt import backends, constants
+
+
+def connect_reader(db, address=None):
+    """
+    Return a reader for the database, through the service at address if one
+    is configured, otherwise reading it directly, or from the local replica
+    named by the REZRXT_REPLICA env var.
+
+    Args:
+        db      (str): location of the database.
+        address (str): address of the service. (default: REZRXT_SERVICE env var)
+
+    Returns:
+        RezRxtDbReaderI
+    """
+    address = address or environ.get(constants.REZRXT_SERVICE)
+    if not address:
+        return backends.get_reader(db, replica=environ.get(constants.REZRXT_REPLICA))
+    from rezrxt.service.client import ServiceReader
+
+    return ServiceReader(address, db)
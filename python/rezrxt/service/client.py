@@ -0,0 +1,300 @@
+"""
+client.py - reader talking to a rezrxt-serve service. (see server.py)
+
+Service addresses are either "unix:<socket path>", or "http://host:port"
+(or just "host:port") for tcp.
+"""
+
+__all__ = ("RezRxtDbClient", "ServiceReader", "connect_reader")
+
+from os.path import exists
+from os import environ
+from urllib import quote, urlencode
+import httplib
+import json
+import socket
+
+from rezrxt import backends, constants
+from rezrxt.cache import copy_doc
+from rezrxt.dbinterface import RezRxtDbReaderI
+from rezrxt.exceptions import PackedResolveError, ServiceUnavailable
+from rezrxt.filebacked.index import select_range
+from rezrxt.service import connect_reader
+
+# seconds to wait on the service before giving up on it
+DEFAULT_TIMEOUT = 5.0
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+    """
+    HTTP connection over a unix socket.
+    """
+    def __init__(self, socket_path, timeout=DEFAULT_TIMEOUT):
+        httplib.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except socket.error:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def _connection(address, timeout):
+    """
+    Return an unopened HTTP connection to the service at address.
+    """
+    if address.startswith("unix:"):
+        return UnixHTTPConnection(address[len("unix:"):], timeout)
+    if address.startswith("http://"):
+        address = address[len("http://"):]
+    return httplib.HTTPConnection(address.rstrip("/"), timeout=timeout)
+
+
+class RezRxtDbClient(RezRxtDbReaderI):
+    """
+    Reader answering every request through the service. Responses are kept,
+    and revalidated with If-None-Match when requested again.
+    """
+    def __init__(self, address, db=None, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            address   (str): address of the service.
+            db        (str): location of the database the service is expected to
+                             serve. If supplied, responses about any other
+                             database raise ServiceUnavailable.
+            timeout (float): seconds to wait on the service.
+        """
+        self.address = address
+        self.db = None if db is None else backends.realdb(db)
+        self.timeout = timeout
+        self._conn = None
+        # path -> (etag, parsed body)
+        self._responses = {}
+        super(RezRxtDbClient, self).__init__()
+
+    def _request(self, path):
+        """
+        GET path from the service, reusing the connection where possible.
+
+        Returns:
+            (status, etag, body)
+        """
+        headers = {}
+        if path in self._responses:
+            headers["If-None-Match"] = self._responses[path][0]
+        while True:
+            reused = self._conn is not None
+            if not reused:
+                self._conn = _connection(self.address, self.timeout)
+            try:
+                self._conn.request("GET", path, headers=headers)
+                response = self._conn.getresponse()
+                body = response.read()
+                break
+            except (socket.error, httplib.HTTPException) as err:
+                self._conn.close()
+                self._conn = None
+                # the service may have closed an idle connection, so a request
+                # over one is retried on a new one. a new one failing is final.
+                if not reused:
+                    raise ServiceUnavailable("service at {0} is unavailable - {1}"\
+                                             .format(self.address, err))
+
+        served = response.getheader(constants.DB_HEADER)
+        if self.db is not None and served != self.db:
+            raise ServiceUnavailable("service at {0} serves {1}, not {2}"\
+                                     .format(self.address, served, self.db))
+        return response.status, response.getheader("ETag"), body
+
+    def _get(self, route, *args, **query):
+        """
+        Return the parsed response to a request.
+
+        Raises:
+            KeyError: If the service reports a missing key.
+            ServiceUnavailable: If the service cannot answer.
+        """
+        path = "/" + "/".join([route] + [quote(str(arg), safe="") for arg in args])
+        params = [("context", context) for context in query.get("contexts", ())]
+        params.extend(("field", field) for field in query.get("fields", ()))
+        if query.get("approximate"):
+            params.append(("approximate", 1))
+        if params:
+            path += "?" + urlencode(params)
+
+        status, etag, body = self._request(path)
+        if status == 304:
+            return self._responses[path][1]
+        if status == 404:
+            raise KeyError(json.loads(body).get("message", path))
+        if status != 200:
+            raise ServiceUnavailable("service at {0} answered {1} to {2}"\
+                                     .format(self.address, status, path))
+        data = json.loads(body)
+        self._responses[path] = (etag, data)
+        return data
+
+    def ping(self):
+        """
+        Return the counters of the service.
+
+        Raises:
+            ServiceUnavailable: If the service cannot be reached.
+        """
+        return self._get("stats")
+
+    def contexts(self):
+        return iter(self._get("contexts"))
+
+    def names(self, context):
+        return iter(self._get("names", context))
+
+    def timestamps(self, context, name):
+        return iter(self._get("timestamps", context, name))
+
+    def timestamp_range(self, context, name, start=None, end=None, include_start=True,
+                        include_end=True, reverse=False, limit=None):
+        # the timestamps are revalidated by etag, and selected from here
+        return select_range(self._get("timestamps", context, name), start, end,
+                            include_start, include_end, reverse, limit)
+
+    def latest(self, context, name, count=1):
+        return self.timestamp_range(context, name, reverse=True, limit=count)
+
+    def rxt_fields(self, context, name, timestamp, fields, approximate=False):
+        return self._get("fields", context, name, timestamp, fields=sorted(set(fields)),
+                         approximate=approximate)
+
+    def stream_rxt_fields(self, context, name, fields, start=None, end=None, reverse=False):
+        fields = list(fields)
+        for t_stamp in self.timestamp_range(context, name, start, end, reverse=reverse):
+            try:
+                yield t_stamp, self.rxt_fields(context, name, t_stamp, fields)
+            except KeyError:
+                continue
+
+    def resolve_timestamp(self, context, name, timestamp, approximate=False):
+        if approximate is not True:
+            return int(timestamp)
+        return self._get("resolve", context, name, timestamp, approximate=True)["timestamp"]
+
+    def resolve(self, context, name, timestamp, approximate=False):
+        data = self._get("resolve", context, name, timestamp, approximate=approximate)
+        if data["path"] is None:
+            raise PackedResolveError("resolve({0}, {1}, {2}) - packed in {3}"\
+                                     .format(context, name, timestamp, data["location"]))
+        return data["path"]
+
+    def location(self, context, name, timestamp, approximate=False):
+        return self._get("resolve", context, name, timestamp, approximate=approximate)["location"]
+
+    def rxt_dict(self, context, name, timestamp, approximate=False):
+        return copy_doc(self.rxt_dict_shared(context, name, timestamp, approximate))
+
+    def rxt_dict_shared(self, context, name, timestamp, approximate=False):
+        # the parsed response is kept, to answer a 304 with
+        return self._get("rxt", context, name, timestamp, approximate=approximate)
+
+    def tools(self, context, name, timestamp, approximate=False):
+        return self._get("tools", context, name, timestamp, approximate=approximate)
+
+    def snapshot(self, contexts, timestamp):
+        contexts = list(contexts)
+        if not contexts:
+            return {}
+        return self._get("snapshot", int(timestamp), contexts=contexts)
+
+    def launch_script(self, context, name, timestamp, shell, approximate=False):
+        path = self._get("launch_script", context, name, timestamp, shell,
+                         approximate=approximate)["path"]
+        # a tcp service may run on a host whose paths are not visible here
+        return path if path is not None and exists(path) else None
+
+
+class ServiceReader(RezRxtDbReaderI):
+    """
+    Reader using the service while it is reachable, and reading the database
+    directly once it is not.
+    """
+    def __init__(self, address, db, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            address   (str): address of the service.
+            db        (str): location of the database.
+            timeout (float): seconds to wait on the service.
+        """
+        self.client = RezRxtDbClient(address, db, timeout)
+        self.db = db
+        self.direct = None
+        super(ServiceReader, self).__init__()
+
+    def _call(self, method, *args):
+        """
+        Call a reader method through the service, falling back to the database.
+        """
+        if self.direct is None:
+            try:
+                return getattr(self.client, method)(*args)
+            except ServiceUnavailable:
+                self.direct = backends.get_reader(self.db,
+                                                  replica=environ.get(constants.REZRXT_REPLICA))
+        return getattr(self.direct, method)(*args)
+
+    def contexts(self):
+        return self._call("contexts")
+
+    def names(self, context):
+        return self._call("names", context)
+
+    def timestamps(self, context, name):
+        return self._call("timestamps", context, name)
+
+    def timestamp_range(self, context, name, start=None, end=None, include_start=True,
+                        include_end=True, reverse=False, limit=None):
+        return self._call("timestamp_range", context, name, start, end, include_start,
+                          include_end, reverse, limit)
+
+    def latest(self, context, name, count=1):
+        return self._call("latest", context, name, count)
+
+    def rxt_fields(self, context, name, timestamp, fields, approximate=False):
+        return self._call("rxt_fields", context, name, timestamp, fields, approximate)
+
+    def stream_rxt_fields(self, context, name, fields, start=None, end=None, reverse=False):
+        # each resolve is a call of its own, so the stream falls back part way through
+        fields = list(fields)
+        for t_stamp in self.timestamp_range(context, name, start, end, reverse=reverse):
+            try:
+                yield t_stamp, self.rxt_fields(context, name, t_stamp, fields)
+            except KeyError:
+                continue
+
+    def resolve_timestamp(self, context, name, timestamp, approximate=False):
+        return self._call("resolve_timestamp", context, name, timestamp, approximate)
+
+    def resolve(self, context, name, timestamp, approximate=False):
+        return self._call("resolve", context, name, timestamp, approximate)
+
+    def location(self, context, name, timestamp, approximate=False):
+        return self._call("location", context, name, timestamp, approximate)
+
+    def rxt_dict(self, context, name, timestamp, approximate=False):
+        return self._call("rxt_dict", context, name, timestamp, approximate)
+
+    def rxt_dict_shared(self, context, name, timestamp, approximate=False):
+        return self._call("rxt_dict_shared", context, name, timestamp, approximate)
+
+    def tools(self, context, name, timestamp, approximate=False):
+        return self._call("tools", context, name, timestamp, approximate)
+
+    def snapshot(self, contexts, timestamp):
+        return self._call("snapshot", contexts, timestamp)
+
+    def launch_script(self, context, name, timestamp, shell, approximate=False):
+        return self._call("launch_script", context, name, timestamp, shell, approximate)
+
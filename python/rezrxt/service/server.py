@@ -0,0 +1,367 @@
+"""
+server.py - long running read service over a database.
+
+The service keeps the timestamps of every context and name in memory, and
+answers HTTP GET requests, over a unix socket or tcp, with json:
+
+/contexts                                  list of contexts
+/names/<context>                           list of names
+/timestamps/<context>/<name>               list of timestamps
+/resolve/<context>/<name>/<ts>             {"timestamp": <exact ts>, "location": <str>,
+                                            "path": <path, or null if packed>}
+/rxt/<context>/<name>/<ts>                 the resolve
+/tools/<context>/<name>/<ts>               tools manifest, or null
+/launch_script/<context>/<name>/<ts>/<shell>  {"path": <path or null>}
+/snapshot/<ts>?context=<context>&...      every name of the contexts as of ts
+/fields/<context>/<name>/<ts>?field=<key>&...  selected keys of the resolve
+/stats                                     counters
+
+Resolve requests accept ?approximate=1. Every response carries an ETag, and
+a request whose If-None-Match matches it is answered with 304. Responses
+about the contents of a single resolve are cached, though not paths, which
+packing or pruning removes, and identical requests in flight at the same
+time are computed once. Missing keys are answered with 404 and
+{"error": "KeyError", "message": <str>}.
+
+Every response names the database served in the X-Rezrxt-Db header, so that
+clients may check they are talking to the service they expect.
+"""
+
+__all__ = ("RezRxtService", "Coalescer", "serve")
+
+from os.path import exists
+from os import remove
+from urllib import unquote
+from urlparse import urlsplit, parse_qs
+import BaseHTTPServer
+import SocketServer
+import bisect
+import hashlib
+import json
+import threading
+import time
+
+from rezrxt import backends
+from rezrxt.cache import RxtCache
+from rezrxt.constants import DB_HEADER
+from rezrxt.exceptions import PackedResolveError
+
+# seconds for which the timestamps of a context and name are served from
+# memory before being reloaded.
+DEFAULT_REFRESH = 2.0
+
+
+class Coalescer(object):
+    """
+    Computes identical requests in flight at the same time once. The first
+    caller computes the result; concurrent callers with the same key wait
+    for it.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.coalesced = 0
+
+    def run(self, key, func):
+        """
+        Return func(), sharing the call with concurrent callers using key.
+        Exceptions are shared too.
+        """
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = {"done": threading.Event()}
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call["result"] = func()
+            except Exception as err:
+                call["error"] = err
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                call["done"].set()
+        else:
+            call["done"].wait()
+
+        if "error" in call:
+            raise call["error"]
+        return call["result"]
+
+
+class RezRxtService(object):
+    """
+    Answers requests against a database, independently of the transport.
+    """
+    def __init__(self, db, refresh=DEFAULT_REFRESH, cache_bytes=None):
+        """
+        Args:
+            db            (str): database location. (see rezrxt.backends)
+            refresh     (float): seconds the timestamps of a context and name are
+                                 served from memory before being reloaded.
+            cache_bytes   (int): byte budget of the response cache.
+        """
+        self.db = backends.realdb(db)
+        self.refresh = refresh
+        self.responses = RxtCache() if cache_bytes is None else RxtCache(cache_bytes)
+        self.coalescer = Coalescer()
+        self.requests = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (context, name) -> (expiry time, sorted timestamps)
+        self._timestamps = {}
+        # (expiry time, {context: sorted names})
+        self._names = (0, {})
+
+    def reader(self):
+        """
+        Return the reader of the calling thread. Readers are not shared between
+        threads, as some backends (sqlite) forbid it.
+        """
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            reader = self._local.reader = backends.get_reader(self.db)
+        return reader
+
+    def load(self):
+        """
+        Load the timestamps of every context and name into memory.
+
+        Returns:
+            number of context and name pairs loaded.
+        """
+        count = 0
+        for context, names in self.names_map().items():
+            for name in names:
+                self.timestamps(context, name)
+                count += 1
+        return count
+
+    def names_map(self):
+        """
+        Return {context: sorted names}, reloading it once it has expired.
+        """
+        expiry, names = self._names
+        if expiry > time.time():
+            return names
+        reader = self.reader()
+        names = dict((context, list(reader.names(context))) for context in reader.contexts())
+        self._names = (time.time() + self.refresh, names)
+        return names
+
+    def timestamps(self, context, name):
+        """
+        Return the sorted timestamps of a context and name, from memory.
+
+        Raises:
+            KeyError: If the database does not contain the context or name.
+        """
+        key = (context, name)
+        entry = self._timestamps.get(key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        timestamps = self.coalescer.run(("timestamps",) + key, lambda: sorted(
+            self.reader().timestamps(context, name)))
+        with self._lock:
+            self._timestamps[key] = (time.time() + self.refresh, timestamps)
+        return timestamps
+
+    def resolve_timestamp(self, context, name, timestamp, approximate=False):
+        """
+        Resolve a timestamp against the in memory index. (see
+        RezRxtDbReaderI.resolve_timestamp)
+        """
+        if not approximate:
+            return int(timestamp)
+        timestamps = self.timestamps(context, name)
+        if not timestamps:
+            raise KeyError("resolve_timestamp({0}, {1}, {2}) - no resolves"\
+                           .format(context, name, timestamp))
+        pos = bisect.bisect_right(timestamps, int(timestamp))
+        return timestamps[pos - 1] if pos else timestamps[0]
+
+    def _resolve_body(self, kind, context, name, timestamp, arg=None):
+        """
+        Return the json body of a response about a single, exact, resolve,
+        via the response cache. Paths are not cached, as packing or pruning
+        the resolve removes them, and they are cheap to look up.
+
+        Args:
+            arg: the shell of a launch script, or the sorted tuple of keys to
+                 retrieve.
+        """
+        key = (kind, context, name, timestamp, arg)
+        cached = kind not in ("resolve", "launch_script")
+        body = self.responses.get(key) if cached else None
+        if body is not None:
+            return body
+
+        def compute():
+            """
+            Read the resolve and serialize the response.
+            """
+            reader = self.reader()
+            if kind == "rxt":
+                data = reader.rxt_dict_shared(context, name, timestamp)
+            elif kind == "tools":
+                data = reader.tools(context, name, timestamp)
+            elif kind == "launch_script":
+                data = {"path": reader.launch_script(context, name, timestamp, arg)}
+            elif kind == "fields":
+                data = reader.rxt_fields(context, name, timestamp, arg)
+            else:
+                try:
+                    path = reader.resolve(context, name, timestamp)
+                except PackedResolveError:
+                    path = None
+                data = {"timestamp": timestamp, "path": path,
+                        "location": reader.location(context, name, timestamp)}
+            return json.dumps(data)
+
+        body = self.coalescer.run(key, compute)
+        # a missing manifest may yet be baked, so is not cached.
+        if cached and body != "null":
+            self.responses.put(key, body, len(body))
+        return body
+
+    def handle(self, path):
+        """
+        Answer a request.
+
+        Args:
+            path (str): request path, including any query string.
+
+        Returns:
+            (status, json body)
+        """
+        self.requests += 1
+        url = urlsplit(path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        query = parse_qs(url.query)
+        try:
+            body = self._dispatch(parts, query)
+        except KeyError as err:
+            return 404, json.dumps({"error": "KeyError", "message": err.message})
+        except (ValueError, TypeError) as err:
+            return 400, json.dumps({"error": type(err).__name__, "message": str(err)})
+        if body is None:
+            return 404, json.dumps({"error": "NotFound", "message": url.path})
+        return 200, body
+
+    def _dispatch(self, parts, query):
+        """
+        Route a request to its handler.
+
+        Returns:
+            json body, or None if no route matches.
+        """
+        route, args = parts[0], parts[1:]
+        approximate = query.get("approximate", ["0"])[0] in ("1", "true")
+        if route == "contexts" and not args:
+            return json.dumps(sorted(self.names_map()))
+        if route == "names" and len(args) == 1:
+            names = self.names_map().get(args[0])
+            if names is None:
+                raise KeyError("names({0}) - context does not exist".format(args[0]))
+            return json.dumps(names)
+        if route == "timestamps" and len(args) == 2:
+            return json.dumps(self.timestamps(*args))
+        if route == "stats" and not args:
+            return json.dumps({"requests": self.requests,
+                               "coalesced": self.coalescer.coalesced,
+                               "cache": self.responses.stats(),
+                               "names": len(self._timestamps)})
+        if route == "snapshot" and len(args) == 1:
+            contexts = query.get("context") or sorted(self.names_map())
+            return json.dumps(self.reader().snapshot(contexts, int(args[0])))
+        if route in ("resolve", "rxt", "tools") and len(args) == 3:
+            context, name, timestamp = args
+            t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+            return self._resolve_body(route, context, name, t_stamp)
+        if route == "fields" and len(args) == 3:
+            context, name, timestamp = args
+            t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+            fields = tuple(sorted(set(query.get("field", []))))
+            return self._resolve_body(route, context, name, t_stamp, fields)
+        if route == "launch_script" and len(args) == 4:
+            context, name, timestamp, shell = args
+            t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+            return self._resolve_body(route, context, name, t_stamp, shell)
+        return None
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves GET requests through the RezRxtService of the server.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """
+        Answer a request, honoring If-None-Match.
+        """
+        service = self.server.service
+        status, body = service.handle(self.path)
+        etag = '"{0}"'.format(hashlib.sha1(body).hexdigest())
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            status, body = 304, ""
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header(DB_HEADER, service.db)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # unix socket clients have no address
+        return str(self.client_address or "local")
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, fmt, *args)
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    HTTP server handling each connection in a thread.
+    """
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """
+    HTTP server on a unix socket, handling each connection in a thread.
+    """
+    daemon_threads = True
+
+
+def serve(service, socket_path=None, host="127.0.0.1", port=None, verbose=False):
+    """
+    Create a server answering requests through service. Serve requests by
+    calling serve_forever on it.
+
+    Args:
+        service (RezRxtService): the service.
+        socket_path       (str): path to the unix socket to listen on. Replaced
+                                 if it exists.
+        host              (str): host to listen on, if not using a socket.
+        port              (int): port to listen on, if not using a socket.
+        verbose          (bool): Whether to log each request.
+
+    Returns:
+        SocketServer.BaseServer
+    """
+    if socket_path is not None:
+        if exists(socket_path):
+            remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port or 0), RequestHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
@@ -0,0 +1,339 @@
+"""
+reader implementation, backed by a sqlite database. (see schema.py)
+"""
+
+__all__ = ("RezRxtDbReader",)
+
+from os.path import isfile, expanduser
+from os.path import join as pjoin
+from os import environ
+import hashlib
+import json
+
+from rezrxt import instrument
+from rezrxt.dbinterface import RezRxtDbReaderI
+from rezrxt.cache import copy_doc, shared_cache
+from rezrxt.filebacked.fsutil import atomic_write, makedirs_exist_ok
+from rezrxt.filebacked.record import split_rxt
+from rezrxt.jsonscan import scan_fields
+from rezrxt.sqlite.schema import connect
+
+# a single indexed seek. the greatest timestamp not after the one supplied,
+# or failing that, the earliest.
+_FLOOR_QUERY = """
+SELECT timestamp FROM (
+    SELECT * FROM (SELECT timestamp, 0 AS after FROM resolves
+                   WHERE context = ? AND name = ? AND timestamp <= ?
+                   ORDER BY timestamp DESC LIMIT 1)
+    UNION ALL
+    SELECT * FROM (SELECT timestamp, 1 AS after FROM resolves
+                   WHERE context = ? AND name = ?
+                   ORDER BY timestamp ASC LIMIT 1)
+) ORDER BY after LIMIT 1
+"""
+
+
+# the floor of every name of a context in one pass over its rows
+_SNAPSHOT_QUERY = """
+SELECT name, COALESCE(MAX(CASE WHEN timestamp <= ? THEN timestamp END), MIN(timestamp))
+FROM resolves WHERE context = ? GROUP BY name ORDER BY name
+"""
+
+
+def launch_dir():
+    """
+    Return the directory baked launch scripts are written to, so that they may
+    be sourced.
+    """
+    return pjoin(environ.get("XDG_CACHE_HOME") or expanduser(pjoin("~", ".cache")),
+                 "rezrxt", "launch")
+
+
+class RezRxtDbReader(RezRxtDbReaderI):
+    """
+    Database Reader.
+    """
+    def __init__(self, db_path, cache=None):
+        """
+        Args:
+            db_path   (str): path to the database file.
+            cache (RxtCache): cache of parsed resolves. Defaults to the process
+                              wide cache. Pass False to disable caching.
+
+        Raises:
+            AssertionError: If the database does not exist.
+        """
+        self.db_path = db_path
+        self.conn = connect(db_path)
+        self.cache = shared_cache() if cache is None else (None if cache is False else cache)
+        super(RezRxtDbReader, self).__init__()
+
+    def resolve_timestamp(self, context, name, timestamp, approximate=False):
+        """
+        Return the exact timestamp under which a resolve is stored.
+
+        Args:
+            context      (str): The context name.
+            name         (str): The package name.
+            timestamp    (int): The timestamp.
+            approximate (bool): Whether to find the closest timestamp less than or
+                                equal to the one provided. If the timestamp predates
+                                every resolve, the earliest is returned.
+
+        Returns:
+            int
+
+        Raises:
+            KeyError: If approximate and the db is missing the context or name.
+        """
+        if approximate is not True:
+            return int(timestamp)
+        instrument.count("sqlite.query")
+        row = self.conn.execute(_FLOOR_QUERY, (context, name, int(timestamp),
+                                               context, name)).fetchone()
+        if row is None:
+            raise KeyError("resolve_timestamp({0}, {1}, {2}) - no resolves in {3}"\
+                           .format(context, name, timestamp, self.db_path))
+        return row[0]
+
+    def resolve(self, context, name, timestamp, approximate=False):
+        """
+        Return the location of a resolve, as resolves are not stored in files
+        of their own. (see location)
+        """
+        return self.location(context, name, timestamp, approximate)
+
+    def location(self, context, name, timestamp, approximate=False):
+        """
+        Return a locator for a resolve, of the form <db path>:<context>/<name>/<timestamp>.
+
+        Raises:
+            KeyError: If db is missing either the context, name, or timestamp.
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        self._row("timestamp", context, name, t_stamp)
+        return "{0}:{1}/{2}/{3}".format(self.db_path, context, name, t_stamp)
+
+    def _row(self, column, context, name, timestamp):
+        """
+        Return a column of the resolve stored under an exact timestamp.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        instrument.count("sqlite.query")
+        row = self.conn.execute("SELECT {0} FROM resolves WHERE context = ? AND name = ? "
+                                "AND timestamp = ?".format(column),
+                                (context, name, int(timestamp))).fetchone()
+        if row is None:
+            raise KeyError("{0}, {1}, {2} does not exist in {3}"\
+                           .format(context, name, timestamp, self.db_path))
+        return row[0]
+
+    def rxt_dict(self, context, name, timestamp, approximate=False):
+        """
+        Retrieve a python dictionary matching the name, context, and timestamp.
+
+        Args:
+            context      (str): Context of the package.
+            name         (str): Name of the package.
+            timestamp    (int): Timestamp of the resolve.
+            approximate (bool): Whether to get the nearest timestamp,
+                                less than or equal to timestamp.
+
+        Returns:
+            python dict, a copy of the cached resolve, which the caller may modify.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        return copy_doc(self.rxt_dict_shared(context, name, timestamp, approximate))
+
+    def rxt_dict_shared(self, context, name, timestamp, approximate=False):
+        """
+        Retrieve the cached python dictionary of a resolve, which must be
+        treated as read-only. (see RezRxtDbReaderI.rxt_dict_shared)
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        # resolves are never modified in place, so need no validator.
+        key = (self.db_path, context, name, t_stamp)
+        if self.cache is not None:
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+
+        with instrument.phase("reader.rxt_dict"):
+            rxt = self._row("rxt", context, name, t_stamp)
+            instrument.count("bytes.read", len(rxt))
+            with instrument.phase("record.parse"):
+                data = json.loads(rxt)
+        if self.cache is not None:
+            self.cache.put(key, data, len(rxt))
+        return data
+
+    def rxt_fields(self, context, name, timestamp, fields, approximate=False):
+        """
+        Retrieve selected top level keys of a resolve, scanning its json only
+        as far as the last of them. A resolve already in the cache is not read.
+        (see RezRxtDbReaderI.rxt_fields)
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        if self.cache is not None:
+            data = self.cache.get((self.db_path, context, name, t_stamp))
+            if data is not None:
+                return dict((key, data[key]) for key in fields if key in data)
+        return scan_fields([self._row("rxt", context, name, t_stamp)], fields)
+
+    def stream_rxt_fields(self, context, name, fields, start=None, end=None, reverse=False):
+        """
+        Retrieve selected top level keys of every resolve of a context and name,
+        fetching one row at a time. (see RezRxtDbReaderI.stream_rxt_fields)
+
+        Raises:
+            KeyError: If the db is missing the context or name.
+        """
+        fields = list(fields)
+        for t_stamp in self.timestamp_range(context, name, start, end, reverse=reverse):
+            try:
+                yield t_stamp, self.rxt_fields(context, name, t_stamp, fields)
+            except KeyError:
+                continue
+
+    def snapshot(self, contexts, timestamp):
+        """
+        Resolve every name of the supplied contexts as of a timestamp, with one
+        query per context. (see RezRxtDbReaderI.snapshot)
+
+        Raises:
+            KeyError: If the db is missing a context.
+        """
+        snapshot = {}
+        for context in contexts:
+            rows = self.conn.execute(_SNAPSHOT_QUERY, (int(timestamp), context)).fetchall()
+            if not rows:
+                raise KeyError("snapshot({0}) - context does not exist in {1}"\
+                               .format(context, self.db_path))
+            snapshot[context] = dict(
+                (name, {"timestamp": t_stamp,
+                        "location": "{0}:{1}/{2}/{3}".format(self.db_path, context, name, t_stamp),
+                        "header": split_rxt(self.rxt_dict_shared(context, name, t_stamp))[0]})
+                for name, t_stamp in rows)
+        return snapshot
+
+    def tools(self, context, name, timestamp, approximate=False):
+        """
+        Return the tools provided by each package of a resolve, from the tools
+        manifest stored when it was added.
+
+        Returns:
+            dict of package name -> list of tools, or None if the resolve was not baked.
+
+        Raises:
+            KeyError: If the resolve does not exist.
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        tools = self._row("tools", context, name, t_stamp)
+        return None if tools is None else json.loads(tools)
+
+    def launch_script(self, context, name, timestamp, shell, approximate=False):
+        """
+        Return the path to the baked launch script of a resolve, for the supplied
+        shell type. The script is written to launch_dir, named by its digest,
+        the first time it is requested.
+
+        Returns:
+            Path to the script, or None if no script was baked for the shell.
+
+        Raises:
+            KeyError: If approximate and the db is missing the context or name.
+        """
+        t_stamp = self.resolve_timestamp(context, name, timestamp, approximate)
+        row = self.conn.execute("SELECT script FROM launch_scripts WHERE context = ? AND "
+                                "name = ? AND timestamp = ? AND shell = ?",
+                                (context, name, t_stamp, shell)).fetchone()
+        if row is None:
+            return None
+        path = pjoin(launch_dir(), "{0}.{1}".format(hashlib.sha256(row[0]).hexdigest(), shell))
+        if not isfile(path):
+            makedirs_exist_ok(launch_dir())
+            atomic_write(path, row[0])
+        return path
+
+    def contexts(self):
+        """
+        Return a generator of contexts, in sorted order.
+        """
+        for row in self.conn.execute("SELECT DISTINCT context FROM resolves ORDER BY context"):
+            yield row[0]
+
+    def names(self, context):
+        """
+        Return a list of the names within the supplied context, in sorted order.
+
+        Raises:
+            KeyError: If context does not exist in DB.
+        """
+        names = [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT name FROM resolves WHERE context = ? ORDER BY name", (context,))]
+        if not names:
+            raise KeyError("names({0}) - context does not exist in {1}"\
+                           .format(context, self.db_path))
+        return names
+
+    def timestamps(self, context, name):
+        """
+        Return a list of the timestamps within the supplied context and name, in
+        ascending order.
+
+        Raises:
+            KeyError: If supplied with non-extant keys.
+        """
+        timestamps = [row[0] for row in self.conn.execute(
+            "SELECT timestamp FROM resolves WHERE context = ? AND name = ? ORDER BY timestamp",
+            (context, name))]
+        if not timestamps:
+            raise KeyError("timestamps({0}, {1}) - does not exist in {2}"\
+                           .format(context, name, self.db_path))
+        return timestamps
+
+    def timestamp_range(self, context, name, start=None, end=None, include_start=True,
+                        include_end=True, reverse=False, limit=None):
+        """
+        Return the timestamps between start and end, as a single range scan of
+        the primary key. (see RezRxtDbReaderI.timestamp_range)
+
+        Raises:
+            KeyError: If supplied with non-extant keys.
+        """
+        query = "SELECT timestamp FROM resolves WHERE context = ? AND name = ?"
+        params = [context, name]
+        if start is not None:
+            query += " AND timestamp {0} ?".format(">=" if include_start else ">")
+            params.append(int(start))
+        if end is not None:
+            query += " AND timestamp {0} ?".format("<=" if include_end else "<")
+            params.append(int(end))
+        query += " ORDER BY timestamp {0}".format("DESC" if reverse else "ASC")
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        timestamps = [row[0] for row in self.conn.execute(query, params)]
+        if not timestamps:
+            # an empty range of an extant name is not an error
+            self.timestamps(context, name)
+        return timestamps
+
+    def latest(self, context, name, count=1):
+        """
+        Return the most recent timestamps, newest first.
+
+        Raises:
+            KeyError: If supplied with non-extant keys.
+        """
+        return self.timestamp_range(context, name, reverse=True, limit=count)
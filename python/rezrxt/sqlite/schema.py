@@ -0,0 +1,82 @@
+"""
+schema.py - layout of, and connections to, a sqlite resolve database.
+
+A single database file holds every resolve:
+
+resolves        one row per (context, name, timestamp), holding the rxt json
+                and, once baked, the tools manifest json. The primary key
+                doubles as the index approximate lookups seek on.
+launch_scripts  one row per baked shell script of a resolve.
+
+The database runs in WAL mode, so readers proceed while a writer commits,
+and writers queue on the database lock for up to TIMEOUT seconds.
+"""
+
+__all__ = ("SCHEMA_VERSION", "TIMEOUT", "connect")
+
+from os.path import isfile
+import sqlite3
+
+SCHEMA_VERSION = 1
+
+# seconds a connection waits on a locked database before failing
+TIMEOUT = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resolves (
+    context   TEXT    NOT NULL,
+    name      TEXT    NOT NULL,
+    timestamp INTEGER NOT NULL,
+    rxt       TEXT    NOT NULL,
+    tools     TEXT,
+    PRIMARY KEY (context, name, timestamp)
+);
+CREATE TABLE IF NOT EXISTS launch_scripts (
+    context   TEXT    NOT NULL,
+    name      TEXT    NOT NULL,
+    timestamp INTEGER NOT NULL,
+    shell     TEXT    NOT NULL,
+    script    TEXT    NOT NULL,
+    PRIMARY KEY (context, name, timestamp, shell)
+);
+"""
+
+
+def connect(db_path, create=False):
+    """
+    Open a connection to a sqlite resolve database.
+
+    Args:
+        db_path  (str): path to the database file.
+        create  (bool): Whether to create the database, and its tables, if
+                        missing. Readers never create it.
+
+    Returns:
+        sqlite3.Connection
+
+    Raises:
+        AssertionError: If the database does not exist, and create is False.
+        RuntimeError: If the file is not a resolve database, or was written by a
+                      newer schema.
+    """
+    if not create:
+        assert isfile(db_path), "sqlite database {0} does not exist".format(db_path)
+    conn = sqlite3.connect(db_path, timeout=TIMEOUT)
+    conn.text_factory = str
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        conn.close()
+        raise RuntimeError("sqlite database {0} has schema version {1}, newer than {2}"\
+                           .format(db_path, version, SCHEMA_VERSION))
+    if not create and version == 0:
+        conn.close()
+        raise RuntimeError("{0} is not a rezrxt sqlite database".format(db_path))
+    if create and version < SCHEMA_VERSION:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.executescript(_SCHEMA)
+            conn.execute("PRAGMA user_version={0}".format(SCHEMA_VERSION))
+    # in WAL mode, NORMAL only risks the last transactions on power loss,
+    # never corruption.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
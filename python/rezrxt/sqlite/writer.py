@@ -0,0 +1,87 @@
+"""
+writer implementation, backed by a sqlite database. (see schema.py)
+"""
+
+__all__ = ("RezRxtDbWriter",)
+
+import json
+import sqlite3
+
+from rezrxt import instrument
+from rezrxt.dbinterface import RezRxtDbWriterI
+from rezrxt.exceptions import DuplicateKeyError
+from rezrxt.bake import load_context, launch_scripts, tools_manifest
+from rezrxt.sqlite.schema import connect
+
+
+class RezRxtDbWriter(RezRxtDbWriterI):
+    """
+    Write rxt to database. Each resolve is added, along with its baked data,
+    in a single transaction.
+    """
+    def __init__(self, db_path, bake=False):
+        """
+        Args:
+            db_path (str): path to the database file. Created if missing.
+            bake   (bool): Whether to evaluate each resolve as it is added,
+                           storing its tools manifest and launch scripts
+                           alongside it. Requires rez.
+        """
+        self.db_path = db_path
+        self.conn = connect(db_path, create=True)
+        self.bake = bake
+
+    def add_rxt(self, context, name, rxt_dict):
+        """
+        Add a resolve for the given name and context. The timestamp
+        will be pulled from the rxt_dict
+
+        Args:
+            context   (str): Context of the package.
+            name      (str): Name of the package.
+            rxt_dict (dict): resolve python dict.
+
+        Raises:
+            DuplicateKeyError: If a context already exists with the supplied data.
+        """
+        timestamp = int(rxt_dict["timestamp"])
+        tools, scripts = None, {}
+        if self.bake:
+            with instrument.phase("writer.bake"):
+                resolved = load_context(rxt_dict)
+            tools = json.dumps(tools_manifest(resolved))
+            scripts = launch_scripts(resolved)
+
+        try:
+            with instrument.phase("writer.insert"), self.conn:
+                self.conn.execute("INSERT INTO resolves (context, name, timestamp, rxt, tools) "
+                                  "VALUES (?, ?, ?, ?, ?)",
+                                  (context, name, timestamp, json.dumps(rxt_dict), tools))
+                self.conn.executemany("INSERT INTO launch_scripts (context, name, timestamp, "
+                                      "shell, script) VALUES (?, ?, ?, ?, ?)",
+                                      [(context, name, timestamp, shell, script)
+                                       for shell, script in sorted(scripts.items())])
+        except sqlite3.IntegrityError:
+            raise DuplicateKeyError("add_rxt({0}, {1}, {2}) - already exists in {3}"\
+                                    .format(context, name, timestamp, self.db_path))
+
+    def update_rxt(self, context, name, timestamp, rxt_dict):
+        """
+        Update an existing resolve, provided one exists matching the supplied keys.
+        Args:
+            context   (str): context of the package.
+            name      (str): name of the package.
+            timestamp (str): timestamp of the resolve.
+            rxt_dict (dict): Python dict of the resolve.
+
+        Raises:
+            KeyError: if a composite key constructed by the supplied components does not exist.
+        """
+        raise NotImplementedError("{0} {1} {2} {3}".format(context, name, timestamp, rxt_dict))
+
+    def flush(self):
+        """
+        Each resolve is committed as it is added, so there is nothing to flush.
+        Provided for parity with the filebacked writer.
+        """
+        return 0
@@ -7,7 +7,15 @@ import datetime
 from calendar import timegm
 
 __all__ = ("gmtime_to_epoc", "localtime_to_epoc", "epoc_to_gm_asctime",\
-           "epoc_to_loc_asctime")
+           "epoc_to_loc_asctime", "parse_time")
+
+# formats accepted by parse_time, besides asctime. read as local time, or as
+# gmt when suffixed with "Z".
+_DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S",
+                 "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S")
+
+# seconds in each unit of a relative time. (eg 3d)
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
 
 def gmtime_to_epoc(gmtime):
     """
@@ -19,9 +27,10 @@ def gmtime_to_epoc(gmtime):
 
 def localtime_to_epoc(localtime):
     """
-    Convert localtime to epoc.
+    Convert localtime string to epoc time.
     """
-    raise NotImplementedError("localtime_to_epoc not implemented: {0}".format(localtime))
+    date_t = datetime.datetime.strptime(localtime, "%a %b %d %H:%M:%S %Y")
+    return int(time.mktime(date_t.timetuple()))
 
 
 def epoc_to_gm_asctime(epoc):
@@ -36,3 +45,46 @@ def epoc_to_loc_asctime(epoc):
     Convert seconds since epoc to gmtime.
     """
     return time.asctime(time.localtime(epoc))
+
+
+def parse_time(value, now=None):
+    """
+    Convert a time supplied on the command line to epoc.
+
+    Accepts seconds since epoc, "now", a time relative to now (eg 90m, 12h,
+    3d or 2w, meaning that long ago), a date or date and time (eg 2017-08-20,
+    2017-08-20 21:30 or 2017-08-20T21:30:00, in local time, or gmt with a
+    trailing Z), or an asctime in gmt (eg Sun Aug 20 21:30:00 2017).
+
+    Args:
+        value (str): the time.
+        now   (int): epoc time relative times are relative to. (default: now)
+
+    Returns:
+        int
+
+    Raises:
+        ValueError: If the time is not recognized.
+    """
+    value = str(value).strip()
+    now = int(time.time()) if now is None else now
+    if value.isdigit():
+        return int(value)
+    if value == "now":
+        return now
+    if value[:-1].isdigit() and value[-1] in _UNITS:
+        return now - int(value[:-1]) * _UNITS[value[-1]]
+
+    gmt = value.endswith("Z")
+    for fmt in _DATE_FORMATS:
+        try:
+            date_t = datetime.datetime.strptime(value[:-1] if gmt else value, fmt)
+        except ValueError:
+            continue
+        return timegm(date_t.timetuple()) if gmt else int(time.mktime(date_t.timetuple()))
+    try:
+        return gmtime_to_epoc(value)
+    except ValueError:
+        raise ValueError("unrecognized time \"{0}\" - expected seconds since epoc, now, a "
+                         "relative time such as 3d, or a date such as 2017-08-20 21:30"\
+                         .format(value))
@@ -0,0 +1,83 @@
+"""
+bulktest.py
+"""
+from os.path import join as pjoin
+from os import makedirs
+import json
+
+from rezrxt.filebacked import bulk
+from rezrxt.filebacked.reader import RezRxtDbReader, RezRxtDbReadMgr
+from dbtestcase import DbTestCase, load_sample
+
+
+class BulkAddTest(DbTestCase):
+    """
+    Tests covering adding many resolves at once.
+    """
+    def setUp(self):
+        super(BulkAddTest, self).setUp()
+        self.src_dir = pjoin(self.tmp_dir, "src")
+        makedirs(pjoin(self.src_dir, "nested"))
+        self.rxt = load_sample()
+
+    def export(self, f_name, timestamp, data=None):
+        """
+        Write a copy of the sample resolve to the source directory.
+        """
+        path = pjoin(self.src_dir, f_name)
+        with open(path, "w") as f_handle:
+            if data is None:
+                json.dump(dict(self.rxt, timestamp=timestamp), f_handle)
+            else:
+                f_handle.write(data)
+        return path
+
+    def test_sources_from_paths(self):
+        """
+        Directories are searched recursively, and names parsed from file names.
+        """
+        first = self.export("model-houdini-1.rxt", 1)
+        second = self.export(pjoin("nested", "anim-maya-fx-2.rxt"), 2)
+        self.export("notes.txt", 3)
+        self.assertEqual(list(bulk.sources_from_paths([self.src_dir])),
+                         [("model", "houdini", first), ("anim", "maya-fx", second)])
+        self.assertEqual(list(bulk.sources_from_paths([pjoin(self.src_dir, "*.rxt")], "fx")),
+                         [("fx", "houdini", first)])
+        self.assertEqual(list(bulk.sources_from_paths([pjoin(self.src_dir, "notes.txt")])),
+                         [(None, None, pjoin(self.src_dir, "notes.txt"))])
+
+    def test_sources_from_lines(self):
+        """
+        Lines of "context name path" are parsed, skipping blanks and comments.
+        """
+        lines = ["model houdini /a/b c.rxt\n", "\n", "# comment\n", "bogus\n"]
+        self.assertEqual(list(bulk.sources_from_lines(lines)),
+                         [("model", "houdini", "/a/b c.rxt"), (None, None, "bogus")])
+
+    def test_bulk_add(self):
+        """
+        Resolves are added in parallel, failures reported, and the index and
+        catalog left current.
+        """
+        for timestamp in range(1503267000, 1503267010):
+            self.export("model-houdini-{0}.rxt".format(timestamp), timestamp)
+        self.export("model-houdini-1.rxt", None, "{not json")
+        self.export("model-houdini-2.rxt", None, json.dumps({"status": "solved"}))
+        # duplicates an existing resolve
+        self.export("model-houdini-1503265457.rxt", 1503265457)
+
+        summary = bulk.bulk_add(self.db_path, bulk.sources_from_paths([self.src_dir]),
+                                processes=2, batch_size=4)
+        self.assertEqual(summary["count"], 10)
+        self.assertEqual(sorted(path for path, _ in summary["failures"]),
+                         [pjoin(self.src_dir, f_name) for f_name in
+                          ("model-houdini-1.rxt", "model-houdini-1503265457.rxt",
+                           "model-houdini-2.rxt")])
+
+        mgr = RezRxtDbReadMgr(self.db_path)
+        self.assertTrue(mgr.timestamp_index("model", "houdini").read_current() is not None)
+        self.assertEqual(mgr.catalog().entry("model", "houdini")["max"], 1503267009)
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(len(list(reader.timestamps("model", "houdini"))), 12)
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503267005),
+                         dict(self.rxt, timestamp=1503267005))
@@ -0,0 +1,103 @@
+"""
+cachetest.py
+"""
+from os import utime, stat
+import json
+import unittest
+
+from rezrxt.cache import RxtCache
+from rezrxt.filebacked.reader import RezRxtDbReader
+from dbtestcase import DbTestCase
+
+
+class RxtCacheTest(unittest.TestCase):
+    """
+    Tests covering the LRU cache.
+    """
+    def test_hit_miss(self):
+        """
+        Lookups count hits and misses, and check the validator.
+        """
+        cache = RxtCache(100)
+        self.assertEqual(cache.get("a", 1), None)
+        cache.put("a", {"a": 1}, 10, 1)
+        self.assertEqual(cache.get("a", 1), {"a": 1})
+        self.assertEqual(cache.get("a", 2), None)
+        self.assertFalse("a" in cache)
+        self.assertEqual((cache.hits, cache.misses, cache.nbytes), (1, 2, 0))
+
+    def test_byte_budget(self):
+        """
+        The least recently used entries are evicted to stay within budget.
+        """
+        cache = RxtCache(100)
+        cache.put("a", "a", 40)
+        cache.put("b", "b", 40)
+        cache.get("a")
+        cache.put("c", "c", 40)
+        self.assertTrue("a" in cache)
+        self.assertFalse("b" in cache)
+        self.assertTrue("c" in cache)
+        self.assertEqual(cache.nbytes, 80)
+
+        cache.put("d", "d", 101)
+        self.assertFalse("d" in cache)
+
+
+class ReaderCacheTest(DbTestCase):
+    """
+    Tests covering the use of the cache by RezRxtDbReader.
+    """
+    def setUp(self):
+        """
+        Copy the test database somewhere we can write to.
+        """
+        super(ReaderCacheTest, self).setUp()
+        self.cache = RxtCache()
+        self.reader = RezRxtDbReader(self.db_path, cache=self.cache)
+
+    def test_cached(self):
+        """
+        A second read of the same resolve is served from the cache.
+        """
+        first = self.reader.rxt_dict_shared("model", "houdini", 1503265457)
+        second = self.reader.rxt_dict_shared("model", "houdini", 1503265459, approximate=True)
+        self.assertTrue(first is second)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_private_copy(self):
+        """
+        Changes to a resolve returned by rxt_dict do not reach the cache.
+        """
+        first = self.reader.rxt_dict("model", "houdini", 1503265457)
+        expected = json.loads(json.dumps(first))
+        first["timestamp"] = 0
+        first["resolved_packages"].append("bogus")
+        second = self.reader.rxt_dict("model", "houdini", 1503265457)
+        self.assertEqual(second, expected)
+        self.assertEqual(self.reader.rxt_dict_shared("model", "houdini", 1503265457), expected)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_invalidated(self):
+        """
+        A resolve which changes on disk is re-read, once stat results are not reused.
+        """
+        self.reader = RezRxtDbReader(self.db_path, cache=self.cache, ttl=0)
+        self.reader.rxt_dict("model", "houdini", 1503265457)
+        path = self.reader.resolve("model", "houdini", 1503265457)
+        with open(path, "w") as f_handle:
+            json.dump({"timestamp": 1503265457}, f_handle)
+        f_mtime = stat(path).st_mtime
+        utime(path, (f_mtime + 10, f_mtime + 10))
+
+        self.assertEqual(self.reader.rxt_dict("model", "houdini", 1503265457),
+                         {"timestamp": 1503265457})
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_disabled(self):
+        """
+        Caching may be disabled.
+        """
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        first = reader.rxt_dict("model", "houdini", 1503265457)
+        self.assertFalse(first is reader.rxt_dict("model", "houdini", 1503265457))
@@ -0,0 +1,162 @@
+"""
+clitest.py
+"""
+from os.path import realpath, dirname
+from os.path import join as pjoin
+from os import symlink, environ
+import json
+import subprocess
+import sys
+import unittest
+
+from rezrxt import cli, manifest
+from rezrxt.filebacked.reader import RezRxtDbReader
+from rezrxt.filebacked.writer import RezRxtDbWriteMgr
+from dbtestcase import DbTestCase
+
+
+BIN_DIR = pjoin(dirname(dirname(realpath(__file__))), "bin")
+
+
+class ImportRecorder(object):
+    """
+    Import hook recording the imports of a package, and leaving them to the
+    other finders.
+    """
+    def __init__(self, package):
+        self.package = package
+        self.imported = []
+
+    def find_module(self, fullname, path=None):
+        if fullname == self.package or fullname.startswith(self.package + "."):
+            self.imported.append(fullname)
+        return None
+
+
+class WrapperArgsTest(unittest.TestCase):
+    """
+    Tests covering wrapper argument handling.
+    """
+    def test_no_rez(self):
+        """
+        Importing the wrapper and parsing its arguments does not import rez.
+        """
+        recorder = ImportRecorder("rez")
+        # imported already, rez would not be looked up again
+        loaded = dict((name, sys.modules.pop(name)) for name in list(sys.modules)
+                      if name == "rez" or name.startswith("rez."))
+        sys.meta_path.insert(0, recorder)
+        try:
+            reload(cli)
+            cli.parse_wrapped_args("houdini", ["shell=bash,ts=1503265457"])
+            self.assertEqual(recorder.imported, [])
+            try:
+                import rez
+            except ImportError:
+                pass
+            self.assertEqual(recorder.imported[:1], ["rez"])
+        finally:
+            sys.meta_path.remove(recorder)
+            sys.modules.update(loaded)
+
+    def test_no_service_imports(self):
+        """
+        Importing the wrapper does not import the service client, or the http
+        modules it needs, until a service is configured.
+        """
+        env = dict(environ)
+        env["PYTHONPATH"] = pjoin(dirname(BIN_DIR), "python")
+        out = subprocess.check_output(
+            [sys.executable, "-c", "import sys, rezrxt.cli; print(sorted(name for name in "
+             "('httplib', 'BaseHTTPServer', 'rezrxt.service.client') if name in sys.modules))"],
+            env=env)
+        self.assertEqual(out.strip(), b"[]")
+
+    def test_split_args(self):
+        """
+        --rropt arguments are split from the tool's arguments.
+        """
+        self.assertEqual(cli._split_args(["-v", "--rropt", "context=fx", "scene.hip"]),
+                         (["context=fx"], ["-v", "scene.hip"]))
+
+    def test_parse_wrapped_args(self):
+        """
+        Comma separated wrapper options are parsed.
+        """
+        args = cli.parse_wrapped_args("houdini", ["context=fx,ts=1503265457", "shell=bash"])
+        self.assertEqual((args.context, args.timestamp, args.shell),
+                         ("fx", "1503265457", "bash"))
+        self.assertTrue(cli._can_fast_launch(args, args.shell))
+
+        args = cli.parse_wrapped_args("houdini", ["detached"])
+        self.assertFalse(cli._can_fast_launch(args, "bash"))
+        self.assertFalse(cli._can_fast_launch(args, "tcsh"))
+
+
+class FastLaunchTest(DbTestCase):
+    """
+    Launch a tool through the wrapper using a baked launch script.
+    """
+    def setUp(self):
+        """
+        Copy the test database somewhere we can write to, and link a wrapper.
+        """
+        super(FastLaunchTest, self).setUp()
+        RezRxtDbWriteMgr(self.db_path).write_launch_env(
+            "model", "houdini", "1503266406", {"bash": "export REZRXT_TEST_VAR=baked\n"})
+        self.wrapper = pjoin(self.tmp_dir, "houdini")
+        symlink(pjoin(BIN_DIR, "_wrapper.py"), self.wrapper)
+
+    def test_fast_launch(self):
+        """
+        The tool runs in the baked environment without rez.
+        """
+        env = dict(environ)
+        env["PYTHONPATH"] = pjoin(dirname(BIN_DIR), "python")
+        out = subprocess.check_output(
+            [sys.executable, self.wrapper, "--rropt", "context=model,shell=bash",
+             "--rropt", "db={0},tool=printenv".format(self.db_path), "REZRXT_TEST_VAR"],
+            env=env)
+        self.assertEqual(out.strip(), b"baked")
+
+    def test_manifest_pins_timestamp(self):
+        """
+        A job manifest supplies the database, and pins the resolve launched.
+        """
+        RezRxtDbWriteMgr(self.db_path).write_launch_env(
+            "model", "houdini", "1503265457", {"bash": "export REZRXT_TEST_VAR=pinned\n"})
+        job = manifest.build_manifest(RezRxtDbReader(self.db_path), self.db_path, ["model"],
+                                      1503266000)
+        manifest.write_manifest(pjoin(self.tmp_dir, "job.json"), job)
+
+        env = dict(environ)
+        env.pop("REZRXT_DB_ROOT", None)
+        env["PYTHONPATH"] = pjoin(dirname(BIN_DIR), "python")
+        env["REZRXT_MANIFEST"] = pjoin(self.tmp_dir, "job.json")
+        out = subprocess.check_output(
+            [sys.executable, self.wrapper, "--rropt", "shell=bash,tool=printenv",
+             "REZRXT_TEST_VAR"], env=env)
+        self.assertEqual(out.strip(), b"pinned")
+
+    def test_trace(self):
+        """
+        --rropt trace writes timings and counters before the launch script is exec'd.
+        """
+        trace_path = pjoin(self.tmp_dir, "trace.jsonl")
+        env = dict(environ)
+        env.pop("REZRXT_TRACE", None)
+        env["PYTHONPATH"] = pjoin(dirname(BIN_DIR), "python")
+        out = subprocess.check_output(
+            [sys.executable, self.wrapper, "--rropt", "context=model,shell=bash,tool=printenv",
+             "--rropt", "db={0},trace={1}".format(self.db_path, trace_path),
+             "REZRXT_TEST_VAR"], env=env)
+        self.assertEqual(out.strip(), b"baked")
+
+        with open(trace_path) as f_handle:
+            lines = f_handle.readlines()
+        self.assertEqual(len(lines), 1)
+        trace = json.loads(lines[0])
+        self.assertEqual((trace["meta"]["context"], trace["meta"]["launch"]), ("model", "script"))
+        for name in ("wrapper.args", "wrapper.connect", "reader.launch_script"):
+            self.assertEqual(trace["phases"][name]["calls"], 1)
+        self.assertTrue(trace["counters"]["fs.stat"] > 0)
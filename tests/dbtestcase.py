@@ -0,0 +1,35 @@
+"""
+dbtestcase.py - base of the tests which work on a copy of the test database.
+"""
+from os.path import realpath, dirname
+from os.path import join as pjoin
+import json
+import shutil
+import tempfile
+import unittest
+
+TEST_DB = pjoin(realpath(dirname(__file__)), "db_root")
+SAMPLE = pjoin(TEST_DB, "context", "model", "name", "houdini", "timestamp", "1503265457",
+               "model-houdini-1503265457.rxt")
+
+
+def load_sample():
+    """
+    Return the sample resolve of the test database, model houdini 1503265457.
+    """
+    with open(SAMPLE) as f_handle:
+        return json.load(f_handle)
+
+
+class DbTestCase(unittest.TestCase):
+    """
+    Copies the test database to self.db_path, under a temporary directory,
+    self.tmp_dir, which is removed afterwards.
+    """
+    def setUp(self):
+        self.tmp_dir = realpath(tempfile.mkdtemp())
+        self.db_path = pjoin(self.tmp_dir, "db_root")
+        shutil.copytree(TEST_DB, self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
@@ -0,0 +1,173 @@
+"""
+frozentest.py
+"""
+from os.path import join as pjoin
+import unittest
+
+from rezrxt import backends, instrument
+from rezrxt.cache import RxtCache
+from rezrxt.filebacked.reader import RezRxtDbReader as FileReader
+from rezrxt.filebacked.writer import RezRxtDbWriter, RezRxtDbWriteMgr
+from rezrxt.frozen.exporter import export_db
+from rezrxt.frozen.reader import RezRxtDbReader
+from rezrxt.sqlite.writer import RezRxtDbWriter as SqliteWriter
+from dbtestcase import DbTestCase, load_sample
+
+
+class FrozenTest(DbTestCase):
+    """
+    Tests covering frozen databases, and reading resolves from them.
+    """
+    def setUp(self):
+        super(FrozenTest, self).setUp()
+        self.sample = load_sample()
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini",
+                                             dict(self.sample, timestamp=1503267000))
+        RezRxtDbWriteMgr(self.db_path).write_tools("model", "houdini", "1503265457",
+                                                   {"houdini": ["hython"]})
+        self.frozen = pjoin(self.tmp_dir, "resolves.rxtdb")
+        self.summary = export_db(self.db_path, self.frozen)
+        self.reader = RezRxtDbReader(self.frozen, cache=False)
+
+    def tearDown(self):
+        self.reader.close()
+        super(FrozenTest, self).tearDown()
+
+    def test_export(self):
+        """
+        Every resolve of the database is read back from the export unchanged.
+        """
+        source = FileReader(self.db_path, cache=False)
+        self.assertEqual(list(self.reader.contexts()), sorted(source.contexts()))
+        resolves = 0
+        for context in source.contexts():
+            self.assertEqual(self.reader.names(context), sorted(source.names(context)))
+            for name in source.names(context):
+                timestamps = list(source.timestamps(context, name))
+                self.assertEqual(self.reader.timestamps(context, name), timestamps)
+                for t_stamp in timestamps:
+                    self.assertEqual(self.reader.rxt_dict(context, name, t_stamp),
+                                     source.rxt_dict(context, name, t_stamp))
+                    resolves += 1
+        self.assertEqual(self.summary["resolves"], resolves)
+        self.assertEqual(self.reader.tools("model", "houdini", 1503265457),
+                         {"houdini": ["hython"]})
+        self.assertEqual(self.reader.tools("model", "houdini", 1503267000), None)
+        self.assertEqual(self.reader.launch_script("model", "houdini", 1503265457, "bash"), None)
+
+    def test_lookups(self):
+        """
+        Exact and approximate lookups, and ranges, bisect the records of a name.
+        """
+        reader = self.reader
+        self.assertEqual(reader.timestamps("model", "houdini"),
+                         [1503265457, 1503266406, 1503267000])
+        self.assertEqual(reader.resolve_timestamp("model", "houdini", 1503266500, True),
+                         1503266406)
+        self.assertEqual(reader.resolve_timestamp("model", "houdini", 1503266406, True),
+                         1503266406)
+        self.assertEqual(reader.resolve_timestamp("model", "houdini", 1, True), 1503265457)
+        self.assertEqual(reader.resolve_timestamp("model", "houdini", 1603266500, True),
+                         1503267000)
+        self.assertEqual(reader.resolve("model", "houdini", 1503266500, approximate=True),
+                         "{0}#model/houdini/1503266406".format(self.frozen))
+        self.assertEqual(reader.timestamp_range("model", "houdini", 1503266406, 1503267000,
+                                                include_start=False),
+                         [1503267000])
+        self.assertEqual(reader.timestamp_range("model", "houdini", end=1503267000,
+                                                include_end=False, reverse=True, limit=1),
+                         [1503266406])
+        self.assertEqual(reader.latest("model", "houdini", 2), [1503267000, 1503266406])
+        self.assertEqual(reader.timestamp_range("model", "houdini", 1603266500), [])
+        self.assertEqual(reader.rxt_fields("model", "houdini", 1503267000, ["timestamp"]),
+                         {"timestamp": 1503267000})
+        self.assertEqual([t_stamp for t_stamp, _ in reader.stream_rxt_fields(
+            "model", "houdini", ["timestamp"], start=1503266000, reverse=True)],
+                         [1503267000, 1503266406])
+
+        snapshot = reader.snapshot(["model"], 1503266500)
+        self.assertEqual(sorted(snapshot["model"]), ["houdini", "modo"])
+        self.assertEqual(snapshot["model"]["houdini"]["timestamp"], 1503266406)
+        self.assertFalse("graph" in snapshot["model"]["houdini"]["header"])
+
+    def test_missing(self):
+        """
+        Missing contexts, names and timestamps raise KeyError.
+        """
+        reader = self.reader
+        self.assertRaises(KeyError, reader.names, "anim")
+        self.assertRaises(KeyError, reader.timestamps, "model", "nuke")
+        self.assertRaises(KeyError, reader.timestamps, "aaa", "houdini")
+        self.assertRaises(KeyError, reader.rxt_dict, "model", "houdini", 1503266500)
+        self.assertRaises(KeyError, reader.resolve_timestamp, "model", "nuke", 1503266500, True)
+        self.assertRaises(KeyError, reader.snapshot, ["zzz"], 1503266500)
+
+    def test_no_syscalls(self):
+        """
+        Lookups are answered from the mapping, without touching the file system.
+        """
+        previous = instrument._TRACE
+        trace = instrument._TRACE = instrument.Trace(None)
+        try:
+            reader = RezRxtDbReader(self.frozen, cache=RxtCache())
+            trace.counters.clear()
+            for t_stamp in (1503265000, 1503266500, 1603266500):
+                reader.rxt_dict("model", "houdini", t_stamp, approximate=True)
+                reader.tools("model", "houdini", t_stamp, approximate=True)
+            reader.names("model")
+            self.assertEqual(sum(value for name, value in trace.counters.items()
+                                 if name.startswith("fs.")), 0)
+            self.assertTrue(trace.counters["bytes.read"] > 0)
+            reader.close()
+        finally:
+            instrument._TRACE = previous
+
+    def test_reexport(self):
+        """
+        A new export replaces the file, and is seen by readers created after it.
+        """
+        cache = RxtCache()
+        before = RezRxtDbReader(self.frozen, cache=cache)
+        before.rxt_dict("model", "houdini", 1503267000)
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini",
+                                             dict(self.sample, timestamp=1503268000))
+        export_db(self.db_path, self.frozen, codec="none")
+        after = RezRxtDbReader(self.frozen, cache=cache)
+        self.assertEqual(after.latest("model", "houdini"), [1503268000])
+        self.assertEqual(before.latest("model", "houdini"), [1503267000])
+        self.assertEqual(after.rxt_dict("model", "houdini", 1503267000)["timestamp"], 1503267000)
+        before.close()
+        after.close()
+
+    def test_sqlite_export(self):
+        """
+        Databases of any backend may be exported.
+        """
+        db_path = pjoin(self.tmp_dir, "resolves.sqlite")
+        SqliteWriter(db_path).add_rxt("anim", "maya", dict(self.sample, timestamp=1503265000))
+        export_db(db_path, self.frozen)
+        reader = RezRxtDbReader(self.frozen, cache=False)
+        self.assertEqual(list(reader.contexts()), ["anim"])
+        self.assertEqual(reader.rxt_dict("anim", "maya", 1503265000)["timestamp"], 1503265000)
+        reader.close()
+
+    def test_backends(self):
+        """
+        Frozen databases are selected by suffix or prefix, and are read-only.
+        """
+        self.assertEqual(backends.parse_db(self.frozen), ("frozen", self.frozen))
+        self.assertEqual(backends.parse_db("frozen:/some/where"), ("frozen", "/some/where"))
+        self.assertTrue(backends.db_exists(self.frozen))
+        reader = backends.get_reader(self.frozen, cache=False)
+        self.assertTrue(isinstance(reader, RezRxtDbReader))
+        reader.close()
+        self.assertRaises(ValueError, backends.get_writer, self.frozen)
+
+        junk = pjoin(self.tmp_dir, "junk.rxtdb")
+        with open(junk, "w") as f_handle:
+            f_handle.write("{}" * 64)
+        self.assertRaises(ValueError, RezRxtDbReader, junk)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+indextest.py
+"""
+from os.path import isfile
+from os.path import join as pjoin
+from os import makedirs, rmdir, listdir, remove
+import json
+
+from rezrxt.filebacked.index import TimestampIndex, select_range
+from rezrxt.filebacked.reader import RezRxtDbReadMgr
+from rezrxt.filebacked.writer import RezRxtDbWriteMgr, RezRxtDbWriter
+from dbtestcase import DbTestCase
+
+
+class TimestampIndexTest(DbTestCase):
+    """
+    Tests covering the persistent timestamp index.
+    """
+    def setUp(self):
+        """
+        Copy the test database somewhere we can write to.
+        """
+        super(TimestampIndexTest, self).setUp()
+        self.mgr = RezRxtDbWriteMgr(self.db_path)
+
+    def test_rebuild_missing(self):
+        """
+        A missing index is rebuilt from the directory tree, sorted.
+        """
+        index = self.mgr.timestamp_index("model", "houdini")
+        self.assertEqual(list(index), [1503265457, 1503266406])
+        self.assertFalse(isfile(self.mgr.index_path("model", "houdini")))
+
+    def test_floor(self):
+        """
+        floor returns the closest earlier timestamp, or the earliest.
+        """
+        index = TimestampIndex("unused", "unused")
+        index.timestamps = [10, 20, 30]
+        self.assertEqual(index.floor(5), 10)
+        self.assertEqual(index.floor(20), 20)
+        self.assertEqual(index.floor(29), 20)
+        self.assertEqual(index.floor("45"), 30)
+
+    def test_range(self):
+        """
+        Ranges honor their bounds, order and limit.
+        """
+        timestamps = [10, 20, 30, 40]
+        self.assertEqual(select_range(timestamps), [10, 20, 30, 40])
+        self.assertEqual(select_range(timestamps, 20, 30), [20, 30])
+        self.assertEqual(select_range(timestamps, 20, 30, include_start=False), [30])
+        self.assertEqual(select_range(timestamps, 20, 30, include_end=False), [20])
+        self.assertEqual(select_range(timestamps, 15, 35, reverse=True), [30, 20])
+        self.assertEqual(select_range(timestamps, limit=2), [10, 20])
+        self.assertEqual(select_range(timestamps, reverse=True, limit=3), [40, 30, 20])
+        self.assertEqual(select_range(timestamps, 31, 39), [])
+        self.assertEqual(select_range(timestamps, 30, 20), [])
+
+    def test_write_updates_index(self):
+        """
+        Adding a resolve writes an index that includes the new timestamp.
+        """
+        writer = RezRxtDbWriter(self.db_path)
+        rxt_dict = {"timestamp": 1503266000}
+        writer.add_rxt("model", "houdini", rxt_dict)
+
+        with open(self.mgr.index_path("model", "houdini")) as f_handle:
+            data = json.load(f_handle)
+        self.assertEqual(data["timestamps"], [1503265457, 1503266000, 1503266406])
+        self.assertEqual(self.mgr.resolve("model", "houdini", 1503266001, approximate=True),
+                         self.mgr.rxt_path("model", "houdini", 1503266000))
+
+    def test_stale_index(self):
+        """
+        An index which no longer matches the directory is rebuilt.
+        """
+        self.mgr.reindex("model", "houdini")
+        ts_dir = self.mgr.timestamp_dir("model", "houdini", 1503266406)
+        for fname in listdir(ts_dir):
+            remove(pjoin(ts_dir, fname))
+        rmdir(ts_dir)
+
+        self.assertEqual(list(self.mgr.timestamps("model", "houdini")), [1503265457])
+
+    def test_missing_name(self):
+        """
+        Unknown keys raise KeyError.
+        """
+        self.assertRaises(KeyError, self.mgr.timestamp_index, "model", "nuke")
+
+
+class CatalogTest(DbTestCase):
+    """
+    Tests covering the root level catalog.
+    """
+    def setUp(self):
+        """
+        Copy the test database somewhere we can write to.
+        """
+        super(CatalogTest, self).setUp()
+        self.mgr = RezRxtDbWriteMgr(self.db_path)
+
+    def test_rebuild_catalog(self):
+        """
+        The catalog summarizes every context and name.
+        """
+        catalog = self.mgr.rebuild_catalog()
+        self.assertEqual(list(catalog), ["fx", "model"])
+        self.assertEqual(catalog.entry("model", "houdini"),
+                         {"count": 2, "min": 1503265457, "max": 1503266406})
+        self.assertTrue(isfile(self.mgr.catalog_path()))
+
+    def test_add_updates_catalog(self):
+        """
+        Adding a resolve updates the catalog without a walk of the tree.
+        """
+        self.mgr.rebuild_catalog()
+        writer = RezRxtDbWriter(self.db_path)
+        writer.add_rxt("lighting", "nuke", {"timestamp": 1503267000})
+        writer.add_rxt("model", "houdini", {"timestamp": 1503267001})
+
+        with open(self.mgr.catalog_path()) as f_handle:
+            data = json.load(f_handle)
+        self.assertEqual(data["contexts"]["lighting"],
+                         {"nuke": {"count": 1, "min": 1503267000, "max": 1503267000}})
+        self.assertEqual(data["contexts"]["model"]["houdini"]["max"], 1503267001)
+
+        reader = RezRxtDbWriteMgr(self.db_path)
+        self.assertEqual(list(reader.contexts()), ["fx", "lighting", "model"])
+        self.assertEqual(list(reader.names("lighting")), ["nuke"])
+
+    def test_name_added_externally(self):
+        """
+        A name added to an existing context by other means than the writer
+        makes the catalog stale.
+        """
+        self.mgr.rebuild_catalog()
+        reader = RezRxtDbReadMgr(self.db_path, ttl=0)
+        self.assertEqual(list(reader.names("model")), ["houdini", "modo"])
+        makedirs(pjoin(self.mgr.names_dir("model"), "nuke", "timestamp", "1503267000"))
+        self.assertEqual(list(reader.names("model")), ["houdini", "modo", "nuke"])
+
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini", {"timestamp": 1503267001})
+        with open(self.mgr.catalog_path()) as f_handle:
+            data = json.load(f_handle)
+        self.assertEqual(sorted(data["contexts"]["model"]), ["houdini", "modo", "nuke"])
+
+    def test_missing_context(self):
+        """
+        Unknown contexts raise KeyError.
+        """
+        self.assertRaises(KeyError, list, self.mgr.names("lighting"))
@@ -0,0 +1,78 @@
+"""
+instrumenttest.py
+"""
+from os.path import join as pjoin
+import json
+import shutil
+import tempfile
+import unittest
+
+from rezrxt import instrument
+from rezrxt.cache import RxtCache
+from rezrxt.filebacked.reader import RezRxtDbReader
+from dbtestcase import TEST_DB
+
+
+class InstrumentTest(unittest.TestCase):
+    """
+    Tests covering timings and counters.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.trace_path = pjoin(self.tmp_dir, "trace.jsonl")
+        self.saved = instrument._TRACE
+        instrument._TRACE = None
+
+    def tearDown(self):
+        instrument._TRACE = self.saved
+        shutil.rmtree(self.tmp_dir)
+
+    def test_disabled(self):
+        """
+        Nothing is recorded or written while disabled.
+        """
+        self.assertFalse(instrument.enabled())
+        with instrument.phase("reader.rxt_dict"):
+            instrument.count("fs.stat")
+        instrument.write()
+        self.assertTrue(instrument.phase("a") is instrument.phase("b"))
+
+    def test_reader(self):
+        """
+        Reads record their phases, file system calls, bytes read and cache hits.
+        """
+        # not registered to be written at exit, unlike enable
+        instrument._TRACE = instrument.Trace(self.trace_path)
+        reader = RezRxtDbReader(TEST_DB, cache=RxtCache())
+        reader.rxt_dict("fx", "houdini", 1503266474)
+        reader.rxt_dict("fx", "houdini", 1503266474)
+        reader.resolve("model", "houdini", 1503266000, approximate=True)
+
+        record = instrument._TRACE.record()
+        self.assertEqual(record["phases"]["reader.rxt_dict"]["calls"], 2)
+        self.assertEqual(record["phases"]["record.parse"]["calls"], 1)
+        self.assertEqual(record["phases"]["reader.timestamp_index"]["calls"], 1)
+        self.assertEqual(record["counters"]["bytes.read"], 3547)
+        self.assertEqual((record["counters"]["cache.hit"], record["counters"]["cache.miss"]),
+                         (1, 1))
+
+    def test_write(self):
+        """
+        The trace is appended as a single json line, once.
+        """
+        instrument._TRACE = instrument.Trace(self.trace_path)
+        instrument.annotate(context="fx")
+        with instrument.phase("wrapper.connect"):
+            instrument.count("fs.isdir", 2)
+        instrument.add_time("wrapper.args", 0.5)
+        instrument.write()
+        instrument.write()
+
+        with open(self.trace_path) as f_handle:
+            lines = f_handle.readlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record["meta"], {"context": "fx"})
+        self.assertEqual(record["counters"], {"fs.isdir": 2})
+        self.assertEqual(record["phases"]["wrapper.args"], {"calls": 1, "seconds": 0.5})
+        self.assertEqual(record["phases"]["wrapper.connect"]["calls"], 1)
@@ -0,0 +1,61 @@
+"""
+jsonscantest.py
+"""
+import json
+import unittest
+
+from rezrxt.jsonscan import scan_fields
+
+DOC = {
+    "graph": "digraph { \"a\" -> \"b\" } \\\\ done",
+    "nested": {"list": [1, [2, {"x": "]}"}], None], "empty": {}},
+    "status": "solved",
+    "num": -12.5e3,
+    "flag": False,
+    "unicode": u"caf\u00e9 \"quoted\"",
+    "last": None,
+}
+
+
+def chunked(data, size):
+    """
+    Split data into chunks of size.
+    """
+    return [data[pos:pos + size] for pos in range(0, len(data), size)]
+
+
+class ScanFieldsTest(unittest.TestCase):
+    """
+    Tests covering the extraction of top level keys from a json stream.
+    """
+    def test_every_key(self):
+        """
+        Every key is extracted, whatever the chunk boundaries.
+        """
+        data = json.dumps(DOC, indent=2)
+        for size in (1, 2, 3, 7, 64, len(data)):
+            self.assertEqual(scan_fields(chunked(data, size), DOC), DOC)
+
+    def test_selected_keys(self):
+        data = json.dumps(DOC)
+        self.assertEqual(scan_fields(chunked(data, 5), ["status", "flag", "missing"]),
+                         {"status": "solved", "flag": False})
+
+    def test_stops_early(self):
+        """
+        Chunks after the last wanted key are not read.
+        """
+        data = '{"status": "solved", "graph": "' + "x" * 1000 + '"}'
+
+        def chunks():
+            for chunk in chunked(data, 10):
+                yield chunk
+                if chunk.endswith("xxxxxxxxxx"):
+                    self.fail("read past the wanted keys")
+
+        self.assertEqual(scan_fields(chunks(), ["status"]), {"status": "solved"})
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, scan_fields, ["[1, 2]"], ["a"])
+        self.assertRaises(ValueError, scan_fields, ['{"a": 1, "b": '], ["b"])
+        self.assertRaises(ValueError, scan_fields, [""], ["a"])
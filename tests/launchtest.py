@@ -0,0 +1,88 @@
+"""
+launchtest.py
+"""
+from os import utime, stat
+
+from rezrxt.filebacked.reader import RezRxtDbReader
+from rezrxt.filebacked.writer import RezRxtDbWriteMgr
+from dbtestcase import DbTestCase
+
+
+class LaunchEnvTest(DbTestCase):
+    """
+    Tests covering baked launch scripts.
+    """
+    def setUp(self):
+        """
+        Copy the test database somewhere we can write to.
+        """
+        super(LaunchEnvTest, self).setUp()
+        self.mgr = RezRxtDbWriteMgr(self.db_path)
+        self.reader = RezRxtDbReader(self.db_path, cache=False)
+        self.mgr.write_launch_env("model", "houdini", "1503265457",
+                                  {"bash": "export FOO=bar\n"})
+
+    def test_launch_script(self):
+        """
+        A baked script is found, including via an approximate timestamp.
+        """
+        expected = self.mgr.launch_script_path("model", "houdini", 1503265457, "bash")
+        self.assertEqual(self.reader.launch_script("model", "houdini", 1503265457, "bash"),
+                         expected)
+        self.assertEqual(self.reader.launch_script("model", "houdini", 1503266000, "bash",
+                                                   approximate=True), expected)
+        with open(expected) as f_handle:
+            self.assertEqual(f_handle.read(), "export FOO=bar\n")
+
+    def test_missing(self):
+        """
+        Shells and resolves without a baked script return None.
+        """
+        self.assertEqual(self.reader.launch_script("model", "houdini", 1503265457, "tcsh"), None)
+        self.assertEqual(self.reader.launch_script("model", "houdini", 1503266406, "bash"), None)
+
+    def test_stale(self):
+        """
+        A script baked from a resolve which has since changed is not used.
+        """
+        rxt_file = self.mgr.rxt_path("model", "houdini", 1503265457)
+        r_mtime = stat(rxt_file).st_mtime
+        utime(rxt_file, (r_mtime + 10, r_mtime + 10))
+        self.assertEqual(self.reader.launch_script("model", "houdini", 1503265457, "bash"), None)
+
+
+class ToolsManifestTest(DbTestCase):
+    """
+    Tests covering the tools manifest.
+    """
+    def setUp(self):
+        """
+        Copy the test database somewhere we can write to.
+        """
+        super(ToolsManifestTest, self).setUp()
+        self.mgr = RezRxtDbWriteMgr(self.db_path)
+        self.reader = RezRxtDbReader(self.db_path, cache=False)
+        self.tools = {"houdini": ["hbatch", "houdini", "hython"], "renderman": ["prman"]}
+        self.mgr.write_tools("model", "houdini", "1503265457", self.tools)
+
+    def test_tools(self):
+        """
+        The manifest is returned, including via an approximate timestamp.
+        """
+        self.assertEqual(self.reader.tools("model", "houdini", 1503265457), self.tools)
+        self.assertEqual(self.reader.tools("model", "houdini", 1503266000, approximate=True),
+                         self.tools)
+
+    def test_missing(self):
+        """
+        Resolves without a manifest return None.
+        """
+        self.assertEqual(self.reader.tools("model", "houdini", 1503266406), None)
+
+    def test_get_tools(self):
+        """
+        The wrapper lists tools from the manifest without rez.
+        """
+        from rezrxt import cli
+        self.assertEqual(list(cli.get_tools(self.reader, "model", "houdini", 1503265500)),
+                         sorted(self.tools.items()))
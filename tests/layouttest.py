@@ -0,0 +1,195 @@
+"""
+layouttest.py
+"""
+from os.path import realpath, exists, isdir
+from os.path import join as pjoin
+from os import listdir
+import unittest
+
+from rezrxt import instrument
+from rezrxt.filebacked.layout import Layout, list_timestamps
+from rezrxt.filebacked.migrate import relayout
+from rezrxt.filebacked.packer import pack_db
+from rezrxt.filebacked.prune import RetentionPolicy, prune
+from rezrxt.filebacked.reader import RezRxtDbReader
+from rezrxt.filebacked.replica import sync_replica, ReplicaReader
+from rezrxt.filebacked.writer import RezRxtDbWriter, RezRxtDbWriteMgr
+from dbtestcase import DbTestCase, load_sample
+
+
+# 2017-07-14, 2017-08-21 and 2017-08-22 gmt
+JULY = 1500000000
+AUG_21 = 1503300000
+AUG_22 = 1503400000
+
+
+class LayoutTest(DbTestCase):
+    """
+    Tests covering bucketed layouts, and migrating between layouts.
+    """
+    def setUp(self):
+        super(LayoutTest, self).setUp()
+        self.sample = load_sample()
+        self.t_dir = pjoin(self.db_path, "context", "model", "name", "houdini", "timestamp")
+
+    def add(self, timestamp):
+        """
+        Add a copy of the sample resolve to model houdini.
+        """
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini",
+                                             dict(self.sample, timestamp=timestamp))
+
+    def test_layout(self):
+        """
+        Layouts place timestamps in buckets by their gmt date, and are read
+        from the root of the database.
+        """
+        self.assertEqual(Layout.read(self.db_path), Layout())
+        self.assertEqual(Layout().timestamp_dir("/t", 1503265457), "/t/1503265457")
+        self.assertEqual(Layout("day").timestamp_dir("/t", 1503265457),
+                         "/t/2017/08/20/1503265457")
+        self.assertEqual(Layout("year").bucket(JULY), ["2017"])
+        self.assertRaises(ValueError, Layout, "week")
+        Layout("month").save(self.db_path)
+        self.assertEqual(Layout.read(self.db_path).version, 2)
+        self.assertEqual(Layout.read(self.db_path).buckets, "month")
+
+    def test_bucketed(self):
+        """
+        Resolves of a bucketed database are written to and read from their
+        bucket, alongside those written before it was bucketed.
+        """
+        Layout("day").save(self.db_path)
+        for t_stamp in (JULY, AUG_21, AUG_22):
+            self.add(t_stamp)
+        self.assertTrue(isdir(pjoin(self.t_dir, "2017", "08", "22", str(AUG_22))))
+        self.assertTrue(isdir(pjoin(self.t_dir, "2017", "07", "14", str(JULY))))
+        self.assertEqual(list_timestamps(self.t_dir),
+                         set([JULY, 1503265457, 1503266406, AUG_21, AUG_22]))
+
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(list(reader.timestamps("model", "houdini")),
+                         [JULY, 1503265457, 1503266406, AUG_21, AUG_22])
+        self.assertEqual(reader.rxt_dict("model", "houdini", AUG_21)["timestamp"], AUG_21)
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503265457), self.sample)
+        for t_stamp, expected in ((AUG_22 + 1, AUG_22), (AUG_22 - 1, AUG_21),
+                                  (1503265000, JULY), (1, JULY)):
+            self.assertEqual(reader.resolve_timestamp("model", "houdini", t_stamp, True),
+                             expected)
+
+    def test_stale_floor(self):
+        """
+        An approximate resolve against a stale index lists only the buckets
+        it needs.
+        """
+        Layout("day").save(self.db_path)
+        relayout(self.db_path, "day")
+        for t_stamp in [JULY + day * 86400 for day in range(20)] + [AUG_21]:
+            self.add(t_stamp)
+        # written by a writer which does not update the index
+        RezRxtDbWriteMgr(self.db_path).write_record("model", "houdini", AUG_22,
+                                                    dict(self.sample, timestamp=AUG_22))
+        RezRxtDbWriteMgr(self.db_path).touch_timestamps_dir("model", "houdini")
+
+        previous = instrument._TRACE
+        trace = instrument._TRACE = instrument.Trace(None)
+        try:
+            reader = RezRxtDbReader(self.db_path, cache=False)
+            trace.counters.clear()
+            self.assertEqual(reader.resolve_timestamp("model", "houdini", AUG_22 + 60, True),
+                             AUG_22)
+            self.assertTrue(trace.counters["fs.listdir"] <= 4)
+            trace.counters.clear()
+            self.assertEqual(reader.resolve_timestamp("model", "houdini", AUG_22 - 1, True),
+                             AUG_21)
+            self.assertTrue(trace.counters["fs.listdir"] <= 6)
+        finally:
+            instrument._TRACE = previous
+        self.assertEqual(reader.resolve_timestamp("model", "houdini", 1, True), JULY)
+
+    def test_floor_finer_buckets(self):
+        """
+        Timestamps still in the buckets of a finer layout, during a migration
+        to a coarser one, are found.
+        """
+        relayout(self.db_path, "day")
+        self.add(AUG_21)
+        self.add(AUG_22)
+        self.assertEqual(Layout("month").floor(self.t_dir, 1503266500), 1503266406)
+        self.assertEqual(Layout("month").floor(self.t_dir, AUG_22 - 1), AUG_21)
+        self.assertEqual(Layout("year").floor(self.t_dir, AUG_22 + 1), AUG_22)
+        self.assertEqual(Layout("month").floor(self.t_dir, 1503265000), None)
+
+    def test_relayout(self):
+        """
+        Migrating moves every resolve to the new layout, and readers created
+        before it still find them.
+        """
+        self.add(AUG_21)
+        RezRxtDbWriteMgr(self.db_path).write_tools("model", "houdini", AUG_21,
+                                                   {"houdini": ["hython"]})
+        before = RezRxtDbReader(self.db_path, cache=False)
+        moved = []
+        summary = relayout(self.db_path, "month",
+                           callback=lambda context, name, count: moved.append((context, name)))
+        self.assertEqual((summary["names"], summary["moved"]), (3, 5))
+        self.assertEqual(len(moved), 3)
+        self.assertEqual(Layout.read(self.db_path), Layout("month"))
+        self.assertEqual(listdir(self.t_dir), ["2017"])
+        self.assertTrue(isdir(pjoin(self.t_dir, "2017", "08", str(AUG_21))))
+
+        self.assertEqual(before.rxt_dict("model", "houdini", 1503265457), self.sample)
+        self.assertEqual(before.rxt_dict("model", "houdini", AUG_21 + 1,
+                                         approximate=True)["timestamp"], AUG_21)
+        after = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(list(after.timestamps("model", "houdini")),
+                         [1503265457, 1503266406, AUG_21])
+        self.assertEqual(after.tools("model", "houdini", AUG_21), {"houdini": ["hython"]})
+        self.assertEqual(after.rxt_dict("fx", "houdini", 1503266474)["timestamp"], 1503266474)
+
+        # a resolve left in the old layout by a writer started before the migration
+        straggler = RezRxtDbWriteMgr(self.db_path)
+        straggler.layout = Layout()
+        straggler.write_rxt("model", "houdini", AUG_22, dict(self.sample, timestamp=AUG_22))
+        self.assertEqual(after.rxt_dict("model", "houdini", AUG_22)["timestamp"], AUG_22)
+        summary = relayout(self.db_path, "month")
+        self.assertEqual((summary["names"], summary["moved"]), (1, 1))
+        self.assertEqual(after.rxt_dict("model", "houdini", AUG_22)["timestamp"], AUG_22)
+        self.assertEqual(relayout(self.db_path, "month")["moved"], 0)
+
+        relayout(self.db_path, None)
+        self.assertEqual(Layout.read(self.db_path), Layout())
+        self.assertTrue(isdir(pjoin(self.t_dir, str(AUG_21))))
+        self.assertEqual(after.rxt_dict("model", "houdini", AUG_21)["timestamp"], AUG_21)
+
+    def test_maintenance(self):
+        """
+        Bucketed resolves are pruned, packed and synced to replicas.
+        """
+        Layout("day").save(self.db_path)
+        for t_stamp in (AUG_21, AUG_22):
+            self.add(t_stamp)
+        summary = prune(self.db_path, RetentionPolicy(keep_last=2), contexts=["model"],
+                        names=["houdini"])
+        self.assertEqual(summary["removed"], 2)
+        self.assertFalse(exists(pjoin(self.t_dir, "1503265457")))
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(list(reader.timestamps("model", "houdini")), [AUG_21, AUG_22])
+
+        summary = pack_db(self.db_path, AUG_22, contexts=["model"], names=["houdini"])
+        self.assertEqual(summary["packed"], 1)
+        self.assertFalse(isdir(pjoin(self.t_dir, "2017", "08", "21", str(AUG_21))))
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(reader.rxt_dict("model", "houdini", AUG_21)["timestamp"], AUG_21)
+        self.assertEqual(reader.resolve_timestamp("model", "houdini", AUG_22 - 1, True), AUG_21)
+
+        replica = pjoin(self.tmp_dir, "local", "replica")
+        sync_replica(self.db_path, replica)
+        reader = ReplicaReader(replica, self.db_path, cache=False)
+        self.assertEqual(reader.replica.read_mgr.layout, Layout("day"))
+        self.assertTrue(reader.resolve("model", "houdini", AUG_22).startswith(realpath(replica)))
+        self.assertEqual(reader.rxt_dict("model", "houdini", AUG_22)["timestamp"], AUG_22)
+
+
+if __name__ == "__main__":
+    unittest.main()
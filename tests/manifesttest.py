@@ -0,0 +1,69 @@
+"""
+manifesttest.py
+"""
+from os.path import join as pjoin
+
+from rezrxt import backends, manifest
+from rezrxt.filebacked.reader import RezRxtDbReader
+from rezrxt.filebacked.writer import RezRxtDbWriter
+from dbtestcase import DbTestCase
+
+
+class SnapshotTest(DbTestCase):
+    """
+    Tests covering as-of snapshots and job manifests.
+    """
+    def setUp(self):
+        super(SnapshotTest, self).setUp()
+        self.reader = RezRxtDbReader(self.db_path, cache=False)
+
+    def test_snapshot(self):
+        """
+        Every name resolves as an approximate resolve would.
+        """
+        snapshot = self.reader.snapshot(["model", "fx"], 1503266000)
+        self.assertEqual(sorted(snapshot), ["fx", "model"])
+        self.assertEqual(sorted(snapshot["model"]), ["houdini", "modo"])
+        for context, names in snapshot.items():
+            for name, entry in names.items():
+                t_stamp = self.reader.resolve_timestamp(context, name, 1503266000, True)
+                self.assertEqual(entry["timestamp"], t_stamp)
+                self.assertEqual(entry["location"], self.reader.location(context, name, t_stamp))
+                self.assertEqual(entry["header"]["timestamp"], t_stamp)
+                self.assertFalse("graph" in entry["header"])
+
+    def test_snapshot_missing_context(self):
+        with self.assertRaises(KeyError):
+            self.reader.snapshot(["nope"], 1503266000)
+
+    def test_snapshot_formats(self):
+        """
+        Headers are the same whatever the storage format of the resolve.
+        """
+        rxt = self.reader.rxt_dict("model", "houdini", 1503265457)
+        writer = RezRxtDbWriter(self.db_path)
+        writer.mgr.write_rxt("lgt", "split", 1503265457, rxt, split=True)
+        writer.mgr.write_rxt("lgt", "dedup", 1503265457, rxt, dedup=True)
+        snapshot = self.reader.snapshot(["lgt", "model"], 1503265457)
+        expected = snapshot["model"]["houdini"]["header"]
+        self.assertEqual(snapshot["lgt"]["split"]["header"], expected)
+        self.assertEqual(snapshot["lgt"]["dedup"]["header"], expected)
+
+    def test_manifest(self):
+        """
+        Manifests round trip, and pin the resolves of their snapshot.
+        """
+        job = manifest.build_manifest(self.reader, self.db_path, ["model"], 1503266000)
+        path = pjoin(self.tmp_dir, "job.json")
+        manifest.write_manifest(path, job)
+        job = manifest.read_manifest(path)
+        self.assertEqual(job["db"], backends.realdb(self.db_path))
+        self.assertEqual(manifest.pinned_timestamp(job, "model", "houdini"), 1503265457)
+        self.assertIsNone(manifest.pinned_timestamp(job, "fx", "houdini"))
+
+    def test_read_manifest_invalid(self):
+        path = pjoin(self.tmp_dir, "job.json")
+        with open(path, "w") as f_handle:
+            f_handle.write("[]")
+        with self.assertRaises(ValueError):
+            manifest.read_manifest(path)
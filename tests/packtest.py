@@ -0,0 +1,137 @@
+"""
+packtest.py
+"""
+from os.path import realpath, exists, isdir
+from os.path import join as pjoin
+from os import listdir
+import json
+
+from rezrxt.exceptions import DuplicateKeyError, PackedResolveError
+from rezrxt.filebacked.pack import PackIndex
+from rezrxt.filebacked.packer import pack_db
+from rezrxt.filebacked.prune import RetentionPolicy, prune
+from rezrxt.filebacked.reader import RezRxtDbReader
+from rezrxt.filebacked.replica import sync_replica, ReplicaReader
+from rezrxt.filebacked.writer import RezRxtDbWriter, RezRxtDbWriteMgr
+from dbtestcase import DbTestCase, load_sample
+
+
+class PackTest(DbTestCase):
+    """
+    Tests covering pack files, and reading resolves from them.
+    """
+    def setUp(self):
+        super(PackTest, self).setUp()
+        self.sample = load_sample()
+        self.name_dir = pjoin(self.db_path, "context", "model", "name", "houdini")
+
+    def add(self, timestamp, **keys):
+        """
+        Add a copy of the sample resolve, with keys replaced.
+        """
+        rxt = dict(self.sample, timestamp=timestamp, **keys)
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini", rxt)
+        return rxt
+
+    def test_pack(self):
+        """
+        Packed resolves are read as they were while loose.
+        """
+        RezRxtDbWriteMgr(self.db_path).write_tools("model", "houdini", "1503265457",
+                                                   {"houdini": ["hython"]})
+        newer = self.add(1503267000)
+        summary = pack_db(self.db_path, 1503266500, contexts=["model"], names=["houdini"])
+        self.assertEqual((summary["names"], summary["packed"], summary["inodes"]), (1, 2, 5))
+        self.assertEqual(listdir(pjoin(self.name_dir, "timestamp")), ["1503267000"])
+
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(list(reader.timestamps("model", "houdini")),
+                         [1503265457, 1503266406, 1503267000])
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503265457), self.sample)
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503266500, approximate=True),
+                         reader.rxt_dict("model", "houdini", 1503266406))
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503267000), newer)
+        self.assertTrue(reader.location("model", "houdini", 1503265457).endswith(
+            "timestamps.1.pack#1503265457"))
+        self.assertRaises(PackedResolveError, reader.resolve, "model", "houdini", 1503265457)
+        self.assertEqual(reader.location("model", "houdini", 1503267000),
+                         reader.resolve("model", "houdini", 1503267000))
+        self.assertEqual(list(reader.rxt_files("model", "houdini")),
+                         [reader.location("model", "houdini", 1503265457),
+                          reader.location("model", "houdini", 1503266406),
+                          reader.resolve("model", "houdini", 1503267000)])
+        self.assertEqual(reader.rxt_fields("model", "houdini", 1503265457, ["status", "nope"]),
+                         {"status": self.sample["status"]})
+        self.assertEqual(dict(reader.rxt_lazy("model", "houdini", 1503265457)), self.sample)
+        self.assertEqual([t_stamp for t_stamp, _ in
+                          reader.stream_rxt_fields("model", "houdini", ["status"])],
+                         [1503265457, 1503266406, 1503267000])
+        self.assertEqual(reader.tools("model", "houdini", 1503265457), {"houdini": ["hython"]})
+        self.assertEqual(reader.tools("model", "houdini", 1503266406), None)
+        self.assertEqual(reader.launch_script("model", "houdini", 1503265457, "bash"), None)
+        snapshot = reader.snapshot(["model"], 1503266000)
+        self.assertTrue(snapshot["model"]["houdini"]["location"].endswith("#1503265457"))
+        self.assertRaises(KeyError, reader.rxt_dict, "model", "houdini", 1503265458)
+
+        self.assertRaises(DuplicateKeyError, self.add, 1503265457)
+        mgr = RezRxtDbWriteMgr(self.db_path)
+        self.assertEqual(mgr.reindex("model", "houdini").timestamps,
+                         [1503265457, 1503266406, 1503267000])
+        self.assertEqual(mgr.rebuild_catalog().entry("model", "houdini")["count"], 3)
+
+    def test_append(self):
+        """
+        Later packings append to the pack, and split resolves are merged.
+        """
+        pack_db(self.db_path, 1503266000)
+        with open(pjoin(self.db_path, "config.json"), "w") as f_handle:
+            json.dump({"split": True, "codec": "zlib"}, f_handle)
+        split = self.add(1503267000)
+        pack_db(self.db_path, 1503268000)
+        pack = PackIndex.read(self.name_dir)
+        self.assertEqual((pack.pack, pack.timestamps()),
+                         ("timestamps.1.pack", [1503265457, 1503266406, 1503267000]))
+        self.assertFalse(isdir(pjoin(self.name_dir, "timestamp", "1503267000")))
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503267000), split)
+        self.assertEqual(reader.rxt_dict("fx", "houdini", 1503266474)["timestamp"], 1503266474)
+
+    def test_prune(self):
+        """
+        Pruning a packed resolve writes the next generation of the pack, and
+        readers holding the previous one find the resolves it kept.
+        """
+        with open(pjoin(self.db_path, "config.json"), "w") as f_handle:
+            json.dump({"dedup": True}, f_handle)
+        self.add(1503267000, rez_version="2.13.0")
+        pack_db(self.db_path, 1503268000)
+        reader = RezRxtDbReader(self.db_path, cache=False, ttl=60)
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503267000)["rez_version"],
+                         "2.13.0")
+
+        summary = prune(self.db_path, RetentionPolicy(keep_last=1), blob_grace=-60)
+        self.assertEqual((summary["removed"], summary["blobs"]), (2, 0))
+        self.assertTrue(summary["bytes"] > 0)
+        pack = PackIndex.read(self.name_dir)
+        self.assertEqual((pack.pack, pack.timestamps()), ("timestamps.2.pack", [1503267000]))
+        self.assertFalse(exists(pjoin(self.name_dir, "timestamps.1.pack")))
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503267000)["rez_version"],
+                         "2.13.0")
+        self.assertEqual(list(RezRxtDbReader(self.db_path).timestamps("model", "houdini")),
+                         [1503267000])
+
+    def test_replica(self):
+        """
+        Packs are synced to replicas, and resolves read from them there.
+        """
+        pack_db(self.db_path, 1503266500)
+        replica = pjoin(self.tmp_dir, "local", "replica")
+        summary = sync_replica(self.db_path, replica)
+        self.assertEqual(summary["copied"], 3)
+        reader = ReplicaReader(replica, self.db_path, cache=False)
+        self.assertTrue(reader.location("model", "houdini", 1503265457).startswith(
+            realpath(replica)))
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503265457), self.sample)
+
+        summary = sync_replica(self.db_path, replica)
+        self.assertEqual((summary["copied"], summary["linked"]), (0, 3))
@@ -0,0 +1,156 @@
+"""
+pkgindextest.py
+"""
+from os.path import exists
+from os.path import join as pjoin
+from os import listdir
+import json
+import unittest
+
+from rezrxt import instrument
+from rezrxt.filebacked import pkgindex
+from rezrxt.filebacked.pkgindex import PackageIndex, parse_package, rebuild
+from rezrxt.filebacked.prune import RetentionPolicy, prune
+from rezrxt.filebacked.reader import RezRxtDbReader
+from rezrxt.filebacked.writer import RezRxtDbWriter
+from dbtestcase import DbTestCase, load_sample
+
+
+class PackageIndexTest(DbTestCase):
+    """
+    Tests covering the package index, and finding the resolves using a package.
+    """
+    def setUp(self):
+        super(PackageIndexTest, self).setUp()
+        self.sample = load_sample()
+        self.index = PackageIndex(pjoin(self.db_path, "pkgindex"))
+        self.journal_bytes = pkgindex.JOURNAL_BYTES
+
+    def tearDown(self):
+        pkgindex.JOURNAL_BYTES = self.journal_bytes
+        super(PackageIndexTest, self).tearDown()
+
+    def add(self, timestamp, context="model", name="houdini", houdini="16.0.564", variant=0):
+        """
+        Add a copy of the sample resolve, resolving another houdini.
+        """
+        rxt_dict = json.loads(json.dumps(self.sample))
+        rxt_dict["timestamp"] = timestamp
+        for package in rxt_dict["resolved_packages"]:
+            if package["variables"]["name"] == "houdini":
+                package["variables"].update(version=houdini, index=variant)
+        RezRxtDbWriter(self.db_path).add_rxt(context, name, rxt_dict)
+
+    def test_parse_package(self):
+        """
+        Packages are requested by name, and optionally version and variant.
+        """
+        self.assertEqual(parse_package("houdini"), ("houdini", None, None))
+        self.assertEqual(parse_package("houdini-16.0.564"), ("houdini", "16.0.564", None))
+        self.assertEqual(parse_package("houdini-16.0.564[1]"), ("houdini", "16.0.564", 1))
+        self.assertEqual(parse_package("os-CentOS-7.3.1611"), ("os", "CentOS-7.3.1611", None))
+        self.assertRaises(ValueError, parse_package, "houdini[x]")
+        self.assertRaises(ValueError, parse_package, "-16.0")
+
+    def test_add(self):
+        """
+        The writer records the packages of each resolve it adds, and they are
+        found whether in the journal or folded into the package files.
+        """
+        self.add(1503267000)
+        self.add(1503268000, context="fx", houdini="16.5.268", variant=1)
+        self.assertEqual(sorted(listdir(self.index.path)), [".lock", "journal"])
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(reader.find_package("houdini"),
+                         [("fx", "houdini", 1503268000, "16.5.268", 1),
+                          ("model", "houdini", 1503267000, "16.0.564", 0)])
+        self.assertEqual(reader.find_package("houdini", "16.5.268"),
+                         [("fx", "houdini", 1503268000, "16.5.268", 1)])
+        self.assertEqual(reader.find_package("houdini", "16.0.564", 1), [])
+        self.assertEqual(len(reader.find_package("platform", "linux", None)), 2)
+        self.assertEqual(reader.find_package("nuke"), [])
+
+        pkgindex.JOURNAL_BYTES = 0
+        self.add(1503269000, houdini="16.5.268", variant=1)
+        self.assertEqual(self.index.read_journal(), [])
+        self.assertTrue(exists(self.index.package_path("houdini")))
+        self.assertEqual(reader.find_package("houdini", "16.5.268"),
+                         [("fx", "houdini", 1503268000, "16.5.268", 1),
+                          ("model", "houdini", 1503269000, "16.5.268", 1)])
+        self.assertEqual(self.index.packages(),
+                         ["arch", "houdini", "os", "platform", "renderman"])
+
+        # folding twice, as after a crash before the journal was emptied, is harmless
+        pkgindex.JOURNAL_BYTES = self.journal_bytes
+        self.add(1503270000)
+        with open(self.index.journal_path()) as f_handle:
+            journal = f_handle.read()
+        self.index.fold()
+        with open(self.index.journal_path(), "w") as f_handle:
+            f_handle.write(journal + "[\"model\", \"hou")
+        self.index.fold()
+        self.assertEqual(len(reader.find_package("houdini")), 4)
+
+    def test_find_reads_two_files(self):
+        """
+        A query reads the journal and the file of the package, and nothing else.
+        """
+        pkgindex.JOURNAL_BYTES = 0
+        for t_stamp in range(1503267000, 1503267010):
+            self.add(t_stamp)
+        previous = instrument._TRACE
+        trace = instrument._TRACE = instrument.Trace(None)
+        try:
+            self.assertEqual(len(self.index.find("houdini", "16.0.564")), 10)
+            self.assertEqual(trace.counters["fs.open"], 2)
+            self.assertFalse("fs.listdir" in trace.counters)
+        finally:
+            instrument._TRACE = previous
+
+    def test_rebuild(self):
+        """
+        The index is rebuilt from every resolve, keeping resolves added
+        meanwhile, even once folded from the journal.
+        """
+        summary = rebuild(self.db_path, jobs=2)
+        self.assertEqual((summary["names"], summary["resolves"], summary["packages"]), (3, 4, 6))
+        self.assertEqual(self.index.find("houdini", "16.0.671"),
+                         [("fx", "houdini", 1503266474, "16.0.671", 0),
+                          ("model", "houdini", 1503266406, "16.0.671", 0)])
+        self.assertEqual(self.index.find("modo"), [("model", "modo", 1503265357, "11.1.1", 0)])
+        self.assertEqual(self.index.read_journal(), [])
+
+        self.add(1503267000, houdini="16.5.268")
+        self.index.replace([("model", "modo", 1503265357, [("modo", "11.1.1", 0)])])
+        self.assertEqual(self.index.packages(),
+                         ["arch", "houdini", "modo", "os", "platform", "renderman"])
+        self.assertEqual(self.index.find("houdini"),
+                         [("model", "houdini", 1503267000, "16.5.268", 0)])
+
+        # added while the resolves are read, and folded into the package files
+        before = self.index.keys()
+        self.assertEqual(before, set([("model", "houdini", 1503267000),
+                                      ("model", "modo", 1503265357)]))
+        pkgindex.JOURNAL_BYTES = 0
+        self.add(1503268000, houdini="16.5.268")
+        self.index.replace([("model", "modo", 1503265357, [("modo", "11.1.1", 0)])],
+                           before=before)
+        self.assertEqual(self.index.find("houdini"),
+                         [("model", "houdini", 1503268000, "16.5.268", 0)])
+
+    def test_prune(self):
+        """
+        Pruned resolves are dropped from the index.
+        """
+        rebuild(self.db_path, jobs=1)
+        self.add(1503267000)
+        prune(self.db_path, RetentionPolicy(keep_last=1), contexts=["model"], names=["houdini"])
+        self.assertEqual(self.index.find("houdini"),
+                         [("fx", "houdini", 1503266474, "16.0.671", 0),
+                          ("model", "houdini", 1503267000, "16.0.564", 0)])
+        self.assertEqual([row[:3] for row in self.index.find("renderman")],
+                         [("fx", "houdini", 1503266474), ("model", "houdini", 1503267000)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+prunetest.py
+"""
+from os.path import exists
+from os.path import join as pjoin
+from os import listdir, makedirs, utime
+import json
+import unittest
+
+from rezrxt.manifest import write_manifest
+from rezrxt.filebacked.prune import RetentionPolicy, prune, manifest_pins, DAY
+from rezrxt.filebacked.reader import RezRxtDbReader
+from rezrxt.filebacked.writer import RezRxtDbWriter, RezRxtDbWriteMgr
+from dbtestcase import DbTestCase, SAMPLE, load_sample
+
+
+class RetentionPolicyTest(unittest.TestCase):
+    """
+    Tests covering the rules of a retention policy.
+    """
+    def test_keep_last(self):
+        """
+        The most recent timestamps are kept.
+        """
+        policy = RetentionPolicy(keep_last=2)
+        self.assertEqual(policy.keep("fx", "houdini", [1, 2, 3, 4]), set([3, 4]))
+        self.assertEqual(policy.keep("fx", "houdini", [1]), set([1]))
+
+    def test_daily_after(self):
+        """
+        Recent timestamps are all kept, and only the last of each day before that.
+        """
+        policy = RetentionPolicy(daily_after=2)
+        now = 10 * DAY
+        timestamps = [DAY + 10, DAY + 20, 2 * DAY, 3 * DAY + 5, 9 * DAY, 9 * DAY + 1]
+        self.assertEqual(policy.keep("fx", "houdini", timestamps, now),
+                         set([DAY + 20, 2 * DAY, 3 * DAY + 5, 9 * DAY, 9 * DAY + 1]))
+
+    def test_pinned(self):
+        """
+        Pinned timestamps are kept, whatever the other rules.
+        """
+        policy = RetentionPolicy(keep_last=1, pinned=[("fx", "houdini", "2")])
+        self.assertEqual(policy.keep("fx", "houdini", [1, 2, 3]), set([2, 3]))
+        self.assertEqual(policy.keep("fx", "nuke", [1, 2, 3]), set([3]))
+
+    def test_invalid(self):
+        """
+        A policy must keep the most recent resolve.
+        """
+        self.assertRaises(ValueError, RetentionPolicy)
+        self.assertRaises(ValueError, RetentionPolicy, pinned=[("fx", "houdini", 1)])
+        self.assertRaises(ValueError, RetentionPolicy, keep_last=0)
+        self.assertRaises(ValueError, RetentionPolicy, daily_after=-1)
+
+    def test_from_config(self):
+        """
+        Rules come from the config, unless overridden.
+        """
+        config = {"retention": {"keep_last": 5, "daily_after": 30}}
+        policy = RetentionPolicy.from_config(config, keep_last=2)
+        self.assertEqual((policy.keep_last, policy.daily_after), (2, 30))
+        self.assertRaises(ValueError, RetentionPolicy.from_config, {"retention": None})
+
+
+class PruneTest(DbTestCase):
+    """
+    Tests covering the pruning of a database.
+    """
+    def add(self, timestamp, **keys):
+        """
+        Add a copy of the sample resolve, with keys replaced.
+        """
+        rxt = load_sample()
+        rxt.update(keys, timestamp=timestamp)
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini", rxt)
+
+    def test_prune(self):
+        """
+        Timestamps the policy does not keep are removed, and the index and
+        catalog reflect it.
+        """
+        self.add(1503267000)
+        reader = RezRxtDbReader(self.db_path, ttl=0)
+        removed = []
+        summary = prune(self.db_path, RetentionPolicy(keep_last=1),
+                        callback=lambda *args: removed.append(args))
+        self.assertEqual((summary["names"], summary["removed"], summary["kept"]), (1, 2, 3))
+        self.assertTrue(summary["bytes"] > 0)
+        self.assertEqual(summary["inodes"], 4)
+        self.assertTrue(("model", "houdini", [1503265457, 1503266406]) in removed)
+
+        t_dir = pjoin(self.db_path, "context", "model", "name", "houdini", "timestamp")
+        self.assertEqual(listdir(t_dir), ["1503267000"])
+        self.assertEqual(list(reader.timestamps("model", "houdini")), [1503267000])
+        self.assertEqual(reader.resolve_timestamp("model", "houdini", 1503265500, True),
+                         1503267000)
+        mgr = RezRxtDbWriteMgr(self.db_path)
+        self.assertFalse(mgr.timestamp_index("model", "houdini").read_current() is None)
+        self.assertEqual(mgr.catalog().entry("model", "houdini"),
+                         {"count": 1, "min": 1503267000, "max": 1503267000})
+
+    def test_stale_writer(self):
+        """
+        A writer which read the index of a name before it was pruned records
+        the pruned index in the catalog.
+        """
+        self.add(1503267000)
+        mgr = RezRxtDbWriteMgr(self.db_path)
+        index = mgr.timestamp_index("model", "houdini")
+        prune(self.db_path, RetentionPolicy(keep_last=1))
+        self.assertEqual(mgr.saved_index("model", "houdini", index).timestamps, [1503267000])
+
+    def test_dry_run(self):
+        """
+        A dry run reports what would be removed, and removes nothing.
+        """
+        summary = prune(self.db_path, RetentionPolicy(keep_last=1), dry_run=True)
+        self.assertEqual((summary["removed"], summary["inodes"]), (1, 2))
+        self.assertEqual(summary["bytes"], len(open(SAMPLE).read()))
+        self.assertEqual(list(RezRxtDbReader(self.db_path).timestamps("model", "houdini")),
+                         [1503265457, 1503266406])
+
+    def test_selected(self):
+        """
+        Only the selected contexts and names are pruned.
+        """
+        self.add(1503267000)
+        summary = prune(self.db_path, RetentionPolicy(keep_last=1), contexts=["model"],
+                        names=["modo"])
+        self.assertEqual(summary["removed"], 0)
+        self.assertRaises(KeyError, prune, self.db_path, RetentionPolicy(keep_last=1),
+                          contexts=["lighting"])
+
+    def test_manifest(self):
+        """
+        Timestamps pinned by a manifest are kept.
+        """
+        manifests = pjoin(self.tmp_dir, "manifests")
+        makedirs(manifests)
+        write_manifest(pjoin(manifests, "job.json"),
+                       {"version": 1, "db": self.db_path, "timestamp": 1503265500,
+                        "contexts": {"model": {"houdini": {"timestamp": 1503265457}}}})
+        with open(pjoin(manifests, "other.json"), "w") as f_handle:
+            f_handle.write("{}")
+        pins = manifest_pins([manifests])
+        self.assertEqual(pins, set([("model", "houdini", 1503265457)]))
+
+        self.add(1503267000)
+        prune(self.db_path, RetentionPolicy(keep_last=1, pinned=pins))
+        self.assertEqual(list(RezRxtDbReader(self.db_path).timestamps("model", "houdini")),
+                         [1503265457, 1503267000])
+
+    def test_blobs(self):
+        """
+        Blobs no resolve references are collected once past their grace period.
+        """
+        with open(pjoin(self.db_path, "config.json"), "w") as f_handle:
+            json.dump({"dedup": True}, f_handle)
+        self.add(1503267000, host="a")
+        self.add(1503268000, rez_version="2.13.0")
+        self.add(1503269000, rez_version="2.13.0")
+        blob_dir = pjoin(self.db_path, "blobs")
+        blobs = [pjoin(blob_dir, fan_out, f_name) for fan_out in listdir(blob_dir)
+                 for f_name in listdir(pjoin(blob_dir, fan_out))]
+        self.assertEqual(len(blobs), 2)
+
+        policy = RetentionPolicy(keep_last=1)
+        summary = prune(self.db_path, policy, dry_run=True)
+        self.assertEqual(summary["blobs"], 0)
+        summary = prune(self.db_path, policy, dry_run=True, blob_grace=-60)
+        self.assertEqual(summary["blobs"], 1)
+
+        for path in blobs:
+            utime(path, (1503260000, 1503260000))
+        summary = prune(self.db_path, policy)
+        self.assertEqual((summary["removed"], summary["blobs"]), (4, 1))
+        self.assertEqual(len([path for path in blobs if exists(path)]), 1)
+        rxt = RezRxtDbReader(self.db_path).rxt_dict("model", "houdini", 1503269000)
+        self.assertEqual(rxt["rez_version"], "2.13.0")
@@ -6,7 +6,11 @@ from os.path import join as pjoin
 import json
 import unittest
 
+from rezrxt import instrument
 from rezrxt.filebacked.reader import RezRxtDbReadMgr, RezRxtDbReader
+from rezrxt.filebacked.writer import RezRxtDbWriter
+from dbtestcase import DbTestCase
+
 
 RXT_STR =\
 """
@@ -256,6 +260,19 @@ class FileBackedReaderTest(unittest.TestCase):
         expected = [1503265457, 1503266406]
         self.assertEqual(timestamps, expected)
 
+    def test_timestamp_range(self):
+        """
+        Ranges and the most recent timestamps are served in order.
+        """
+        self.assertEqual(self.reader.timestamp_range("model", "houdini", 1503265457, 1503266406,
+                                                     include_start=False), [1503266406])
+        self.assertEqual(self.reader.timestamp_range("model", "houdini", reverse=True),
+                         [1503266406, 1503265457])
+        self.assertEqual(self.reader.timestamp_range("model", "houdini", end=1503265000), [])
+        self.assertEqual(self.reader.latest("model", "houdini"), [1503266406])
+        self.assertEqual(self.reader.latest("model", "houdini", 5), [1503266406, 1503265457])
+        self.assertRaises(KeyError, self.reader.latest, "model", "nuke")
+
     def test_rxt_files(self):
         """
         verify that we return the correct file list.
@@ -268,3 +285,68 @@ class FileBackedReaderTest(unittest.TestCase):
         expected = [pjoin(base_path, t_stamps[0], "{0}-{1}-{2}.rxt".format(ctx, pkg, t_stamps[0])),
                     pjoin(base_path, t_stamps[1], "{0}-{1}-{2}.rxt".format(ctx, pkg, t_stamps[1]))]
         self.assertEqual(files, expected)
+
+
+class StatReuseTest(DbTestCase):
+    """
+    Tests covering the reuse of stat results and timestamp indexes.
+    """
+    def setUp(self):
+        """
+        Copy the test database somewhere we can write to, and count file
+        system calls.
+        """
+        super(StatReuseTest, self).setUp()
+        self.previous = instrument._TRACE
+        self.trace = instrument._TRACE = instrument.Trace(None)
+
+    def tearDown(self):
+        instrument._TRACE = self.previous
+        super(StatReuseTest, self).tearDown()
+
+    def fs_calls(self):
+        """
+        Return the file system calls counted since the last call, and reset them.
+        """
+        calls = sum(value for name, value in self.trace.counters.items()
+                    if name.startswith("fs."))
+        self.trace.counters.clear()
+        return calls
+
+    def test_repeated_resolve(self):
+        """
+        Resolving the same name again within the ttl does not touch the disk.
+        """
+        mgr = RezRxtDbReadMgr(self.db_path, ttl=60)
+        first = mgr.resolve_timestamp("model", "houdini", 1503266000, approximate=True)
+        self.assertTrue(self.fs_calls() > 0)
+        second = mgr.resolve_timestamp("model", "houdini", 1503266500, approximate=True)
+        self.assertEqual(self.fs_calls(), 0)
+        self.assertEqual((first, second), (1503265457, 1503266406))
+
+    def test_missing(self):
+        """
+        Lookups of missing keys still raise KeyError, and their stats are reused.
+        """
+        mgr = RezRxtDbReadMgr(self.db_path, ttl=60)
+        self.assertRaises(KeyError, mgr.resolve_timestamp, "model", "nuke", 1503266000, True)
+        self.fs_calls()
+        self.assertRaises(KeyError, mgr.resolve_timestamp, "model", "nuke", 1503266000, True)
+        self.assertEqual(self.fs_calls(), 0)
+
+    def test_ttl(self):
+        """
+        A resolve added meanwhile is seen once stats are not reused.
+        """
+        cached = RezRxtDbReader(self.db_path, ttl=60)
+        uncached = RezRxtDbReader(self.db_path, ttl=0)
+        for reader in (cached, uncached):
+            self.assertEqual(reader.resolve_timestamp("model", "houdini", 1503267000, True),
+                             1503266406)
+        rxt = json.loads(RXT_STR)
+        rxt["timestamp"] = 1503266900
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini", rxt)
+        self.assertEqual(cached.resolve_timestamp("model", "houdini", 1503267000, True),
+                         1503266406)
+        self.assertEqual(uncached.resolve_timestamp("model", "houdini", 1503267000, True),
+                         1503266900)
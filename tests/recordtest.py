@@ -0,0 +1,265 @@
+"""
+recordtest.py
+"""
+from os.path import isfile
+from os.path import join as pjoin
+from os import walk
+import json
+
+from rezrxt.cache import RxtCache
+from rezrxt.filebacked import record, codec, migrate
+from rezrxt.filebacked.config import CONFIG_NAME
+from rezrxt.filebacked.reader import RezRxtDbReader
+from rezrxt.filebacked.writer import RezRxtDbWriter, RezRxtDbWriteMgr
+from dbtestcase import DbTestCase, load_sample
+
+
+class SplitRecordTest(DbTestCase):
+    """
+    Tests covering resolves stored as a header plus cold sections.
+    """
+    def setUp(self):
+        super(SplitRecordTest, self).setUp()
+        with open(pjoin(self.db_path, CONFIG_NAME), "w") as f_handle:
+            json.dump({"split": True}, f_handle)
+        self.rxt = load_sample()
+        self.rxt["timestamp"] = 1503267000
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini", self.rxt)
+        self.reader = RezRxtDbReader(self.db_path, cache=False)
+
+    def test_layout(self):
+        """
+        The header holds no cold keys, and the cold file exists.
+        """
+        path = self.reader.resolve("model", "houdini", 1503267000)
+        with open(path) as f_handle:
+            header = json.load(f_handle)
+        self.assertFalse("graph" in header)
+        self.assertEqual(header["status"], "solved")
+        self.assertTrue(isfile(path + record.COLD_SUFFIX))
+        self.assertFalse(record.standalone(path))
+        self.assertTrue(record.standalone(self.reader.resolve("model", "houdini", 1503265457)))
+
+    def test_rxt_dict(self):
+        """
+        rxt_dict reassembles the complete resolve.
+        """
+        self.assertEqual(self.reader.rxt_dict("model", "houdini", 1503267000), self.rxt)
+
+    def test_lazy(self):
+        """
+        Cold sections are only loaded when accessed.
+        """
+        lazy = self.reader.rxt_lazy("model", "houdini", 1503267000)
+        self.assertEqual(lazy["status"], "solved")
+        self.assertEqual(lazy.loaded_sections, set())
+        self.assertTrue("graph" in lazy)
+        self.assertEqual(lazy["package_paths"], self.rxt["package_paths"])
+        self.assertEqual(lazy.loaded_sections, set(["packages"]))
+        self.assertEqual(sorted(lazy), sorted(self.rxt))
+        self.assertEqual(lazy.to_dict(), self.rxt)
+
+    def test_plain_lazy(self):
+        """
+        Plain rxt files are served through the same mapping.
+        """
+        lazy = self.reader.rxt_lazy("model", "houdini", 1503265457)
+        self.assertFalse(lazy.is_split())
+        self.assertEqual(dict(lazy), load_sample())
+
+
+class CompressedRecordTest(DbTestCase):
+    """
+    Tests covering compressed resolves.
+    """
+    def setUp(self):
+        super(CompressedRecordTest, self).setUp()
+        self.reader = RezRxtDbReader(self.db_path, cache=False)
+
+    def test_codecs(self):
+        """
+        Every available codec round trips, and is detected on read.
+        """
+        data = json.dumps(load_sample()).encode()
+        for name in codec.available_codecs():
+            encoded = codec.encode(data, name)
+            self.assertEqual(codec.detect(encoded), name)
+            self.assertEqual(codec.decode(encoded), data)
+        self.assertRaises(ValueError, codec.encode, data, "snappy")
+
+    def test_write_compressed(self):
+        """
+        Compressed resolves, plain or split, are read transparently.
+        """
+        mgr = RezRxtDbWriteMgr(self.db_path)
+        rxt = load_sample()
+        for timestamp, split in ((1503267000, False), (1503267001, True)):
+            rxt["timestamp"] = timestamp
+            mgr.write_rxt("model", "houdini", str(timestamp), rxt, split=split, codec="zlib")
+            self.assertEqual(self.reader.rxt_dict("model", "houdini", timestamp), rxt)
+
+        with open(mgr.rxt_path("model", "houdini", 1503267000), "rb") as f_handle:
+            self.assertEqual(codec.detect(f_handle.read()), "zlib")
+        self.assertFalse(record.standalone(mgr.rxt_path("model", "houdini", 1503267000)))
+
+    def test_rewrite(self):
+        """
+        Rewriting a resolve preserves its contents, and the validity of its sidecars.
+        """
+        mgr = RezRxtDbWriteMgr(self.db_path)
+        mgr.write_tools("model", "houdini", "1503265457", {"houdini": ["hython"]})
+        before, after = mgr.rewrite_rxt("model", "houdini", "1503265457", split=True, codec="bz2")
+        self.assertTrue(after < before)
+        self.assertEqual(self.reader.rxt_dict("model", "houdini", 1503265457), load_sample())
+        self.assertEqual(self.reader.tools("model", "houdini", 1503265457), {"houdini": ["hython"]})
+
+        mgr.rewrite_rxt("model", "houdini", "1503265457", split=False, codec="none")
+        path = mgr.rxt_path("model", "houdini", 1503265457)
+        self.assertFalse(isfile(path + record.COLD_SUFFIX))
+        with open(path) as f_handle:
+            self.assertEqual(json.load(f_handle), load_sample())
+
+    def test_recompress(self):
+        """
+        The whole database is recompressed in parallel.
+        """
+        summary = migrate.recompress(self.db_path, codec="zlib", split=False, processes=2)
+        self.assertEqual((summary["count"], summary["failures"]), (4, []))
+        self.assertEqual(self.reader.rxt_dict("model", "houdini", 1503265457), load_sample())
+
+
+class DedupRecordTest(DbTestCase):
+    """
+    Tests covering resolves deduplicated through the blob store.
+    """
+    def setUp(self):
+        super(DedupRecordTest, self).setUp()
+        self.mgr = RezRxtDbWriteMgr(self.db_path)
+        self.rxt = load_sample()
+
+    def blobs(self):
+        """
+        Return the names of the blobs in the blob store.
+        """
+        return sorted(f_name for _, _, f_names in walk(self.mgr.blobs_dir()) for f_name in f_names)
+
+    def write(self, context, timestamp, split=False):
+        """
+        Write the sample resolve, deduplicated, at timestamp.
+        """
+        rxt = dict(self.rxt, timestamp=timestamp)
+        self.mgr.write_rxt(context, "houdini", str(timestamp), rxt, split=split, dedup=True)
+        return rxt
+
+    def test_shared_blob(self):
+        """
+        Resolves differing only in their volatile keys share one blob, across contexts.
+        """
+        first = self.write("model", 1503267000)
+        second = self.write("model", 1503267001)
+        third = self.write("anim", 1503267002)
+        self.assertEqual(len(self.blobs()), 1)
+
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503267000), first)
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503267001), second)
+        self.assertEqual(reader.rxt_dict("anim", "houdini", 1503267002), third)
+
+        with open(self.mgr.rxt_path("model", "houdini", 1503267000)) as f_handle:
+            header = json.load(f_handle)
+        self.assertFalse("graph" in header)
+        self.assertEqual(header["timestamp"], 1503267000)
+
+        changed = dict(self.rxt, timestamp=1503267003, status="failed")
+        self.mgr.write_rxt("model", "houdini", "1503267003", changed, dedup=True)
+        self.assertEqual(len(self.blobs()), 2)
+
+    def test_split_blob(self):
+        """
+        Split resolves store their cold sections as a shared blob.
+        """
+        rxt = self.write("model", 1503267000, split=True)
+        self.write("model", 1503267001, split=True)
+        self.assertEqual(len(self.blobs()), 1)
+
+        path = self.mgr.rxt_path("model", "houdini", 1503267000)
+        self.assertFalse(isfile(path + record.COLD_SUFFIX))
+        lazy = RezRxtDbReader(self.db_path, cache=False).rxt_lazy("model", "houdini", 1503267000)
+        self.assertEqual(lazy["status"], "solved")
+        self.assertEqual(lazy.loaded_sections, set())
+        self.assertEqual(lazy["graph"], rxt["graph"])
+        self.assertEqual(lazy.to_dict(), rxt)
+
+    def test_cache_by_digest(self):
+        """
+        A body shared by several resolves is parsed once.
+        """
+        self.write("model", 1503267000)
+        self.write("model", 1503267001)
+        cache = RxtCache()
+        reader = RezRxtDbReader(self.db_path, cache=cache)
+        reader.rxt_dict("model", "houdini", 1503267000)
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503267001)["timestamp"], 1503267001)
+        self.assertEqual((cache.stats()["entries"], cache.stats()["hits"]), (1, 1))
+
+    def test_rewrite(self):
+        """
+        Existing resolves are moved into the blob store, and back out of it.
+        """
+        self.mgr.rewrite_rxt("model", "houdini", "1503265457", dedup=True)
+        self.assertEqual(len(self.blobs()), 1)
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503265457), self.rxt)
+
+        self.mgr.rewrite_rxt("model", "houdini", "1503265457", dedup=False)
+        with open(self.mgr.rxt_path("model", "houdini", 1503265457)) as f_handle:
+            self.assertEqual(json.load(f_handle), self.rxt)
+
+
+class FieldsTest(DbTestCase):
+    """
+    Tests covering the retrieval of selected keys of a resolve.
+    """
+    def setUp(self):
+        super(FieldsTest, self).setUp()
+        self.rxt = load_sample()
+        mgr = RezRxtDbWriteMgr(self.db_path)
+        self.formats = {"plain": {}, "split": {"split": True}, "zlib": {"codec": "zlib"},
+                        "dedup": {"dedup": True}, "split_dedup": {"split": True, "dedup": True}}
+        for name, options in self.formats.items():
+            mgr.write_rxt("lgt", name, 1503265457, self.rxt, **options)
+        self.reader = RezRxtDbReader(self.db_path, cache=False)
+
+    def test_formats(self):
+        """
+        Hot and cold keys are read from every format.
+        """
+        fields = ["status", "timestamp", "graph", "resolved_packages", "package_requests",
+                  "missing"]
+        expected = dict((key, self.rxt[key]) for key in fields if key in self.rxt)
+        for name in self.formats:
+            self.assertEqual(self.reader.rxt_fields("lgt", name, 1503265457, fields), expected,
+                             name)
+
+    def test_stream(self):
+        self.assertEqual(list(self.reader.stream_rxt_fields("model", "houdini", ["created"],
+                                                            reverse=True)),
+                         [(1503266406, {"created": 1503266406}),
+                          (1503265457, {"created": 1503265457})])
+        self.assertEqual(list(self.reader.stream_rxt_fields("model", "houdini", ["created"],
+                                                            start=1503266000)),
+                         [(1503266406, {"created": 1503266406})])
+
+    def test_cached(self):
+        """
+        A cached resolve answers without reading the file.
+        """
+        reader = RezRxtDbReader(self.db_path, cache=RxtCache())
+        reader.rxt_dict("lgt", "plain", 1503265457)
+        self.assertEqual(reader.rxt_fields("lgt", "plain", 1503265457, ["status"]),
+                         {"status": "solved"})
+        self.assertEqual(reader.cache.stats()["hits"], 1)
+
+    def test_missing(self):
+        self.assertRaises(KeyError, self.reader.rxt_fields, "lgt", "plain", 1, ["status"])
@@ -0,0 +1,103 @@
+"""
+replicatest.py
+"""
+from os.path import realpath, dirname, islink
+from os.path import join as pjoin
+from os import listdir
+
+from rezrxt import backends
+from rezrxt.filebacked.replica import sync_replica, ReplicaReader
+from rezrxt.filebacked.writer import RezRxtDbWriter, RezRxtDbWriteMgr
+from dbtestcase import DbTestCase, TEST_DB, load_sample
+
+
+class ReplicaTest(DbTestCase):
+    """
+    Tests covering local replicas.
+    """
+    def setUp(self):
+        super(ReplicaTest, self).setUp()
+        self.replica = pjoin(self.tmp_dir, "local", "replica")
+
+    def add(self, timestamp):
+        """
+        Add a copy of the sample resolve to the primary.
+        """
+        rxt = load_sample()
+        rxt["timestamp"] = timestamp
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini", rxt)
+
+    def test_sync(self):
+        """
+        The first sync copies everything. Later syncs copy only what changed,
+        and swap in a new generation.
+        """
+        summary = sync_replica(self.db_path, self.replica)
+        self.assertEqual((summary["copied"], summary["linked"]), (4, 0))
+        self.assertTrue(islink(self.replica))
+        first = realpath(self.replica)
+
+        reader = backends.get_reader(self.replica)
+        self.assertEqual(list(reader.contexts()), ["fx", "model"])
+        self.assertEqual(list(reader.timestamps("model", "houdini")), [1503265457, 1503266406])
+
+        self.add(1503267000)
+        RezRxtDbWriteMgr(self.db_path).write_tools("fx", "houdini", "1503266474",
+                                                   {"houdini": ["hython"]})
+        summary = sync_replica(self.db_path, self.replica)
+        # the new resolve, and the tools manifest of a changed directory
+        self.assertEqual((summary["copied"], summary["linked"]), (2, 4))
+        self.assertNotEqual(realpath(self.replica), first)
+        self.assertEqual(backends.get_reader(self.replica).tools("fx", "houdini", 1503266474),
+                         {"houdini": ["hython"]})
+
+        sync_replica(self.db_path, self.replica, keep=2)
+        self.assertEqual(len([x for x in listdir(dirname(self.replica))
+                              if x.startswith(".replica.")]), 2)
+
+    def test_not_a_replica(self):
+        """
+        A directory is not replaced by a replica.
+        """
+        with self.assertRaises(ValueError):
+            sync_replica(self.db_path, self.db_path)
+
+    def test_reader(self):
+        """
+        Resolves are read from the replica, falling back to the primary for
+        those it does not have yet.
+        """
+        sync_replica(self.db_path, self.replica)
+        self.add(1503267000)
+        reader = backends.get_reader(self.db_path, replica=self.replica)
+        self.assertTrue(isinstance(reader, ReplicaReader))
+
+        local = realpath(self.replica)
+        self.assertTrue(reader.resolve("model", "houdini", 1503265457).startswith(local))
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503265457)["timestamp"],
+                         1503265457)
+        self.assertTrue(reader.resolve("model", "houdini", 1503267000).startswith(self.db_path))
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503267000)["timestamp"],
+                         1503267000)
+        # times after the sync see resolves added since
+        self.assertEqual(reader.resolve_timestamp("model", "houdini", 1503267500, True),
+                         1503267000)
+        self.assertEqual(reader.resolve_timestamp("model", "houdini", 1503266000, True),
+                         1503265457)
+        self.assertEqual(reader.latest("model", "houdini"), [1503267000])
+        # names unchanged since the sync are resolved by the replica
+        self.assertTrue(reader.resolve("fx", "houdini", 1503267500, True).startswith(local))
+        snapshot = reader.snapshot(["fx", "model"], 1503267500)
+        self.assertTrue(snapshot["fx"]["houdini"]["location"].startswith(local))
+        self.assertEqual(snapshot["model"]["houdini"]["timestamp"], 1503267000)
+        with self.assertRaises(KeyError):
+            reader.rxt_dict("model", "houdini", 1)
+
+    def test_other_primary(self):
+        """
+        A replica of another database is ignored.
+        """
+        sync_replica(TEST_DB, self.replica)
+        reader = ReplicaReader(self.replica, self.db_path)
+        self.assertTrue(reader.replica is None)
+        self.assertTrue(reader.resolve("model", "houdini", 1503265457).startswith(self.db_path))
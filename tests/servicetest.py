@@ -0,0 +1,174 @@
+"""
+servicetest.py
+"""
+from os.path import exists
+from os.path import join as pjoin
+from os import environ
+import shutil
+import threading
+
+from rezrxt import backends, constants
+from rezrxt.exceptions import PackedResolveError, ServiceUnavailable
+from rezrxt.filebacked.packer import pack_db
+from rezrxt.filebacked.replica import sync_replica, ReplicaReader
+from rezrxt.service import client as client_module
+from rezrxt.service.client import RezRxtDbClient, ServiceReader, connect_reader, _connection
+from rezrxt.service.server import RezRxtService, Coalescer, serve
+from dbtestcase import DbTestCase, TEST_DB
+
+
+class ServiceTest(DbTestCase):
+    """
+    Tests covering the read service and its client.
+    """
+    def setUp(self):
+        super(ServiceTest, self).setUp()
+        self.socket_path = pjoin(self.tmp_dir, "rezrxt.sock")
+        self.service = RezRxtService(self.db_path)
+        self.server = serve(self.service, self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.address = "unix:" + self.socket_path
+        self.direct = backends.get_reader(self.db_path, cache=False)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(ServiceTest, self).tearDown()
+
+    def test_reads(self):
+        client = RezRxtDbClient(self.address, self.db_path)
+        self.assertEqual(list(client.contexts()), ["fx", "model"])
+        self.assertEqual(list(client.names("model")), ["houdini", "modo"])
+        self.assertEqual(list(client.timestamps("model", "houdini")), [1503265457, 1503266406])
+        self.assertEqual(client.latest("model", "houdini"), [1503266406])
+        self.assertEqual(client.rxt_dict("model", "houdini", 1503265457),
+                         self.direct.rxt_dict("model", "houdini", 1503265457))
+        self.assertEqual(client.resolve("model", "houdini", 1503265457),
+                         self.direct.resolve("model", "houdini", 1503265457))
+        self.assertEqual(client.location("model", "houdini", 1503265457),
+                         self.direct.location("model", "houdini", 1503265457))
+
+    def test_resolve_packed(self):
+        """
+        Paths are looked up again, rather than cached, so a resolve packed
+        since it was requested is reported as such.
+        """
+        environ[constants.REZRXT_STAT_TTL] = "0"
+        try:
+            client = RezRxtDbClient(self.address, self.db_path)
+            self.assertTrue(exists(client.resolve("model", "houdini", 1503265457)))
+            pack_db(self.db_path, 1503266000, contexts=["model"], names=["houdini"])
+            self.assertRaises(PackedResolveError, client.resolve, "model", "houdini", 1503265457)
+            self.assertTrue(client.location("model", "houdini", 1503265457).endswith(
+                "timestamps.1.pack#1503265457"))
+        finally:
+            del environ[constants.REZRXT_STAT_TTL]
+
+    def test_approximate(self):
+        client = RezRxtDbClient(self.address, self.db_path)
+        for timestamp in (1503265000, 1503266000, 1503269999):
+            self.assertEqual(client.resolve_timestamp("model", "houdini", timestamp, True),
+                             self.direct.resolve_timestamp("model", "houdini", timestamp, True))
+        self.assertEqual(client.rxt_dict("model", "houdini", 1503266000, True)["timestamp"],
+                         1503265457)
+
+    def test_snapshot(self):
+        client = RezRxtDbClient(self.address, self.db_path)
+        self.assertEqual(client.snapshot(["model"], 1503266000),
+                         self.direct.snapshot(["model"], 1503266000))
+        with self.assertRaises(KeyError):
+            client.snapshot(["nope"], 1503266000)
+
+    def test_fields(self):
+        client = RezRxtDbClient(self.address, self.db_path)
+        self.assertEqual(client.rxt_fields("model", "houdini", 1503266000, ["status", "timestamp"],
+                                           approximate=True),
+                         {"status": "solved", "timestamp": 1503265457})
+
+    def test_missing_key(self):
+        client = RezRxtDbClient(self.address, self.db_path)
+        with self.assertRaises(KeyError):
+            list(client.names("nope"))
+        with self.assertRaises(KeyError):
+            client.rxt_dict("model", "houdini", 1000000000)
+
+    def test_etag_revalidation(self):
+        client = RezRxtDbClient(self.address, self.db_path)
+        first = client.rxt_dict("model", "houdini", 1503265457)
+        status, _, body = client._request("/rxt/model/houdini/1503265457")
+        self.assertEqual((status, body), (304, ""))
+        self.assertEqual(client.rxt_dict("model", "houdini", 1503265457), first)
+
+    def test_coalescer(self):
+        coalescer = Coalescer()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait()
+            return "result"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(coalescer.run("k", compute)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while coalescer.coalesced < 3:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["result"] * 4)
+
+    def test_reconnect(self):
+        """
+        A request over a connection closed since is retried on a new one, but
+        a new connection failing is not retried.
+        """
+        client = RezRxtDbClient(self.address, self.db_path)
+        self.assertEqual(list(client.contexts()), ["fx", "model"])
+        client._conn.sock.close()
+        self.assertEqual(list(client.names("model")), ["houdini", "modo"])
+
+        connections = []
+
+        def connection(address, timeout):
+            connections.append(address)
+            return _connection(address, timeout)
+        client_module._connection = connection
+        try:
+            missing = RezRxtDbClient("unix:" + pjoin(self.tmp_dir, "missing.sock"))
+            self.assertRaises(ServiceUnavailable, missing.contexts)
+        finally:
+            client_module._connection = _connection
+        self.assertEqual(len(connections), 1)
+
+    def test_fallback_when_unreachable(self):
+        reader = connect_reader(self.db_path, "unix:" + pjoin(self.tmp_dir, "missing.sock"))
+        self.assertIsInstance(reader, ServiceReader)
+        self.assertEqual(list(reader.contexts()), ["fx", "model"])
+        self.assertIsNotNone(reader.direct)
+
+    def test_fallback_to_replica(self):
+        replica = pjoin(self.tmp_dir, "replica")
+        sync_replica(self.db_path, replica)
+        environ[constants.REZRXT_REPLICA] = replica
+        try:
+            reader = connect_reader(self.db_path, "unix:" + pjoin(self.tmp_dir, "missing.sock"))
+            self.assertEqual(list(reader.contexts()), ["fx", "model"])
+        finally:
+            del environ[constants.REZRXT_REPLICA]
+        self.assertIsInstance(reader.direct, ReplicaReader)
+
+    def test_fallback_on_other_db(self):
+        other = pjoin(self.tmp_dir, "other")
+        shutil.copytree(TEST_DB, other)
+        with self.assertRaises(ServiceUnavailable):
+            RezRxtDbClient(self.address, other).ping()
+        reader = ServiceReader(self.address, other)
+        self.assertEqual(list(reader.contexts()), ["fx", "model"])
+        self.assertIsNotNone(reader.direct)
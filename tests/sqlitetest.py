@@ -0,0 +1,142 @@
+"""
+sqlitetest.py
+"""
+from os.path import isfile
+from os.path import join as pjoin
+from os import environ
+import json
+import shutil
+import tempfile
+import unittest
+
+from rezrxt import backends
+from rezrxt.exceptions import DuplicateKeyError
+from rezrxt.sqlite.reader import RezRxtDbReader
+from rezrxt.sqlite.writer import RezRxtDbWriter
+from dbtestcase import TEST_DB, load_sample
+
+
+class SqliteTest(unittest.TestCase):
+    """
+    Tests covering the sqlite backend.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = pjoin(self.tmp_dir, "resolves.sqlite")
+        self.rxt = load_sample()
+        writer = RezRxtDbWriter(self.db_path)
+        for context, name, timestamp in (("model", "houdini", 1503265457),
+                                         ("model", "houdini", 1503266000),
+                                         ("model", "maya", 1503265000),
+                                         ("anim", "maya", 1503265000)):
+            writer.add_rxt(context, name, dict(self.rxt, timestamp=timestamp))
+        self.reader = RezRxtDbReader(self.db_path, cache=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_listing(self):
+        """
+        Contexts, names and timestamps are listed in sorted order.
+        """
+        self.assertEqual(list(self.reader.contexts()), ["anim", "model"])
+        self.assertEqual(list(self.reader.names("model")), ["houdini", "maya"])
+        self.assertEqual(list(self.reader.timestamps("model", "houdini")),
+                         [1503265457, 1503266000])
+        self.assertRaises(KeyError, self.reader.names, "lgt")
+        self.assertRaises(KeyError, self.reader.timestamps, "model", "nuke")
+
+    def test_approximate(self):
+        """
+        Approximate timestamps resolve to the latest resolve not after them, or
+        the earliest.
+        """
+        self.assertEqual(self.reader.resolve_timestamp("model", "houdini", 1503265999, True),
+                         1503265457)
+        self.assertEqual(self.reader.resolve_timestamp("model", "houdini", 1603265999, True),
+                         1503266000)
+        self.assertEqual(self.reader.resolve_timestamp("model", "houdini", 1, True), 1503265457)
+        self.assertRaises(KeyError, self.reader.resolve_timestamp, "model", "nuke", 1, True)
+        self.assertEqual(self.reader.rxt_dict("model", "houdini", 1503265999, True),
+                         dict(self.rxt, timestamp=1503265457))
+        self.assertRaises(KeyError, self.reader.rxt_dict, "model", "houdini", 1503265999)
+
+    def test_duplicate(self):
+        """
+        Adding an existing resolve raises DuplicateKeyError.
+        """
+        self.assertRaises(DuplicateKeyError, RezRxtDbWriter(self.db_path).add_rxt,
+                          "model", "houdini", dict(self.rxt, timestamp=1503265457))
+
+    def test_baked(self):
+        """
+        Baked tools and launch scripts are stored with the resolve.
+        """
+        writer = RezRxtDbWriter(self.db_path)
+        with writer.conn:
+            writer.conn.execute("UPDATE resolves SET tools = ? WHERE timestamp = 1503265457",
+                                (json.dumps({"houdini": ["hython"]}),))
+            writer.conn.execute("INSERT INTO launch_scripts VALUES (?, ?, ?, ?, ?)",
+                                ("model", "houdini", 1503265457, "bash", "export FOO=bar\n"))
+        self.assertEqual(self.reader.tools("model", "houdini", 1503265457),
+                         {"houdini": ["hython"]})
+        self.assertEqual(self.reader.tools("model", "houdini", 1503266000), None)
+
+        environ["XDG_CACHE_HOME"] = self.tmp_dir
+        try:
+            script = self.reader.launch_script("model", "houdini", 1503265999, "bash", True)
+        finally:
+            del environ["XDG_CACHE_HOME"]
+        self.assertTrue(script.startswith(self.tmp_dir))
+        with open(script) as f_handle:
+            self.assertEqual(f_handle.read(), "export FOO=bar\n")
+        self.assertEqual(self.reader.launch_script("model", "houdini", 1503265457, "tcsh"), None)
+
+    def test_backends(self):
+        """
+        The backend is selected by prefix, or by the kind of path.
+        """
+        self.assertEqual(backends.parse_db(self.db_path), ("sqlite", self.db_path))
+        self.assertEqual(backends.parse_db(TEST_DB), ("filebacked", TEST_DB))
+        self.assertEqual(backends.parse_db("sqlite:/some/where"), ("sqlite", "/some/where"))
+        # a filebacked database named like a sqlite one
+        studio = pjoin(self.tmp_dir, "studio.db")
+        shutil.copytree(TEST_DB, studio)
+        self.assertEqual(backends.parse_db(studio), ("filebacked", studio))
+        self.assertEqual(list(backends.get_reader(studio, cache=False).names("model")),
+                         ["houdini", "modo"])
+        self.assertTrue(backends.db_exists("sqlite:" + self.db_path))
+        self.assertFalse(isfile(pjoin(self.tmp_dir, "missing.db")))
+        self.assertFalse(backends.db_exists(pjoin(self.tmp_dir, "missing.db")))
+        self.assertEqual(backends.get_reader(self.db_path, cache=False)
+                         .rxt_dict("anim", "maya", 1503265000)["timestamp"], 1503265000)
+        self.assertEqual(list(backends.get_reader(TEST_DB, cache=False).contexts()),
+                         ["fx", "model"])
+        self.assertRaises(AssertionError, backends.get_reader, pjoin(self.tmp_dir, "missing.db"))
+
+    def test_snapshot(self):
+        snapshot = self.reader.snapshot(["model", "anim"], 1503265500)
+        self.assertEqual(dict((name, entry["timestamp"])
+                              for name, entry in snapshot["model"].items()),
+                         {"houdini": 1503265457, "maya": 1503265000})
+        self.assertEqual(snapshot["anim"]["maya"]["location"],
+                         self.reader.resolve("anim", "maya", 1503265000))
+        self.assertFalse("graph" in snapshot["anim"]["maya"]["header"])
+        with self.assertRaises(KeyError):
+            self.reader.snapshot(["nope"], 1503265500)
+
+    def test_timestamp_range(self):
+        self.assertEqual(self.reader.timestamp_range("model", "houdini", 1503265457, 1503266000,
+                                                     include_end=False), [1503265457])
+        self.assertEqual(self.reader.timestamp_range("model", "houdini", 1503265458), [1503266000])
+        self.assertEqual(self.reader.timestamp_range("model", "houdini", end=1), [])
+        self.assertEqual(self.reader.latest("model", "houdini", 5), [1503266000, 1503265457])
+        with self.assertRaises(KeyError):
+            self.reader.timestamp_range("model", "nuke", end=1)
+
+    def test_rxt_fields(self):
+        self.assertEqual(self.reader.rxt_fields("model", "houdini", 1503265999, ["timestamp",
+                                                "status"], approximate=True),
+                         {"timestamp": 1503265457, "status": self.rxt["status"]})
+        self.assertEqual([t_stamp for t_stamp, _ in self.reader.stream_rxt_fields(
+            "model", "houdini", ["status"])], [1503265457, 1503266000])
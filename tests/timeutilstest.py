@@ -0,0 +1,37 @@
+"""
+timeutilstest.py
+"""
+import time
+import unittest
+
+from rezrxt.timeutils import parse_time, gmtime_to_epoc, localtime_to_epoc, epoc_to_loc_asctime
+
+
+class ParseTimeTest(unittest.TestCase):
+    """
+    Tests covering the parsing of times supplied on the command line.
+    """
+    def test_epoc(self):
+        self.assertEqual(parse_time("1503265457"), 1503265457)
+        self.assertEqual(parse_time(1503265457), 1503265457)
+
+    def test_relative(self):
+        self.assertEqual(parse_time("now", now=1000000), 1000000)
+        self.assertEqual(parse_time("90m", now=1000000), 1000000 - 5400)
+        self.assertEqual(parse_time("3d", now=1000000), 1000000 - 3 * 86400)
+
+    def test_dates(self):
+        self.assertEqual(parse_time("2017-08-20T21:44:17Z"), 1503265457)
+        self.assertEqual(parse_time("2017-08-20 21:44:17Z"), 1503265457)
+        self.assertEqual(parse_time("2017-08-20Z"), 1503187200)
+        self.assertEqual(parse_time("2017-08-20 21:44"),
+                         int(time.mktime((2017, 8, 20, 21, 44, 0, 0, 0, -1))))
+        self.assertEqual(parse_time("Sun Aug 20 21:44:17 2017"), 1503265457)
+
+    def test_asctime(self):
+        self.assertEqual(gmtime_to_epoc("Sun Aug 20 21:44:17 2017"), 1503265457)
+        self.assertEqual(localtime_to_epoc(epoc_to_loc_asctime(1503265457)), 1503265457)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, parse_time, "yesterday")
+        self.assertRaises(ValueError, parse_time, "3y")
@@ -0,0 +1,153 @@
+"""
+writertest.py
+"""
+from os.path import exists
+from os.path import join as pjoin
+from os import listdir, stat, walk
+from multiprocessing import Pool
+import stat as st
+
+from rezrxt.exceptions import DuplicateKeyError
+from rezrxt.filebacked import fsutil
+from rezrxt.filebacked import writer as writer_module
+from rezrxt.filebacked.reader import RezRxtDbReader, RezRxtDbReadMgr
+from rezrxt.filebacked.writer import RezRxtDbWriter, RezRxtDbWriteMgr
+from dbtestcase import DbTestCase, load_sample
+
+
+def _add(task):
+    """
+    Pool worker adding a resolve with its own writer, as a separate host would.
+    """
+    db_path, context, timestamp = task
+    rxt = load_sample()
+    rxt["timestamp"] = timestamp
+    RezRxtDbWriter(db_path).add_rxt(context, "houdini", rxt)
+
+
+class WriterTest(DbTestCase):
+    """
+    Tests covering atomic and concurrent writes.
+    """
+    def setUp(self):
+        super(WriterTest, self).setUp()
+        self.rxt = load_sample()
+
+    def test_duplicate(self):
+        """
+        Adding an existing resolve raises DuplicateKeyError, leaving it intact.
+        """
+        writer = RezRxtDbWriter(self.db_path)
+        with self.assertRaises(DuplicateKeyError):
+            writer.add_rxt("model", "houdini", dict(self.rxt, status="failed"))
+        self.assertTrue(issubclass(DuplicateKeyError, KeyError))
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(reader.rxt_dict("model", "houdini", 1503265457), self.rxt)
+
+    def test_failed_write(self):
+        """
+        A resolve which cannot be encoded or written does not claim its
+        timestamp, and may be written again.
+        """
+        mgr = RezRxtDbWriteMgr(self.db_path)
+        rxt = dict(self.rxt, timestamp=1503267000)
+        with self.assertRaises(TypeError):
+            mgr.write_rxt("model", "houdini", 1503267000, dict(rxt, status=object()))
+        self.assertFalse(exists(mgr.timestamp_dir("model", "houdini", 1503267000)))
+
+        def fail(encoded):
+            raise IOError("disk full")
+        mgr._write_encoded = fail
+        with self.assertRaises(IOError):
+            mgr.write_rxt("model", "houdini", 1503267000, rxt)
+        self.assertEqual(sorted(listdir(mgr.timestamps_dir("model", "houdini"))),
+                         ["1503265457", "1503266406"])
+
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini", rxt)
+        reader = RezRxtDbReader(self.db_path, cache=False)
+        self.assertEqual(list(reader.timestamps("model", "houdini")),
+                         [1503265457, 1503266406, 1503267000])
+
+    def test_failed_bake(self):
+        """
+        A resolve which fails to evaluate while baking is not stored, and may
+        be added again.
+        """
+        def fail(rxt_dict):
+            raise RuntimeError("commands() failed")
+        load_context = writer_module.load_context
+        writer_module.load_context = fail
+        try:
+            baking = RezRxtDbWriter(self.db_path, bake=True)
+            rxt = dict(self.rxt, timestamp=1503267000)
+            self.assertRaises(RuntimeError, baking.add_rxt, "model", "houdini", rxt)
+            self.assertRaises(RuntimeError, baking.store_rxt, "model", "houdini", rxt)
+        finally:
+            writer_module.load_context = load_context
+        mgr = RezRxtDbWriteMgr(self.db_path)
+        self.assertFalse(exists(mgr.timestamp_dir("model", "houdini", 1503267000)))
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini", rxt)
+
+    def test_no_temporary_files(self):
+        """
+        Writes leave no temporary files behind, and honor the umask.
+        """
+        RezRxtDbWriter(self.db_path).add_rxt("model", "houdini", dict(self.rxt, timestamp=1))
+        leftovers = [f_name for _, _, f_names in walk(self.db_path)
+                     for f_name in f_names if f_name.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+        path = RezRxtDbReadMgr(self.db_path).rxt_path("model", "houdini", 1)
+        self.assertTrue(stat(path).st_mode & st.S_IRGRP or stat(path).st_mode & st.S_IROTH)
+
+    def test_concurrent_writers(self):
+        """
+        Writers in separate processes, adding to the same names, lose no updates
+        to the indexes or catalog.
+        """
+        tasks = [(self.db_path, context, timestamp)
+                 for timestamp in range(1503267000, 1503267040)
+                 for context in ("model", "lgt")]
+        pool = Pool(4)
+        try:
+            pool.map(_add, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        mgr = RezRxtDbReadMgr(self.db_path)
+        self.assertEqual(len(mgr.timestamp_index("model", "houdini").read_current()["timestamps"]),
+                         42)
+        self.assertEqual(mgr.timestamp_index("lgt", "houdini").read_current()["timestamps"],
+                         range(1503267000, 1503267040))
+        self.assertEqual(mgr.catalog().entry("lgt", "houdini")["count"], 40)
+        self.assertEqual(mgr.catalog().entry("model", "houdini")["count"], 42)
+
+    def test_batch_durability(self):
+        """
+        With batch durability, fsyncs are deferred until the writer is flushed.
+        """
+        writer = RezRxtDbWriter(self.db_path, durability="batch")
+        writer.add_rxt("model", "houdini", dict(self.rxt, timestamp=1))
+        pending = len(writer.mgr.sync_batch)
+        self.assertTrue(pending >= 2)
+        self.assertEqual(writer.flush(), pending)
+        self.assertEqual(len(writer.mgr.sync_batch), 0)
+
+        writer = RezRxtDbWriter(self.db_path, durability="always")
+        writer.add_rxt("model", "houdini", dict(self.rxt, timestamp=2))
+        self.assertEqual(len(writer.mgr.sync_batch), 0)
+        self.assertRaises(ValueError, RezRxtDbWriteMgr, self.db_path, "sometimes")
+
+    def test_sync_batch(self):
+        """
+        A batch is due once it holds enough paths.
+        """
+        batch = fsutil.SyncBatch(max_pending=2, max_delay=60)
+        path = pjoin(self.db_path, "file")
+        fsutil.atomic_write(path, b"data")
+        self.assertFalse(batch.add(path))
+        self.assertTrue(batch.add(path))
+        self.assertEqual(batch.flush(), 2)
+        self.assertFalse(batch.due())
+        self.assertEqual([f_name for f_name in listdir(self.db_path) if f_name.endswith(".tmp")],
+                         [])